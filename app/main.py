@@ -13,6 +13,8 @@ from views.login_dialog import LoginDialog
 from views.main_window import MainWindow
 from db.create_tables import create_all_tables
 from db.manage_data import create_seed_data
+from db.sync import install_from_env as install_sync_from_env
+from db.maintenance import install_from_env as install_maintenance_from_env
 from config.settings import settings
 from controllers.auth_controller import auth
 import traceback
@@ -146,6 +148,14 @@ class SisUSFApplication:
             # Criar dados iniciais
             create_seed_data()
             
+            # Modo offline: diário de alterações + sincronização em segundo plano
+            if install_sync_from_env():
+                print("🔄 Modo offline: sincronização com o servidor central ativada")
+
+            # Faltas e última consulta em lotes (SISUSF_MANUTENCAO_INTERVALO)
+            if install_maintenance_from_env():
+                print("🧹 Manutenção de consultas agendada em segundo plano")
+            
             return True
             
         except Exception as e:
@@ -164,6 +174,8 @@ class SisUSFApplication:
         if login_dialog.exec_() == LoginDialog.Accepted:
             return True
         else:
+            # tentativas bloqueadas antes de desistir do login
+            auth.descarregar_bloqueios()
             return False
     
     def show_main_window(self):
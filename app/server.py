@@ -0,0 +1,591 @@
+# =============================================================================
+# app/server.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Modo serviço: API HTTP/JSON local sobre os controllers.
+
+Um único processo mantém o pool de conexões aquecido e atende vários
+terminais (clientes leves ou o próprio aplicativo desktop), em vez de cada
+estação abrir o seu pool contra o PostgreSQL.
+
+- asyncio aceita as conexões (HTTP/1.1 com keep-alive) e faz o parse;
+- os controllers (síncronos, SQLAlchemy) rodam num pool de threads com o
+  mesmo tamanho do pool de conexões, então nenhuma requisição fica
+  esperando conexão dentro de uma thread;
+- cada requisição roda em nome do usuário do token (auth.acting_as), sem
+  tocar no login do processo.
+
+    python -m app.server [--host 127.0.0.1] [--port 8765] [--workers N]
+
+    POST /login              {"email", "password"} -> {"token", "usuario"}
+    POST /logout
+    GET  /status
+    GET  /pacientes?q=&limite=
+    GET  /pacientes/{id}
+    POST /pacientes          campos do paciente (+ "endereco")
+    PUT  /pacientes/{id}
+    GET  /relatorios/dashboard
+    GET  /relatorios/consultas-por-tipo?inicio=AAAA-MM-DD&fim=AAAA-MM-DD
+    GET  /relatorios/faixa-etaria
+    GET  /relatorios/sem-consulta?meses=12&familia_id=&cursor=
+    GET  /relatorios/adesao?competencia=AAAA-MM&abaixo_de=&medicamento_id=&cursor=&limite=
+    GET  /auditoria?tabela=&registro_id=&usuario_id=&acao=&desde=&ate=&cursor=&limite=
+    GET  /auditoria/{tabela}/{id}/versao?em=
+    GET  /agenda?inicio=&fim=&profissional_id=
+    GET  /agenda/horarios?profissional_id=&dia=
+    POST /agenda             {"paciente_id", "profissional_id", "data_hora", "tipo"?, "duracao_minutos"?}
+    POST /agenda/{id}/cancelar  {"motivo"?}
+    POST /agenda/recorrencia {"regra": {...}, "pacientes": [ids] | "condicao": "hipertens", "simular": bool}
+    GET  /medicamentos/alertas?dias=
+    GET  /medicamentos/alertas/feed?apos=&limite=&pendentes=
+    GET  /medicamentos/{id}/extrato?limite=
+    POST /medicamentos/{id}/entrada  {"quantidade", "lote"?, "validade"?, "observacoes"?}
+    POST /dispensacoes       {"paciente_id", "itens": [{"medicamento_id", "quantidade", "dias_tratamento"?}],
+                              "observacoes"?, "confirmar_alertas"?}
+    POST /interacoes/verificar  {"paciente_id", "medicamento_ids"?: [ids], "principios"?: [nomes]}
+    GET  /pacientes/{id}/marcadores
+    PUT  /pacientes/{id}/marcadores  {"alergias": [princípios], "uso_continuo": [princípios]}
+
+Demais rotas se registram com @routes.route(...).
+Autenticação: cabeçalho "Authorization: Bearer <token>".
+
+Variáveis de ambiente:
+  SISUSF_API_HOST (127.0.0.1), SISUSF_API_PORT (8765)
+  SISUSF_API_WORKERS     threads dos controllers (padrão: tamanho do pool do banco)
+  SISUSF_API_SESSAO_TTL  segundos de inatividade até o token expirar (28800)
+"""
+import os
+import re
+import sys
+import json
+import enum
+import time
+import asyncio
+import logging
+import secrets
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Date, DateTime, Enum
+
+from controllers.auth_controller import auth
+from controllers.paciente_controller import paciente_controller
+from controllers.relatorio_controller import relatorio_controller
+from controllers.interacao_controller import interacao_controller
+from controllers.auditoria_controller import auditoria_controller
+from controllers.agenda_controller import agenda_controller
+from controllers.recorrencia_controller import recorrencia_controller
+from controllers.estoque_controller import estoque_controller
+from db.connection import db_manager
+from models.consulta import Consulta
+from models.endereco import Endereco
+from models.paciente import Paciente
+from utils.permissions import policy_for
+
+logger = logging.getLogger("sisusf.api")
+
+MAX_BODY = 1024 * 1024
+KEEPALIVE_TIMEOUT = 30.0
+SESSAO_TTL = float(os.getenv("SISUSF_API_SESSAO_TTL", "28800"))
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ---------------------------
+# JSON
+# ---------------------------
+def _json_default(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, SimpleNamespace):
+        return _usuario_json(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"{type(value).__name__} não é serializável")
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def _usuario_json(usuario) -> dict:
+    dados = {k: v for k, v in vars(usuario).items() if k != "permissions"}
+    dados["permissoes"] = sorted(policy_for(usuario).actions())
+    return dados
+
+
+def from_json(model, data: dict) -> dict:
+    """Converte valores JSON (strings de data, valor/nome de enum) pelos tipos das colunas"""
+    columns = model.__table__.c
+    convertido = {}
+    for key, value in data.items():
+        if key in columns and value is not None and isinstance(value, str):
+            tipo = columns[key].type
+            if isinstance(tipo, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(tipo, Date):
+                value = date.fromisoformat(value)
+            elif isinstance(tipo, Enum) and tipo.enum_class is not None:
+                try:
+                    value = tipo.enum_class(value)
+                except ValueError:
+                    value = tipo.enum_class[value]
+        convertido[key] = value
+    return convertido
+
+
+# ---------------------------
+# Sessões (token -> usuário)
+# ---------------------------
+class TokenStore:
+    def __init__(self, ttl: float = SESSAO_TTL, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._sessoes: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def criar(self, usuario) -> str:
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessoes[token] = [usuario, self.clock()]
+        return token
+
+    def usuario(self, token: Optional[str]):
+        if not token:
+            return None
+        with self._lock:
+            sessao = self._sessoes.get(token)
+            if sessao is None:
+                return None
+            agora = self.clock()
+            if agora - sessao[1] > self.ttl:
+                del self._sessoes[token]
+                return None
+            sessao[1] = agora
+            return sessao[0]
+
+    def remover(self, token: str) -> None:
+        with self._lock:
+            self._sessoes.pop(token, None)
+
+
+# ---------------------------
+# Rotas
+# ---------------------------
+class Router:
+    def __init__(self):
+        self._routes: List[Tuple[str, "re.Pattern", Callable, bool]] = []
+
+    def route(self, method: str, path: str, public: bool = False):
+        """path com parâmetros: /pacientes/{id:int}, /auditoria/{tabela}"""
+        def compile_part(match):
+            name, _, kind = match.group(1).partition(":")
+            return f"(?P<{name}>\\d+)" if kind == "int" else f"(?P<{name}>[^/]+)"
+        pattern = re.compile("^" + re.sub(r"\{([^}]+)\}", compile_part, path) + "$")
+        ints = set(re.findall(r"\{(\w+):int\}", path))
+
+        def decorator(handler):
+            def call(request):
+                request.params = {k: int(v) if k in ints else v for k, v in request.params.items()}
+                return handler(request)
+            self._routes.append((method, pattern, call, public))
+            return handler
+        return decorator
+
+    def match(self, method: str, path: str):
+        allowed = False
+        for route_method, pattern, handler, public in self._routes:
+            found = pattern.match(path)
+            if found:
+                if route_method == method:
+                    return handler, public, found.groupdict()
+                allowed = True
+        raise HTTPError(405 if allowed else 404, "Método não permitido" if allowed else "Rota não encontrada")
+
+
+# instância global
+routes = Router()
+sessoes = TokenStore()
+
+
+def _int(value) -> Optional[int]:
+    return int(value) if value not in (None, "") else None
+
+
+def _date(value) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+@routes.route("POST", "/login", public=True)
+def login(request):
+    dados = request.json or {}
+    result = auth.login(dados.get("email", ""), dados.get("password", ""), request.ip)
+    if not result["success"]:
+        return result
+    return {"success": True, "message": result["message"], "token": sessoes.criar(result["user"]),
+            "usuario": result["user"]}
+
+
+@routes.route("POST", "/logout")
+def logout(request):
+    auth.logout()
+    sessoes.remover(request.token)
+    return {"success": True, "message": "Logout realizado"}
+
+
+@routes.route("GET", "/status", public=True)
+def status(request):
+    return {"success": True, "banco": db_manager.get_database_info()}
+
+
+@routes.route("GET", "/pacientes")
+def buscar_pacientes(request):
+    pacientes = paciente_controller.search_pacientes(request.query.get("q", ""),
+                                                     _int(request.query.get("limite")) or 50)
+    return {"success": True, "pacientes": pacientes}
+
+
+@routes.route("GET", "/pacientes/{id:int}")
+def obter_paciente(request):
+    return paciente_controller.get_paciente_by_id(request.params["id"])
+
+
+@routes.route("POST", "/pacientes")
+def criar_paciente(request):
+    dados = from_json(Paciente, request.json or {})
+    if isinstance(dados.get("endereco"), dict):
+        dados["endereco"] = from_json(Endereco, dados["endereco"])
+    return paciente_controller.create_paciente(dados)
+
+
+@routes.route("PUT", "/pacientes/{id:int}")
+def atualizar_paciente(request):
+    return paciente_controller.update_paciente(request.params["id"], from_json(Paciente, request.json or {}))
+
+
+@routes.route("GET", "/relatorios/dashboard")
+def dashboard(request):
+    return relatorio_controller.get_dashboard_data()
+
+
+@routes.route("GET", "/relatorios/consultas-por-tipo")
+def consultas_por_tipo(request):
+    hoje = date.today()
+    return relatorio_controller.get_consultas_por_tipo(_date(request.query.get("inicio")) or hoje.replace(day=1),
+                                                       _date(request.query.get("fim")) or hoje)
+
+
+@routes.route("GET", "/relatorios/faixa-etaria")
+def faixa_etaria(request):
+    return relatorio_controller.get_pacientes_por_faixa_etaria()
+
+
+@routes.route("GET", "/relatorios/sem-consulta")
+def sem_consulta(request):
+    q = request.query
+    return relatorio_controller.pacientes_sem_consulta(
+        meses=_int(q.get("meses")) or 12, familia_id=_int(q.get("familia_id")),
+        cursor=q.get("cursor"), limite=_int(q.get("limite")) or 50)
+
+
+@routes.route("GET", "/relatorios/adesao")
+def adesao(request):
+    q = request.query
+    return relatorio_controller.adesao(
+        competencia=_date(q["competencia"] + "-01") if q.get("competencia") else None,
+        abaixo_de=float(q.get("abaixo_de") or 0.8), medicamento_id=_int(q.get("medicamento_id")),
+        cursor=q.get("cursor"), limite=_int(q.get("limite")) or 50)
+
+
+@routes.route("GET", "/auditoria")
+def auditoria(request):
+    q = request.query
+    return auditoria_controller.buscar(
+        tabela=q.get("tabela"), registro_id=_int(q.get("registro_id")), usuario_id=_int(q.get("usuario_id")),
+        acao=q.get("acao"), desde=_date(q.get("desde")), ate=_date(q.get("ate")),
+        cursor=q.get("cursor"), limite=_int(q.get("limite")) or 50,
+    )
+
+
+@routes.route("GET", "/auditoria/{tabela}/{id:int}/versao")
+def versao(request):
+    em = request.query.get("em")
+    return auditoria_controller.versao_registro(request.params["tabela"], request.params["id"],
+                                                em=datetime.fromisoformat(em) if em else None)
+
+
+@routes.route("GET", "/agenda")
+def agenda(request):
+    q = request.query
+    hoje = date.today()
+    inicio = _date(q.get("inicio")) or hoje
+    consultas = agenda_controller.agenda_periodo(inicio, _date(q.get("fim")) or inicio, _int(q.get("profissional_id")))
+    return {"success": True, "consultas": consultas}
+
+
+@routes.route("GET", "/agenda/horarios")
+def horarios(request):
+    return agenda_controller.horarios(int(request.query["profissional_id"]),
+                                      _date(request.query.get("dia")) or date.today())
+
+
+@routes.route("POST", "/agenda")
+def agendar(request):
+    dados = from_json(Consulta, request.json or {})
+    return agenda_controller.agendar(dados["paciente_id"], dados["profissional_id"], dados["data_hora"],
+                                     tipo=dados.get("tipo"), duracao_minutos=dados.get("duracao_minutos"),
+                                     observacoes=dados.get("observacoes"))
+
+
+@routes.route("POST", "/agenda/{id:int}/cancelar")
+def cancelar(request):
+    return agenda_controller.cancelar(request.params["id"], (request.json or {}).get("motivo"))
+
+
+@routes.route("POST", "/agenda/recorrencia")
+def recorrencia(request):
+    dados = request.json or {}
+    regra = from_json(Consulta, dados.get("regra") or {})
+    regra["inicio"] = _date(regra.get("inicio"))
+    pacientes = [int(i) for i in dados.get("pacientes") or []]
+    if not pacientes:
+        condicao = (dados.get("condicao") or "").strip()
+        if not condicao:
+            raise HTTPError(400, "Informe os pacientes ou a condição da coorte")
+        pacientes = recorrencia_controller.pacientes_da_coorte(condicao)
+    return recorrencia_controller.gerar(regra, pacientes, simular=bool(dados.get("simular")))
+
+
+@routes.route("GET", "/medicamentos/alertas")
+def alertas_estoque(request):
+    return estoque_controller.alertas(_int(request.query.get("dias")) or 30)
+
+
+@routes.route("GET", "/medicamentos/alertas/feed")
+def feed_alertas_estoque(request):
+    pendentes = [_int(i) for i in (request.query.get("pendentes") or "").split(",")]
+    return estoque_controller.novos_alertas(_int(request.query.get("apos")) or 0,
+                                            _int(request.query.get("limite")) or 100,
+                                            [i for i in pendentes if i is not None])
+
+
+@routes.route("GET", "/medicamentos/{id:int}/extrato")
+def extrato_estoque(request):
+    return estoque_controller.extrato(request.params["id"], _int(request.query.get("limite")) or 50)
+
+
+@routes.route("POST", "/medicamentos/{id:int}/entrada")
+def entrada_estoque(request):
+    dados = request.json or {}
+    return estoque_controller.entrada(request.params["id"], int(dados["quantidade"]), dados.get("lote"),
+                                      _date(dados.get("validade")), dados.get("observacoes"))
+
+
+@routes.route("POST", "/dispensacoes")
+def dispensar(request):
+    dados = request.json or {}
+    return estoque_controller.dispensar(int(dados["paciente_id"]), dados.get("itens") or [], dados.get("observacoes"),
+                                        bool(dados.get("confirmar_alertas")))
+
+
+@routes.route("POST", "/interacoes/verificar")
+def verificar_interacoes(request):
+    dados = request.json or {}
+    return interacao_controller.verificar(int(dados["paciente_id"]), dados.get("medicamento_ids") or [],
+                                          dados.get("principios") or [])
+
+
+@routes.route("GET", "/pacientes/{id:int}/marcadores")
+def marcadores_paciente(request):
+    return interacao_controller.marcadores(request.params["id"])
+
+
+@routes.route("PUT", "/pacientes/{id:int}/marcadores")
+def definir_marcadores_paciente(request):
+    dados = request.json or {}
+    return interacao_controller.definir_marcadores(request.params["id"], dados.get("alergias") or [],
+                                                   dados.get("uso_continuo") or [])
+
+
+# ---------------------------
+# Servidor
+# ---------------------------
+def _default_workers() -> int:
+    pool = db_manager.engine.pool
+    size = getattr(pool, "size", lambda: 5)() + max(getattr(pool, "_max_overflow", 0), 0)
+    return max(2, min(size, 32))
+
+
+class APIServer:
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 workers: Optional[int] = None, router: Router = routes, tokens: TokenStore = sessoes):
+        self.host = host or os.getenv("SISUSF_API_HOST", "127.0.0.1")
+        self.port = port if port is not None else int(os.getenv("SISUSF_API_PORT", "8765"))
+        self.workers = workers or int(os.getenv("SISUSF_API_WORKERS", "0")) or _default_workers()
+        self.router = router
+        self.tokens = tokens
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+
+    async def start(self) -> None:
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="sisusf-api")
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("API em http://%s:%d (%d workers)", self.host, self.port, self.workers)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # conexões keep-alive ociosas não impedem o encerramento
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    # ------------------------
+    # HTTP
+    # ------------------------
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        ip = (writer.get_extra_info("peername") or ("", 0))[0]
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"success": False, "message": "Requisição muito grande"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._dispatch(method, target, headers, body, ip)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _respond(self, writer, status: int, payload, keep_alive: bool) -> None:
+        body = payload if isinstance(payload, bytes) else _encode(payload)
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, target: str, headers: dict, body: bytes, ip: str):
+        try:
+            url = urlsplit(target)
+            handler, public, params = self.router.match(method.upper(), url.path)
+
+            token = headers.get("authorization", "")
+            token = token[7:] if token.lower().startswith("bearer ") else None
+            usuario = self.tokens.usuario(token)
+            if usuario is None and not public:
+                raise HTTPError(401, "Não autenticado")
+            try:
+                dados = json.loads(body) if body else None
+            except ValueError:
+                raise HTTPError(400, "JSON inválido")
+
+            request = SimpleNamespace(params=params, query=dict(parse_qsl(url.query)), json=dados,
+                                      usuario=usuario, token=token, ip=ip)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, self._call, handler, request)
+            return 200, result
+        except HTTPError as e:
+            return e.status, {"success": False, "message": e.message}
+        except (ValueError, KeyError) as e:
+            return 400, {"success": False, "message": f"Parâmetro inválido: {e}"}
+        except Exception as e:
+            logger.exception("Erro em %s %s", method, target)
+            return 500, {"success": False, "message": f"Erro interno: {e}"}
+
+    @staticmethod
+    def _call(handler, request) -> bytes:
+        # controllers consultam auth.current_user: aqui é o usuário do token
+        with auth.acting_as(request.usuario):
+            # serializado ainda na thread: objetos do ORM e nenhum custo no loop
+            return _encode(handler(request))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SISUSF - API HTTP/JSON local")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    from db.create_tables import create_all_tables
+    from db.manage_data import create_seed_data
+    from db.sync import install_from_env as install_sync_from_env
+    from db.maintenance import install_from_env as install_maintenance_from_env
+
+    if not create_all_tables():
+        return 1
+    create_seed_data()
+    install_sync_from_env()
+    install_maintenance_from_env()
+    db_manager.warm_pool()
+
+    server = APIServer(args.host, args.port, args.workers)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # resumos de logins bloqueados ainda abertos
+        auth.descarregar_bloqueios()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
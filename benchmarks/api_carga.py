@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Teste de carga da API local (app/server.py)
+
+Sobe o servidor num banco SQLite temporário com N pacientes (ou usa --url de
+um servidor já em execução) e dispara C clientes concorrentes, cada um com
+a sua conexão keep-alive, alternando busca de pacientes, ficha do paciente
+e dashboard. Mede requisições/s e latência (p50/p95/p99).
+
+Execute: python benchmarks/api_carga.py [--clientes 50] [--requisicoes 40] [--workers N]
+         python benchmarks/api_carga.py --url http://127.0.0.1:8765 --email admin@sisusf.com --senha admin123
+"""
+
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from datetime import date
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cadastro_pacientes import gerar_cpf
+
+
+async def request(reader, writer, method, path, token=None, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: sisusf\r\nContent-Length: {len(data)}\r\n"
+    if token:
+        head += f"Authorization: Bearer {token}\r\n"
+    writer.write(head.encode() + b"\r\n" + data)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def cliente(host, port, token, ids, n, latencias, erros):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(n):
+            rota = ("/pacientes?q=Benchmark&limite=20", f"/pacientes/{ids[i % len(ids)]}",
+                    "/relatorios/dashboard")[i % 3]
+            inicio = time.perf_counter()
+            status, resposta = await request(reader, writer, "GET", rota, token)
+            latencias.append(time.perf_counter() - inicio)
+            if status != 200 or not resposta.get("success"):
+                erros.append((rota, status, resposta.get("message")))
+    finally:
+        writer.close()
+
+
+async def carga(host, port, email, senha, clientes, requisicoes, ids):
+    reader, writer = await asyncio.open_connection(host, port)
+    _, login = await request(reader, writer, "POST", "/login", body={"email": email, "password": senha})
+    writer.close()
+    if not login.get("success"):
+        raise SystemExit(f"Falha no login: {login.get('message')}")
+
+    latencias, erros = [], []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(host, port, login["token"], ids, requisicoes, latencias, erros)
+                           for _ in range(clientes)))
+    return time.perf_counter() - inicio, sorted(latencias), erros
+
+
+def preparar_servidor(pacientes, workers):
+    workdir = tempfile.mkdtemp(prefix="sisusf_bench_")
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "sisusf.db")
+    os.environ.setdefault("PG_RETRIES", "0")
+
+    from app.server import APIServer
+    from controllers.auth_controller import auth
+    from controllers.paciente_controller import paciente_controller
+    from db.create_tables import create_all_tables
+    from db.manage_data import create_seed_data
+    from models.paciente import Sexo
+
+    create_all_tables()
+    create_seed_data()
+    ids = []
+    with auth.acting_as(SimpleNamespace(id=1, nome="Benchmark", email="bench@sisusf.com", tipo="admin")):
+        for i in range(pacientes):
+            result = paciente_controller.create_paciente({
+                "nome_completo": f"Paciente Benchmark {i}", "cpf": gerar_cpf(i), "cns": f"7{i:014d}",
+                "sexo": Sexo.FEMININO, "data_nascimento": date(1950 + i % 60, 1 + i % 12, 1 + i % 28),
+            })
+            ids.append(result["paciente_id"])
+
+    loop = asyncio.new_event_loop()
+    server = APIServer("127.0.0.1", 0, workers)
+    loop.run_until_complete(server.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return server, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API local")
+    parser.add_argument("--clientes", type=int, default=50)
+    parser.add_argument("--requisicoes", type=int, default=40, help="requisições por cliente")
+    parser.add_argument("--pacientes", type=int, default=200)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--url", help="servidor já em execução (senão sobe um local)")
+    parser.add_argument("--email", default="admin@sisusf.com")
+    parser.add_argument("--senha", default="admin123")
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        host, port, ids, workers = url.hostname, url.port or 80, list(range(1, args.pacientes + 1)), "?"
+    else:
+        server, ids = preparar_servidor(args.pacientes, args.workers)
+        host, port, workers = server.host, server.port, server.workers
+
+    duracao, latencias, erros = asyncio.run(
+        carga(host, port, args.email, args.senha, args.clientes, args.requisicoes, ids))
+
+    total = len(latencias)
+    pct = lambda p: latencias[min(total - 1, int(total * p))] * 1000
+    print(f"🏁 {args.clientes} clientes concorrentes x {args.requisicoes} requisições ({workers} workers)")
+    print(f"   vazão:    {total / duracao:8.1f} requisições/s")
+    print(f"   latência: p50 {pct(0.50):.1f} ms  p95 {pct(0.95):.1f} ms  p99 {pct(0.99):.1f} ms")
+    if erros:
+        print(f"   ⚠️ {len(erros)} respostas com erro (primeira: {erros[0]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark do caminho de escrita de pacientes (PacienteController)
+
+Cadastra N pacientes em sequência via create_paciente (com endereço e log
+de auditoria) e depois atualiza cada um via update_paciente, em um banco
+SQLite temporário. Mede cadastros/s, atualizações/s e instruções SQL por
+operação.
+
+Execute: python benchmarks/cadastro_pacientes.py [--pacientes 1000] [--perfil safe]
+"""
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+from types import SimpleNamespace
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def gerar_cpf(n: int) -> str:
+    base = f"{n + 100000000:09d}"[-9:]
+    digits = [int(d) for d in base]
+    for peso_inicial in (10, 11):
+        soma = sum(d * p for d, p in zip(digits, range(peso_inicial, 1, -1)))
+        dv = (soma * 10) % 11
+        digits.append(0 if dv == 10 else dv)
+    return "".join(map(str, digits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cadastro de pacientes")
+    parser.add_argument("--pacientes", type=int, default=1000)
+    parser.add_argument("--perfil", default="safe")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="sisusf_bench_")
+    os.environ["SQLITE_PATH"] = os.path.join(workdir, "sisusf.db")
+    os.environ["SQLITE_PROFILE"] = args.perfil
+    os.environ.setdefault("PG_RETRIES", "0")
+
+    from db.connection import db_manager
+    from db.create_tables import create_all_tables
+    from db.instrumentation import query_metrics
+    from controllers.auth_controller import auth
+    from controllers.paciente_controller import paciente_controller
+    from models.paciente import Sexo
+
+    create_all_tables()
+    auth.current_user = SimpleNamespace(id=1, nome="Benchmark", email="bench@sisusf.com", tipo="admin")
+    query_metrics.reset()
+
+    ids = []
+    start = time.perf_counter()
+    for i in range(args.pacientes):
+        result = paciente_controller.create_paciente({
+            "nome_completo": f"Paciente Benchmark {i}",
+            "cpf": gerar_cpf(i),
+            "cns": f"7{i:014d}",
+            "sexo": Sexo.FEMININO,
+            "data_nascimento": date(1950 + i % 60, 1 + i % 12, 1 + i % 28),
+            "endereco": {
+                "cep": "01001000", "logradouro": "Rua A", "numero": str(i),
+                "bairro": "Centro", "cidade": "São Paulo", "uf": "SP",
+            },
+        })
+        if not result["success"]:
+            raise SystemExit(f"Falha no cadastro {i}: {result['message']}")
+        ids.append(result["paciente_id"])
+    cadastro = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for paciente_id in ids:
+        result = paciente_controller.update_paciente(paciente_id, {"telefone": "1133334444"})
+        if not result["success"]:
+            raise SystemExit(f"Falha na atualização {paciente_id}: {result['message']}")
+    atualizacao = time.perf_counter() - start
+
+    ops = query_metrics.snapshot()["operations"]
+    print(f"🏁 {args.pacientes} cadastros sequenciais (SQLite, perfil {args.perfil}, {db_manager.database_type})")
+    print(f"   cadastro:    {args.pacientes / cadastro:8.1f} pacientes/s  "
+          f"({ops['create_paciente']['statements'] / args.pacientes:.1f} instruções SQL/cadastro)")
+    print(f"   atualização: {args.pacientes / atualizacao:8.1f} pacientes/s  "
+          f"({ops['update_paciente']['statements'] / args.pacientes:.1f} instruções SQL/atualização)")
+
+
+if __name__ == "__main__":
+    main()
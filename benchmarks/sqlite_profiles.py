@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos perfis de desempenho do SQLite (db/sqlite_profile.py)
+
+Para cada preset (safe / balanced / fast) cria um banco novo, carrega N
+pacientes e mede:
+  - carga em lote (1000 linhas por transação)
+  - cadastros unitários (uma transação por paciente, como na tela de cadastro)
+  - busca por CPF (igualdade, índice único)
+  - busca por nome (ILIKE '%termo%', como PacienteController.search_pacientes)
+
+Execute: python benchmarks/sqlite_profiles.py [--pacientes 100000]
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, insert
+from db.sqlite_profile import SQLITE_PROFILES, install_profile
+from models.endereco import Endereco
+from models.familia import Familia
+from models.paciente import Paciente
+
+NOMES = ["Maria", "José", "Ana", "João", "Antônio", "Francisca", "Carlos", "Paulo", "Lucas", "Luiza"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira", "Costa", "Rodrigues", "Almeida"]
+
+
+def _paciente_row(i: int) -> dict:
+    now = datetime.utcnow()
+    return {
+        "nome_completo": f"{random.choice(NOMES)} {random.choice(SOBRENOMES)} {random.choice(SOBRENOMES)} {i}",
+        "cpf": f"{i:011d}",
+        "cns": f"7{i:014d}",
+        "sexo": "FEMININO" if i % 2 else "MASCULINO",
+        "data_nascimento": date(1940 + i % 80, 1 + i % 12, 1 + i % 28),
+        "ativo": True,
+        "status": "ATIVO",
+        "data_cadastro": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def run_profile(profile: str, total: int, unitarios: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"bench_{profile}.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    install_profile(engine, profile, overrides="")
+    tabela = Paciente.__table__
+    Paciente.metadata.create_all(engine, tables=[Endereco.__table__, Familia.__table__, tabela])
+
+    # Carga em lote
+    start = time.perf_counter()
+    for base in range(0, total, 1000):
+        rows = [_paciente_row(i) for i in range(base, min(base + 1000, total))]
+        with engine.begin() as conn:
+            conn.execute(insert(tabela), rows)
+    lote = total / (time.perf_counter() - start)
+
+    # Cadastros unitários: um commit (e um fsync, conforme synchronous) por linha
+    start = time.perf_counter()
+    for i in range(total, total + unitarios):
+        with engine.begin() as conn:
+            conn.execute(insert(tabela), [_paciente_row(i)])
+    unit = unitarios / (time.perf_counter() - start)
+
+    # Busca por CPF
+    cpfs = [f"{random.randrange(total):011d}" for _ in range(2000)]
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        for cpf in cpfs:
+            conn.execute(select(tabela.c.id).where(tabela.c.cpf == cpf)).first()
+    busca_cpf = len(cpfs) / (time.perf_counter() - start)
+
+    # Busca por nome (varredura, limit 50)
+    termos = [random.choice(SOBRENOMES) + " " + random.choice(SOBRENOMES) for _ in range(50)]
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        for termo in termos:
+            conn.execute(
+                select(tabela).where(tabela.c.nome_completo.ilike(f"%{termo}%")).limit(50)
+            ).fetchall()
+    busca_nome = len(termos) / (time.perf_counter() - start)
+
+    engine.dispose()
+    return {
+        "perfil": profile,
+        "lote_linhas_s": lote,
+        "unitario_tx_s": unit,
+        "busca_cpf_q_s": busca_cpf,
+        "busca_nome_q_s": busca_nome,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos perfis SQLite do SISUSF")
+    parser.add_argument("--pacientes", type=int, default=100000)
+    parser.add_argument("--unitarios", type=int, default=2000)
+    parser.add_argument("--perfis", default=",".join(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"🏁 Benchmark SQLite: {args.pacientes} pacientes, {args.unitarios} cadastros unitários")
+    print(f"{'perfil':<10} {'lote (lin/s)':>14} {'unit. (tx/s)':>14} {'CPF (q/s)':>12} {'nome (q/s)':>12}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for profile in args.perfis.split(","):
+            r = run_profile(profile.strip(), args.pacientes, args.unitarios, workdir)
+            print(
+                f"{r['perfil']:<10} {r['lote_linhas_s']:>14.0f} {r['unitario_tx_s']:>14.0f} "
+                f"{r['busca_cpf_q_s']:>12.0f} {r['busca_nome_q_s']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
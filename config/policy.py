@@ -0,0 +1,42 @@
+# =============================================================================
+# config/policy.py
+# =============================================================================
+# Política de acesso declarativa, compilada no login por utils/permissions.py.
+#
+# roles: perfil (TipoUsuario) -> recurso -> ações permitidas.
+#   "*" vale para qualquer recurso sem regra própria; uma regra por recurso
+#   substitui a regra "*" para aquele recurso.
+# ubs: ajustes por unidade de saúde do usuário, aplicados sobre o perfil:
+#   "conceder"/"negar": perfil -> recurso -> ações.
+
+ACTIONS = ("create", "read", "update", "delete", "report", "audit")
+
+POLICY = {
+    "roles": {
+        "ADMIN": {
+            "*": ["create", "read", "update", "delete", "report", "audit"],
+        },
+        "MEDICO": {
+            "*": ["create", "read", "update", "report"],
+        },
+        "ENFERMEIRO": {
+            "*": ["create", "read", "update"],
+        },
+        "ACS": {
+            "*": ["read", "update"],
+            "consultas": ["read"],
+            "medicamentos": ["read"],
+            "dispensacoes": ["read"],
+        },
+        "PACIENTE": {},
+    },
+    "ubs": {
+        # exemplo:
+        # "2077485": {"conceder": {"ENFERMEIRO": {"*": ["report"]}}},
+    },
+}
+
+# nomes antigos de perfil ainda aceitos
+ROLE_ALIASES = {
+    "AGENTE": "ACS",
+}
@@ -0,0 +1,339 @@
+# =============================================================================
+# controllers/agenda_controller.py
+# =============================================================================
+"""
+Agenda: modelos de horário por profissional, geração de horários e
+marcação de consultas.
+
+A ocupação de cada profissional por dia fica em memória (utils/intervals.py),
+carregada de uma vez para a janela visível (carregar_janela); conflitos são
+verificados por busca binária, sem consulta por horário candidato. Dias
+carregados há mais de SISUSF_AGENDA_CACHE_TTL segundos são recarregados
+(e descartados da memória na carga seguinte).
+A barreira final contra marcação dupla vinda de outra estação é o índice
+único (profissional, horário) e, no PostgreSQL, a restrição de exclusão por
+sobreposição. No SQLite só existe o índice único: ele barra duas consultas
+no mesmo horário de início, mas não horários que apenas se sobrepõem
+(ex.: 09:00-09:20 e 09:10-09:30) marcados por estações diferentes dentro
+do TTL do cache.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from models.agenda import ModeloAgenda
+from models.consulta import Consulta, StatusConsulta, TipoConsulta
+from models.paciente import Paciente
+from models.usuario import Usuario, TipoUsuario
+from utils.intervals import DayIntervals
+from db.unit_of_work import unit_of_work
+from db.instrumentation import track_operation
+from controllers.auth_controller import auth
+
+logger = logging.getLogger("sisusf.agenda")
+
+AGENDA_CACHE_TTL = float(os.getenv("SISUSF_AGENDA_CACHE_TTL", "60"))
+DURACAO_PADRAO = 20
+
+
+def _dias(inicio: date, fim: date) -> Iterable[date]:
+    for n in range((fim - inicio).days + 1):
+        yield inicio + timedelta(days=n)
+
+
+class AgendaIndex:
+    """Ocupação por (profissional, dia) e modelos de horário em memória"""
+
+    def __init__(self, ttl: float = AGENDA_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._dias: Dict[Tuple[int, date], Tuple[float, DayIntervals]] = {}
+        self._modelos: Optional[Tuple[float, Dict[int, List[ModeloAgenda]]]] = None
+        self._lock = threading.RLock()
+
+    def ocupacao(self, profissional_id: int, dia: date) -> Optional[DayIntervals]:
+        with self._lock:
+            entrada = self._dias.get((profissional_id, dia))
+            if entrada is None or self.clock() - entrada[0] > self.ttl:
+                return None
+            return entrada[1]
+
+    def carregar(self, session, inicio: date, fim: date, profissional_ids: Optional[Iterable[int]] = None) -> None:
+        """Uma consulta para toda a janela [inicio, fim]"""
+        query = session.query(Consulta.id, Consulta.profissional_id, Consulta.data_hora, Consulta.duracao_minutos) \
+            .filter(Consulta.data_hora >= datetime.combine(inicio, datetime.min.time()),
+                    Consulta.data_hora < datetime.combine(fim + timedelta(days=1), datetime.min.time()),
+                    Consulta.status != StatusConsulta.CANCELADA)
+        if profissional_ids is not None:
+            profissional_ids = list(profissional_ids)
+            query = query.filter(Consulta.profissional_id.in_(profissional_ids))
+
+        por_dia: Dict[Tuple[int, date], list] = {}
+        for consulta_id, profissional_id, data_hora, duracao in query:
+            fim_consulta = data_hora + timedelta(minutes=duracao or DURACAO_PADRAO)
+            por_dia.setdefault((profissional_id, data_hora.date()), []).append((data_hora, fim_consulta, consulta_id))
+
+        # só os profissionais que a consulta cobriu: os demais não ganham um dia "livre" falso
+        if profissional_ids is not None:
+            profissionais = set(profissional_ids)
+        else:
+            profissionais = {p for p, _ in por_dia} | set(self.modelos(session))
+        agora = self.clock()
+        with self._lock:
+            # dias expirados seriam recarregados de qualquer forma: não acumulam
+            for chave in [c for c, (carregado, _) in self._dias.items() if agora - carregado > self.ttl]:
+                del self._dias[chave]
+            for profissional_id in profissionais:
+                for dia in _dias(inicio, fim):
+                    self._dias[(profissional_id, dia)] = (
+                        agora, DayIntervals(por_dia.get((profissional_id, dia), ())))
+
+    def modelos(self, session) -> Dict[int, List[ModeloAgenda]]:
+        """Modelos ativos por profissional (tabela pequena: carregada inteira)"""
+        with self._lock:
+            if self._modelos is not None and self.clock() - self._modelos[0] <= self.ttl:
+                return self._modelos[1]
+        por_profissional: Dict[int, List[ModeloAgenda]] = {}
+        for modelo in session.query(ModeloAgenda).filter(ModeloAgenda.ativo == True) \
+                .order_by(ModeloAgenda.hora_inicio):
+            por_profissional.setdefault(modelo.profissional_id, []).append(modelo)
+            # o cache sobrevive à sessão: um rollback nela não pode expirar os modelos
+            session.expunge(modelo)
+        with self._lock:
+            self._modelos = (self.clock(), por_profissional)
+        return por_profissional
+
+    def adicionar(self, profissional_id: int, inicio: datetime, fim: datetime, consulta_id: int) -> None:
+        with self._lock:
+            entrada = self._dias.get((profissional_id, inicio.date()))
+            if entrada is not None:
+                entrada[1].add(inicio, fim, consulta_id)
+
+    def remover(self, profissional_id: int, dia: date, consulta_id: int) -> None:
+        with self._lock:
+            entrada = self._dias.get((profissional_id, dia))
+            if entrada is not None:
+                entrada[1].remove(consulta_id)
+
+    def invalidar(self, profissional_id: Optional[int] = None, dia: Optional[date] = None) -> None:
+        with self._lock:
+            if profissional_id is None:
+                self._dias.clear()
+                self._modelos = None
+            else:
+                self._dias.pop((profissional_id, dia), None)
+
+
+class AgendaController:
+    def __init__(self):
+        self.index = AgendaIndex()
+        self._ouvintes = []
+
+    def _ocupacao(self, session, profissional_id: int, dia: date) -> DayIntervals:
+        ocupacao = self.index.ocupacao(profissional_id, dia)
+        if ocupacao is None:
+            self.index.carregar(session, dia, dia, [profissional_id])
+            ocupacao = self.index.ocupacao(profissional_id, dia)
+        return ocupacao
+
+    def _modelo_do_horario(self, session, profissional_id: int, data_hora: datetime) -> Optional[ModeloAgenda]:
+        for modelo in self.index.modelos(session).get(profissional_id, []):
+            if modelo.vale_em(data_hora.date()) and modelo.hora_inicio <= data_hora.time() < modelo.hora_fim:
+                return modelo
+        return None
+
+    # ------------------------
+    # Modelos de horário
+    # ------------------------
+    @track_operation()
+    def definir_modelo(self, profissional_id: int, dia_semana: int, hora_inicio, hora_fim,
+                       duracao_minutos: int = DURACAO_PADRAO, tipo: TipoConsulta = TipoConsulta.CONSULTA_MEDICA,
+                       vigencia_inicio: Optional[date] = None, vigencia_fim: Optional[date] = None) -> dict:
+        """Acrescenta um período de atendimento semanal ao profissional"""
+        if not auth.has_permission('create', 'agenda'):
+            return {"success": False, "message": "Sem permissão"}
+        if not 0 <= dia_semana <= 6:
+            return {"success": False, "message": "Dia da semana inválido"}
+        if hora_fim <= hora_inicio or duracao_minutos <= 0:
+            return {"success": False, "message": "Período ou duração inválidos"}
+
+        try:
+            with unit_of_work("definir_modelo_agenda") as uow:
+                session = uow.session
+                sobreposto = session.query(ModeloAgenda.id).filter(
+                    ModeloAgenda.profissional_id == profissional_id,
+                    ModeloAgenda.dia_semana == dia_semana,
+                    ModeloAgenda.ativo == True,
+                    ModeloAgenda.hora_inicio < hora_fim,
+                    ModeloAgenda.hora_fim > hora_inicio
+                ).first()
+                if sobreposto:
+                    return {"success": False, "message": "Período sobrepõe outro horário do profissional"}
+                modelo = ModeloAgenda(
+                    profissional_id=profissional_id, dia_semana=dia_semana,
+                    hora_inicio=hora_inicio, hora_fim=hora_fim, duracao_minutos=duracao_minutos, tipo=tipo,
+                    vigencia_inicio=vigencia_inicio, vigencia_fim=vigencia_fim,
+                    created_by=auth.current_user.nome
+                )
+                session.add(modelo)
+            self.index.invalidar()
+            return {"success": True, "message": "Horário de atendimento salvo", "modelo_id": modelo.id}
+        except Exception as e:
+            return {"success": False, "message": f"Erro ao salvar horário: {str(e)}"}
+
+    # ------------------------
+    # Consulta da agenda
+    # ------------------------
+    @track_operation()
+    def carregar_janela(self, inicio: date, fim: date, profissional_ids: Optional[List[int]] = None) -> dict:
+        """Carrega a ocupação da janela visível (ex.: semana do calendário) em uma consulta"""
+        if not auth.has_permission('read', 'consultas'):
+            return {"success": False, "message": "Sem permissão"}
+        with unit_of_work("carregar_agenda", readonly=True) as uow:
+            self.index.carregar(uow.session, inicio, fim, profissional_ids)
+        return {"success": True}
+
+    @track_operation()
+    def horarios(self, profissional_id: int, dia: date) -> dict:
+        """Horários do dia gerados pelos modelos, com a situação de cada um"""
+        if not auth.has_permission('read', 'consultas'):
+            return {"success": False, "message": "Sem permissão"}
+
+        with unit_of_work("horarios_agenda", readonly=True) as uow:
+            modelos = [m for m in self.index.modelos(uow.session).get(profissional_id, []) if m.vale_em(dia)]
+            ocupacao = self._ocupacao(uow.session, profissional_id, dia)
+
+        horarios = []
+        for modelo in modelos:
+            passo = timedelta(minutes=modelo.duracao_minutos)
+            inicio = datetime.combine(dia, modelo.hora_inicio)
+            limite = datetime.combine(dia, modelo.hora_fim)
+            while inicio + passo <= limite:
+                consulta_id = ocupacao.conflict(inicio, inicio + passo)
+                horarios.append({"inicio": inicio, "fim": inicio + passo, "tipo": modelo.tipo,
+                                 "livre": consulta_id is None, "consulta_id": consulta_id})
+                inicio += passo
+        return {"success": True, "horarios": horarios}
+
+    @track_operation()
+    def agenda_periodo(self, inicio: date, fim: date, profissional_id: Optional[int] = None) -> List[dict]:
+        """Consultas não canceladas com data_hora em [inicio, fim] (dias inteiros), com o paciente.
+
+        Usa o índice (profissional_id, data_hora); só as colunas que a agenda exibe.
+        """
+        if not auth.has_permission('read', 'consultas'):
+            return []
+        with unit_of_work("agenda_periodo", readonly=True) as uow:
+            query = uow.session.query(
+                Consulta.id, Consulta.profissional_id, Consulta.data_hora, Consulta.duracao_minutos,
+                Consulta.tipo, Consulta.status, Consulta.paciente_id, Paciente.nome_completo
+            ).join(Paciente, Paciente.id == Consulta.paciente_id).filter(
+                Consulta.data_hora >= datetime.combine(inicio, datetime.min.time()),
+                Consulta.data_hora < datetime.combine(fim + timedelta(days=1), datetime.min.time()),
+                Consulta.status != StatusConsulta.CANCELADA
+            )
+            if profissional_id is not None:
+                query = query.filter(Consulta.profissional_id == profissional_id)
+            return [dict(row._mapping) for row in query.order_by(Consulta.data_hora)]
+
+    @track_operation()
+    def profissionais(self) -> List[dict]:
+        """Profissionais ativos que atendem (médicos e enfermeiros)"""
+        with unit_of_work("profissionais_agenda", readonly=True) as uow:
+            return [{"id": i, "nome": nome} for i, nome in uow.session.query(Usuario.id, Usuario.nome).filter(
+                Usuario.ativo == True,
+                Usuario.tipo.in_((TipoUsuario.MEDICO, TipoUsuario.ENFERMEIRO))
+            ).order_by(Usuario.nome)]
+
+    # ------------------------
+    # Avisos de alteração (telas com cache de janelas)
+    # ------------------------
+    def on_change(self, callback) -> None:
+        """callback(profissional_id, dia) após marcar ou cancelar consultas"""
+        self._ouvintes.append(callback)
+
+    def off_change(self, callback) -> None:
+        """Remove um callback registrado com on_change (tela fechada)"""
+        if callback in self._ouvintes:
+            self._ouvintes.remove(callback)
+
+    def _notificar(self, profissional_id: int, dias) -> None:
+        for dia in set(dias):
+            for callback in list(self._ouvintes):
+                try:
+                    callback(profissional_id, dia)
+                except Exception as e:
+                    logger.warning("Falha ao notificar alteração da agenda: %r", e)
+
+    # ------------------------
+    # Marcação
+    # ------------------------
+    @track_operation()
+    def agendar(self, paciente_id: int, profissional_id: int, data_hora: datetime,
+                tipo: Optional[TipoConsulta] = None, duracao_minutos: Optional[int] = None,
+                observacoes: Optional[str] = None) -> dict:
+        if not auth.has_permission('create', 'consultas'):
+            return {"success": False, "message": "Sem permissão para agendar consultas"}
+
+        dia = data_hora.date()
+        try:
+            with unit_of_work("agendar_consulta") as uow:
+                session = uow.session
+                modelo = self._modelo_do_horario(session, profissional_id, data_hora)
+                duracao = duracao_minutos or (modelo.duracao_minutos if modelo else DURACAO_PADRAO)
+                fim = data_hora + timedelta(minutes=duracao)
+
+                conflito = self._ocupacao(session, profissional_id, dia).conflict(data_hora, fim)
+                if conflito is not None:
+                    return {"success": False, "message": "Horário indisponível", "code": "CONFLICT",
+                            "consulta_id": conflito}
+                if session.query(Paciente.id).filter(Paciente.id == paciente_id).first() is None:
+                    return {"success": False, "message": "Paciente não encontrado"}
+
+                consulta = Consulta(
+                    paciente_id=paciente_id, profissional_id=profissional_id, data_hora=data_hora,
+                    duracao_minutos=duracao, tipo=tipo or (modelo.tipo if modelo else TipoConsulta.CONSULTA_MEDICA),
+                    status=StatusConsulta.AGENDADA, observacoes=observacoes,
+                    created_by=auth.current_user.nome
+                )
+                session.add(consulta)
+                session.flush()
+        except IntegrityError:
+            # outra estação marcou o mesmo horário depois do carregamento
+            self.index.invalidar(profissional_id, dia)
+            return {"success": False, "message": "Horário indisponível", "code": "CONFLICT"}
+        except Exception as e:
+            return {"success": False, "message": f"Erro ao agendar consulta: {str(e)}"}
+
+        self.index.adicionar(profissional_id, data_hora, fim, consulta.id)
+        self._notificar(profissional_id, [dia])
+        return {"success": True, "message": "Consulta agendada", "consulta_id": consulta.id}
+
+    @track_operation()
+    def cancelar(self, consulta_id: int, motivo: Optional[str] = None) -> dict:
+        if not auth.has_permission('update', 'consultas'):
+            return {"success": False, "message": "Sem permissão"}
+
+        try:
+            with unit_of_work("cancelar_consulta") as uow:
+                consulta = uow.session.query(Consulta).filter(
+                    Consulta.id == consulta_id,
+                    Consulta.status == StatusConsulta.AGENDADA
+                ).first()
+                if not consulta:
+                    return {"success": False, "message": "Consulta agendada não encontrada"}
+                consulta.status = StatusConsulta.CANCELADA
+                if motivo:
+                    consulta.observacoes = f"{consulta.observacoes}\n{motivo}" if consulta.observacoes else motivo
+                consulta.updated_by = auth.current_user.nome
+            self.index.remover(consulta.profissional_id, consulta.data_hora.date(), consulta.id)
+            self._notificar(consulta.profissional_id, [consulta.data_hora.date()])
+            return {"success": True, "message": "Consulta cancelada"}
+        except Exception as e:
+            return {"success": False, "message": f"Erro: {str(e)}"}
+
+# Instância global
+agenda_controller = AgendaController()
@@ -0,0 +1,167 @@
+# =============================================================================
+# controllers/auditoria_controller.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+Consultas aos logs de auditoria: quem acessou/alterou um registro e o que um
+usuário fez num período.
+
+As consultas usam os índices (tabela, registro_id, timestamp) e
+(usuario_id, timestamp) e paginação por chave: cada página devolve
+"proximo_cursor" (timestamp|id do último registro) e a próxima começa logo
+depois dele, sem OFFSET nem COUNT(*) — o custo por página não depende do
+tamanho da tabela.
+
+versao_registro() reconstrói o estado de um registro em qualquer momento
+aplicando os diffs gravados por db/audit_diff.py.
+"""
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, not_, select
+
+from controllers.auth_controller import auth
+from db.audit_diff import replay
+from db.audit_partitions import month_end, query_sources
+from db.instrumentation import track_operation
+from db.unit_of_work import unit_of_work
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    return f"{timestamp.isoformat()}|{log_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        timestamp, log_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise ValueError(f"Cursor de paginação inválido: {cursor!r}")
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.min.time())
+
+
+class AuditoriaController:
+
+    @track_operation()
+    def historico_registro(self, tabela: str, registro_id: int,
+                           cursor: Optional[str] = None, limite: int = PAGE_SIZE) -> dict:
+        """Quem acessou/alterou o registro, do mais recente para o mais antigo"""
+        return self._buscar(tabela=tabela, registro_id=registro_id, cursor=cursor, limite=limite)
+
+    @track_operation()
+    def atividade_usuario(self, usuario_id: int, desde=None, ate=None,
+                          cursor: Optional[str] = None, limite: int = PAGE_SIZE) -> dict:
+        """O que o usuário fez no período (padrão: hoje)"""
+        if desde is None and ate is None and cursor is None:
+            desde = date.today()
+        return self._buscar(usuario_id=usuario_id, desde=desde, ate=ate, cursor=cursor, limite=limite)
+
+    @track_operation()
+    def buscar(self, tabela: Optional[str] = None, registro_id: Optional[int] = None,
+               usuario_id: Optional[int] = None, acao: Optional[str] = None,
+               desde=None, ate=None, cursor: Optional[str] = None, limite: int = PAGE_SIZE) -> dict:
+        """Página de eventos (timestamp decrescente); 'ate' é exclusivo"""
+        return self._buscar(tabela, registro_id, usuario_id, acao, desde, ate, cursor, limite)
+
+    @track_operation()
+    def versao_registro(self, tabela: str, registro_id: int, em=None) -> dict:
+        """Estado do registro no instante 'em' (padrão: agora), refeito a partir dos diffs"""
+        if not auth.has_permission('audit', 'logs_auditoria'):
+            return {"success": False, "message": "Sem permissão"}
+        em = _as_datetime(em)
+
+        with unit_of_work("versao_registro", readonly=True) as uow:
+            conn = uow.session.connection()
+            eventos: List[dict] = []
+            for table, month in query_sources(conn):
+                if month is not None and em is not None and _as_datetime(month) > em:
+                    continue
+                c = table.c
+                filtros = [c.tabela == tabela, c.registro_id == registro_id,
+                           c.acao.in_(("CREATE", "UPDATE", "DELETE"))]
+                if em is not None:
+                    filtros.append(c.timestamp <= em)
+                query = select(c.id, c.acao, c.timestamp, c.dados_novos).where(*filtros)
+                eventos.extend(dict(r) for r in conn.execute(query).mappings())
+
+        if not eventos:
+            return {"success": False, "message": "Nenhuma alteração registrada até a data informada"}
+        eventos.sort(key=lambda e: (e["timestamp"], e["id"]))
+        return {
+            "success": True,
+            "dados": replay(eventos),      # None: registro excluído nessa data
+            "alteracoes": len(eventos),
+            "ultima_alteracao": eventos[-1]["timestamp"],
+        }
+
+    def _buscar(self, tabela=None, registro_id=None, usuario_id=None, acao=None,
+                desde=None, ate=None, cursor=None, limite=PAGE_SIZE) -> dict:
+        if not auth.has_permission('audit', 'logs_auditoria'):
+            return {"success": False, "message": "Sem permissão"}
+
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        limite = max(1, min(int(limite), MAX_PAGE_SIZE))
+        desde, ate = _as_datetime(desde), _as_datetime(ate)
+
+        with unit_of_work("buscar_auditoria", readonly=True) as uow:
+            conn = uow.session.connection()
+            rows: List[dict] = []
+            for table, month in query_sources(conn):
+                if month is not None:
+                    inicio_mes = _as_datetime(month)
+                    fim_mes = _as_datetime(month_end(month))
+                    # tabelas mensais (SQLite) fora do intervalo nem são consultadas
+                    if (after and inicio_mes > after[0]) or (ate and inicio_mes >= ate) \
+                            or (desde and fim_mes <= desde):
+                        continue
+                    # já há uma página completa mais recente que este mês inteiro
+                    if len(rows) > limite and rows[limite]["timestamp"] >= fim_mes:
+                        break
+
+                c = table.c
+                filtros = []
+                if tabela is not None:
+                    filtros.append(c.tabela == tabela)
+                if registro_id is not None:
+                    filtros.append(c.registro_id == registro_id)
+                if usuario_id is not None:
+                    filtros.append(c.usuario_id == usuario_id)
+                if acao is not None:
+                    filtros.append(c.acao == acao)
+                if desde is not None:
+                    filtros.append(c.timestamp >= desde)
+                if ate is not None:
+                    filtros.append(c.timestamp < ate)
+                if after is not None:
+                    # faixa no índice (timestamp <= cursor) + desempate por id
+                    filtros.append(c.timestamp <= after[0])
+                    filtros.append(not_(and_(c.timestamp == after[0], c.id >= after[1])))
+
+                query = select(table).where(*filtros) \
+                    .order_by(c.timestamp.desc(), c.id.desc()).limit(limite + 1)
+                rows.extend(dict(r) for r in conn.execute(query).mappings())
+                rows.sort(key=lambda r: (r["timestamp"], r["id"]), reverse=True)
+                del rows[limite + 1:]
+
+        proximo = None
+        if len(rows) > limite:
+            rows = rows[:limite]
+            proximo = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+        return {"success": True, "dados": rows, "proximo_cursor": proximo}
+
+
+# Instância global
+auditoria_controller = AuditoriaController()
@@ -1,35 +1,154 @@
 # =============================================================================
 # controllers/auth_controller.py
 # =============================================================================
+import os
+import math
+import logging
+import threading
+import ipaddress
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
 from types import SimpleNamespace
 from models.usuario import Usuario
-from models.auditoria import LogAuditoria
 from utils.security import SecurityManager
-from db.connection import db_manager
+from utils.rate_limit import SlidingWindowLimiter, WindowAggregator
+from utils.permissions import compile_policy, normalize_role, policy_for
+from db.unit_of_work import unit_of_work
+from db.audit_sink import audit_sink
+from db.audit_diff import register_actor_provider
+from db.instrumentation import track_operation
 from sqlalchemy.exc import OperationalError, DBAPIError
 
+logger = logging.getLogger("sisusf.auth")
+
+
+# Limite de tentativas de login com falha (janela deslizante, em segundos)
+LOGIN_JANELA = float(os.getenv("SISUSF_LOGIN_JANELA", "300"))
+LOGIN_MAX_FALHAS_EMAIL = int(os.getenv("SISUSF_LOGIN_MAX_FALHAS", "5"))
+LOGIN_MAX_FALHAS_IP = int(os.getenv("SISUSF_LOGIN_MAX_FALHAS_IP", "20"))
+
+# Usuário da requisição em andamento (modo serviço, app/server.py); fora de
+# acting_as() vale o usuário logado no aplicativo desktop
+_SEM_USUARIO = object()
+_usuario_requisicao = ContextVar("sisusf_usuario_requisicao", default=_SEM_USUARIO)
+
 
 class AuthController:
     def __init__(self):
-        self.current_user = None
+        self._current_user = None
+        # Tentativas bloqueadas não chegam ao banco nem ao bcrypt
+        self._falhas_email = SlidingWindowLimiter(LOGIN_MAX_FALHAS_EMAIL, LOGIN_JANELA)
+        self._falhas_ip = SlidingWindowLimiter(LOGIN_MAX_FALHAS_IP, LOGIN_JANELA)
+        # ...e geram um único registro de auditoria por janela
+        self._bloqueios = WindowAggregator(LOGIN_JANELA)
+        self._descarga = None  # timer que grava os resumos de janelas encerradas
+        self._descarga_lock = threading.Lock()
+
+    @property
+    def current_user(self):
+        usuario = _usuario_requisicao.get()
+        return self._current_user if usuario is _SEM_USUARIO else usuario
+
+    @current_user.setter
+    def current_user(self, usuario):
+        # dentro de acting_as() (requisições da API) login/logout valem só para o bloco
+        if _usuario_requisicao.get() is _SEM_USUARIO:
+            self._current_user = usuario
+        else:
+            _usuario_requisicao.set(usuario)
+
+    @contextmanager
+    def acting_as(self, usuario):
+        """Executa o bloco em nome de usuario sem alterar o login do processo"""
+        token = _usuario_requisicao.set(usuario)
+        try:
+            yield usuario
+        finally:
+            _usuario_requisicao.reset(token)
 
     # ------------------------
     # Auxiliares
     # ------------------------
-    def _log_auditoria(self, session, usuario_id=None, usuario_nome=None, acao="", ip_address=None, observacoes=""):
-        """Cria log de auditoria, falhas não interrompem fluxo"""
+    def _log_auditoria(self, usuario_id=None, usuario_nome=None, acao="", ip_address=None, observacoes=""):
+        """Enfileira log de auditoria (gravado em lote em segundo plano), falhas não interrompem fluxo"""
         try:
-            log = LogAuditoria(
+            audit_sink.emit(
+                acao,
                 usuario_id=usuario_id,
                 usuario_nome=usuario_nome,
-                acao=acao,
                 ip_address=ip_address,
                 observacoes=observacoes
             )
-            session.add(log)
-            session.commit()
-        except Exception:
-            session.rollback()
+        except Exception as e:
+            logger.warning("Falha ao registrar auditoria %s: %r", acao, e)
+
+    @staticmethod
+    def _limita_ip(ip_address: str) -> bool:
+        """Sem IP ou loopback (aplicativo desktop) não há por IP: só o limite por conta"""
+        if not ip_address:
+            return False
+        try:
+            return not ipaddress.ip_address(ip_address).is_loopback
+        except ValueError:
+            return True
+
+    def _login_bloqueado(self, email: str, ip_address: str):
+        """Segundos de espera se email ou IP excederam o limite; None se liberado"""
+        espera = self._falhas_email.retry_after(email)
+        if self._limita_ip(ip_address):
+            espera = max(espera, self._falhas_ip.retry_after(ip_address))
+        if espera <= 0:
+            return None
+        self._log_bloqueios(self._bloqueios.add((email, ip_address), email=email, ip_address=ip_address))
+        self._agendar_descarga()
+        return espera
+
+    def _registrar_falha(self, email: str, ip_address: str) -> None:
+        self._falhas_email.hit(email)
+        if self._limita_ip(ip_address):
+            self._falhas_ip.hit(ip_address)
+
+    def _agendar_descarga(self) -> None:
+        """Resumos de bloqueio vão para a auditoria ao fim da janela, mesmo sem nova tentativa"""
+        with self._descarga_lock:
+            if self._descarga is not None:
+                return
+            self._descarga = threading.Timer(LOGIN_JANELA, self._descarregar_agendado)
+            self._descarga.daemon = True
+            self._descarga.start()
+
+    def _descarregar_agendado(self) -> None:
+        with self._descarga_lock:
+            self._descarga = None
+        self._log_bloqueios(self._bloqueios.collect())
+        if self._bloqueios.pending():
+            self._agendar_descarga()
+
+    def descarregar_bloqueios(self) -> None:
+        """Grava todos os resumos de bloqueio abertos (logout e encerramento)"""
+        with self._descarga_lock:
+            if self._descarga is not None:
+                self._descarga.cancel()
+                self._descarga = None
+        self._log_bloqueios(self._bloqueios.flush())
+
+    def _log_bloqueios(self, agregados) -> None:
+        """Um registro por email/IP e janela com o total de tentativas bloqueadas"""
+        for agregado in agregados:
+            inicio = datetime.utcfromtimestamp(agregado["inicio"])
+            fim = datetime.utcfromtimestamp(agregado["fim"])
+            try:
+                audit_sink.emit(
+                    "LOGIN_THROTTLED",
+                    usuario_nome=agregado["email"],
+                    ip_address=agregado["ip_address"],
+                    observacoes=f"{agregado['total']} tentativa(s) de login bloqueada(s) entre "
+                                f"{inicio:%d/%m/%Y %H:%M:%S} e {fim:%H:%M:%S} (UTC)",
+                    timestamp=fim
+                )
+            except Exception as e:
+                logger.warning("Falha ao registrar bloqueios de login: %r", e)
 
     def _handle_exception(self, e, code="INTERNAL_ERROR", message="Erro interno"):
         """Formata exceção genérica"""
@@ -43,16 +162,29 @@ class AuthController:
     # ------------------------
     # Login
     # ------------------------
+    @track_operation()
     def login(self, email: str, password: str, ip_address: str = None) -> dict:
         """Realiza login com debug detalhado e tratamento de falhas."""
+        email = (email or "").strip().lower()
+        espera = self._login_bloqueado(email, ip_address)
+        if espera is not None:
+            return {
+                "success": False,
+                "message": f"Muitas tentativas de login. Tente novamente em {math.ceil(espera)} segundos.",
+                "code": "TOO_MANY_ATTEMPTS",
+                "retry_after": espera
+            }
+
         try:
-            with db_manager.get_session() as session:
+            # Somente leitura: a auditoria vai para o audit_sink, fora da transação
+            with unit_of_work("login", readonly=True) as uow:
+                session = uow.session
                 # -----------------------------
                 # Busca usuário ativo
                 # -----------------------------
                 try:
                     user = session.query(Usuario).filter(
-                        Usuario.email == email.lower(),
+                        Usuario.email == email,
                         Usuario.ativo == True
                     ).first()
                     print(f"DEBUG: usuário carregado: {user}")
@@ -62,8 +194,8 @@ class AuthController:
 
                 # Usuário não encontrado
                 if not user:
+                    self._registrar_falha(email, ip_address)
                     self._log_auditoria(
-                        session,
                         usuario_nome=email,
                         acao="LOGIN_FAILED_USER_NOT_FOUND",
                         ip_address=ip_address,
@@ -83,8 +215,8 @@ class AuthController:
                     return self._handle_exception(e, "AUTH_VALIDATION_ERROR", "Erro ao validar credenciais")
 
                 if not senha_valida:
+                    self._registrar_falha(email, ip_address)
                     self._log_auditoria(
-                        session,
                         usuario_id=getattr(user, "id", None),
                         usuario_nome=email,
                         acao="LOGIN_FAILED_INVALID_PASSWORD",
@@ -101,18 +233,21 @@ class AuthController:
                     nome=getattr(user, "nome", None),
                     email=getattr(user, "email", None),
                     cpf=getattr(user, "cpf", None),
-                    tipo=str(getattr(user, "tipo", None)) if getattr(user, "tipo", None) else None,
+                    tipo=normalize_role(getattr(user, "tipo", None)),
                     cns=getattr(user, "cns", None),
                     conselho_profissional=getattr(user, "conselho_profissional", None),
                     ativo=getattr(user, "ativo", None)
                 )
+                self._falhas_email.reset(email)
+
+                # permissões compiladas uma vez por sessão
+                user_data.permissions = compile_policy(user_data.tipo, getattr(user, "ubs", None))
                 self.current_user = user_data
 
                 # -----------------------------
                 # Log de auditoria login bem-sucedido
                 # -----------------------------
                 self._log_auditoria(
-                    session,
                     usuario_id=user_data.id,
                     usuario_nome=user_data.nome,
                     acao="LOGIN",
@@ -129,21 +264,20 @@ class AuthController:
     # ------------------------
     # Logout
     # ------------------------
+    @track_operation()
     def logout(self):
         """Realiza logout do usuário com log de auditoria"""
+        # resumos de bloqueio ainda abertos vão para a auditoria antes de sair
+        self.descarregar_bloqueios()
         if not self.current_user:
             return
         try:
-            with db_manager.get_session() as session:
-                self._log_auditoria(
-                    session,
-                    usuario_id=self.current_user.id,
-                    usuario_nome=self.current_user.nome,
-                    acao="LOGOUT",
-                    observacoes="Logout realizado"
-                )
-        except Exception:
-            pass
+            self._log_auditoria(
+                usuario_id=self.current_user.id,
+                usuario_nome=self.current_user.nome,
+                acao="LOGOUT",
+                observacoes="Logout realizado"
+            )
         finally:
             self.current_user = None
 
@@ -153,21 +287,21 @@ class AuthController:
     def is_authenticated(self) -> bool:
         return self.current_user is not None
 
-    def has_permission(self, action: str) -> bool:
-        """Verifica permissões do usuário"""
+    def has_permission(self, action: str, resource: str = None) -> bool:
+        """Verifica permissões do usuário (política compilada no login, utils/permissions.py)"""
         if not self.current_user:
             return False
+        return policy_for(self.current_user).allows(action, resource)
 
-        permissions = {
-            'admin': ['create', 'read', 'update', 'delete', 'report'],
-            'medico': ['create', 'read', 'update', 'report'],
-            'enfermeiro': ['create', 'read', 'update'],
-            'agente': ['read', 'update']
-        }
-
-        role = str(self.current_user.tipo).lower()
-        return action in permissions.get(role, [])
+    def has_permissions(self, actions, resource: str = None) -> dict:
+        """Várias verificações de uma vez (montagem de menus e barras de ferramentas)"""
+        if not self.current_user:
+            return {action: False for action in actions}
+        return policy_for(self.current_user).allows_many(actions, resource)
 
 
 # Instância global
 auth = AuthController()
+
+# usuário gravado nos diffs de auditoria capturados no flush
+register_actor_provider(lambda: auth.current_user)
@@ -0,0 +1,458 @@
+# =============================================================================
+# controllers/estoque_controller.py
+# =============================================================================
+"""
+Estoque de medicamentos: entradas e dispensações.
+
+Cada alteração de saldo é um UPDATE condicional na própria linha do
+medicamento (estoque_atual = estoque_atual - q WHERE estoque_atual >= q),
+sem ler o saldo antes: duas farmácias dispensando o mesmo medicamento não
+sobrescrevem uma à outra e o saldo nunca fica negativo. Na mesma transação
+entra o movimento no livro movimentos_estoque (somente inclusão), conferido
+periodicamente contra o saldo por db/maintenance.py (rotina "estoque", que
+só alerta; o ajuste é feito por reconciliar(corrigir=True)).
+
+Uma dispensação com vários itens é uma transação só; os itens são
+atualizados em ordem de id do medicamento (ordem de travamento igual em
+todas as estações, sem deadlock) e, se algum não tiver saldo, nada é
+gravado.
+
+Lotes (FEFO): o saldo de cada medicamento é a soma dos seus lotes. Os lotes
+com saldo ficam em memória num heap por validade (FefoIndex), carregado
+pelo índice (medicamento_id, validade); a dispensação consome do lote que
+vence primeiro, dividindo a quantidade entre lotes se preciso, com um
+UPDATE condicional por lote na mesma transação. Lotes vencidos não são
+dispensados. Se outra estação mudou um lote (o UPDATE condicional não
+acha o saldo esperado), os lotes daquele medicamento são relidos do banco
+— nesse ponto a linha do medicamento já está travada pela transação.
+
+Alertas: quem altera o saldo registra em alertas_estoque, na mesma
+transação, quando o medicamento cruza o estoque_minimo (ESTOQUE_BAIXO /
+ESTOQUE_NORMALIZADO); lotes vencendo são alertados pela rotina
+"vencimentos" de db/maintenance.py. alertas() monta o painel pelos índices
+parciais (custo proporcional ao número de alertas) e novos_alertas() é o
+feed incremental (ids maiores que o último visto); on_alerta() avisa as
+telas desta estação logo após o commit. No PostgreSQL os ids saem da
+sequência antes do commit, então um alerta pode ficar visível depois de um
+id maior: o feed devolve as lacunas dos últimos ALERTAS_JANELA_IDS ids
+como "pendentes" e as relê na chamada seguinte.
+
+Antes de gravar, a dispensação é conferida contra as alergias e o uso
+contínuo do paciente (controllers/interacao_controller.py); alertas
+bloqueantes exigem confirmar_alertas=True.
+"""
+from collections import OrderedDict
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, text, update
+
+from controllers.auth_controller import auth
+from controllers.interacao_controller import interacao_controller
+from db.connection import db_manager
+from db.instrumentation import track_operation
+from db.maintenance import reconciliar_estoque
+from db.unit_of_work import unit_of_work
+from models.medicamento import (ESTOQUE_BAIXO_SQL, LOTE_COM_SALDO_SQL, AlertaEstoque, DispensacaoMedicamento,
+                                LoteMedicamento, Medicamento, MovimentoEstoque, TipoAlerta, TipoMovimento)
+
+logger = logging.getLogger("sisusf.estoque")
+
+ESTOQUE_CACHE_TTL = float(os.getenv("SISUSF_ESTOQUE_CACHE_TTL", "300"))
+SEM_LOTE = "SEM-LOTE"
+# lacunas de id do feed de alertas relidas (transações ainda não confirmadas)
+ALERTAS_JANELA_IDS = int(os.getenv("SISUSF_ALERTAS_JANELA_IDS", "100"))
+
+
+class EstoqueInsuficiente(Exception):
+    """Itens sem saldo numa dispensação (desfaz a transação inteira)"""
+
+    def __init__(self, medicamento_ids: List[int]):
+        super().__init__(f"Estoque insuficiente: {medicamento_ids}")
+        self.medicamento_ids = medicamento_ids
+
+
+def _quantidades(itens: Iterable[dict]) -> Dict[int, int]:
+    """Soma itens repetidos do mesmo medicamento; ordem de travamento por id"""
+    total: Dict[int, int] = {}
+    for item in itens:
+        quantidade = int(item["quantidade"])
+        if quantidade <= 0:
+            raise ValueError("A quantidade deve ser maior que zero")
+        medicamento_id = int(item["medicamento_id"])
+        total[medicamento_id] = total.get(medicamento_id, 0) + quantidade
+    return OrderedDict(sorted(total.items()))
+
+
+def _dias_tratamento(itens: Iterable[dict]) -> Dict[int, int]:
+    """Dias de tratamento informados por medicamento (base do cálculo de adesão)"""
+    total: Dict[int, int] = {}
+    for item in itens:
+        if item.get("dias_tratamento"):
+            dias = int(item["dias_tratamento"])
+            if dias <= 0:
+                raise ValueError("Os dias de tratamento devem ser maiores que zero")
+            medicamento_id = int(item["medicamento_id"])
+            total[medicamento_id] = total.get(medicamento_id, 0) + dias
+    return total
+
+
+class FefoIndex:
+    """Lotes com saldo por medicamento: heap (validade, lote_id) + saldo de cada lote"""
+
+    def __init__(self, ttl: float = ESTOQUE_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._lotes: Dict[int, Tuple[float, list, Dict[int, int]]] = {}
+        self._lock = threading.RLock()
+
+    def carregar(self, session, medicamento_id: int) -> Tuple[list, Dict[int, int]]:
+        """Relê os lotes com saldo do medicamento (índice medicamento_id, validade)"""
+        rows = session.query(LoteMedicamento.id, LoteMedicamento.validade, LoteMedicamento.quantidade).filter(
+            LoteMedicamento.medicamento_id == medicamento_id, LoteMedicamento.quantidade > 0
+        ).order_by(LoteMedicamento.validade, LoteMedicamento.id).all()
+        # sem validade vai para o fim; a lista ordenada já é um heap válido
+        heap = sorted((r.validade or date.max, r.id) for r in rows)
+        saldos = {r.id: r.quantidade for r in rows}
+        with self._lock:
+            self._lotes[medicamento_id] = (self.clock(), heap, saldos)
+        return heap, saldos
+
+    def _lotes_de(self, session, medicamento_id: int) -> Tuple[list, Dict[int, int]]:
+        entrada = self._lotes.get(medicamento_id)
+        if entrada is None or self.clock() - entrada[0] > self.ttl:
+            return self.carregar(session, medicamento_id)
+        return entrada[1], entrada[2]
+
+    def separar(self, session, medicamento_id: int, quantidade: int, hoje: date,
+                baixar: Callable[[int, int], bool]) -> Optional[List[Tuple[int, int]]]:
+        """Consome `quantidade` dos lotes que vencem primeiro: [(lote_id, qtd)],
+        ou None se os lotes válidos não bastarem. baixar(lote_id, qtd) grava
+        a baixa no banco e retorna False se o lote não tinha esse saldo."""
+        with self._lock:
+            heap, saldos = self._lotes_de(session, medicamento_id)
+            retiradas: List[Tuple[int, int]] = []
+            restante = quantidade
+            relido = False
+            while restante:
+                if not heap:
+                    if relido:
+                        break
+                    # lotes em cache acabaram: outra estação pode ter dado entrada num lote novo
+                    heap, saldos = self.carregar(session, medicamento_id)
+                    relido = True
+                    continue
+                validade, lote_id = heap[0]
+                if validade < hoje:
+                    heapq.heappop(heap)          # vencido: fica no banco, sai da separação
+                    saldos.pop(lote_id, None)
+                    continue
+                tirar = min(restante, saldos[lote_id])
+                if not baixar(lote_id, tirar):
+                    if relido:
+                        break
+                    # alterado por outra estação: relê com o medicamento já travado
+                    heap, saldos = self.carregar(session, medicamento_id)
+                    relido = True
+                    continue
+                saldos[lote_id] -= tirar
+                if not saldos[lote_id]:
+                    heapq.heappop(heap)
+                    del saldos[lote_id]
+                retiradas.append((lote_id, tirar))
+                restante -= tirar
+            return None if restante else retiradas
+
+    def invalidar(self, medicamento_id: Optional[int] = None) -> None:
+        with self._lock:
+            if medicamento_id is None:
+                self._lotes.clear()
+            else:
+                self._lotes.pop(medicamento_id, None)
+
+
+def _alerta_dict(alerta, nome: Optional[str] = None) -> dict:
+    return {"id": alerta.id, "medicamento_id": alerta.medicamento_id, "nome": nome, "lote_id": alerta.lote_id,
+            "tipo": alerta.tipo, "saldo": alerta.saldo, "validade": alerta.validade,
+            "created_at": alerta.created_at}
+
+
+class EstoqueController:
+    def __init__(self):
+        self.lotes = FefoIndex()
+        self._ouvintes: List[Callable[[List[dict]], None]] = []
+
+    # ------------------------
+    # Alertas
+    # ------------------------
+    def on_alerta(self, callback: Callable[[List[dict]], None]) -> None:
+        """callback(alertas) após cada commit que gerou alertas nesta estação"""
+        self._ouvintes.append(callback)
+
+    def _notificar(self, alertas: List[AlertaEstoque]) -> None:
+        if not alertas:
+            return
+        dados = [_alerta_dict(a) for a in alertas]
+        for callback in list(self._ouvintes):
+            try:
+                callback(dados)
+            except Exception as e:
+                logger.warning("Falha ao notificar alerta de estoque: %r", e)
+
+    def _alertar_estoque(self, session, medicamento_id: int, delta: int, agora: datetime,
+                         alertas: List[AlertaEstoque]) -> None:
+        """Registra a passagem pelo estoque_minimo causada por delta"""
+        saldo, minimo = session.execute(select(Medicamento.estoque_atual, Medicamento.estoque_minimo)
+                                        .where(Medicamento.id == medicamento_id)).one()
+        minimo = minimo or 0
+        anterior = saldo - delta
+        if anterior >= minimo > saldo:
+            tipo = TipoAlerta.ESTOQUE_BAIXO
+        elif anterior < minimo <= saldo:
+            tipo = TipoAlerta.ESTOQUE_NORMALIZADO
+        else:
+            return
+        alerta = AlertaEstoque(medicamento_id=medicamento_id, tipo=tipo, saldo=saldo, created_at=agora)
+        session.add(alerta)
+        alertas.append(alerta)
+
+    def _baixar_lote(self, session, lote_id: int, quantidade: int) -> bool:
+        tabela = LoteMedicamento.__table__
+        resultado = session.execute(update(tabela).where(
+            tabela.c.id == lote_id, tabela.c.quantidade >= quantidade
+        ).values(quantidade=tabela.c.quantidade - quantidade))
+        return resultado.rowcount == 1
+
+    def _entrada_lote(self, session, medicamento_id: int, lote: str, validade: Optional[date],
+                      quantidade: int) -> int:
+        """Soma ao lote (criado na primeira entrada); retorna o id do lote"""
+        tabela = LoteMedicamento.__table__
+        somado = session.execute(update(tabela).where(
+            tabela.c.medicamento_id == medicamento_id, tabela.c.lote == lote
+        ).values(quantidade=tabela.c.quantidade + quantidade))
+        if somado.rowcount:
+            return session.query(LoteMedicamento.id).filter(
+                LoteMedicamento.medicamento_id == medicamento_id, LoteMedicamento.lote == lote).scalar()
+        novo = LoteMedicamento(medicamento_id=medicamento_id, lote=lote, validade=validade, quantidade=quantidade)
+        session.add(novo)
+        session.flush()
+        return novo.id
+
+    def _movimentar(self, session, medicamento_id: int, delta: int, agora: datetime) -> bool:
+        """Soma delta ao saldo numa única instrução; saída só se houver saldo"""
+        tabela = Medicamento.__table__
+        query = update(tabela).where(tabela.c.id == medicamento_id, tabela.c.ativo == True)
+        if delta < 0:
+            query = query.where(tabela.c.estoque_atual >= -delta)
+        resultado = session.execute(query.values(
+            estoque_atual=tabela.c.estoque_atual + delta, updated_at=agora, updated_by=auth.current_user.nome))
+        return resultado.rowcount == 1
+
+    @track_operation()
+    def entrada(self, medicamento_id: int, quantidade: int, lote: Optional[str] = None,
+                validade: Optional[date] = None, observacoes: Optional[str] = None) -> dict:
+        if not auth.has_permission('create', 'medicamentos'):
+            return {"success": False, "message": "Sem permissão"}
+        if int(quantidade) <= 0:
+            return {"success": False, "message": "A quantidade deve ser maior que zero"}
+
+        agora = datetime.utcnow()
+        alertas: List[AlertaEstoque] = []
+        try:
+            with unit_of_work("entrada_estoque") as uow:
+                session = uow.session
+                if not self._movimentar(session, medicamento_id, int(quantidade), agora):
+                    return {"success": False, "message": "Medicamento não encontrado ou inativo"}
+                self._alertar_estoque(session, medicamento_id, int(quantidade), agora, alertas)
+                lote_id = self._entrada_lote(session, medicamento_id, (lote or SEM_LOTE).strip(), validade,
+                                             int(quantidade))
+                session.add(MovimentoEstoque(
+                    medicamento_id=medicamento_id, tipo=TipoMovimento.ENTRADA, quantidade=int(quantidade),
+                    lote_id=lote_id, usuario_id=auth.current_user.id, observacoes=observacoes, created_at=agora))
+        except Exception as e:
+            return {"success": False, "message": f"Erro ao registrar entrada: {str(e)}"}
+        finally:
+            self.lotes.invalidar(medicamento_id)
+        self._notificar(alertas)
+        return {"success": True, "message": "Entrada registrada", "lote_id": lote_id}
+
+    @track_operation()
+    def dispensar(self, paciente_id: int, itens: List[dict], observacoes: Optional[str] = None,
+                  confirmar_alertas: bool = False) -> dict:
+        """itens: [{"medicamento_id": ..., "quantidade": ..., "dias_tratamento"?: ...}, ...], tudo ou nada"""
+        if not auth.has_permission('create', 'dispensacoes'):
+            return {"success": False, "message": "Sem permissão"}
+        try:
+            quantidades = _quantidades(itens)
+            dias_tratamento = _dias_tratamento(itens)
+        except (KeyError, TypeError, ValueError) as e:
+            return {"success": False, "message": f"Itens inválidos: {str(e)}"}
+        if not quantidades:
+            return {"success": False, "message": "Nenhum item para dispensar"}
+        # marcadores relidos do banco: alergia registrada em outra estação vale na hora
+        try:
+            verificacao = interacao_controller.verificar(paciente_id, list(quantidades), atualizar=True)
+        except Exception as e:
+            verificacao = {"success": False, "message": repr(e)}
+        alertas_clinicos = verificacao.get("alertas", [])
+        if not confirmar_alertas:
+            if not verificacao["success"]:
+                # sem conferência não há como afirmar que é seguro: bloqueia como um alerta
+                return {"success": False, "code": "ALERTA_CLINICO", "alertas": [],
+                        "message": "Não foi possível conferir alergias e interações "
+                                   f"({verificacao['message']}): confirme para dispensar"}
+            if verificacao["bloqueante"]:
+                return {"success": False, "code": "ALERTA_CLINICO", "alertas": alertas_clinicos,
+                        "message": "Alergia ou interação contraindicada: confirme para dispensar"}
+
+        usuario = auth.current_user
+        agora = datetime.utcnow()
+        alertas: List[AlertaEstoque] = []
+        try:
+            with unit_of_work("dispensar_medicamentos") as uow:
+                session = uow.session
+                hoje = agora.date()
+                sem_saldo, retiradas = [], {}
+                for medicamento_id, quantidade in quantidades.items():
+                    # o UPDATE do total trava o medicamento antes de mexer nos lotes
+                    if self._movimentar(session, medicamento_id, -quantidade, agora):
+                        retiradas[medicamento_id] = self.lotes.separar(
+                            session, medicamento_id, quantidade, hoje,
+                            lambda lote_id, q: self._baixar_lote(session, lote_id, q))
+                    if retiradas.get(medicamento_id) is None:
+                        sem_saldo.append(medicamento_id)
+                if sem_saldo:
+                    raise EstoqueInsuficiente(sem_saldo)
+                for medicamento_id, quantidade in quantidades.items():
+                    self._alertar_estoque(session, medicamento_id, -quantidade, agora, alertas)
+
+                dispensacoes = [DispensacaoMedicamento(
+                    paciente_id=paciente_id, medicamento_id=medicamento_id, quantidade=quantidade,
+                    dias_tratamento=dias_tratamento.get(medicamento_id), data_dispensacao=agora,
+                    profissional_id=usuario.id, observacoes=observacoes, created_by=usuario.nome
+                ) for medicamento_id, quantidade in quantidades.items()]
+                session.add_all(dispensacoes)
+                session.flush()
+                session.add_all([MovimentoEstoque(
+                    medicamento_id=d.medicamento_id, tipo=TipoMovimento.DISPENSACAO, quantidade=-q,
+                    dispensacao_id=d.id, lote_id=lote_id, usuario_id=usuario.id, created_at=agora
+                ) for d in dispensacoes for lote_id, q in retiradas[d.medicamento_id]])
+        except EstoqueInsuficiente as e:
+            # o heap já descontou baixas que foram desfeitas
+            for medicamento_id in quantidades:
+                self.lotes.invalidar(medicamento_id)
+            return {"success": False, "message": self._mensagem_sem_saldo(e.medicamento_ids, quantidades),
+                    "code": "ESTOQUE_INSUFICIENTE", "medicamento_ids": e.medicamento_ids}
+        except Exception as e:
+            for medicamento_id in quantidades:
+                self.lotes.invalidar(medicamento_id)
+            return {"success": False, "message": f"Erro ao dispensar medicamentos: {str(e)}"}
+
+        self._notificar(alertas)
+        return {"success": True, "message": "Medicamentos dispensados",
+                "dispensacao_ids": [d.id for d in dispensacoes],
+                "lotes": {medicamento_id: [{"lote_id": lote_id, "quantidade": q} for lote_id, q in itens]
+                          for medicamento_id, itens in retiradas.items()},
+                "alertas": alertas_clinicos}
+
+    def _mensagem_sem_saldo(self, medicamento_ids: List[int], quantidades: Dict[int, int]) -> str:
+        with unit_of_work("estoque_insuficiente", readonly=True) as uow:
+            saldos = {m.id: m for m in uow.session.query(Medicamento).filter(Medicamento.id.in_(medicamento_ids))}
+        partes = []
+        for medicamento_id in medicamento_ids:
+            medicamento = saldos.get(medicamento_id)
+            if medicamento is None or not medicamento.ativo:
+                partes.append(f"medicamento {medicamento_id} não encontrado ou inativo")
+            else:
+                partes.append(f"{medicamento.nome}: saldo {medicamento.estoque_atual}, "
+                              f"solicitado {quantidades[medicamento_id]}")
+        return "Estoque insuficiente (" + "; ".join(partes) + ")"
+
+    @track_operation()
+    def extrato(self, medicamento_id: int, limite: int = 50) -> dict:
+        """Saldo atual e últimos movimentos do livro"""
+        if not auth.has_permission('read', 'medicamentos'):
+            return {"success": False, "message": "Sem permissão"}
+        with unit_of_work("extrato_estoque", readonly=True) as uow:
+            medicamento = uow.session.get(Medicamento, medicamento_id)
+            if medicamento is None:
+                return {"success": False, "message": "Medicamento não encontrado"}
+            movimentos = uow.session.query(MovimentoEstoque).filter(
+                MovimentoEstoque.medicamento_id == medicamento_id
+            ).order_by(MovimentoEstoque.id.desc()).limit(limite).all()
+            return {
+                "success": True,
+                "saldo": medicamento.estoque_atual,
+                "abaixo_do_minimo": (medicamento.estoque_atual or 0) < (medicamento.estoque_minimo or 0),
+                "movimentos": [{"id": m.id, "tipo": m.tipo, "quantidade": m.quantidade,
+                                "dispensacao_id": m.dispensacao_id, "usuario_id": m.usuario_id,
+                                "observacoes": m.observacoes, "created_at": m.created_at} for m in movimentos],
+            }
+
+    @track_operation()
+    def alertas(self, dias: int = 30, hoje: Optional[date] = None) -> dict:
+        """Painel: medicamentos abaixo do mínimo e lotes com saldo vencendo em até `dias` dias"""
+        if not auth.has_permission('read', 'medicamentos'):
+            return {"success": False, "message": "Sem permissão"}
+        limite = (hoje or date.today()) + timedelta(days=dias)
+        with unit_of_work("alertas_estoque", readonly=True) as uow:
+            conn = uow.session.connection()
+            m = Medicamento.__table__
+            l = LoteMedicamento.__table__
+            # mesmos predicados dos índices parciais (models/medicamento.py)
+            baixo = conn.execute(
+                select(m.c.id.label("medicamento_id"), m.c.nome, m.c.estoque_atual, m.c.estoque_minimo)
+                .where(text(ESTOQUE_BAIXO_SQL)).order_by(m.c.nome, m.c.id)
+            ).mappings().all()
+            vencendo = conn.execute(
+                select(l.c.id.label("lote_id"), l.c.medicamento_id, m.c.nome, l.c.lote, l.c.validade,
+                       l.c.quantidade)
+                .select_from(l.join(m, m.c.id == l.c.medicamento_id))
+                .where(text(LOTE_COM_SALDO_SQL), l.c.validade <= limite, m.c.ativo)
+                .order_by(l.c.validade, l.c.id)
+            ).mappings().all()
+        return {"success": True, "estoque_baixo": [dict(r) for r in baixo],
+                "vencendo": [dict(r) for r in vencendo]}
+
+    @track_operation()
+    def novos_alertas(self, apos_id: int = 0, limite: int = 100, pendentes: Iterable[int] = ()) -> dict:
+        """Feed: alertas com id maior que apos_id (faixa da chave primária) e os
+        ids pendentes da chamada anterior; devolve ultimo_id e os novos pendentes"""
+        if not auth.has_permission('read', 'medicamentos'):
+            return {"success": False, "message": "Sem permissão"}
+        pendentes = {i for i in pendentes if apos_id - ALERTAS_JANELA_IDS < i <= apos_id}
+        filtro = AlertaEstoque.id > apos_id
+        if pendentes:
+            filtro = or_(filtro, AlertaEstoque.id.in_(sorted(pendentes)))
+        with unit_of_work("novos_alertas_estoque", readonly=True) as uow:
+            rows = uow.session.query(AlertaEstoque, Medicamento.nome).join(
+                Medicamento, Medicamento.id == AlertaEstoque.medicamento_id
+            ).filter(filtro).order_by(AlertaEstoque.id).limit(limite).all()
+            dados = [_alerta_dict(alerta, nome) for alerta, nome in rows]
+        ultimo_id = max([apos_id] + [a["id"] for a in dados])
+        # ids ainda não vistos da janela final: podem ser transações em andamento
+        lidos = {a["id"] for a in dados}
+        janela = set(range(max(apos_id, ultimo_id - ALERTAS_JANELA_IDS) + 1, ultimo_id + 1)) | pendentes
+        return {"success": True, "alertas": dados, "ultimo_id": ultimo_id,
+                "pendentes": sorted(i for i in janela - lidos if i > ultimo_id - ALERTAS_JANELA_IDS)}
+
+    def ultimo_alerta_id(self) -> int:
+        """Ponto de partida do feed para uma tela recém-aberta"""
+        with unit_of_work("ultimo_alerta_estoque", readonly=True) as uow:
+            return uow.session.query(func.max(AlertaEstoque.id)).scalar() or 0
+
+    @track_operation()
+    def reconciliar(self, corrigir: bool = False) -> dict:
+        """Saldos que não batem com o livro (corrigir=True registra os ajustes)"""
+        if not auth.has_permission('audit', 'medicamentos'):
+            return {"success": False, "message": "Sem permissão"}
+        resultado = reconciliar_estoque(db_manager.engine, lote=500, corrigir=corrigir)
+        return {"success": True, "divergencias": resultado["divergencias"]}
+
+# Instância global
+estoque_controller = EstoqueController()
@@ -0,0 +1,321 @@
+# =============================================================================
+# controllers/interacao_controller.py
+# =============================================================================
+"""
+Alergias e interações medicamentosas.
+
+O catálogo interacoes_medicamentosas (pares de princípios ativos) é
+carregado em memória como matriz de bits (MatrizInteracoes): cada
+princípio ganha um índice e a sua linha é um inteiro cujo bit j indica
+interação com o princípio j; a gravidade só é buscada para os pares que
+batem. Os marcadores do paciente (alergias e uso contínuo, por princípio
+ativo) viram duas máscaras, guardadas por paciente.
+
+Verificar uma prescrição de k medicamentos é então k ANDs de inteiros
+contra a máscara do paciente e a da própria prescrição, sem SQL quando a
+matriz e o paciente já estão em memória — pode rodar a cada tecla no
+formulário. A matriz é relida após SISUSF_INTERACOES_TTL segundos (padrão
+300) ou quando o catálogo é alterado nesta estação; o perfil do paciente
+após SISUSF_PERFIS_TTL segundos (padrão 30) ou quando os seus marcadores
+mudam nesta estação. A dispensação relê sempre o perfil do banco:
+marcadores gravados em outra estação valem na hora para ela.
+
+Só o catálogo e os marcadores dos pacientes ganham índice na matriz; um
+nome digitado que não está no catálogo não aloca nada e só é comparado
+com os nomes das alergias do paciente. Um medicamento_id desconhecido
+relê a matriz no máximo uma vez a cada INTERACOES_RECARGA_MINIMA segundos.
+
+Alergia ao princípio ou interação CONTRAINDICADA são bloqueantes: a
+dispensação (estoque_controller.dispensar) só prossegue com confirmação.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from controllers.auth_controller import auth
+from db.instrumentation import track_operation
+from db.unit_of_work import unit_of_work
+from models.interacao import (GravidadeInteracao, InteracaoMedicamentosa, PacientePrincipioAtivo, TipoMarcador,
+                              normalizar_principio)
+from models.medicamento import Medicamento
+from models.paciente import Paciente
+
+INTERACOES_CACHE_TTL = float(os.getenv("SISUSF_INTERACOES_TTL", "300"))
+INTERACOES_RECARGA_MINIMA = 5.0
+PERFIS_CACHE_TTL = float(os.getenv("SISUSF_PERFIS_TTL", "30"))
+PERFIS_EM_CACHE = 2048
+
+BLOQUEANTES = (GravidadeInteracao.CONTRAINDICADA,)
+
+
+def _bits(mascara: int):
+    """Índices dos bits ligados"""
+    while mascara:
+        menor = mascara & -mascara
+        yield menor.bit_length() - 1
+        mascara ^= menor
+
+
+class MatrizInteracoes:
+    """Princípios ativos indexados e linhas de bits da matriz de interação"""
+
+    def __init__(self, ttl: float = INTERACOES_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._carregado_em: Optional[float] = None
+        self._indices: Dict[str, int] = {}
+        self._nomes: List[str] = []
+        self._linhas: List[int] = []
+        self._pares: Dict[Tuple[int, int], Tuple[GravidadeInteracao, Optional[str]]] = {}
+        self._medicamentos: Dict[int, int] = {}
+
+    def buscar(self, principio: str) -> Optional[int]:
+        """Índice de um princípio já conhecido (não aloca)"""
+        return self._indices.get(principio)
+
+    def indice(self, principio: str) -> int:
+        """Índice do princípio, alocado se novo: só para o catálogo e marcadores"""
+        indice = self._indices.get(principio)
+        if indice is None:
+            with self._lock:
+                indice = self._indices.get(principio)
+                if indice is None:
+                    # princípio fora do catálogo: linha vazia (só entra na checagem de alergia)
+                    indice = len(self._nomes)
+                    self._nomes.append(principio)
+                    self._indices[principio] = indice
+        return indice
+
+    def carregar(self, session) -> None:
+        """Relê o catálogo de interações e o princípio ativo de cada medicamento"""
+        interacoes = session.query(InteracaoMedicamentosa.principio_a, InteracaoMedicamentosa.principio_b,
+                                   InteracaoMedicamentosa.gravidade, InteracaoMedicamentosa.descricao).all()
+        medicamentos = session.query(Medicamento.id, Medicamento.principio_ativo, Medicamento.nome).all()
+        with self._lock:
+            # os índices só crescem: máscaras de pacientes já calculadas continuam valendo
+            pares = {}
+            for a, b, gravidade, descricao in interacoes:
+                i, j = sorted((self.indice(a), self.indice(b)))
+                pares[(i, j)] = (gravidade, descricao)
+            medicamentos = {m_id: self.indice(normalizar_principio(principio or nome))
+                            for m_id, principio, nome in medicamentos}
+            linhas = [0] * len(self._nomes)
+            for i, j in pares:
+                linhas[i] |= 1 << j
+                linhas[j] |= 1 << i
+            # troca de uma vez: verificações em andamento leem a versão anterior inteira
+            self._linhas, self._pares, self._medicamentos = linhas, pares, medicamentos
+            self._carregado_em = self.clock()
+
+    def atual(self, idade_maxima: Optional[float] = None) -> "MatrizInteracoes":
+        """Relê a matriz se passou do TTL (ou de idade_maxima, se informada)"""
+        limite = self.ttl if idade_maxima is None else idade_maxima
+        if self._carregado_em is None or self.clock() - self._carregado_em > limite:
+            with unit_of_work("carregar_interacoes", readonly=True) as uow:
+                self.carregar(uow.session)
+        return self
+
+    def invalidar(self) -> None:
+        self._carregado_em = None
+
+    def mascara(self, principios: Iterable[str]) -> int:
+        mascara = 0
+        for principio in principios:
+            mascara |= 1 << self.indice(principio)
+        return mascara
+
+    def indice_medicamento(self, medicamento_id: int) -> Optional[int]:
+        return self._medicamentos.get(medicamento_id)
+
+    def nome(self, indice: int) -> str:
+        return self._nomes[indice]
+
+    def linha(self, indice: int) -> int:
+        return self._linhas[indice] if indice < len(self._linhas) else 0
+
+    def par(self, i: int, j: int) -> Tuple[GravidadeInteracao, Optional[str]]:
+        return self._pares[(min(i, j), max(i, j))]
+
+
+class InteracaoController:
+    def __init__(self):
+        self.matriz = MatrizInteracoes()
+        self.perfis_ttl = PERFIS_CACHE_TTL
+        self.clock = time.monotonic
+        # paciente_id -> (carregado_em, máscara de alergias, máscara de uso contínuo, nomes das alergias)
+        self._perfis: "OrderedDict[int, Tuple[float, int, int, frozenset]]" = OrderedDict()
+        self._perfis_lock = threading.Lock()
+
+    # ------------------------
+    # Perfil do paciente
+    # ------------------------
+    def _perfil(self, paciente_id: int, atualizar: bool = False) -> Tuple[float, int, int, frozenset]:
+        if not atualizar:
+            with self._perfis_lock:
+                perfil = self._perfis.get(paciente_id)
+                if perfil is not None and self.clock() - perfil[0] <= self.perfis_ttl:
+                    self._perfis.move_to_end(paciente_id)
+                    return perfil
+        with unit_of_work("perfil_interacoes", readonly=True) as uow:
+            marcadores = uow.session.query(PacientePrincipioAtivo.tipo, PacientePrincipioAtivo.principio_ativo) \
+                .filter(PacientePrincipioAtivo.paciente_id == paciente_id).all()
+        alergias = frozenset(p for t, p in marcadores if t == TipoMarcador.ALERGIA)
+        perfil = (self.clock(), self.matriz.mascara(alergias),
+                  self.matriz.mascara(p for t, p in marcadores if t == TipoMarcador.USO_CONTINUO), alergias)
+        with self._perfis_lock:
+            self._perfis[paciente_id] = perfil
+            while len(self._perfis) > PERFIS_EM_CACHE:
+                self._perfis.popitem(last=False)
+        return perfil
+
+    def invalidar_paciente(self, paciente_id: int) -> None:
+        with self._perfis_lock:
+            self._perfis.pop(paciente_id, None)
+
+    # ------------------------
+    # Verificação
+    # ------------------------
+    def verificar(self, paciente_id: int, medicamento_ids: Iterable[int] = (),
+                  principios: Iterable[str] = (), atualizar: bool = False) -> dict:
+        """Confere a prescrição (medicamentos e/ou princípios ativos) contra as
+        alergias e o uso contínuo do paciente e contra ela mesma;
+        atualizar=True relê os marcadores do paciente (dispensação)"""
+        if not auth.has_permission('read', 'pacientes'):
+            return {"success": False, "message": "Sem permissão"}
+        matriz = self.matriz.atual()
+        _, alergias, continuos, nomes_alergias = self._perfil(paciente_id, atualizar)
+
+        alertas = []
+        prescritos = []
+        for medicamento_id in medicamento_ids:
+            indice = matriz.indice_medicamento(medicamento_id)
+            if indice is None:
+                # talvez cadastrado depois da última carga; id inválido não relê a cada tecla
+                matriz = self.matriz.atual(idade_maxima=INTERACOES_RECARGA_MINIMA)
+                indice = matriz.indice_medicamento(medicamento_id)
+            if indice is not None:
+                prescritos.append(indice)
+        for principio in principios:
+            nome = normalizar_principio(principio)
+            indice = matriz.buscar(nome) if nome else None
+            if indice is not None:
+                prescritos.append(indice)
+            elif nome in nomes_alergias:
+                alertas.append(self._alerta_alergia(nome))
+
+        mascara = 0
+        for i in prescritos:
+            if alergias >> i & 1:
+                alertas.append(self._alerta_alergia(matriz.nome(i)))
+            # com o uso contínuo e com os itens anteriores da prescrição (cada par uma vez)
+            for j in _bits(matriz.linha(i) & (continuos | mascara)):
+                gravidade, descricao = matriz.par(i, j)
+                alertas.append({"tipo": "interacao", "principio": matriz.nome(i), "com": matriz.nome(j),
+                                "gravidade": gravidade, "descricao": descricao})
+            mascara |= 1 << i
+
+        bloqueante = any(a["tipo"] == "alergia" or a["gravidade"] in BLOQUEANTES for a in alertas)
+        return {"success": True, "alertas": alertas, "bloqueante": bloqueante}
+
+    @staticmethod
+    def _alerta_alergia(principio: str) -> dict:
+        return {"tipo": "alergia", "principio": principio, "com": None, "gravidade": None,
+                "descricao": "Paciente alérgico ao princípio ativo"}
+
+    # ------------------------
+    # Cadastros
+    # ------------------------
+    @track_operation()
+    def marcadores(self, paciente_id: int) -> dict:
+        if not auth.has_permission('read', 'pacientes'):
+            return {"success": False, "message": "Sem permissão"}
+        with unit_of_work("marcadores_paciente", readonly=True) as uow:
+            rows = uow.session.query(PacientePrincipioAtivo).filter(
+                PacientePrincipioAtivo.paciente_id == paciente_id
+            ).order_by(PacientePrincipioAtivo.tipo, PacientePrincipioAtivo.principio_ativo).all()
+            dados = {tipo.value: [] for tipo in TipoMarcador}
+            for m in rows:
+                dados[m.tipo.value].append({"principio_ativo": m.principio_ativo, "observacao": m.observacao})
+        return {"success": True, "dados": dados}
+
+    @track_operation()
+    def definir_marcadores(self, paciente_id: int, alergias: Iterable[str] = (),
+                           uso_continuo: Iterable[str] = ()) -> dict:
+        """Substitui as alergias e o uso contínuo do paciente (listas de princípios ativos)"""
+        if not auth.has_permission('update', 'pacientes'):
+            return {"success": False, "message": "Sem permissão"}
+        novos = {(tipo, normalizar_principio(p))
+                 for tipo, lista in ((TipoMarcador.ALERGIA, alergias), (TipoMarcador.USO_CONTINUO, uso_continuo))
+                 for p in lista if p and p.strip()}
+        with unit_of_work("definir_marcadores") as uow:
+            session = uow.session
+            if session.get(Paciente, paciente_id) is None:
+                return {"success": False, "message": "Paciente não encontrado"}
+            atuais = {(m.tipo, m.principio_ativo): m for m in session.query(PacientePrincipioAtivo).filter(
+                PacientePrincipioAtivo.paciente_id == paciente_id)}
+            for chave, marcador in atuais.items():
+                if chave not in novos:
+                    session.delete(marcador)
+            session.add_all([PacientePrincipioAtivo(paciente_id=paciente_id, tipo=tipo, principio_ativo=principio)
+                             for tipo, principio in novos - set(atuais)])
+        self.invalidar_paciente(paciente_id)
+        return {"success": True, "message": "Alergias e uso contínuo atualizados"}
+
+    @track_operation()
+    def cadastrar_interacao(self, principio_a: str, principio_b: str, gravidade: GravidadeInteracao,
+                            descricao: Optional[str] = None) -> dict:
+        if not auth.has_permission('audit', 'medicamentos'):
+            return {"success": False, "message": "Sem permissão"}
+        a, b = sorted((normalizar_principio(principio_a), normalizar_principio(principio_b)))
+        if not a or not b or a == b:
+            return {"success": False, "message": "Informe dois princípios ativos diferentes"}
+        with unit_of_work("cadastrar_interacao") as uow:
+            session = uow.session
+            interacao = session.query(InteracaoMedicamentosa).filter(
+                InteracaoMedicamentosa.principio_a == a, InteracaoMedicamentosa.principio_b == b).first()
+            if interacao is None:
+                interacao = InteracaoMedicamentosa(principio_a=a, principio_b=b, gravidade=gravidade)
+                session.add(interacao)
+            interacao.gravidade = gravidade
+            interacao.descricao = descricao
+        self.matriz.invalidar()
+        return {"success": True, "message": "Interação cadastrada"}
+
+    @track_operation()
+    def importar_texto_livre(self) -> dict:
+        """Cria marcadores a partir de Paciente.alergias / medicamentos_uso_continuo
+        para os termos que são princípios ativos conhecidos; o texto é mantido"""
+        if not auth.has_permission('update', 'pacientes'):
+            return {"success": False, "message": "Sem permissão"}
+        with unit_of_work("importar_marcadores") as uow:
+            session = uow.session
+            conhecidos = {normalizar_principio(p or n) for p, n in
+                          session.query(Medicamento.principio_ativo, Medicamento.nome)}
+            for a, b in session.query(InteracaoMedicamentosa.principio_a, InteracaoMedicamentosa.principio_b):
+                conhecidos.update((a, b))
+            existentes = set(session.query(PacientePrincipioAtivo.paciente_id, PacientePrincipioAtivo.tipo,
+                                           PacientePrincipioAtivo.principio_ativo))
+            novos = set()
+            for paciente_id, alergias, continuos in session.query(
+                    Paciente.id, Paciente.alergias, Paciente.medicamentos_uso_continuo).filter(
+                    (Paciente.alergias.isnot(None)) | (Paciente.medicamentos_uso_continuo.isnot(None))):
+                for tipo, texto in ((TipoMarcador.ALERGIA, alergias), (TipoMarcador.USO_CONTINUO, continuos)):
+                    for termo in re.split(r"[,;/\n]+", texto or ""):
+                        principio = normalizar_principio(termo)
+                        if principio in conhecidos:
+                            novos.add((paciente_id, tipo, principio))
+            novos -= existentes
+            session.add_all([PacientePrincipioAtivo(paciente_id=p, tipo=t, principio_ativo=principio)
+                             for p, t, principio in sorted(novos, key=lambda n: (n[0], n[1].value, n[2]))])
+        with self._perfis_lock:
+            self._perfis.clear()
+        return {"success": True, "message": f"{len(novos)} marcador(es) importado(s)", "total": len(novos)}
+
+
+# Instância global
+interacao_controller = InteracaoController()
@@ -0,0 +1,207 @@
+# =============================================================================
+# controllers/recorrencia_controller.py
+# =============================================================================
+"""
+Consultas recorrentes para coortes de acompanhamento (hipertensos,
+diabéticos...): uma regra vira, para cada paciente, uma série de consultas
+(ex.: mensal por 12 meses) de uma vez só.
+
+- a ocupação de toda a janela é carregada em uma consulta e a alocação de
+  horários é feita em memória (utils/intervals.py), inclusive entre os
+  pacientes da própria coorte;
+- cada ocorrência vai para o primeiro horário livre dos modelos de agenda
+  do profissional na data prevista ou nos dias seguintes (tolerancia_dias);
+- a gravação é um INSERT em lote por bloco, numa única transação, com um
+  registro de auditoria por bloco; simular=True só devolve o plano.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from models.consulta import Consulta, StatusConsulta
+from models.paciente import Paciente
+from utils.datas import add_months
+from utils.intervals import DayIntervals
+from db.unit_of_work import unit_of_work
+from db.audit_sink import audit_sink
+from db.instrumentation import track_operation
+from db import sync
+from controllers.auth_controller import auth
+from controllers.agenda_controller import agenda_controller
+
+BLOCO_INSERCAO = 500
+MAX_OCORRENCIAS = 60
+
+
+def datas_previstas(regra: dict) -> List[date]:
+    """Datas-alvo da regra: inicio + k * intervalo (meses ou dias)"""
+    inicio, ocorrencias = regra["inicio"], int(regra.get("ocorrencias", 12))
+    if regra.get("intervalo_dias"):
+        passo = int(regra["intervalo_dias"])
+        return [inicio + timedelta(days=passo * k) for k in range(ocorrencias)]
+    meses = int(regra.get("intervalo_meses", 1))
+    return [add_months(inicio, meses * k) for k in range(ocorrencias)]
+
+
+class RecorrenciaController:
+
+    def __init__(self, agenda=agenda_controller):
+        self.agenda = agenda
+
+    @track_operation()
+    def pacientes_da_coorte(self, condicao: str) -> List[int]:
+        """Pacientes ativos com a condição crônica informada (ex.: 'hipertens');
+        condição vazia não seleciona ninguém (seria a população inteira)"""
+        condicao = (condicao or "").strip()
+        if not condicao or not auth.has_permission('read', 'pacientes'):
+            return []
+        # % e _ digitados são literais, não curingas
+        literal = condicao.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with unit_of_work("pacientes_da_coorte", readonly=True) as uow:
+            return [i for (i,) in uow.session.query(Paciente.id).filter(
+                Paciente.ativo == True,
+                Paciente.condicoes_cronicas.ilike(f"%{literal}%", escape="\\")
+            ).order_by(Paciente.nome_completo)]
+
+    @track_operation()
+    def gerar(self, regra: dict, paciente_ids: List[int], simular: bool = False) -> dict:
+        """Expande a regra para a coorte.
+
+        regra: profissional_id, inicio (date), ocorrencias, intervalo_meses ou
+        intervalo_dias, tipo, duracao_minutos (padrão: do modelo de agenda),
+        tolerancia_dias (padrão 7).
+        """
+        if not auth.has_permission('create', 'consultas'):
+            return {"success": False, "message": "Sem permissão para agendar consultas"}
+        datas = datas_previstas(regra)
+        if not datas or len(datas) > MAX_OCORRENCIAS:
+            return {"success": False, "message": f"Informe de 1 a {MAX_OCORRENCIAS} ocorrências"}
+        if not paciente_ids:
+            return {"success": False, "message": "Nenhum paciente na coorte"}
+
+        profissional_id = regra["profissional_id"]
+        tolerancia = int(regra.get("tolerancia_dias", 7))
+        ultimo_dia = datas[-1] + timedelta(days=tolerancia)
+
+        with unit_of_work("planejar_recorrencia", readonly=True) as uow:
+            # id inexistente estouraria a chave estrangeira só na gravação
+            existentes = {i for (i,) in uow.session.query(Paciente.id).filter(Paciente.id.in_(paciente_ids))}
+            inexistentes = sorted(set(paciente_ids) - existentes)
+            if inexistentes:
+                return {"success": False, "code": "NOT_FOUND",
+                        "message": f"Paciente(s) não encontrado(s): {', '.join(map(str, inexistentes))}"}
+            modelos = self.agenda.index.modelos(uow.session).get(profissional_id, [])
+            if not modelos:
+                return {"success": False, "message": "Profissional sem horário de atendimento definido"}
+            self.agenda.index.carregar(uow.session, datas[0], ultimo_dia, [profissional_id])
+
+        # cópias: as marcações planejadas não entram no índice compartilhado
+        ocupacao: Dict[date, DayIntervals] = {}
+
+        def dia_ocupado(dia: date) -> DayIntervals:
+            if dia not in ocupacao:
+                ocupacao[dia] = DayIntervals(self.agenda.index.ocupacao(profissional_id, dia) or ())
+            return ocupacao[dia]
+
+        plano, nao_agendadas = [], []
+        for paciente_id in paciente_ids:
+            for data_prevista in datas:
+                horario = self._primeiro_livre(modelos, dia_ocupado, data_prevista, tolerancia,
+                                               regra.get("duracao_minutos"))
+                if horario is None:
+                    nao_agendadas.append({"paciente_id": paciente_id, "data_prevista": data_prevista,
+                                          "motivo": "Sem horário livre dentro da tolerância"})
+                    continue
+                inicio, fim, modelo = horario
+                dia_ocupado(inicio.date()).add(inicio, fim, ("plano", paciente_id, inicio))
+                plano.append({
+                    "paciente_id": paciente_id, "profissional_id": profissional_id, "data_hora": inicio,
+                    "duracao_minutos": int((fim - inicio).total_seconds() // 60),
+                    "tipo": regra.get("tipo") or modelo.tipo, "data_prevista": data_prevista,
+                })
+
+        resultado = {"success": True, "simulacao": simular, "consultas": plano,
+                     "nao_agendadas": nao_agendadas, "total": len(plano)}
+        if simular or not plano:
+            resultado["message"] = f"{len(plano)} consulta(s) planejada(s), {len(nao_agendadas)} sem horário"
+            return resultado
+
+        try:
+            ids = self._gravar(plano, regra.get("observacoes"))
+        except IntegrityError:
+            # outra estação ocupou um dos horários depois do carregamento
+            self.agenda.index.invalidar()
+            return {"success": False, "code": "CONFLICT",
+                    "message": "A agenda foi alterada em outra estação. Gere a recorrência novamente."}
+
+        for consulta, consulta_id in zip(plano, ids):
+            fim = consulta["data_hora"] + timedelta(minutes=consulta["duracao_minutos"])
+            self.agenda.index.adicionar(profissional_id, consulta["data_hora"], fim, consulta_id)
+        self.agenda._notificar(profissional_id, [c["data_hora"].date() for c in plano])
+        resultado["consulta_ids"] = ids
+        resultado["message"] = f"{len(plano)} consulta(s) agendada(s), {len(nao_agendadas)} sem horário"
+        return resultado
+
+    @staticmethod
+    def _primeiro_livre(modelos, dia_ocupado, data_prevista: date, tolerancia: int, duracao: Optional[int]):
+        for atraso in range(tolerancia + 1):
+            dia = data_prevista + timedelta(days=atraso)
+            for modelo in modelos:
+                if not modelo.vale_em(dia):
+                    continue
+                passo = timedelta(minutes=duracao or modelo.duracao_minutos)
+                inicio = datetime.combine(dia, modelo.hora_inicio)
+                limite = datetime.combine(dia, modelo.hora_fim)
+                ocupacao = dia_ocupado(dia)
+                while inicio + passo <= limite:
+                    if ocupacao.conflict(inicio, inicio + passo) is None:
+                        return inicio, inicio + passo, modelo
+                    inicio += passo
+        return None
+
+    def _gravar(self, plano: List[dict], observacoes: Optional[str]) -> List[int]:
+        """INSERT em lote por bloco; devolve os ids na ordem do plano"""
+        tabela = Consulta.__table__
+        agora = datetime.utcnow()
+        usuario = auth.current_user
+        ids: List[int] = []
+        with unit_of_work("gerar_recorrencia") as uow:
+            conn = uow.session.connection()
+            for n in range(0, len(plano), BLOCO_INSERCAO):
+                bloco = plano[n:n + BLOCO_INSERCAO]
+                conn.execute(insert(tabela), [{
+                    "paciente_id": c["paciente_id"], "profissional_id": c["profissional_id"],
+                    "data_hora": c["data_hora"], "duracao_minutos": c["duracao_minutos"],
+                    "tipo": c["tipo"], "status": StatusConsulta.AGENDADA, "observacoes": observacoes,
+                    "created_at": agora, "updated_at": agora, "created_by": usuario.nome,
+                } for c in bloco])
+
+                # ids pelo índice único (profissional, horário): uma consulta por bloco
+                horarios = {c["data_hora"] for c in bloco}
+                por_horario = dict(conn.execute(
+                    select(tabela.c.data_hora, tabela.c.id).where(
+                        tabela.c.profissional_id == bloco[0]["profissional_id"],
+                        tabela.c.data_hora.in_(horarios),
+                        tabela.c.status != StatusConsulta.CANCELADA)
+                ).all())
+                bloco_ids = [por_horario[c["data_hora"]] for c in bloco]
+                ids.extend(bloco_ids)
+
+                # INSERT direto não passa pelo flush do ORM: diário de sincronização explícito
+                sync.journal_rows(conn, tabela.name, bloco_ids)
+
+        # um registro de auditoria por bloco, só depois do commit
+        for n in range(0, len(ids), BLOCO_INSERCAO):
+            bloco_ids = ids[n:n + BLOCO_INSERCAO]
+            audit_sink.emit(
+                "CREATE",
+                usuario_id=usuario.id,
+                usuario_nome=usuario.nome,
+                tabela=tabela.name,
+                observacoes=f"Recorrência: {len(bloco_ids)} consulta(s) agendada(s) em lote "
+                            f"(ids {min(bloco_ids)}-{max(bloco_ids)})"
+            )
+        return ids
+
+# Instância global
+recorrencia_controller = RecorrenciaController()
@@ -2,60 +2,110 @@
 # controllers/relatorio_controller.py
 # =============================================================================
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, case, or_, select
 from models.paciente import Paciente
 from models.consulta import Consulta
 from models.auditoria import LogAuditoria
+from models.medicamento import AdesaoMedicamento, Medicamento
 from db.connection import db_manager
+from db.maintenance import calcular_adesao
+from db.unit_of_work import unit_of_work
+from db.instrumentation import track_operation
 from controllers.auth_controller import auth
+from utils.datas import add_months, competencia_fechada
 from datetime import date, datetime
+from typing import Optional, Tuple
+import threading
+import time
+
+# Números do dashboard carregados durante o login valem por este tempo (s)
+DASHBOARD_PREFETCH_TTL = 60.0
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# PDC a partir do qual o paciente é considerado aderente
+PDC_ADERENTE = 0.8
+
+
+def encode_cursor(ultima_consulta: Optional[datetime], paciente_id: int) -> str:
+    return f"{ultima_consulta.isoformat() if ultima_consulta else ''}|{paciente_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[datetime], int]]:
+    if not cursor:
+        return None
+    try:
+        ultima, paciente_id = cursor.rsplit("|", 1)
+        return (datetime.fromisoformat(ultima) if ultima else None), int(paciente_id)
+    except ValueError:
+        raise ValueError(f"Cursor de paginação inválido: {cursor!r}")
 
 class RelatorioController:
+    def __init__(self):
+        self._prefetched = None
+        self._prefetch_lock = threading.Lock()
+
+    def _dashboard_numbers(self, session) -> dict:
+        hoje = date.today()
+        inicio_mes = hoje.replace(day=1)
+
+        total_pacientes = session.query(func.count(Paciente.id)).filter(Paciente.ativo == True).scalar()
+        pacientes_mes = session.query(func.count(Paciente.id)).filter(
+            and_(
+                Paciente.ativo == True,
+                func.date(Paciente.created_at) >= inicio_mes
+            )
+        ).scalar()
+        consultas_hoje = session.query(func.count(Consulta.id)).filter(func.date(Consulta.data_hora) == hoje).scalar()
+        consultas_mes = session.query(func.count(Consulta.id)).filter(
+            and_(
+                func.date(Consulta.data_hora) >= inicio_mes,
+                func.date(Consulta.data_hora) <= hoje
+            )
+        ).scalar()
+
+        return {
+            "total_pacientes": total_pacientes,
+            "pacientes_mes": pacientes_mes,
+            "consultas_hoje": consultas_hoje,
+            "consultas_mes": consultas_mes,
+            "data_atualizacao": datetime.now().isoformat()
+        }
 
+    @track_operation()
+    def prefetch_dashboard(self) -> None:
+        """Carrega os números do dashboard antes do login terminar (ver controllers/warmup.py).
+
+        Não verifica permissão: o resultado só é entregue por get_dashboard_data,
+        que verifica.
+        """
+        with unit_of_work("prefetch_dashboard", readonly=True) as uow:
+            data = self._dashboard_numbers(uow.session)
+        with self._prefetch_lock:
+            self._prefetched = (time.monotonic(), data)
+
+    @track_operation()
     def get_dashboard_data(self) -> dict:
         if not auth.has_permission('read'):
             return {"success": False, "message": "Sem permissão"}
 
-        session = db_manager.get_session()
-        try:
-            hoje = date.today()
-            inicio_mes = hoje.replace(day=1)
+        # primeira abertura após o login: usa (uma vez) os números pré-carregados
+        with self._prefetch_lock:
+            prefetched, self._prefetched = self._prefetched, None
+        if prefetched and time.monotonic() - prefetched[0] < DASHBOARD_PREFETCH_TTL:
+            return {"success": True, "data": prefetched[1]}
 
-            total_pacientes = session.query(func.count(Paciente.id)).filter(Paciente.ativo == True).scalar()
-            pacientes_mes = session.query(func.count(Paciente.id)).filter(
-                and_(
-                    Paciente.ativo == True,
-                    func.date(Paciente.created_at) >= inicio_mes
-                )
-            ).scalar()
-            consultas_hoje = session.query(func.count(Consulta.id)).filter(func.date(Consulta.data_hora) == hoje).scalar()
-            consultas_mes = session.query(func.count(Consulta.id)).filter(
-                and_(
-                    func.date(Consulta.data_hora) >= inicio_mes,
-                    func.date(Consulta.data_hora) <= hoje
-                )
-            ).scalar()
-
-            return {
-                "success": True,
-                "data": {
-                    "total_pacientes": total_pacientes,
-                    "pacientes_mes": pacientes_mes,
-                    "consultas_hoje": consultas_hoje,
-                    "consultas_mes": consultas_mes,
-                    "data_atualizacao": datetime.now().isoformat()
-                }
-            }
-        finally:
-            session.close()
+        with unit_of_work("get_dashboard_data", readonly=True) as uow:
+            return {"success": True, "data": self._dashboard_numbers(uow.session)}
 
+    @track_operation()
     def get_consultas_por_tipo(self, inicio: date, fim: date) -> dict:
         if not auth.has_permission('report'):
             return {"success": False, "message": "Sem permissão"}
 
-        session = db_manager.get_session()
-        try:
-            resultado = session.query(
+        with unit_of_work("get_consultas_por_tipo", readonly=True) as uow:
+            resultado = uow.session.query(
                 Consulta.tipo,
                 func.count(Consulta.id).label('total')
             ).filter(
@@ -67,13 +117,11 @@ class RelatorioController:
 
             dados = [{"tipo": r.tipo.value, "total": r.total} for r in resultado]
             return {"success": True, "dados": dados}
-        finally:
-            session.close()
 
+    @track_operation()
     def get_pacientes_por_faixa_etaria(self) -> dict:
-        session = db_manager.get_session()
-        try:
-            pacientes = session.query(Paciente).filter(Paciente.ativo == True).all()
+        with unit_of_work("get_pacientes_por_faixa_etaria", readonly=True) as uow:
+            pacientes = uow.session.query(Paciente).filter(Paciente.ativo == True).all()
             faixas = {'0-17': 0, '18-39': 0, '40-59': 0, '60+': 0}
 
             for p in pacientes:
@@ -89,8 +137,112 @@ class RelatorioController:
 
             dados = [{"faixa": k, "total": v} for k, v in faixas.items()]
             return {"success": True, "dados": dados}
-        finally:
-            session.close()
+
+    @track_operation()
+    def pacientes_sem_consulta(self, meses: int = 12, familia_id: Optional[int] = None,
+                               cursor: Optional[str] = None, limite: int = PAGE_SIZE,
+                               hoje: Optional[date] = None) -> dict:
+        """Pacientes ativos sem consulta realizada nos últimos `meses` meses:
+        primeiro os nunca atendidos (por id), depois pela última consulta mais
+        antiga. Usa pacientes.ultima_consulta e os índices (familia_id,
+        ultima_consulta, id) / (ultima_consulta, id), com paginação por chave
+        ("proximo_cursor"), sem agregar as consultas."""
+        if not auth.has_permission('report'):
+            return {"success": False, "message": "Sem permissão"}
+
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        limite = max(1, min(int(limite), MAX_PAGE_SIZE))
+        corte = datetime.combine(add_months(hoje or date.today(), -int(meses)), datetime.min.time())
+
+        colunas = (Paciente.id, Paciente.nome_completo, Paciente.familia_id, Paciente.ultima_consulta,
+                   Paciente.telefone, Paciente.celular)
+        filtros = [Paciente.ativo == True]
+        if familia_id is not None:
+            filtros.append(Paciente.familia_id == familia_id)
+
+        with unit_of_work("pacientes_sem_consulta", readonly=True) as uow:
+            conn = uow.session.connection()
+            rows = []
+            if after is None or after[0] is None:
+                query = select(*colunas).where(*filtros, Paciente.ultima_consulta.is_(None))
+                if after is not None:
+                    query = query.where(Paciente.id > after[1])
+                rows = [dict(r) for r in conn.execute(query.order_by(Paciente.id).limit(limite + 1)).mappings()]
+            if len(rows) <= limite:
+                query = select(*colunas).where(*filtros, Paciente.ultima_consulta < corte)
+                if after is not None and after[0] is not None:
+                    query = query.where(or_(Paciente.ultima_consulta > after[0],
+                                            and_(Paciente.ultima_consulta == after[0], Paciente.id > after[1])))
+                query = query.order_by(Paciente.ultima_consulta, Paciente.id).limit(limite + 1 - len(rows))
+                rows.extend(dict(r) for r in conn.execute(query).mappings())
+
+        proximo = None
+        if len(rows) > limite:
+            rows = rows[:limite]
+            proximo = encode_cursor(rows[-1]["ultima_consulta"], rows[-1]["id"])
+        return {"success": True, "dados": rows, "proximo_cursor": proximo}
+
+    @track_operation()
+    def calcular_adesao(self, competencia: Optional[date] = None) -> dict:
+        """Recalcula o resumo de adesão do mês (padrão: último mês fechado)"""
+        if not auth.has_permission('report'):
+            return {"success": False, "message": "Sem permissão"}
+        resultado = calcular_adesao(db_manager.engine, MAX_PAGE_SIZE, competencia=competencia, recalcular=True)
+        return {"success": True, "message": f"{resultado['linhas']} par(es) paciente/medicamento calculados",
+                "total": resultado["linhas"]}
+
+    @track_operation()
+    def adesao(self, competencia: Optional[date] = None, abaixo_de: float = PDC_ADERENTE,
+               medicamento_id: Optional[int] = None, cursor: Optional[str] = None,
+               limite: int = PAGE_SIZE) -> dict:
+        """Pacientes com PDC abaixo de `abaixo_de` na competência, do menor PDC
+        para o maior (índice competencia, pdc, id; cursor "pdc|id"), e o
+        resumo do mês (padrão: último mês fechado). Lê só
+        adesao_medicamentos, já calculada."""
+        if not auth.has_permission('report'):
+            return {"success": False, "message": "Sem permissão"}
+        try:
+            after = tuple(t(v) for t, v in zip((float, int), cursor.rsplit("|", 1))) if cursor else None
+        except ValueError:
+            return {"success": False, "message": f"Cursor de paginação inválido: {cursor!r}"}
+        limite = max(1, min(int(limite), MAX_PAGE_SIZE))
+        competencia = (competencia or competencia_fechada(datetime.utcnow())).replace(day=1)
+
+        filtros = [AdesaoMedicamento.competencia == competencia]
+        if medicamento_id is not None:
+            filtros.append(AdesaoMedicamento.medicamento_id == medicamento_id)
+
+        with unit_of_work("relatorio_adesao", readonly=True) as uow:
+            conn = uow.session.connection()
+            total, aderentes, media = conn.execute(select(
+                func.count(AdesaoMedicamento.id),
+                func.coalesce(func.sum(case((AdesaoMedicamento.pdc >= PDC_ADERENTE, 1), else_=0)), 0),
+                func.avg(AdesaoMedicamento.pdc),
+            ).where(*filtros)).one()
+
+            query = select(
+                AdesaoMedicamento.id, AdesaoMedicamento.paciente_id, Paciente.nome_completo,
+                AdesaoMedicamento.medicamento_id, Medicamento.nome.label("medicamento"),
+                AdesaoMedicamento.inicio, AdesaoMedicamento.dias_cobertos, AdesaoMedicamento.dias_periodo,
+                AdesaoMedicamento.dispensacoes, AdesaoMedicamento.pdc,
+            ).join(Paciente, Paciente.id == AdesaoMedicamento.paciente_id).join(
+                Medicamento, Medicamento.id == AdesaoMedicamento.medicamento_id
+            ).where(*filtros, AdesaoMedicamento.pdc < abaixo_de)
+            if after is not None:
+                query = query.where(or_(AdesaoMedicamento.pdc > after[0],
+                                        and_(AdesaoMedicamento.pdc == after[0], AdesaoMedicamento.id > after[1])))
+            rows = [dict(r) for r in conn.execute(
+                query.order_by(AdesaoMedicamento.pdc, AdesaoMedicamento.id).limit(limite + 1)).mappings()]
+
+        proximo = None
+        if len(rows) > limite:
+            rows = rows[:limite]
+            proximo = f"{rows[-1]['pdc']!r}|{rows[-1]['id']}"
+        return {"success": True, "dados": rows, "proximo_cursor": proximo,
+                "resumo": {"total": total, "aderentes": aderentes, "pdc_medio": media}}
 
 # Instância global
 relatorio_controller = RelatorioController()
@@ -0,0 +1,83 @@
+# =============================================================================
+# controllers/warmup.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+Aquecimento especulativo durante o login.
+
+Enquanto o usuário digita e enquanto o bcrypt verifica a senha, uma thread
+em segundo plano abre as conexões do pool, configura os mappers do ORM e
+pré-carrega os números do dashboard. Quando o login termina, a janela
+principal abre já preenchida.
+
+Nada aqui depende do usuário logado: o que é pré-carregado só é entregue
+depois pelos controllers, que verificam as permissões normalmente.
+"""
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy.orm import configure_mappers
+
+from db.connection import db_manager
+from controllers.relatorio_controller import relatorio_controller
+
+logger = logging.getLogger("sisusf.warmup")
+
+
+class Warmup:
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable]] = []
+        self._thread = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.timings: Dict[str, float] = {}
+
+    def register(self, name: str, func: Callable) -> None:
+        """Adiciona uma etapa (ex.: carga de tabelas de referência)"""
+        self._steps.append((name, func))
+
+    def start(self) -> bool:
+        """Inicia o aquecimento uma única vez; retorna False se já iniciado"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self._run, name="sisusf-warmup", daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout: float = 5.0) -> bool:
+        """Aguarda o fim do aquecimento (se iniciado)"""
+        if self._thread is None:
+            return True
+        return self._done.wait(timeout)
+
+    def reset(self) -> None:
+        """Permite aquecer de novo (próximo login)"""
+        with self._lock:
+            if self._thread is not None and not self._done.is_set():
+                return
+            self._thread = None
+            self._done.clear()
+
+    def _run(self) -> None:
+        try:
+            for name, func in self._steps:
+                start = time.perf_counter()
+                try:
+                    func()
+                except Exception as exc:
+                    # aquecimento é só otimização: a tela carrega normalmente depois
+                    logger.warning("Aquecimento '%s' falhou: %s", name, str(exc).splitlines()[0])
+                self.timings[name] = (time.perf_counter() - start) * 1000.0
+            logger.debug("Aquecimento concluído: %s", {k: round(v, 1) for k, v in self.timings.items()})
+        finally:
+            self._done.set()
+
+
+# Instância global
+warmup = Warmup()
+warmup.register("pool", db_manager.warm_pool)
+warmup.register("mappers", configure_mappers)
+warmup.register("dashboard", relatorio_controller.prefetch_dashboard)
@@ -0,0 +1,170 @@
+# =============================================================================
+# db/audit_diff.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Captura automática de alterações para a auditoria.
+
+Para as models registradas (track_changes), cada flush grava em
+logs_auditoria, na mesma transação e num único INSERT multi-linha, o que
+mudou em cada registro:
+
+    CREATE  dados_novos = {campo: [None, valor]}      campos não nulos
+    UPDATE  dados_novos = {campo: [antes, depois]}    só os campos alterados
+    DELETE  dados_novos = {campo: [valor, None]}      último estado
+
+dados_anteriores fica vazio: o diff já traz os dois lados. O tamanho do log
+acompanha o que mudou, não a largura da linha. Qualquer versão de um
+registro é reconstruída aplicando os diffs em ordem (replay); logs antigos
+com o dicionário de valores completo (sem pares [antes, depois]) são
+tratados como retrato do registro.
+
+Valores são gravados na forma JSON: datas em ISO 8601, enums pelo valor.
+"""
+import enum
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models.auditoria import LogAuditoria
+from models.consulta import Consulta
+from models.endereco import Endereco
+from models.familia import Familia
+from models.paciente import Paciente
+
+logger = logging.getLogger("sisusf.audit")
+
+# colunas que mudam em todo UPDATE e não dizem nada sobre o conteúdo
+DEFAULT_EXCLUDE = frozenset({"updated_at", "updated_by"})
+
+_tracked: Dict[type, frozenset] = {}
+_actor_provider: Optional[Callable] = None
+
+
+def track_changes(*models, exclude: Iterable[str] = DEFAULT_EXCLUDE) -> None:
+    """Registra models cujas alterações são auditadas automaticamente"""
+    for model in models:
+        _tracked[model] = frozenset(exclude)
+
+
+def register_actor_provider(provider: Callable) -> None:
+    """Função que devolve o usuário atual (objeto com id e nome, ou None)"""
+    global _actor_provider
+    _actor_provider = provider
+
+
+def to_json_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _column_keys(mapper, exclude) -> List[str]:
+    return [attr.key for attr in mapper.column_attrs if attr.key not in exclude]
+
+
+def _snapshot_diff(state, keys, created: bool) -> dict:
+    diff = {}
+    for key in keys:
+        value = state.dict.get(key)
+        if value is not None:
+            value = to_json_value(value)
+            diff[key] = [None, value] if created else [value, None]
+    return diff
+
+
+def _update_diff(state, keys) -> dict:
+    diff = {}
+    for key in keys:
+        history = state.attrs[key].history
+        if not history.has_changes():
+            continue
+        old = to_json_value(history.deleted[0]) if history.deleted else None
+        new = to_json_value(history.added[0]) if history.added else None
+        if old != new:
+            diff[key] = [old, new]
+    return diff
+
+
+def _registro_id(state) -> Optional[int]:
+    identity = state.identity or state.mapper.primary_key_from_instance(state.obj())
+    return identity[0] if identity and len(identity) == 1 else None
+
+
+def collect_changes(session) -> List[dict]:
+    """Linhas de auditoria para o flush em andamento (chamado em after_flush)"""
+    rows = []
+    for objects, acao in ((session.new, "CREATE"), (session.dirty, "UPDATE"), (session.deleted, "DELETE")):
+        for obj in objects:
+            exclude = _tracked.get(type(obj))
+            if exclude is None:
+                continue
+            state = inspect(obj)
+            keys = _column_keys(state.mapper, exclude)
+            if acao == "UPDATE":
+                diff = _update_diff(state, keys)
+            else:
+                diff = _snapshot_diff(state, keys, created=acao == "CREATE")
+            if not diff:
+                continue
+            rows.append({
+                "acao": acao,
+                "tabela": state.mapper.local_table.name,
+                "registro_id": _registro_id(state),
+                "dados_novos": diff,
+            })
+    return rows
+
+
+def replay(eventos: Iterable[dict]) -> Optional[dict]:
+    """Estado do registro depois dos eventos (em ordem cronológica); None se excluído"""
+    estado: Optional[dict] = None
+    for evento in eventos:
+        if evento["acao"] == "DELETE":
+            estado = None
+            continue
+        payload = evento.get("dados_novos")
+        if not isinstance(payload, dict) or evento["acao"] not in ("CREATE", "UPDATE"):
+            continue  # READ, LOGIN etc. não alteram o registro
+        if estado is None:
+            estado = {}
+        for campo, valor in payload.items():
+            if isinstance(valor, list) and len(valor) == 2:
+                estado[campo] = valor[1]
+            else:
+                estado[campo] = to_json_value(valor)  # formato antigo: retrato
+    return estado
+
+
+# ---------------------------
+# Eventos
+# ---------------------------
+@event.listens_for(Session, "after_flush")
+def _write_changes(session, flush_context):
+    if not _tracked:
+        return
+    rows = collect_changes(session)
+    if not rows:
+        return
+
+    actor = _actor_provider() if _actor_provider else None
+    timestamp = datetime.utcnow()
+    for row in rows:
+        row.update({
+            "usuario_id": getattr(actor, "id", None),
+            "usuario_nome": getattr(actor, "nome", None),
+            "timestamp": timestamp,
+        })
+    # mesma conexão/transação do flush: alteração e auditoria no mesmo commit
+    session.connection().execute(LogAuditoria.__table__.insert(), rows)
+
+
+track_changes(Paciente, Endereco, Familia, Consulta)
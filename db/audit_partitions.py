@@ -0,0 +1,367 @@
+# =============================================================================
+# db/audit_partitions.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Particionamento mensal e arquivamento de logs_auditoria.
+
+PostgreSQL: logs_auditoria é uma tabela particionada por RANGE (timestamp),
+uma partição por mês (logs_auditoria_AAAAMM) mais logs_auditoria_default
+para o que cair fora das partições existentes. As partições dos próximos
+meses são criadas antecipadamente (ensure_partitions, chamado em
+create_all_tables). A chave primária passa a ser (id, timestamp), exigência
+do PostgreSQL para tabelas particionadas.
+
+SQLite: esquema de tabelas rotativas. logs_auditoria guarda só o mês
+corrente; na rotação, os meses anteriores são movidos para tabelas
+logs_auditoria_AAAAMM com os mesmos índices.
+
+Arquivamento (archive_partitions): partições/tabelas mensais mais antigas que
+a janela de retenção são exportadas para <arquivo>/logs_auditoria_AAAAMM.jsonl.gz
+(uma linha JSON por registro) e removidas. A remoção só acontece se o número
+de linhas exportadas conferir com o da partição.
+
+    python -m db.audit_partitions               # cria partições + arquiva
+    python -m db.audit_partitions migrar        # PostgreSQL: converte tabela existente
+
+Variáveis de ambiente:
+  SISUSF_AUDIT_RETENTION_MONTHS  meses mantidos no banco (padrão 24)
+  SISUSF_AUDIT_MONTHS_AHEAD      partições futuras criadas (padrão 3)
+  SISUSF_AUDIT_ARCHIVE_DIR       destino dos arquivos (padrão data/arquivo_auditoria)
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import logging
+import functools
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (Column, Index, MetaData, PrimaryKeyConstraint, Table, func,
+                        inspect, select, text)
+from sqlalchemy.exc import DBAPIError
+
+from models.auditoria import LogAuditoria
+
+logger = logging.getLogger("sisusf.audit")
+
+TABLE_NAME = LogAuditoria.__tablename__
+DEFAULT_PARTITION = f"{TABLE_NAME}_default"
+_MONTH_TABLE = re.compile(rf"^{TABLE_NAME}_(\d{{4}})(\d{{2}})$")
+
+
+# ---------------------------
+# Meses
+# ---------------------------
+def _month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _add_months(d: date, months: int) -> date:
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_table_name(d: date) -> str:
+    return f"{TABLE_NAME}_{d.year:04d}{d.month:02d}"
+
+
+def _parse_month(name: str) -> Optional[date]:
+    match = _MONTH_TABLE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _engine(engine):
+    if engine is None:
+        from db.connection import db_manager
+        engine = db_manager.engine
+    return engine
+
+
+def _is_postgresql(engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+# ---------------------------
+# Definições de tabela
+# ---------------------------
+def _copy_table(name: str, partitioned: bool = False) -> Table:
+    """Tabela com as colunas e índices de LogAuditoria (nomes de índice com sufixo)"""
+    source = LogAuditoria.__table__
+    columns = [
+        Column(c.name, c.type, nullable=c.nullable,
+               primary_key=c.primary_key and not partitioned, autoincrement=c.primary_key)
+        for c in source.columns
+    ]
+    args = list(columns)
+    kwargs = {}
+    if partitioned:
+        args.append(PrimaryKeyConstraint("id", "timestamp", name=f"{TABLE_NAME}_pkey"))
+        kwargs["postgresql_partition_by"] = "RANGE (timestamp)"
+
+    table = Table(name, MetaData(), *args, **kwargs)
+    suffix = "" if name == TABLE_NAME else name[len(TABLE_NAME):]
+    for index in source.indexes:
+        Index(index.name + suffix, *(table.c[c.name] for c in index.columns))
+    return table
+
+
+def _month_tables(conn) -> Dict[date, str]:
+    if _is_postgresql(conn.engine):
+        names = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ), {"parent": TABLE_NAME}).scalars().all()
+    else:
+        names = inspect(conn).get_table_names()
+    months = {}
+    for name in names:
+        month = _parse_month(name)
+        if month is not None:
+            months[month] = name
+    return dict(sorted(months.items()))
+
+
+def audit_tables(engine=None) -> Dict[date, str]:
+    """Tabelas/partições mensais existentes, por mês"""
+    with _engine(engine).connect() as conn:
+        return _month_tables(conn)
+
+
+@functools.lru_cache(maxsize=64)
+def _month_table(name: str) -> Table:
+    return _copy_table(name)
+
+
+def query_sources(conn) -> List[Tuple[Table, Optional[date]]]:
+    """Tabelas a consultar, da mais recente para a mais antiga: (tabela, mês).
+
+    No PostgreSQL só a tabela particionada (o planner descarta as partições
+    fora do intervalo); no SQLite a tabela viva (mês None) e as mensais.
+    """
+    sources: List[Tuple[Table, Optional[date]]] = [(LogAuditoria.__table__, None)]
+    if conn.engine.dialect.name == "sqlite":
+        months = _month_tables(conn)
+        sources.extend((_month_table(months[m]), m) for m in sorted(months, reverse=True))
+    return sources
+
+
+def month_end(month: date) -> date:
+    """Primeiro dia do mês seguinte (limite superior exclusivo da partição)"""
+    return _add_months(month, 1)
+
+
+# ---------------------------
+# PostgreSQL
+# ---------------------------
+def _is_partitioned(conn) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :name"
+    ), {"name": TABLE_NAME}).first() is not None
+
+
+def create_partitioned_table(engine=None) -> bool:
+    """PostgreSQL: cria logs_auditoria particionada antes do create_all.
+
+    Retorna False se a tabela já existe sem particionamento (ver migrate_to_partitioned).
+    """
+    engine = _engine(engine)
+    if not _is_postgresql(engine):
+        return True
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(TABLE_NAME):
+            _copy_table(TABLE_NAME, partitioned=True).create(conn)
+            logger.info("Tabela %s criada com particionamento mensal", TABLE_NAME)
+            return True
+        if _is_partitioned(conn):
+            return True
+    logger.warning("%s existe sem particionamento; execute 'python -m db.audit_partitions migrar'", TABLE_NAME)
+    return False
+
+
+def _create_pg_partitions(conn, first: date, last: date) -> List[str]:
+    created = []
+    existing = set(_month_tables(conn).values())
+    month = first
+    while month <= last:
+        name = month_table_name(month)
+        if name not in existing:
+            # em savepoint: um conflito com a partição default (linhas do mês já
+            # gravadas nela) não impede a criação das demais partições
+            try:
+                with conn.begin_nested():
+                    conn.execute(text(
+                        f'CREATE TABLE "{name}" PARTITION OF "{TABLE_NAME}" '
+                        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+                    ))
+                created.append(name)
+            except DBAPIError as exc:
+                logger.warning("Partição %s não criada: %s", name, str(exc.orig).splitlines()[0])
+        month = _add_months(month, 1)
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{TABLE_NAME}" DEFAULT'))
+    return created
+
+
+def migrate_to_partitioned(engine=None) -> int:
+    """PostgreSQL: converte uma logs_auditoria comum em particionada (uma única transação)"""
+    engine = _engine(engine)
+    if not _is_postgresql(engine):
+        raise RuntimeError("Particionamento nativo disponível apenas no PostgreSQL")
+    legacy = f"{TABLE_NAME}_legado"
+    with engine.begin() as conn:
+        if _is_partitioned(conn):
+            return 0
+        conn.execute(text(f'ALTER TABLE "{TABLE_NAME}" RENAME TO "{legacy}"'))
+        conn.execute(text(f'ALTER SEQUENCE IF EXISTS "{TABLE_NAME}_id_seq" RENAME TO "{legacy}_id_seq"'))
+        for index in LogAuditoria.__table__.indexes:
+            conn.execute(text(f'ALTER INDEX IF EXISTS "{index.name}" RENAME TO "{index.name}_legado"'))
+        conn.execute(text(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{TABLE_NAME}_pkey" TO "{legacy}_pkey"'))
+
+        _copy_table(TABLE_NAME, partitioned=True).create(conn)
+        oldest = conn.execute(text(f'SELECT min("timestamp") FROM "{legacy}"')).scalar()
+        current = _month_start(datetime.utcnow())
+        _create_pg_partitions(conn, _month_start(oldest) if oldest else current,
+                              _add_months(current, _env_int("SISUSF_AUDIT_MONTHS_AHEAD", 3)))
+
+        columns = ", ".join(f'"{c.name}"' for c in LogAuditoria.__table__.columns)
+        moved = conn.execute(text(
+            f'INSERT INTO "{TABLE_NAME}" ({columns}) SELECT {columns} FROM "{legacy}"'
+        )).rowcount
+        conn.execute(text(
+            f"SELECT setval('{TABLE_NAME}_id_seq', COALESCE((SELECT max(id) FROM \"{TABLE_NAME}\"), 0) + 1, false)"
+        ))
+        conn.execute(text(f'DROP TABLE "{legacy}"'))
+    logger.info("%s convertida para particionada: %d registros", TABLE_NAME, moved)
+    return moved
+
+
+# ---------------------------
+# SQLite
+# ---------------------------
+def rotate_live_table(engine=None, today: Optional[date] = None) -> Dict[str, int]:
+    """SQLite: move os meses anteriores ao corrente para logs_auditoria_AAAAMM"""
+    engine = _engine(engine)
+    live = LogAuditoria.__table__
+    cutoff = datetime.combine(_month_start(today or datetime.utcnow()), datetime.min.time())
+    moved = {}
+    with engine.begin() as conn:
+        months = conn.execute(
+            select(func.strftime("%Y%m", live.c.timestamp)).where(live.c.timestamp < cutoff).distinct()
+        ).scalars().all()
+        for raw in sorted(months):
+            month = date(int(raw[:4]), int(raw[4:]), 1)
+            start = datetime.combine(month, datetime.min.time())
+            end = datetime.combine(_add_months(month, 1), datetime.min.time())
+            target = _copy_table(month_table_name(month))
+            target.create(conn, checkfirst=True)
+
+            in_month = (live.c.timestamp >= start) & (live.c.timestamp < end)
+            names = [c.name for c in live.columns]
+            conn.execute(target.insert().from_select(names, select(*live.columns).where(in_month)))
+            moved[target.name] = conn.execute(live.delete().where(in_month)).rowcount
+    for name, rows in moved.items():
+        logger.info("Auditoria: %d registros movidos para %s", rows, name)
+    return moved
+
+
+# ---------------------------
+# Jobs
+# ---------------------------
+def ensure_partitions(engine=None, months_ahead: Optional[int] = None,
+                      today: Optional[date] = None) -> List[str]:
+    """Cria as partições do mês corrente e dos próximos meses (PostgreSQL) ou
+    rotaciona a tabela viva (SQLite). Retorna as tabelas criadas/alimentadas."""
+    engine = _engine(engine)
+    months_ahead = months_ahead if months_ahead is not None else _env_int("SISUSF_AUDIT_MONTHS_AHEAD", 3)
+    current = _month_start(today or datetime.utcnow())
+
+    if _is_postgresql(engine):
+        with engine.begin() as conn:
+            if not _is_partitioned(conn):
+                return []
+            return _create_pg_partitions(conn, current, _add_months(current, months_ahead))
+    if engine.dialect.name == "sqlite":
+        return list(rotate_live_table(engine, today))
+    return []
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _export(conn, table: str, path: str) -> int:
+    """Exporta a tabela para JSON lines comprimido (grava em .tmp e renomeia)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    source = _copy_table(table)
+    rows = 0
+    result = conn.execution_options(stream_results=True).execute(select(source).order_by(source.c.id))
+    with gzip.open(tmp, "wt", encoding="utf-8") as out:
+        for partial in result.mappings().partitions(1000):
+            for row in partial:
+                out.write(json.dumps(dict(row), ensure_ascii=False, default=_json_default) + "\n")
+                rows += 1
+    os.replace(tmp, path)
+    return rows
+
+
+def archive_partitions(engine=None, retention_months: Optional[int] = None,
+                       archive_dir: Optional[str] = None, today: Optional[date] = None) -> List[dict]:
+    """Exporta e remove as partições mais antigas que a janela de retenção"""
+    engine = _engine(engine)
+    retention_months = retention_months if retention_months is not None \
+        else _env_int("SISUSF_AUDIT_RETENTION_MONTHS", 24)
+    archive_dir = archive_dir or os.getenv("SISUSF_AUDIT_ARCHIVE_DIR", os.path.join("data", "arquivo_auditoria"))
+    oldest_kept = _add_months(_month_start(today or datetime.utcnow()), -retention_months)
+    postgresql = _is_postgresql(engine)
+
+    archived = []
+    for month, table in audit_tables(engine).items():
+        if month >= oldest_kept:
+            continue
+        path = os.path.join(archive_dir, f"{table}.jsonl.gz")
+        with engine.begin() as conn:
+            if postgresql:
+                # bloqueia gravações tardias (spool de auditoria) durante a exportação
+                conn.execute(text(f'LOCK TABLE "{table}" IN SHARE MODE'))
+            expected = conn.execute(text(f'SELECT count(*) FROM "{table}"')).scalar()
+            rows = _export(conn, table, path)
+            if rows != expected:
+                raise RuntimeError(f"{table}: {rows} linhas exportadas, {expected} esperadas; tabela mantida")
+            if postgresql:
+                conn.execute(text(f'ALTER TABLE "{TABLE_NAME}" DETACH PARTITION "{table}"'))
+            conn.execute(text(f'DROP TABLE "{table}"'))
+        logger.info("Auditoria: %s arquivada em %s (%d registros)", table, path, rows)
+        archived.append({"tabela": table, "registros": rows, "arquivo": path})
+    return archived
+
+
+def run_maintenance(engine=None) -> dict:
+    """Criação de partições + arquivamento (job periódico/linha de comando)"""
+    engine = _engine(engine)
+    return {"particoes": ensure_partitions(engine), "arquivadas": archive_partitions(engine)}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if len(sys.argv) > 1 and sys.argv[1] == "migrar":
+        print(f"✅ {migrate_to_partitioned()} registros migrados")
+    else:
+        resultado = run_maintenance()
+        print(f"✅ Partições: {resultado['particoes'] or 'nenhuma nova'}")
+        for item in resultado["arquivadas"]:
+            print(f"📦 {item['tabela']}: {item['registros']} registros → {item['arquivo']}")
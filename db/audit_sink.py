@@ -0,0 +1,276 @@
+# =============================================================================
+# db/audit_sink.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Gravação assíncrona e em lote dos logs de auditoria.
+
+emit() não toca o banco: o evento é anexado a um arquivo de spool local
+(JSON lines) e colocado numa fila em memória limitada. Uma thread em segundo
+plano grava os eventos em lote (INSERT multi-linha) quando a fila atinge
+batch_size ou a cada flush_interval segundos, e no encerramento (close()).
+
+O spool é a garantia de durabilidade: o arquivo guarda tudo o que ainda não
+foi gravado no banco (offset confirmado em <spool>.offset). Se o processo cair
+ou o banco ficar fora do ar, os eventos são regravados a partir do spool na
+próxima inicialização/reconexão. Se a fila encher, os eventos continuam só no
+spool e são lidos de lá quando a thread alcançar.
+
+Um spool por estação (uma instância do SISUSF por diretório de dados).
+
+Variáveis de ambiente:
+  SISUSF_AUDIT_SPOOL     caminho do spool (padrão data/audit_spool.jsonl)
+  SISUSF_AUDIT_FSYNC     1 = fsync a cada evento (sobrevive a queda de energia)
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from models.auditoria import LogAuditoria
+
+logger = logging.getLogger("sisusf.audit")
+
+_COLUMNS = ("usuario_id", "usuario_nome", "acao", "tabela", "registro_id",
+            "dados_anteriores", "dados_novos", "ip_address", "observacoes")
+
+
+class AuditSink:
+    def __init__(self, spool_path: Optional[str] = None, engine=None, max_queue: int = 10000,
+                 batch_size: int = 200, flush_interval: float = 1.0, fsync: Optional[bool] = None):
+        self.spool_path = spool_path or os.getenv("SISUSF_AUDIT_SPOOL", os.path.join("data", "audit_spool.jsonl"))
+        self.offset_path = self.spool_path + ".offset"
+        self._engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync if fsync is not None else os.getenv("SISUSF_AUDIT_FSYNC", "0") == "1"
+
+        self._queue: "queue.Queue[Tuple[dict, int]]" = queue.Queue(maxsize=max_queue)
+        self._spool_lock = threading.Lock()
+        self._spool = None
+        self._committed = 0          # offset do spool já gravado no banco
+        self._spool_behind = False   # há eventos só no spool (fila cheia/recuperação)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._atexit = False
+
+        self._stats = {
+            "emitted": 0, "flushed": 0, "batches": 0, "errors": 0, "overflow": 0,
+            "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0,
+        }
+
+    # ------------------------
+    # API
+    # ------------------------
+    def emit(self, acao: str, **fields) -> None:
+        """Registra um evento de auditoria sem bloquear no banco"""
+        self.start()
+        evento = {k: fields.get(k) for k in _COLUMNS}
+        evento["acao"] = acao
+        evento["timestamp"] = (fields.get("timestamp") or datetime.utcnow()).isoformat()
+        line = (json.dumps(evento, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+        # Spool e fila sob a mesma trava: a ordem da fila é a ordem do arquivo
+        with self._spool_lock:
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            end = self._spool.tell()
+            self._stats["emitted"] += 1
+            self._idle.clear()
+            if self._spool_behind:
+                # enquanto a thread relê o spool, a fila não recebe eventos
+                # (senão um evento posterior confirmaria o offset de um anterior)
+                return
+            try:
+                self._queue.put_nowait((evento, end))
+            except queue.Full:
+                self._spool_behind = True
+                self._stats["overflow"] += 1
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._spool_lock:
+            if self._thread is not None:
+                return
+            spool_dir = os.path.dirname(self.spool_path)
+            if spool_dir:
+                os.makedirs(spool_dir, exist_ok=True)
+            self._spool = open(self.spool_path, "ab")
+            self._committed = self._read_offset()
+            # sobras de uma execução anterior (queda/banco fora do ar)
+            self._spool_behind = self._spool.tell() > self._committed
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sisusf-audit-sink", daemon=True)
+            self._thread.start()
+            if not self._atexit:
+                # close() é idempotente; reiniciar depois de close() não registra de novo
+                atexit.register(self.close)
+                self._atexit = True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Aguarda a gravação de tudo o que já foi emitido"""
+        if self._thread is None:
+            return True
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Grava o que estiver pendente e encerra a thread (closeEvent/atexit)"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        with self._spool_lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._spool_lock:
+            data = dict(self._stats)
+            data["queue_depth"] = self._queue.qsize()
+            data["spool_pending_bytes"] = (self._spool.tell() if self._spool else 0) - self._committed
+        data["avg_flush_ms"] = data["total_flush_ms"] / data["batches"] if data["batches"] else 0.0
+        return data
+
+    # ------------------------
+    # Thread de gravação
+    # ------------------------
+    @property
+    def engine(self):
+        if self._engine is None:
+            from db.connection import db_manager
+            self._engine = db_manager.engine
+        return self._engine
+
+    def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                if self._spool_behind:
+                    batch, end = self._read_spool_batch()
+                else:
+                    batch, end = self._next_queue_batch()
+
+                if batch:
+                    self._insert(batch)
+                    self._commit_offset(end)
+                    backoff = 0.5
+                elif self._stop.is_set():
+                    break
+                else:
+                    self._compact_spool()
+                    # sob a trava de emit(): um evento emitido depois da leitura vazia não é dado como gravado
+                    with self._spool_lock:
+                        if self._queue.empty() and not self._spool_behind:
+                            self._idle.set()
+            except Exception as exc:
+                self._stats["errors"] += 1
+                # eventos continuam no spool; relê de lá quando o banco voltar
+                self._spool_behind = True
+                logger.warning("Falha ao gravar auditoria (nova tentativa em %.1fs): %s",
+                               backoff, str(exc).splitlines()[0])
+                if self._stop.wait(backoff):
+                    # encerrando com banco indisponível: o spool fica para a próxima execução
+                    break
+                backoff = min(backoff * 2, 30.0)
+
+    def _next_queue_batch(self) -> Tuple[List[dict], int]:
+        """Espera o primeiro evento e acumula até batch_size ou flush_interval"""
+        batch, end = [], self._committed
+        wait = 0.05 if self._stop.is_set() else self.flush_interval
+        deadline = time.monotonic() + wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    evento, offset = self._queue.get(timeout=remaining)
+                else:
+                    evento, offset = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if offset <= self._committed:
+                continue  # já gravado a partir do spool
+            batch.append(evento)
+            end = offset
+        return batch, end
+
+    def _read_spool_batch(self) -> Tuple[List[dict], int]:
+        batch = []
+        with open(self.spool_path, "rb") as spool:
+            spool.seek(self._committed)
+            end = self._committed
+            for line in spool:
+                if not line.endswith(b"\n"):
+                    break  # linha incompleta (queda durante a escrita)
+                end += len(line)
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    logger.error("Linha inválida no spool de auditoria ignorada (offset %d)", end - len(line))
+                if len(batch) >= self.batch_size:
+                    break
+            else:
+                with self._spool_lock:
+                    if self._spool is not None and end >= self._spool.tell():
+                        self._spool_behind = False
+        return batch, end
+
+    def _insert(self, batch: List[dict]) -> None:
+        rows = []
+        for evento in batch:
+            row = {k: evento.get(k) for k in _COLUMNS}
+            row["timestamp"] = datetime.fromisoformat(evento["timestamp"])
+            rows.append(row)
+
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            conn.execute(LogAuditoria.__table__.insert(), rows)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        self._stats["flushed"] += len(rows)
+        self._stats["batches"] += 1
+        self._stats["last_flush_ms"] = elapsed_ms
+        self._stats["total_flush_ms"] += elapsed_ms
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+        logger.debug("Auditoria: %d eventos gravados em %.1f ms (fila=%d)", len(rows), elapsed_ms, self._queue.qsize())
+
+    # ------------------------
+    # Spool
+    # ------------------------
+    def _read_offset(self) -> int:
+        try:
+            with open(self.offset_path, "r") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _commit_offset(self, end: int) -> None:
+        self._committed = end
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(end))
+        os.replace(tmp, self.offset_path)
+
+    def _compact_spool(self) -> None:
+        """Zera o spool quando tudo o que foi escrito já está no banco"""
+        with self._spool_lock:
+            if self._spool is None or self._spool_behind or not self._queue.empty():
+                return
+            if self._committed and self._spool.tell() == self._committed:
+                self._spool.truncate(0)
+                self._spool.seek(0)
+                self._commit_offset(0)
+
+
+# instância global
+audit_sink = AuditSink()
@@ -7,12 +7,24 @@ Variáveis de ambiente:
   DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS
   PG_RETRIES (int), PG_BACKOFF (float seconds), PG_TIMEOUT (int seconds)
   SISUSF_LOG_LEVEL (DEBUG/INFO/WARNING/ERROR)
+  SQLITE_PATH (arquivo do fallback, padrão data/sisusf.db)
+  SQLITE_PROFILE (safe/balanced/fast), SQLITE_PRAGMAS (ver db/sqlite_profile.py)
+  SISUSF_SQL_METRICS, SISUSF_SLOW_QUERY_MS, SISUSF_METRICS_INTERVAL (ver db/instrumentation.py)
+  SISUSF_NPLUSONE, SISUSF_NPLUSONE_THRESHOLD (ver db/nplusone.py)
+  DB_READ_URLS (réplicas PostgreSQL de leitura, separadas por vírgula)
+  DB_REPLICA_MAX_LAG (segundos; réplica mais atrasada que isso não recebe leituras)
+  SQLITE_POOL_SIZE, SQLITE_READ_POOL_SIZE (0 desliga o pool de leitura do SQLite)
+  DB_MODE=offline (réplica local SQLite sincronizada com o PostgreSQL, ver db/sync.py)
+  DB_CENTRAL_URL (URL do banco central no modo offline; padrão: DB_HOST/DB_NAME/...)
 
 Principais melhorias:
  - retries/backoff configuráveis
  - mensagens de erro granulares e sem vazar senha
  - usa engine.begin() ao executar PRAGMA/SET para evitar warnings de commit
  - health helpers
+ - PRAGMAs do SQLite aplicados em toda conexão do pool (evento "connect")
+ - roteamento leitura/escrita: unidades somente leitura usam réplicas (ou um
+   pool SQLite somente leitura), respeitando "ler as próprias escritas"
 """
 from __future__ import annotations
 
@@ -25,13 +37,21 @@ import os
 import sys
 import time
 import logging
-from typing import Optional
+import itertools
+import threading
+import contextvars
+from typing import Dict, List, Optional
 from urllib.parse import quote_plus
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.exc import OperationalError, ArgumentError, DBAPIError
 
+from db.sqlite_profile import install_profile
+from db.instrumentation import install_from_env
+from db.nplusone import enable_from_env as enable_nplusone_from_env
+
 # ---------------------------
 # Locale / Encoding
 # ---------------------------
@@ -78,6 +98,26 @@ def _mask_password(url: Optional[str], password: Optional[str]) -> str:
     return url
 
 
+def _parse_lsn(lsn: Optional[str]) -> Optional[int]:
+    """Converte um pg_lsn ('16/B374D848') em inteiro comparável"""
+    if not lsn:
+        return None
+    hi, lo = str(lsn).split("/")
+    return (int(hi, 16) << 32) + int(lo, 16)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Chave de "ler as próprias escritas": no desktop há um usuário por processo;
+# o modo serviço define uma chave por usuário/requisição.
+read_your_writes_key: contextvars.ContextVar = contextvars.ContextVar("sisusf_ryw_key", default="default")
+
+
 # ---------------------------
 # Database manager
 # ---------------------------
@@ -86,6 +126,20 @@ class DatabaseManager:
         self.engine = None
         self.SessionLocal = None
         self.database_type: Optional[str] = None
+        self.sqlite_pragmas: Optional[dict] = None
+
+        # roteamento de leitura
+        self.read_engines: List = []
+        self._read_sessionmakers: Dict = {}
+        self._read_cycle = None
+        self.replica_max_lag = float(_env_int("DB_REPLICA_MAX_LAG", 5))
+        self._replica_status: Dict = {}   # engine -> (verificado_em, lsn, atraso_s)
+        self._pending_writes: Dict = {}   # chave -> (momento, lsn do primário)
+        self._routing_lock = threading.Lock()
+
+        # modo offline (DB_MODE=offline): réplica local + sincronização com o central
+        self.offline = os.getenv("DB_MODE", "").lower() == "offline"
+        self._central_engine = None
 
         # configurações de retry/backoff via env
         self.pg_retries = int(os.getenv("PG_RETRIES", "2"))
@@ -101,6 +155,13 @@ class DatabaseManager:
         self._setup_database()
 
     def _setup_database(self) -> None:
+        # modo offline: réplica local sempre; o PostgreSQL central é sincronizado
+        # em segundo plano (db/sync.py)
+        if self.offline:
+            logger.info("Modo offline: usando a réplica local SQLite (sincronização em segundo plano).")
+            self._setup_sqlite()
+            return
+
         # tenta PostgreSQL primeiro
         if self._setup_postgresql():
             return
@@ -109,7 +170,7 @@ class DatabaseManager:
         logger.info("FALLBACK: configurando SQLite como alternativa.")
         self._setup_sqlite()
 
-    def _setup_postgresql(self) -> bool:
+    def _postgresql_url(self):
         db_host = os.getenv("DB_HOST", "localhost")
         db_port = os.getenv("DB_PORT", "5432")
         db_name = os.getenv("DB_NAME", "sisusf")
@@ -118,6 +179,29 @@ class DatabaseManager:
 
         password_encoded = quote_plus(db_pass) if db_pass else ""
         database_url = f"postgresql://{db_user}:{password_encoded}@{db_host}:{db_port}/{db_name}"
+        return database_url, db_user, db_host, db_port, db_name
+
+    def central_engine(self):
+        """Engine do PostgreSQL central usada pela sincronização no modo offline.
+
+        Criada sem testar a conexão: o link pode estar fora do ar e a
+        sincronização tenta de novo mais tarde.
+        """
+        if self._central_engine is None:
+            url = os.getenv("DB_CENTRAL_URL") or self._postgresql_url()[0]
+            self._central_engine = create_engine(
+                url,
+                pool_size=2,
+                max_overflow=0,
+                pool_recycle=3600,
+                pool_pre_ping=True,
+                connect_args={"connect_timeout": int(self.pg_connect_timeout), "application_name": "SISUSF-sync"}
+                if url.startswith("postgresql") else {},
+            )
+        return self._central_engine
+
+    def _setup_postgresql(self) -> bool:
+        database_url, db_user, db_host, db_port, db_name = self._postgresql_url()
 
         logger.info("Tentando PostgreSQL: %s@%s:%s/%s", db_user, db_host, db_port, db_name)
 
@@ -153,6 +237,7 @@ class DatabaseManager:
                 )
                 self.database_type = "postgresql"
                 logger.info("Conexão PostgreSQL estabelecida com sucesso.")
+                self._setup_pg_replicas()
                 return True
 
             except OperationalError as oe:
@@ -192,37 +277,177 @@ class DatabaseManager:
             )
         return False
 
+    def _setup_pg_replicas(self) -> None:
+        urls = [u.strip() for u in os.getenv("DB_READ_URLS", "").split(",") if u.strip()]
+        for url in urls:
+            try:
+                engine = create_engine(
+                    url,
+                    echo=False,
+                    pool_size=5,
+                    max_overflow=10,
+                    pool_timeout=30,
+                    pool_recycle=3600,
+                    pool_pre_ping=True,
+                    connect_args={
+                        "connect_timeout": int(self.pg_connect_timeout),
+                        "application_name": "SISUSF-leitura",
+                    },
+                )
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                self._add_read_engine(engine)
+                logger.info("Réplica de leitura configurada: %s", _mask_password(str(engine.url), engine.url.password))
+            except Exception as exc:
+                logger.warning("Réplica de leitura ignorada (%s): %s", _mask_password(url, None), str(exc).splitlines()[0])
+
+    def _add_read_engine(self, engine) -> None:
+        self.read_engines.append(engine)
+        self._read_sessionmakers[engine] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self._read_cycle = itertools.cycle(self.read_engines)
+
     def _setup_sqlite(self) -> bool:
         try:
-            os.makedirs("data", exist_ok=True)
-            database_url = "sqlite:///data/sisusf.db"
+            db_path = os.getenv("SQLITE_PATH", os.path.join("data", "sisusf.db"))
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            database_url = f"sqlite:///{db_path}"
+            # QueuePool explícito: o padrão do SQLAlchemy 1.4 para arquivos é
+            # NullPool, que reabre o arquivo (e reaplica os PRAGMAs) a cada sessão
             self.engine = create_engine(
                 database_url,
                 echo=False,
+                poolclass=QueuePool,
+                pool_size=_env_int("SQLITE_POOL_SIZE", 5),
+                max_overflow=10,
                 connect_args={"check_same_thread": False, "timeout": 20},
             )
 
-            # Aplicar pragmas dentro de begin() para evitar warnings sobre commit
+            # PRAGMAs são por conexão: aplicados no evento "connect" para que
+            # todas as conexões do pool tenham foreign_keys e o perfil escolhido
+            self.sqlite_pragmas = install_profile(self.engine)
+
+            # encoding só altera no momento de criação do arquivo DB;
+            # abrir uma conexão aqui valida o arquivo e já aplica o perfil
             with self.engine.begin() as conn:
-                # encoding só altera no momento de criação do arquivo DB
-                # garantimos foreign_keys e journal_mode
-                conn.execute(text("PRAGMA foreign_keys = ON"))
-                conn.execute(text("PRAGMA journal_mode = WAL"))
+                conn.execute(text("SELECT 1"))
 
             self.SessionLocal = sessionmaker(
                 autocommit=False, autoflush=False, bind=self.engine
             )
             self.database_type = "sqlite"
-            logger.info("SQLite configurado com sucesso (data/sisusf.db).")
+
+            # Pool separado e somente leitura para unidades readonly. Em WAL os
+            # leitores veem tudo o que já foi commitado: não há atraso de réplica.
+            read_pool_size = _env_int("SQLITE_READ_POOL_SIZE", 4)
+            if read_pool_size > 0:
+                read_engine = create_engine(
+                    database_url,
+                    echo=False,
+                    poolclass=QueuePool,
+                    pool_size=read_pool_size,
+                    max_overflow=read_pool_size,
+                    connect_args={"check_same_thread": False, "timeout": 20},
+                )
+                install_profile(read_engine)
+
+                @event.listens_for(read_engine, "connect")
+                def _query_only(dbapi_connection, connection_record):
+                    dbapi_connection.execute("PRAGMA query_only = ON")
+
+                self._add_read_engine(read_engine)
+
+            logger.info(
+                "SQLite configurado com sucesso (%s, synchronous=%s).",
+                db_path,
+                self.sqlite_pragmas.get("synchronous"),
+            )
             return True
         except Exception as e:
             logger.exception("Erro crítico ao configurar SQLite: %s", e)
             raise
 
-    def get_session(self):
+    def get_session(self, readonly: bool = False, **kwargs):
+        """Nova sessão; kwargs sobrescrevem o sessionmaker (ex.: expire_on_commit=False).
+
+        readonly=True permite rotear a sessão para uma engine de leitura.
+        """
         if not self.SessionLocal:
             raise RuntimeError("SessionLocal não inicializada. Banco não disponível.")
-        return self.SessionLocal()
+        if readonly:
+            engine = self.choose_read_engine()
+            if engine is not self.engine:
+                return self._read_sessionmakers[engine](**kwargs)
+        return self.SessionLocal(**kwargs)
+
+    # ------------------------
+    # Roteamento leitura/escrita
+    # ------------------------
+    def note_write(self) -> None:
+        """Registra uma escrita commitada para garantir "ler as próprias escritas" """
+        if self.database_type != "postgresql" or not self.read_engines:
+            return
+        lsn = None
+        try:
+            with self.engine.connect() as conn:
+                lsn = _parse_lsn(conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar())
+        except Exception as exc:
+            logger.debug("note_write: LSN indisponível (%s); usando janela de tempo.", exc)
+        with self._routing_lock:
+            self._pending_writes[read_your_writes_key.get()] = (time.monotonic(), lsn)
+
+    def _replica_position(self, engine):
+        """(lsn aplicado, atraso em s) da réplica, com cache curto"""
+        now = time.monotonic()
+        cached = self._replica_status.get(engine)
+        if cached and now - cached[0] < 0.25:
+            return cached[1], cached[2]
+        try:
+            with engine.connect() as conn:
+                # réplica que já aplicou tudo o que recebeu está em dia, por mais antiga que
+                # seja a última transação (primário ocioso)
+                row = conn.execute(text(
+                    "SELECT pg_last_wal_replay_lsn()::text, "
+                    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                )).first()
+            lsn, lag = _parse_lsn(row[0]), float(row[1] or 0)
+        except Exception as exc:
+            logger.warning("Réplica indisponível, lendo do primário: %s", str(exc).splitlines()[0])
+            lsn, lag = None, float("inf")
+        self._replica_status[engine] = (now, lsn, lag)
+        return lsn, lag
+
+    def choose_read_engine(self):
+        """Engine para uma unidade somente leitura (réplica em dia ou primário)"""
+        if not self.read_engines:
+            return self.engine
+        with self._routing_lock:
+            engine = next(self._read_cycle)
+        if self.database_type != "postgresql":
+            return engine
+
+        lsn, lag = self._replica_position(engine)
+        if lag > self.replica_max_lag:
+            return self.engine
+
+        key = read_your_writes_key.get()
+        pending = self._pending_writes.get(key)
+        if pending is None:
+            return engine
+        written_at, write_lsn = pending
+        caught_up = (
+            lsn is not None and lsn >= write_lsn
+            if write_lsn is not None
+            else time.monotonic() - written_at > self.replica_max_lag
+        )
+        if not caught_up:
+            return self.engine
+        with self._routing_lock:
+            if self._pending_writes.get(key) == pending:
+                del self._pending_writes[key]
+        return engine
 
     def test_connection(self) -> bool:
         if not self.engine:
@@ -243,6 +468,33 @@ class DatabaseManager:
             logger.exception("test_connection: erro inesperado - %s", exc)
             return False
 
+    def warm_pool(self, connections: Optional[int] = None) -> int:
+        """Abre antecipadamente as conexões do pool (escrita e leitura).
+
+        Usado durante o login: conexão TCP/autenticação no PostgreSQL e os
+        PRAGMAs do SQLite ficam fora do caminho da primeira tela.
+        """
+        opened = 0
+        for engine in [self.engine] + list(self.read_engines):
+            if engine is None:
+                continue
+            size = connections or getattr(engine.pool, "size", lambda: 1)()
+            held = []
+            try:
+                # mantidas abertas juntas para forçar conexões distintas no pool
+                for _ in range(size):
+                    conn = engine.connect()
+                    held.append(conn)
+                    conn.execute(text("SELECT 1"))
+                    opened += 1
+            except (OperationalError, DBAPIError) as exc:
+                logger.warning("warm_pool: %s", str(exc).splitlines()[0])
+            finally:
+                for conn in held:
+                    conn.close()
+        logger.debug("warm_pool: %d conexões abertas", opened)
+        return opened
+
     def get_database_info(self) -> dict:
         try:
             url_str = str(self.engine.url)
@@ -261,6 +513,7 @@ class DatabaseManager:
         try:
             pool = getattr(self.engine, "pool", None)
             pool_size = getattr(pool, "size", None)
+            pool_size = pool_size() if callable(pool_size) else pool_size
         except Exception:
             pool_size = None
 
@@ -269,12 +522,22 @@ class DatabaseManager:
             "url": masked,
             "pool_size": pool_size,
             "echo": getattr(self.engine, "echo", False),
+            "sqlite_pragmas": self.sqlite_pragmas,
+            "read_engines": [_mask_password(str(e.url), e.url.password) for e in self.read_engines],
+            "offline": self.offline,
         }
 
 
 # instância global
 db_manager = DatabaseManager()
 
+# métricas de SQL / log de consultas lentas (ver db/instrumentation.py)
+install_from_env(db_manager.engine)
+for _read_engine in db_manager.read_engines:
+    install_from_env(_read_engine)
+# detector de N+1 em desenvolvimento (SISUSF_NPLUSONE=warn/raise)
+enable_nplusone_from_env()
+
 
 # helpers para frameworks (FastAPI/Flask)
 def get_db():
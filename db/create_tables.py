@@ -5,8 +5,10 @@
 
 import sys
 import traceback
-from sqlalchemy import text
+from sqlalchemy import func, inspect, insert, select, text, update
+from sqlalchemy.exc import DBAPIError
 from db.connection import db_manager
+from db.audit_partitions import create_partitioned_table, ensure_partitions
 from models.base import Base
 
 # Importar todas as models **antes** de criar as tabelas
@@ -16,7 +18,10 @@ import models.endereco
 import models.familia
 import models.consulta
 import models.medicamento
+import models.interacao
 import models.auditoria
+import models.agenda
+import models.sync
 
 # Configurar UTF-8 para o sistema
 if hasattr(sys.stdout, 'reconfigure'):
@@ -61,7 +66,14 @@ def create_all_tables():
         configure_database_encoding()
 
         print("📋 Criando todas as tabelas...")
+        # logs_auditoria particionada (PostgreSQL) precisa existir antes do create_all
+        create_partitioned_table(db_manager.engine)
         Base.metadata.create_all(db_manager.engine)
+        ensure_columns()
+        ensure_indexes()
+        ensure_agenda_constraints()
+        migrate_lotes_legados()
+        ensure_partitions(db_manager.engine)
         print("✅ Todas as tabelas foram criadas com sucesso")
         return True
     except Exception as e:
@@ -70,6 +82,114 @@ def create_all_tables():
         traceback.print_exc()
         return False
 
+# Índices substituídos por índices compostos que cobrem o mesmo prefixo
+OBSOLETE_INDEXES = {
+    'logs_auditoria': ['ix_logs_auditoria_usuario_id', 'ix_logs_auditoria_tabela_registro'],
+}
+
+def ensure_indexes():
+    """Cria os índices das models que ainda não existem em bancos já criados
+    e remove os índices obsoletos"""
+    created = []
+    with db_manager.engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                if not index.unique:
+                    index.create(conn)
+                    created.append(index.name)
+                    continue
+                # dados antigos podem violar um índice único novo: avisa e segue
+                try:
+                    with conn.begin_nested():
+                        index.create(conn)
+                    created.append(index.name)
+                except DBAPIError as e:
+                    print(f"⚠️ Índice único {index.name} não criado (dados duplicados?): {e.orig}")
+            for name in OBSOLETE_INDEXES.get(table.name, []):
+                if name in existing:
+                    conn.execute(text(f'DROP INDEX "{name}"'))
+    if created:
+        print(f"✅ Índices criados: {', '.join(created)}")
+    return created
+
+def ensure_columns():
+    """Acrescenta às tabelas já existentes as colunas novas das models
+    (apenas colunas que aceitam nulo ou têm valor padrão no banco)"""
+    added = []
+    with db_manager.engine.begin() as conn:
+        dialect = conn.dialect
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or (not column.nullable and column.server_default is None):
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg.text}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        print(f"✅ Colunas criadas: {', '.join(added)}")
+    return added
+
+def ensure_agenda_constraints():
+    """PostgreSQL: impede consultas sobrepostas do mesmo profissional
+    (o índice único só cobre horários de início iguais)"""
+    if db_manager.engine.dialect.name != 'postgresql':
+        return False
+    try:
+        with db_manager.engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM pg_constraint WHERE conname = 'ex_consultas_profissional_sobreposicao'"
+            )).first()
+            if exists:
+                return True
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            conn.execute(text(
+                "ALTER TABLE consultas ADD CONSTRAINT ex_consultas_profissional_sobreposicao "
+                "EXCLUDE USING gist (profissional_id WITH =, "
+                "tsrange(data_hora, data_hora + make_interval(mins => duracao_minutos)) WITH &&) "
+                "WHERE (status <> 'CANCELADA')"
+            ))
+        print("✅ Restrição de sobreposição de consultas criada")
+        return True
+    except DBAPIError as e:
+        print(f"⚠️ Restrição de sobreposição de consultas não criada: {e.orig}")
+        return False
+
+def migrate_lotes_legados():
+    """Estoque sem lote (cadastros anteriores a lotes_medicamento) vira um lote
+    com o lote/validade do próprio medicamento; sem efeito quando os lotes
+    já somam o estoque_atual"""
+    medicamentos = models.medicamento.Medicamento.__table__
+    lotes = models.medicamento.LoteMedicamento.__table__
+    estoque = func.coalesce(medicamentos.c.estoque_atual, 0)
+    em_lotes = select(func.coalesce(func.sum(lotes.c.quantidade), 0)) \
+        .where(lotes.c.medicamento_id == medicamentos.c.id).scalar_subquery()
+    with db_manager.engine.begin() as conn:
+        sem_lote = conn.execute(
+            select(medicamentos.c.id, medicamentos.c.lote, medicamentos.c.validade, (estoque - em_lotes).label("quantidade"))
+            .where(estoque > em_lotes)
+        ).all()
+        for m in sem_lote:
+            lote = m.lote or "SEM-LOTE"
+            somado = conn.execute(
+                update(lotes).where(lotes.c.medicamento_id == m.id, lotes.c.lote == lote)
+                .values(quantidade=lotes.c.quantidade + m.quantidade)
+            ).rowcount
+            if not somado:
+                conn.execute(insert(lotes).values(
+                    medicamento_id=m.id, lote=lote, quantidade=m.quantidade,
+                    validade=m.validade.date() if m.validade else None))
+    if sem_lote:
+        print(f"✅ Estoque sem lote migrado: {len(sem_lote)} medicamento(s)")
+    return len(sem_lote)
+
 def drop_all_tables():
     """Remove todas as tabelas (CUIDADO!)"""
     try:
@@ -0,0 +1,344 @@
+# =============================================================================
+# db/instrumentation.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Métricas de SQL e log de consultas lentas.
+
+Instrumenta uma engine via eventos before_cursor_execute/after_cursor_execute:
+  - histograma de latência por instrução (SQL normalizado)
+  - contagem de instruções e tempo por operação de controller
+    (métodos decorados com @track_operation)
+  - log de consultas lentas com SQL normalizado e o *formato* dos parâmetros
+    (nomes e tipos). Valores nunca são registrados: são dados de saúde.
+  - tempo de espera no checkout do pool de conexões
+
+Variáveis de ambiente:
+  SISUSF_SQL_METRICS       (1/0, padrão 1)
+  SISUSF_SLOW_QUERY_MS     limiar do log de consultas lentas (padrão 200)
+  SISUSF_METRICS_INTERVAL  segundos entre resumos periódicos no log (0 = desligado)
+"""
+import os
+import re
+import time
+import bisect
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from collections import deque
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger("sisusf.db.metrics")
+slow_logger = logging.getLogger("sisusf.db.slow")
+
+# Limites superiores (ms) dos baldes do histograma; o último balde é "+inf"
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Limite de instruções distintas acompanhadas (o excedente vai para OUTRAS)
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "<outras instruções>"
+
+_current_operation: contextvars.ContextVar = contextvars.ContextVar("sisusf_operation", default=None)
+
+# ---------------------------
+# Normalização
+# ---------------------------
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_RE_NAMED_PARAM = re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s|\?")
+_RE_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    """Remove literais e placeholders do SQL para agrupar instruções equivalentes"""
+    sql = _RE_STRING.sub("?", statement)
+    sql = _RE_NAMED_PARAM.sub("?", sql)
+    sql = _RE_NUMBER.sub("?", sql)
+    sql = _RE_IN_LIST.sub("(?...)", sql)
+    return _RE_SPACES.sub(" ", sql).strip()
+
+
+def _shape_of(value) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+def param_shape(parameters, executemany: bool = False) -> str:
+    """Descreve os parâmetros (nomes e tipos) sem expor os valores"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameters[0] if parameters else None
+        return f"{len(parameters)}x {param_shape(first)}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {_shape_of(v)}" for k, v in sorted(parameters.items())) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_shape_of(v) for v in parameters) + ")"
+    return _shape_of(parameters)
+
+
+# ---------------------------
+# Estruturas de métricas
+# ---------------------------
+class LatencyHistogram:
+    """Histograma de latências em baldes fixos (ms)"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, elapsed_ms: float) -> None:
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil aproximado (limite superior do balde)"""
+        if not self.count:
+            return None
+        target = self.count * p
+        acc = 0
+        for i, n in enumerate(self.buckets):
+            acc += n
+            if acc >= target:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class QueryMetrics:
+    """Coletor de métricas de SQL de uma ou mais engines"""
+
+    def __init__(self, slow_query_ms: Optional[float] = None, slow_log_size: int = 100):
+        if slow_query_ms is None:
+            try:
+                slow_query_ms = float(os.getenv("SISUSF_SLOW_QUERY_MS", "200"))
+            except ValueError:
+                slow_query_ms = 200.0
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._statements: Dict[str, LatencyHistogram] = {}
+        self._operations: Dict[str, dict] = {}
+        self._pool_wait = LatencyHistogram()
+        self._slow_queries = deque(maxlen=slow_log_size)
+        self._summary_thread: Optional[threading.Thread] = None
+        self._summary_stop = threading.Event()
+
+    # ------------------------
+    # Instalação
+    # ------------------------
+    def install(self, engine) -> None:
+        """Registra os eventos de execução e de pool na engine"""
+        if engine is None or getattr(engine, "_sisusf_metrics", None) is self:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        self._instrument_pool(engine.pool)
+        engine._sisusf_metrics = self
+
+    def _instrument_pool(self, pool) -> None:
+        # Não há evento "antes do checkout"; medimos a obtenção da conexão
+        # envolvendo _do_get, que é onde o pool bloqueia quando está esgotado.
+        do_get = getattr(pool, "_do_get", None)
+        if do_get is None or getattr(do_get, "_sisusf_timed", False):
+            return
+
+        @functools.wraps(do_get)
+        def timed_do_get():
+            start = time.perf_counter()
+            try:
+                return do_get()
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000.0
+                with self._lock:
+                    self._pool_wait.add(elapsed_ms)
+
+        timed_do_get._sisusf_timed = True
+        pool._do_get = timed_do_get
+
+    # ------------------------
+    # Eventos
+    # ------------------------
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sisusf_query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("sisusf_query_start")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000.0
+        self.record(statement, parameters, elapsed_ms, executemany)
+
+    def record(self, statement: str, parameters, elapsed_ms: float, executemany: bool = False) -> None:
+        normalized = normalize_sql(statement)
+        operation = _current_operation.get()
+
+        with self._lock:
+            hist = self._statements.get(normalized)
+            if hist is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    normalized_key = OTHER_STATEMENTS
+                    hist = self._statements.setdefault(normalized_key, LatencyHistogram())
+                else:
+                    hist = self._statements[normalized] = LatencyHistogram()
+            hist.add(elapsed_ms)
+
+            if operation is not None:
+                op = self._operations.setdefault(operation, {"calls": 0, "statements": 0, "sql_ms": 0.0, "elapsed_ms": 0.0})
+                op["statements"] += 1
+                op["sql_ms"] += elapsed_ms
+
+        if elapsed_ms >= self.slow_query_ms:
+            entry = {
+                "timestamp": time.time(),
+                "elapsed_ms": round(elapsed_ms, 3),
+                "operation": operation,
+                "sql": normalized,
+                "params": param_shape(parameters, executemany),
+            }
+            self._slow_queries.append(entry)
+            slow_logger.warning(
+                "Consulta lenta (%.1f ms) op=%s sql=%s params=%s",
+                elapsed_ms, operation or "-", normalized, entry["params"],
+            )
+
+    def _finish_operation(self, name: str, elapsed_ms: float) -> None:
+        with self._lock:
+            op = self._operations.setdefault(name, {"calls": 0, "statements": 0, "sql_ms": 0.0, "elapsed_ms": 0.0})
+            op["calls"] += 1
+            op["elapsed_ms"] += elapsed_ms
+
+    # ------------------------
+    # API programática
+    # ------------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "statements": {sql: h.to_dict() for sql, h in self._statements.items()},
+                "operations": {name: dict(op) for name, op in self._operations.items()},
+                "pool_wait": self._pool_wait.to_dict(),
+                "slow_queries": list(self._slow_queries),
+            }
+
+    def top_statements(self, n: int = 10, key: str = "total_ms") -> List[dict]:
+        stats = self.snapshot()["statements"]
+        ranked = sorted(stats.items(), key=lambda item: item[1][key], reverse=True)
+        return [dict(sql=sql, **data) for sql, data in ranked[:n]]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self._operations.clear()
+            self._pool_wait = LatencyHistogram()
+            self._slow_queries.clear()
+
+    def log_summary(self, top: int = 5) -> None:
+        snap = self.snapshot()
+        total = sum(s["count"] for s in snap["statements"].values())
+        logger.info("Resumo SQL: %d instruções, %d consultas lentas", total, len(snap["slow_queries"]))
+        for item in self.top_statements(top):
+            logger.info(
+                "  %6d x  avg=%.2fms p95=%sms max=%.2fms  %s",
+                item["count"], item["avg_ms"], item["p95_ms"], item["max_ms"], item["sql"][:160],
+            )
+        for name, op in sorted(snap["operations"].items()):
+            calls = op["calls"] or 1
+            logger.info(
+                "  op %-28s chamadas=%d instr/chamada=%.1f sql_ms/chamada=%.2f",
+                name, op["calls"], op["statements"] / calls, op["sql_ms"] / calls,
+            )
+        wait = snap["pool_wait"]
+        if wait["count"]:
+            logger.info("  pool checkout: %d esperas, p95=%sms, max=%.2fms", wait["count"], wait["p95_ms"], wait["max_ms"])
+
+    def start_periodic_summary(self, interval_s: float) -> None:
+        """Registra um resumo no log a cada interval_s segundos (thread daemon)"""
+        if interval_s <= 0 or (self._summary_thread and self._summary_thread.is_alive()):
+            return
+        self._summary_stop.clear()
+
+        def loop():
+            while not self._summary_stop.wait(interval_s):
+                try:
+                    self.log_summary()
+                except Exception:
+                    logger.exception("Falha ao gerar resumo de métricas SQL")
+
+        self._summary_thread = threading.Thread(target=loop, name="sisusf-sql-metrics", daemon=True)
+        self._summary_thread.start()
+
+    def stop_periodic_summary(self) -> None:
+        self._summary_stop.set()
+
+
+# instância global
+query_metrics = QueryMetrics()
+
+
+def track_operation(name: Optional[str] = None):
+    """Decorator que atribui as instruções SQL executadas à operação informada"""
+
+    def decorator(func):
+        op_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_operation.set(op_name)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                query_metrics._finish_operation(op_name, (time.perf_counter() - start) * 1000.0)
+                _current_operation.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def count_statements(engine):
+    """Context manager que coleta (em lista) o SQL normalizado executado na engine
+    pela thread atual (gravações em segundo plano, como o audit_sink, ficam de fora)"""
+    statements: List[str] = []
+    thread_id = threading.get_ident()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id:
+            statements.append(normalize_sql(statement))
+
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+
+
+def install_from_env(engine) -> None:
+    """Instala as métricas na engine conforme SISUSF_SQL_METRICS/SISUSF_METRICS_INTERVAL"""
+    if os.getenv("SISUSF_SQL_METRICS", "1") == "0":
+        return
+    query_metrics.install(engine)
+    try:
+        interval = float(os.getenv("SISUSF_METRICS_INTERVAL", "0"))
+    except ValueError:
+        interval = 0.0
+    query_metrics.start_periodic_summary(interval)
@@ -0,0 +1,463 @@
+# =============================================================================
+# db/maintenance.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Rotinas de manutenção das consultas em segundo plano.
+
+Cada rotina é um UPDATE ... WHERE por conjunto, em lotes de no máximo
+`lote` linhas, cada lote na sua própria transação: os bloqueios em
+consultas/pacientes duram um lote, não a varredura inteira, e entre os
+lotes há uma pausa curta para as gravações das estações passarem.
+
+  faltas            consultas AGENDADA cujo horário passou há mais que a
+                    tolerância viram FALTOU
+  ultima_consulta   pacientes.ultima_consulta = horário da última consulta
+                    REALIZADA (só os pacientes desatualizados). O ORM já
+                    mantém a coluna (models/consulta.py); esta rotina é a
+                    carga inicial e cobre gravações fora do ORM
+                    (INSERT em lote, alterações recebidas na sincronização)
+  estoque           medicamentos.estoque_atual x soma do livro
+                    movimentos_estoque; a rotina agendada não corrige:
+                    cada diferença vira um alerta ESTOQUE_DIVERGENTE
+                    (alertas_estoque, uma vez por saldo) e fica no log. O
+                    ajuste é decisão da farmácia
+                    (estoque_controller.reconciliar(corrigir=True)). Só o
+                    saldo de abertura (medicamento sem nenhum movimento no
+                    livro) é registrado direto
+  vencimentos       um alerta LOTE_VENCENDO (alertas_estoque) por lote com
+                    saldo que vence em até SISUSF_ALERTA_VENCIMENTO_DIAS
+                    dias (índice parcial ix_lotes_medicamento_vencimento)
+  adesao            resumo mensal de adesão (PDC) dos pacientes com condição
+                    crônica em adesao_medicamentos: histórico de dispensações
+                    carregado em colunas e calculado de uma vez (utils/pdc.py).
+                    Por padrão calcula o último mês fechado, uma vez por mês
+  sync              limpeza do diário de sincronização: entradas que todas
+                    as estações já receberam e mapas de registros excluídos
+                    (db/sync.py, podar_diario; sem o diário não faz nada)
+
+Em "faltas", no PostgreSQL, a seleção do lote usa FOR UPDATE SKIP LOCKED:
+consultas que uma estação está editando ficam para a rodada seguinte em vez
+de esperar. "ultima_consulta" não trava na seleção: o UPDATE recalcula o
+valor a partir das consultas, então repetir um paciente é inofensivo.
+As alterações entram no diário de sincronização (db/sync.py) quando ele
+está ligado e cada lote gravado gera um registro de auditoria.
+
+Consulta.data_hora é hora local (a agenda monta o horário com
+datetime.combine), então a tolerância das faltas é medida com datetime.now().
+
+    python -m db.maintenance                 # todas as rotinas, uma vez
+    python -m db.maintenance faltas          # só uma rotina
+    python -m db.maintenance ultima_consulta # carga inicial de pacientes.ultima_consulta
+
+Variáveis de ambiente:
+  SISUSF_MANUTENCAO_INTERVALO   segundos entre rodadas em segundo plano
+                                (ausente/0: não agenda; ver install_from_env)
+  SISUSF_MANUTENCAO_LOTE        linhas por lote (padrão 500)
+  SISUSF_MANUTENCAO_PAUSA       segundos entre lotes (padrão 0.05)
+  SISUSF_FALTA_TOLERANCIA_HORAS horas após o horário até marcar falta (padrão 24)
+  SISUSF_ALERTA_VENCIMENTO_DIAS dias de antecedência do alerta de vencimento (padrão 30)
+  SISUSF_PDC_DIAS               dias da janela de adesão até o fim do mês (padrão 180)
+"""
+import os
+import time
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, delete, exists, func, insert, select, text, update
+
+from db import sync
+from db.audit_sink import audit_sink
+from models.consulta import Consulta, StatusConsulta
+from models.medicamento import (LOTE_COM_SALDO_SQL, AdesaoMedicamento, AlertaEstoque, DispensacaoMedicamento,
+                                LoteMedicamento, Medicamento, MovimentoEstoque, TipoAlerta, TipoMovimento)
+from models.paciente import Paciente
+from utils.datas import competencia_fechada
+from utils.pdc import pdc
+
+logger = logging.getLogger("sisusf.manutencao")
+
+USUARIO_MANUTENCAO = "manutencao"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _auditar_lote(tabela: str, ids, descricao: str) -> None:
+    """Um registro de auditoria por lote gravado (depois do commit)"""
+    try:
+        audit_sink.emit("UPDATE", usuario_nome=USUARIO_MANUTENCAO, tabela=tabela,
+                        observacoes=f"Manutenção: {descricao} em {len(ids)} registro(s) "
+                                    f"(ids {min(ids)}-{max(ids)})")
+    except Exception as e:
+        logger.warning("Falha ao auditar lote de %s: %r", tabela, e)
+
+
+# ---------------------------
+# Rotinas (cada uma retorna linhas alteradas e lotes executados)
+# ---------------------------
+def marcar_faltas(engine, lote: int, pausa: float = 0.0, agora: Optional[datetime] = None,
+                  tolerancia: Optional[timedelta] = None) -> dict:
+    """AGENDADA -> FALTOU para consultas que passaram da tolerância.
+
+    agora: hora local, o mesmo relógio de Consulta.data_hora (padrão datetime.now())
+    """
+    agora = agora or datetime.now()
+    gravado_em = datetime.utcnow()
+    if tolerancia is None:
+        tolerancia = timedelta(hours=_env_float("SISUSF_FALTA_TOLERANCIA_HORAS", 24))
+    tabela = Consulta.__table__
+    limite = agora - tolerancia
+    lote_sql = (select(tabela.c.id, tabela.c.updated_at)
+                .where(tabela.c.status == StatusConsulta.AGENDADA, tabela.c.data_hora < limite)
+                .order_by(tabela.c.id).limit(lote)
+                .with_for_update(skip_locked=True))
+
+    linhas = lotes = 0
+    while True:
+        with engine.begin() as conn:
+            bases = dict(conn.execute(lote_sql).all())
+            if bases:
+                # status repetido no WHERE: não sobrescreve quem mudou a consulta no meio
+                linhas += conn.execute(
+                    update(tabela)
+                    .where(tabela.c.id.in_(list(bases)), tabela.c.status == StatusConsulta.AGENDADA)
+                    .values(status=StatusConsulta.FALTOU, updated_at=gravado_em, updated_by=USUARIO_MANUTENCAO)
+                ).rowcount
+                sync.journal_updates(conn, tabela.name, bases, ["status", "updated_by"])
+                lotes += 1
+        if bases:
+            _auditar_lote(tabela.name, bases, "consultas AGENDADA marcadas como FALTOU")
+        if len(bases) < lote:
+            return {"linhas": linhas, "lotes": lotes}
+        time.sleep(pausa)
+
+
+def atualizar_ultima_consulta(engine, lote: int, pausa: float = 0.0,
+                              agora: Optional[datetime] = None) -> dict:
+    """pacientes.ultima_consulta a partir das consultas REALIZADA (por faixa de ids)"""
+    agora = agora or datetime.utcnow()
+    pacientes = Paciente.__table__
+    consultas = Consulta.__table__
+    realizada = and_(consultas.c.paciente_id == pacientes.c.id, consultas.c.status == StatusConsulta.REALIZADA)
+    ultima = func.max(consultas.c.data_hora)
+
+    linhas = lotes = 0
+    ultimo_id = 0
+    while True:
+        with engine.begin() as conn:
+            # só os desatualizados (inclusive quem não tem mais consulta REALIZADA e volta a
+            # NULL); a paginação por id mantém cada lote curto
+            bases = dict(conn.execute(
+                select(pacientes.c.id, pacientes.c.updated_at)
+                .select_from(pacientes.outerjoin(consultas, realizada))
+                .where(pacientes.c.id > ultimo_id)
+                .group_by(pacientes.c.id, pacientes.c.updated_at, pacientes.c.ultima_consulta)
+                .having(pacientes.c.ultima_consulta.is_distinct_from(ultima))
+                .order_by(pacientes.c.id).limit(lote)
+            ).all())
+            if bases:
+                linhas += conn.execute(
+                    update(pacientes)
+                    .where(pacientes.c.id.in_(list(bases)))
+                    .values(ultima_consulta=select(ultima).where(realizada).scalar_subquery(),
+                            updated_at=agora, updated_by=USUARIO_MANUTENCAO)
+                ).rowcount
+                sync.journal_updates(conn, pacientes.name, bases, ["ultima_consulta", "updated_by"])
+                ultimo_id = max(bases)
+                lotes += 1
+        if bases:
+            _auditar_lote(pacientes.name, bases, "ultima_consulta recalculada")
+        if len(bases) < lote:
+            return {"linhas": linhas, "lotes": lotes}
+        time.sleep(pausa)
+
+
+def reconciliar_estoque(engine, lote: int, pausa: float = 0.0, agora: Optional[datetime] = None,
+                        corrigir: bool = False, alertar: bool = False) -> dict:
+    """Saldo de cada medicamento x soma do livro de movimentos (por faixa de ids).
+
+    corrigir=True registra um AJUSTE para cada diferença; alertar=True
+    registra só o saldo de abertura e alerta as demais diferenças."""
+    agora = agora or datetime.utcnow()
+    medicamentos = Medicamento.__table__
+    movimentos = MovimentoEstoque.__table__
+    alertas = AlertaEstoque.__table__
+    saldo = func.coalesce(medicamentos.c.estoque_atual, 0)
+
+    divergencias: List[dict] = []
+    linhas = lotes = 0
+    ultimo_id = 0
+    while True:
+        with engine.begin() as conn:
+            # trava o lote de medicamentos: dispensações em andamento terminam antes da soma
+            ids = [r.id for r in conn.execute(
+                select(medicamentos.c.id).where(medicamentos.c.id > ultimo_id)
+                .order_by(medicamentos.c.id).limit(lote).with_for_update())]
+            if ids:
+                livro = (select(movimentos.c.medicamento_id, func.sum(movimentos.c.quantidade).label("total"))
+                         .where(movimentos.c.medicamento_id.in_(ids))
+                         .group_by(movimentos.c.medicamento_id).subquery())
+                total = func.coalesce(livro.c.total, 0)
+                rows = conn.execute(
+                    select(medicamentos.c.id.label("medicamento_id"), saldo.label("saldo"), total.label("livro"),
+                           livro.c.medicamento_id.is_(None).label("livro_vazio"))
+                    .select_from(medicamentos.outerjoin(livro, livro.c.medicamento_id == medicamentos.c.id))
+                    .where(medicamentos.c.id.in_(ids), saldo != total)
+                ).mappings().all()
+                lote_divergente = [{k: r[k] for k in ("medicamento_id", "saldo", "livro")} for r in rows]
+                # livro vazio: saldo de abertura, anterior ao livro de estoque
+                ajustar = lote_divergente if corrigir else \
+                    [d for d, r in zip(lote_divergente, rows) if alertar and r["livro_vazio"]]
+                if ajustar:
+                    conn.execute(insert(movimentos), [{
+                        "medicamento_id": d["medicamento_id"], "tipo": TipoMovimento.AJUSTE,
+                        "quantidade": d["saldo"] - d["livro"], "created_at": agora,
+                        "observacoes": f"Reconciliação: saldo {d['saldo']}, livro {d['livro']}",
+                    } for d in ajustar])
+                alertar_ids = [] if corrigir or not alertar else \
+                    [d["medicamento_id"] for d, r in zip(lote_divergente, rows) if not r["livro_vazio"]]
+                if alertar_ids:
+                    saldos = {d["medicamento_id"]: d["saldo"] for d in lote_divergente}
+                    # um alerta por saldo divergente: rodadas seguintes não repetem
+                    ja_alertados = set(conn.execute(
+                        select(alertas.c.medicamento_id, alertas.c.saldo)
+                        .where(alertas.c.medicamento_id.in_(alertar_ids),
+                               alertas.c.tipo == TipoAlerta.ESTOQUE_DIVERGENTE)).all())
+                    novos = [i for i in alertar_ids if (i, saldos[i]) not in ja_alertados]
+                    if novos:
+                        conn.execute(insert(alertas), [{
+                            "medicamento_id": i, "tipo": TipoAlerta.ESTOQUE_DIVERGENTE,
+                            "saldo": saldos[i], "created_at": agora,
+                        } for i in novos])
+                for d in lote_divergente:
+                    nivel = logging.INFO if d["livro"] == 0 else logging.WARNING
+                    logger.log(nivel, "Estoque do medicamento %d: saldo %d, livro %d", d["medicamento_id"],
+                               d["saldo"], d["livro"])
+                divergencias.extend(lote_divergente)
+                linhas += len(ajustar)
+                ultimo_id = ids[-1]
+                lotes += 1
+        if len(ids) < lote:
+            return {"linhas": linhas, "lotes": lotes, "divergencias": divergencias}
+        time.sleep(pausa)
+
+
+def conferir_estoque(engine, lote: int, pausa: float = 0.0, agora: Optional[datetime] = None) -> dict:
+    """Rotina agendada: alerta as diferenças entre saldo e livro, sem corrigir"""
+    return reconciliar_estoque(engine, lote, pausa, agora, corrigir=False, alertar=True)
+
+
+def alertar_vencimentos(engine, lote: int, pausa: float = 0.0, agora: Optional[datetime] = None,
+                        dias: Optional[int] = None) -> dict:
+    """Alerta (uma vez) os lotes com saldo que vencem nos próximos `dias` dias"""
+    agora = agora or datetime.utcnow()
+    if dias is None:
+        dias = int(_env_float("SISUSF_ALERTA_VENCIMENTO_DIAS", 30))
+    lotes = LoteMedicamento.__table__
+    alertas = AlertaEstoque.__table__
+    ja_alertado = exists().where(alertas.c.lote_id == lotes.c.id, alertas.c.tipo == TipoAlerta.LOTE_VENCENDO)
+    lote_sql = (select(lotes.c.id, lotes.c.medicamento_id, lotes.c.quantidade, lotes.c.validade)
+                .where(text(LOTE_COM_SALDO_SQL), lotes.c.validade <= agora.date() + timedelta(days=dias),
+                       ~ja_alertado)
+                .order_by(lotes.c.validade, lotes.c.id).limit(lote))
+
+    linhas = lotes_executados = 0
+    while True:
+        with engine.begin() as conn:
+            vencendo = conn.execute(lote_sql).all()
+            if vencendo:
+                conn.execute(insert(alertas), [{
+                    "medicamento_id": l.medicamento_id, "lote_id": l.id, "tipo": TipoAlerta.LOTE_VENCENDO,
+                    "saldo": l.quantidade, "validade": l.validade, "created_at": agora,
+                } for l in vencendo])
+                linhas += len(vencendo)
+                lotes_executados += 1
+        if len(vencendo) < lote:
+            return {"linhas": linhas, "lotes": lotes_executados}
+        time.sleep(pausa)
+
+
+def carregar_dispensacoes(conn, desde: date, ate: date, lote: int) -> Dict[str, np.ndarray]:
+    """Dispensações dos pacientes crônicos em colunas, ordenadas por
+    (paciente, medicamento, data); dias: dias_tratamento ou a quantidade"""
+    d = DispensacaoMedicamento.__table__
+    p = Paciente.__table__
+    result = conn.execution_options(stream_results=True).execute(
+        select(d.c.paciente_id, d.c.medicamento_id, d.c.data_dispensacao,
+               func.coalesce(d.c.dias_tratamento, d.c.quantidade))
+        .select_from(d.join(p, p.c.id == d.c.paciente_id))
+        .where(p.c.condicoes_cronicas.isnot(None), p.c.condicoes_cronicas != "",
+               d.c.data_dispensacao >= datetime.combine(desde, datetime.min.time()),
+               d.c.data_dispensacao < datetime.combine(ate + timedelta(days=1), datetime.min.time()))
+        .order_by(d.c.paciente_id, d.c.medicamento_id, d.c.data_dispensacao, d.c.id))
+    partes = [np.array([(r[0], r[1], r[2].toordinal(), max(r[3] or 0, 0)) for r in parte], dtype=np.int64)
+              for parte in result.partitions(lote)]
+    colunas = np.concatenate(partes) if partes else np.zeros((0, 4), dtype=np.int64)
+    return {"paciente_id": colunas[:, 0], "medicamento_id": colunas[:, 1],
+            "data": colunas[:, 2], "dias": colunas[:, 3]}
+
+
+def calcular_adesao(engine, lote: int, pausa: float = 0.0, agora: Optional[datetime] = None,
+                    competencia: Optional[date] = None, dias: Optional[int] = None,
+                    recalcular: bool = False) -> dict:
+    """PDC de cada par paciente/medicamento na janela de `dias` dias que
+    termina no último dia da competência; substitui o resumo do mês"""
+    agora = agora or datetime.utcnow()
+    competencia = (competencia or competencia_fechada(agora)).replace(day=1)
+    if dias is None:
+        dias = int(_env_float("SISUSF_PDC_DIAS", 180))
+    fim = (competencia + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    inicio = fim - timedelta(days=dias - 1)
+    resumo = AdesaoMedicamento.__table__
+
+    with engine.connect() as conn:
+        if not recalcular and conn.execute(
+                select(resumo.c.id).where(resumo.c.competencia == competencia).limit(1)).first():
+            return {"linhas": 0, "lotes": 0}
+        # dispensações anteriores à janela ainda podem cobrir os primeiros dias
+        colunas = carregar_dispensacoes(conn, inicio - timedelta(days=dias), fim, lote)
+
+    paciente, medicamento = colunas["paciente_id"], colunas["medicamento_id"]
+    novo_par = np.r_[True, (paciente[1:] != paciente[:-1]) | (medicamento[1:] != medicamento[:-1])] \
+        if len(paciente) else np.zeros(0, dtype=bool)
+    grupos = np.cumsum(novo_par) - 1
+    n_grupos = int(novo_par.sum())
+    cobertos, periodo, dispensacoes, proporcao = pdc(grupos, colunas["data"], colunas["dias"], n_grupos,
+                                                     inicio.toordinal(), fim.toordinal())
+    pares_paciente, pares_medicamento = paciente[novo_par], medicamento[novo_par]
+    linhas = [{
+        "competencia": competencia, "paciente_id": int(pares_paciente[g]),
+        "medicamento_id": int(pares_medicamento[g]),
+        "inicio": date.fromordinal(int(fim.toordinal() + 1 - periodo[g])), "fim": fim,
+        "dias_cobertos": int(cobertos[g]), "dias_periodo": int(periodo[g]),
+        "dispensacoes": int(dispensacoes[g]), "pdc": float(proporcao[g]), "created_at": agora,
+    } for g in np.flatnonzero(periodo > 0)]
+
+    # troca o resumo do mês numa transação: relatórios veem o antigo ou o novo
+    lotes = 0
+    with engine.begin() as conn:
+        conn.execute(delete(resumo).where(resumo.c.competencia == competencia))
+        for i in range(0, len(linhas), lote):
+            conn.execute(insert(resumo), linhas[i:i + lote])
+            lotes += 1
+    logger.info("Adesão %s: %d par(es) paciente/medicamento", competencia.strftime("%m/%Y"), len(linhas))
+    return {"linhas": len(linhas), "lotes": lotes}
+
+
+ROTINAS: Dict[str, Callable[..., dict]] = {
+    "faltas": marcar_faltas,
+    "ultima_consulta": atualizar_ultima_consulta,
+    "estoque": conferir_estoque,
+    "vencimentos": alertar_vencimentos,
+    "adesao": calcular_adesao,
+    "sync": sync.podar_diario,
+}
+
+
+# ---------------------------
+# Execução agendada
+# ---------------------------
+class MaintenanceRunner:
+    def __init__(self, engine=None, lote: Optional[int] = None, pausa: Optional[float] = None,
+                 interval: Optional[float] = None):
+        self._engine = engine
+        self.lote = lote or int(_env_float("SISUSF_MANUTENCAO_LOTE", 500))
+        self.pausa = pausa if pausa is not None else _env_float("SISUSF_MANUTENCAO_PAUSA", 0.05)
+        self.interval = interval or _env_float("SISUSF_MANUTENCAO_INTERVALO", 900)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.ultimos: List[dict] = []
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from db.connection import db_manager
+            self._engine = db_manager.engine
+        return self._engine
+
+    def run_once(self, rotinas: Optional[List[str]] = None) -> List[dict]:
+        """Executa as rotinas e retorna, por rotina, linhas alteradas, lotes e duração"""
+        resultados = []
+        with self._lock:
+            for nome in rotinas or list(ROTINAS):
+                inicio = time.perf_counter()
+                resultado = ROTINAS[nome](self.engine, self.lote, self.pausa)
+                resultado.update(rotina=nome, duracao_ms=round((time.perf_counter() - inicio) * 1000, 1))
+                if resultado["linhas"]:
+                    logger.info("Manutenção %s: %d linha(s) em %d lote(s), %.1f ms", nome,
+                                resultado["linhas"], resultado["lotes"], resultado["duracao_ms"])
+                resultados.append(resultado)
+            self.last_run = datetime.utcnow()
+            self.ultimos = resultados
+        return resultados
+
+    def status(self) -> dict:
+        return {
+            "ultima_execucao": self.last_run,
+            "ultimo_erro": self.last_error,
+            "resultados": self.ultimos,
+            "executando": self._thread is not None,
+        }
+
+    # ------------------------
+    # Thread em segundo plano
+    # ------------------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sisusf-manutencao", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as exc:
+                # tenta de novo na próxima rodada; lotes já confirmados ficam
+                self.last_error = str(exc).splitlines()[0]
+                logger.warning("Manutenção falhou: %s", self.last_error)
+            self._stop.wait(self.interval)
+
+
+# instância global
+maintenance_runner = MaintenanceRunner()
+
+
+def install_from_env() -> bool:
+    """Agenda a manutenção se SISUSF_MANUTENCAO_INTERVALO estiver definido.
+
+    No modo offline as rotinas rodam no central, não nas réplicas: duas
+    estações marcando a mesma falta gerariam conflitos de sincronização.
+    """
+    from db.connection import db_manager
+    if db_manager.offline or _env_float("SISUSF_MANUTENCAO_INTERVALO", 0) <= 0:
+        return False
+    maintenance_runner.start()
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    for item in maintenance_runner.run_once(sys.argv[1:] or None):
+        print(f"✅ {item['rotina']}: {item['linhas']} linha(s), {item['lotes']} lote(s), {item['duracao_ms']} ms")
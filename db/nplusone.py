@@ -0,0 +1,115 @@
+# =============================================================================
+# db/nplusone.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Detector de consultas N+1 (desenvolvimento e testes).
+
+Quando habilitado, acompanha os SELECTs disparados por lazy load de
+relacionamentos (Consulta.paciente, Familia.membros, Paciente.endereco,
+backrefs dispensacoes_recebidas, ...) dentro de uma mesma Session. Se a
+mesma instrução (estruturalmente idêntica, mudando só os parâmetros) se
+repete `threshold` vezes, emite um aviso ou levanta NPlusOneError apontando
+o trecho do código que acessou o relacionamento.
+
+Variáveis de ambiente:
+  SISUSF_NPLUSONE            off/warn/raise (padrão off)
+  SISUSF_NPLUSONE_THRESHOLD  repetições toleradas (padrão 3)
+"""
+import os
+import logging
+import warnings
+import traceback
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db.instrumentation import normalize_sql
+
+logger = logging.getLogger("sisusf.db.nplusone")
+
+_STATE_KEY = "sisusf_nplusone"
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IGNORED_FILES = (os.path.abspath(__file__),)
+
+
+class NPlusOneError(Exception):
+    """Lazy load repetido detectado em modo "raise" """
+
+
+class NPlusOneWarning(UserWarning):
+    """Lazy load repetido detectado em modo "warn" """
+
+
+def _call_site() -> str:
+    """Primeiro frame do projeto (fora do SQLAlchemy e deste módulo) na pilha"""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        filename = os.path.abspath(frame.filename)
+        if filename in _IGNORED_FILES or not filename.startswith(_PROJECT_ROOT):
+            continue
+        if os.sep + "site-packages" + os.sep in filename:
+            continue
+        return f"{os.path.relpath(filename, _PROJECT_ROOT)}:{frame.lineno} em {frame.name}()"
+    return "<desconhecido>"
+
+
+class NPlusOneDetector:
+    def __init__(self, mode: str = "warn", threshold: int = 3):
+        self.mode = mode
+        self.threshold = threshold
+        self.enabled = False
+
+    def enable(self, mode: Optional[str] = None, threshold: Optional[int] = None) -> None:
+        if mode is not None:
+            self.mode = mode
+        if threshold is not None:
+            self.threshold = threshold
+        if not self.enabled:
+            event.listen(Session, "do_orm_execute", self._on_orm_execute)
+            self.enabled = True
+
+    def disable(self) -> None:
+        if self.enabled:
+            event.remove(Session, "do_orm_execute", self._on_orm_execute)
+            self.enabled = False
+
+    def reset(self, session: Session) -> None:
+        """Zera as contagens da sessão (início de uma nova unidade de trabalho)"""
+        session.info.pop(_STATE_KEY, None)
+
+    def _on_orm_execute(self, orm_execute_state) -> None:
+        if not orm_execute_state.is_select or not orm_execute_state.is_relationship_load:
+            return
+
+        counts = orm_execute_state.session.info.setdefault(_STATE_KEY, {})
+        key = normalize_sql(str(orm_execute_state.statement))
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] != self.threshold:
+            return
+
+        origem = orm_execute_state.lazy_loaded_from
+        classe = origem.class_.__name__ if origem is not None else "?"
+        message = (
+            f"Possível N+1: lazy load a partir de {classe} repetido {self.threshold}x "
+            f"na mesma sessão, em {_call_site()}. SQL: {key[:200]}"
+        )
+        if self.mode == "raise":
+            raise NPlusOneError(message)
+        warnings.warn(message, NPlusOneWarning, stacklevel=2)
+        logger.warning(message)
+
+
+# instância global
+nplusone_detector = NPlusOneDetector()
+
+
+def enable_from_env() -> None:
+    mode = os.getenv("SISUSF_NPLUSONE", "off").lower()
+    if mode not in ("warn", "raise"):
+        return
+    try:
+        threshold = int(os.getenv("SISUSF_NPLUSONE_THRESHOLD", "3"))
+    except ValueError:
+        threshold = 3
+    nplusone_detector.enable(mode, threshold)
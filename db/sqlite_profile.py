@@ -0,0 +1,115 @@
+# =============================================================================
+# db/sqlite_profile.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Perfis de desempenho do SQLite.
+
+Os PRAGMAs do SQLite valem por conexão: executá-los uma única vez dentro de
+engine.begin() só configura a primeira conexão do pool. Aqui os PRAGMAs são
+aplicados no evento "connect" do SQLAlchemy, ou seja, em toda nova conexão
+DBAPI aberta pelo pool.
+
+Presets:
+  safe      - durabilidade máxima (synchronous=FULL), caches padrão
+  balanced  - WAL + synchronous=NORMAL, cache de 64 MiB e mmap de 256 MiB
+  fast      - synchronous=OFF, caches grandes; pode perder as últimas
+              transações em queda de energia. Uso: cargas em lote/testes.
+
+Variáveis de ambiente:
+  SQLITE_PROFILE  (safe/balanced/fast, padrão balanced)
+  SQLITE_PRAGMAS  sobrescritas pontuais, ex.: "cache_size=-32768,mmap_size=0"
+"""
+import os
+import logging
+from typing import Dict, Optional, Union
+
+from sqlalchemy import event
+
+logger = logging.getLogger("sisusf.db")
+
+# foreign_keys fica fora dos presets: é obrigatório em qualquer perfil.
+SQLITE_PROFILES: Dict[str, Dict[str, Union[int, str]]] = {
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -2000,          # ~2 MiB (padrão do SQLite)
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 20000,        # ms
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,         # 64 MiB
+        "mmap_size": 268435456,       # 256 MiB
+        "temp_store": "MEMORY",
+        "busy_timeout": 20000,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,        # 256 MiB
+        "mmap_size": 1073741824,      # 1 GiB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+# ordem importa: journal_mode antes de synchronous
+_PRAGMA_ORDER = ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+
+
+def _parse_overrides(raw: Optional[str]) -> Dict[str, Union[int, str]]:
+    overrides: Dict[str, Union[int, str]] = {}
+    if not raw:
+        return overrides
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        key, value = (part.strip() for part in item.split("=", 1))
+        if key not in _PRAGMA_ORDER:
+            logger.warning("SQLITE_PRAGMAS: PRAGMA '%s' não suportado, ignorando.", key)
+            continue
+        try:
+            overrides[key] = int(value)
+        except ValueError:
+            overrides[key] = value.upper()
+    return overrides
+
+
+def resolve_profile(name: Optional[str] = None, overrides: Optional[str] = None) -> Dict[str, Union[int, str]]:
+    """Retorna os PRAGMAs do perfil (nome ou SQLITE_PROFILE) com as sobrescritas aplicadas"""
+    name = (name or os.getenv("SQLITE_PROFILE", DEFAULT_PROFILE)).lower()
+    if name not in SQLITE_PROFILES:
+        logger.warning("Perfil SQLite '%s' desconhecido; usando '%s'.", name, DEFAULT_PROFILE)
+        name = DEFAULT_PROFILE
+
+    pragmas = dict(SQLITE_PROFILES[name])
+    pragmas.update(_parse_overrides(overrides if overrides is not None else os.getenv("SQLITE_PRAGMAS")))
+    return pragmas
+
+
+def apply_pragmas(dbapi_connection, pragmas: Dict[str, Union[int, str]]) -> None:
+    """Executa foreign_keys e os PRAGMAs do perfil em uma conexão DBAPI"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA foreign_keys = ON")
+        for key in _PRAGMA_ORDER:
+            if key in pragmas:
+                cursor.execute(f"PRAGMA {key} = {pragmas[key]}")
+    finally:
+        cursor.close()
+
+
+def install_profile(engine, name: Optional[str] = None, overrides: Optional[str] = None) -> Dict[str, Union[int, str]]:
+    """Registra o perfil no evento "connect" da engine e retorna os PRAGMAs usados"""
+    pragmas = resolve_profile(name, overrides)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    return pragmas
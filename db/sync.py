@@ -0,0 +1,762 @@
+# =============================================================================
+# db/sync.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Modo offline: réplica local SQLite sincronizada com o PostgreSQL central.
+
+Com DB_MODE=offline a estação trabalha sempre no SQLite local (leituras
+rápidas, funciona sem link). As gravações feitas pelo ORM nas tabelas
+sincronizadas entram, na mesma transação, no diário sync_journal (apenas as
+colunas alteradas). Uma thread em segundo plano:
+
+  1. envia (push) o diário pendente ao central em lotes; cada lote é uma
+     transação no central e cada alteração tem um change_uuid, então reenviar
+     um lote interrompido não duplica nada;
+  2. recebe (pull) as alterações das outras estações a partir do último id
+     do diário central já aplicado (guardado em sync_estado, na mesma
+     transação local que aplica o lote).
+
+Ordem do diário central: os ids saem da sequência antes do commit, então
+uma transação lenta pode aparecer depois de um id maior. Em vez de travar o
+diário, o pull guarda as lacunas dos últimos SISUSF_SYNC_JANELA_IDS ids
+(sync_estado "pendentes_recebidos") e as relê nas rodadas seguintes. O
+push trava só as linhas que confere (SELECT ... FOR UPDATE).
+
+Alteração recebida que não se aplica na estação (referência que ainda não
+chegou, violação de integridade...) vai para sync_conflitos da própria
+estação e é tentada de novo a cada pull, na ordem do diário; alterações
+seguintes do mesmo registro esperam atrás dela. O que continuar lá aparece
+em status()["nao_aplicadas"].
+
+Identidade: cada registro sincronizado ganha um uuid (sync_id_map); os ids
+inteiros continuam locais a cada banco e as chaves estrangeiras viajam
+como uuid.
+
+Conflitos: cada alteração leva o updated_at que o registro tinha antes dela.
+Se no central o registro já tem outro updated_at (outra estação alterou
+antes), a alteração não é aplicada e fica em sync_conflitos; logo após o
+push a estação relê o registro inteiro do central e sobrescreve a cópia
+local (o pull só traria as colunas que a outra estação alterou).
+
+Central: com SISUSF_SYNC_CENTRAL=1 (só onde existem estações offline) as
+gravações feitas direto no banco central (terminais online e app.server)
+também entram no diário, já como aplicadas; sem a variável o diário fica
+desligado nas instâncias online e as estações só recebem o que outras
+estações enviaram.
+
+Limpeza (rotina "sync" de db/maintenance.py, podar_diario): cada estação
+informa no central até onde recebeu (sync_estado "recebido:<estação>"); as
+entradas que todas as estações ativas nos últimos SISUSF_SYNC_RETENCAO_DIAS
+dias já receberam saem do diário, e os mapas de registros excluídos saem de
+sync_id_map. Na estação, as entradas enviadas há mais que esse prazo são
+apagadas a cada rodada. Uma estação nova depois de uma limpeza começa de
+uma cópia do central, não do diário.
+
+Chaves estrangeiras para tabelas não sincronizadas (ex.: usuarios) são
+enviadas como estão: usuários são cadastrados no central com os mesmos ids.
+
+    python -m db.sync                      # uma rodada de sincronização
+    python -m db.sync bootstrap            # registra no diário os dados locais já existentes
+    python -m db.sync bootstrap-central    # idem no central (dados anteriores ao diário)
+
+Variáveis de ambiente:
+  DB_MODE=offline, DB_CENTRAL_URL (ver db/connection.py)
+  SISUSF_ESTACAO         identificação da estação (padrão: gerada e salva em sync_estado)
+  SISUSF_SYNC_INTERVAL   segundos entre rodadas (padrão 30)
+  SISUSF_SYNC_BATCH      alterações por lote (padrão 200)
+  SISUSF_SYNC_CENTRAL    1: liga o diário nas instâncias online (central com estações offline)
+  SISUSF_SYNC_JANELA_IDS ids do diário central relidos em busca de lacunas (padrão 1000)
+  SISUSF_SYNC_RETENCAO_DIAS  limpeza do diário (padrão 30)
+"""
+import os
+import enum
+import time
+import uuid
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, DateTime, Enum, bindparam, event, func, inspect, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.consulta import Consulta
+from models.endereco import Endereco
+from models.familia import Familia
+from models.paciente import Paciente
+from models.sync import SyncConflito, SyncEstado, SyncIdMap, SyncJournal
+
+logger = logging.getLogger("sisusf.sync")
+
+# ordem de dependência (pais antes dos filhos)
+SYNCED_MODELS = (Endereco, Familia, Paciente, Consulta)
+SYNC_TABLES = {model.__table__.name: model.__table__ for model in SYNCED_MODELS}
+_SYNC_SCHEMA = (SyncJournal.__table__, SyncIdMap.__table__, SyncEstado.__table__, SyncConflito.__table__)
+
+# lacunas de id do diário central relidas pelo pull (transações ainda não confirmadas)
+SYNC_JANELA_IDS = int(os.getenv("SISUSF_SYNC_JANELA_IDS", "1000"))
+SYNC_RETENCAO_DIAS = float(os.getenv("SISUSF_SYNC_RETENCAO_DIAS", "30"))
+
+J = SyncJournal.__table__
+M = SyncIdMap.__table__
+E = SyncEstado.__table__
+C = SyncConflito.__table__
+
+
+# ---------------------------
+# Serialização (JSON) por tipo de coluna
+# ---------------------------
+def _dump(column, value):
+    if value is None:
+        return None
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _load(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    if isinstance(column.type, Enum) and column.type.enum_class is not None:
+        return column.type.enum_class[value]
+    return value
+
+
+def _fk_target(column) -> Optional[str]:
+    """Tabela sincronizada referenciada pela coluna (ou None)"""
+    for fk in column.foreign_keys:
+        if fk.column.table.name in SYNC_TABLES:
+            return fk.column.table.name
+    return None
+
+
+# ---------------------------
+# Mapa de identidade
+# ---------------------------
+def _uuid_for(conn, tabela: str, local_id: int) -> Optional[str]:
+    return conn.execute(select(M.c.uuid).where(M.c.tabela == tabela, M.c.local_id == local_id)).scalar()
+
+
+def _id_for(conn, tabela: str, registro_uuid: str) -> Optional[int]:
+    return conn.execute(select(M.c.local_id).where(M.c.tabela == tabela, M.c.uuid == registro_uuid)).scalar()
+
+
+def _estado(conn, chave: str) -> Optional[str]:
+    return conn.execute(select(E.c.valor).where(E.c.chave == chave)).scalar()
+
+
+def _set_estado(conn, chave: str, valor: str) -> None:
+    if conn.execute(E.update().where(E.c.chave == chave).values(valor=valor)).rowcount == 0:
+        conn.execute(E.insert().values(chave=chave, valor=valor))
+
+
+# ---------------------------
+# Diário de alterações (eventos do ORM)
+# ---------------------------
+class ChangeJournal:
+    """Registra no sync_journal as alterações feitas pelo ORM nas tabelas sincronizadas"""
+
+    def __init__(self):
+        self.enabled = False
+        self.origem: Optional[str] = None
+        self.situacao = "pendente"
+
+    def enable(self, origem: str, central: bool = False) -> None:
+        """central=True: o próprio banco é o central (entradas já nascem aplicadas)"""
+        self.origem = origem
+        self.situacao = "aplicado" if central else "pendente"
+        if not self.enabled:
+            event.listen(Session, "before_flush", self._before_flush)
+            event.listen(Session, "after_flush", self._after_flush)
+            self.enabled = True
+
+    def disable(self) -> None:
+        if self.enabled:
+            event.remove(Session, "before_flush", self._before_flush)
+            event.remove(Session, "after_flush", self._after_flush)
+            self.enabled = False
+
+    # updated_at antes da alteração (no after_flush já foi sobrescrito pelo onupdate)
+    def _before_flush(self, session, flush_context, instances):
+        bases = session.info.setdefault("sisusf_sync_base", {})
+        for obj in list(session.dirty) + list(session.deleted):
+            table = getattr(obj, "__table__", None)
+            if table is None or table.name not in SYNC_TABLES:
+                continue
+            state = inspect(obj)
+            history = state.attrs.updated_at.history
+            bases[id(obj)] = history.deleted[0] if history.deleted else state.dict.get("updated_at")
+
+    def _after_flush(self, session, flush_context):
+        bases = session.info.pop("sisusf_sync_base", {})
+        changes = []
+        for objects, operacao in ((session.new, "INSERT"), (session.dirty, "UPDATE"), (session.deleted, "DELETE")):
+            for obj in objects:
+                table = getattr(obj, "__table__", None)
+                if table is None or table.name not in SYNC_TABLES:
+                    continue
+                changes.append((obj, operacao))
+        if not changes:
+            return
+
+        conn = session.connection()
+        writer = _JournalWriter(conn, self.origem, self.situacao)
+        # uuids dos registros novos primeiro: filhos no mesmo flush referenciam pais novos
+        for obj, operacao in changes:
+            if operacao == "INSERT":
+                writer.new_uuid(obj.__table__.name, obj.id)
+
+        for obj, operacao in sorted(changes, key=lambda c: list(SYNC_TABLES).index(c[0].__table__.name)):
+            state = inspect(obj)
+            table = obj.__table__
+            if operacao == "INSERT":
+                writer.add(table, obj.id, "INSERT", writer.row_payload(table, state.dict), None)
+                continue
+
+            registro_uuid = writer.uuid(table.name, obj.id, bootstrap=operacao == "UPDATE")
+            if registro_uuid is None:
+                continue  # excluído sem nunca ter sido sincronizado
+            if operacao == "DELETE":
+                writer.add(table, obj.id, "DELETE", None, bases.get(id(obj)))
+                continue
+            changed = {}
+            for attr in state.mapper.column_attrs:
+                history = state.attrs[attr.key].history
+                if history.added:
+                    changed[attr.key] = history.added[0]
+            if "updated_at" in state.dict:
+                changed["updated_at"] = state.dict["updated_at"]
+            if changed:
+                writer.add(table, obj.id, "UPDATE", writer.row_payload(table, changed), bases.get(id(obj)))
+        writer.write()
+
+
+class _JournalWriter:
+    """Acumula mapas e entradas do diário de um flush e grava em lote"""
+
+    def __init__(self, conn, origem: str, situacao: str):
+        self.conn = conn
+        self.origem = origem
+        self.situacao = situacao
+        self.maps: List[dict] = []
+        self.entries: List[dict] = []
+        self._cache: Dict[Tuple[str, int], str] = {}
+
+    def new_uuid(self, tabela: str, local_id: int) -> str:
+        registro_uuid = str(uuid.uuid4())
+        self._cache[(tabela, local_id)] = registro_uuid
+        self.maps.append({"tabela": tabela, "local_id": local_id, "uuid": registro_uuid})
+        return registro_uuid
+
+    def uuid(self, tabela: str, local_id: int, bootstrap: bool = True) -> Optional[str]:
+        """uuid do registro; registros anteriores ao diário entram como INSERT completo"""
+        key = (tabela, local_id)
+        if key not in self._cache:
+            found = _uuid_for(self.conn, tabela, local_id)
+            if found is not None:
+                self._cache[key] = found
+            elif bootstrap:
+                table = SYNC_TABLES[tabela]
+                row = self.conn.execute(select(table).where(table.c.id == local_id)).mappings().first()
+                self.new_uuid(tabela, local_id)
+                if row is not None:
+                    self.add(table, local_id, "INSERT", self.row_payload(table, dict(row)), None)
+            else:
+                return None
+        return self._cache[key]
+
+    def row_payload(self, table, values: dict) -> dict:
+        payload = {}
+        for column in table.columns:
+            if column.key == "id" or column.key not in values:
+                continue
+            value = values[column.key]
+            target = _fk_target(column)
+            if target is not None and value is not None:
+                value = self.uuid(target, value)
+            payload[column.key] = _dump(column, value)
+        return payload
+
+    def add(self, table, local_id: int, operacao: str, dados: Optional[dict], base) -> None:
+        self.entries.append({
+            "change_uuid": str(uuid.uuid4()),
+            "origem": self.origem,
+            "tabela": table.name,
+            "registro_uuid": self.uuid(table.name, local_id),
+            "operacao": operacao,
+            "dados": dados,
+            "base_updated_at": base,
+            "situacao": self.situacao,
+            "enviado_em": None,
+            "created_at": datetime.utcnow(),
+        })
+
+    def write(self) -> None:
+        if self.maps:
+            self.conn.execute(M.insert(), self.maps)
+        if self.entries:
+            self.conn.execute(J.insert(), self.entries)
+
+
+def bootstrap(engine, origem: str, central: bool = False) -> int:
+    """Registra no diário os registros que ainda não têm uuid (dados anteriores à sincronização)"""
+    total = 0
+    with engine.begin() as conn:
+        writer = _JournalWriter(conn, origem, "aplicado" if central else "pendente")
+        for tabela, table in SYNC_TABLES.items():
+            mapped = select(M.c.local_id).where(M.c.tabela == tabela)
+            for row in conn.execute(select(table.c.id).where(table.c.id.not_in(mapped)).order_by(table.c.id)):
+                writer.uuid(tabela, row.id)
+                total += 1
+        writer.write()
+    return total
+
+
+def journal_rows(conn, tabela: str, ids) -> None:
+    """Registra no diário linhas gravadas fora do ORM (INSERT em lote), se o diário estiver ligado"""
+    if not change_journal.enabled or tabela not in SYNC_TABLES:
+        return
+    writer = _JournalWriter(conn, change_journal.origem, change_journal.situacao)
+    for local_id in ids:
+        writer.uuid(tabela, local_id)
+    writer.write()
+
+
+def journal_updates(conn, tabela: str, bases: Dict[int, Optional[datetime]], colunas) -> None:
+    """Registra no diário UPDATEs em lote feitos fora do ORM; bases: id -> updated_at anterior"""
+    if not change_journal.enabled or tabela not in SYNC_TABLES or not bases:
+        return
+    table = SYNC_TABLES[tabela]
+    writer = _JournalWriter(conn, change_journal.origem, change_journal.situacao)
+    campos = [table.c.id] + [table.c[c] for c in colunas] + [table.c.updated_at]
+    for row in conn.execute(select(*campos).where(table.c.id.in_(list(bases)))).mappings():
+        valores = dict(row)
+        local_id = valores.pop("id")
+        writer.uuid(tabela, local_id)
+        writer.add(table, local_id, "UPDATE", writer.row_payload(table, valores), bases[local_id])
+    writer.write()
+
+
+# ---------------------------
+# Aplicação de alterações (central no push, réplica no pull)
+# ---------------------------
+def _apply(conn, entry, check_conflict: bool) -> Tuple[str, Optional[str]]:
+    """Aplica uma entrada do diário; retorna (situacao, motivo)"""
+    table = SYNC_TABLES.get(entry["tabela"])
+    if table is None:
+        return "conflito", f"tabela não sincronizada: {entry['tabela']}"
+    local_id = _id_for(conn, table.name, entry["registro_uuid"])
+
+    values = {}
+    for key, value in (entry["dados"] or {}).items():
+        if key not in table.c or key == "id":
+            continue
+        column = table.c[key]
+        target = _fk_target(column)
+        if target is not None and value is not None:
+            value = _id_for(conn, target, value)
+            if value is None:
+                return "conflito", f"referência ausente: {key}"
+        values[key] = _load(column, value)
+
+    if check_conflict and entry["base_updated_at"] is not None and local_id is not None \
+            and entry["operacao"] in ("UPDATE", "DELETE"):
+        # trava a linha até o commit: duas estações não passam pela mesma conferência
+        atual = conn.execute(select(table.c.updated_at).where(table.c.id == local_id).with_for_update()).scalar()
+        if atual != entry["base_updated_at"]:
+            return "conflito", f"registro alterado em outra estação (updated_at {atual})"
+
+    try:
+        with conn.begin_nested():
+            if entry["operacao"] == "DELETE":
+                if local_id is not None:
+                    conn.execute(table.delete().where(table.c.id == local_id))
+                    conn.execute(M.delete().where(M.c.tabela == table.name, M.c.local_id == local_id))
+            elif local_id is None:
+                if entry["operacao"] == "UPDATE":
+                    return "conflito", "registro inexistente no destino"
+                new_id = conn.execute(table.insert().values(**values)).inserted_primary_key[0]
+                conn.execute(M.insert().values(tabela=table.name, local_id=new_id, uuid=entry["registro_uuid"]))
+            elif values:
+                conn.execute(table.update().where(table.c.id == local_id).values(**values))
+    except IntegrityError as exc:
+        return "conflito", f"violação de integridade: {str(exc.orig).splitlines()[0]}"
+    return "aplicado", None
+
+
+# ---------------------------
+# Serviço de sincronização
+# ---------------------------
+class SyncService:
+    def __init__(self, local_engine=None, central_engine=None, origem: Optional[str] = None,
+                 batch_size: Optional[int] = None, interval: Optional[float] = None):
+        self._local = local_engine
+        self._central = central_engine
+        self._origem = origem or os.getenv("SISUSF_ESTACAO")
+        self.batch_size = batch_size or int(os.getenv("SISUSF_SYNC_BATCH", "200"))
+        self.interval = interval or float(os.getenv("SISUSF_SYNC_INTERVAL", "30"))
+        self._schema_ready = False
+        self._posicao_informada = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self.last_sync: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def local(self):
+        if self._local is None:
+            from db.connection import db_manager
+            self._local = db_manager.engine
+        return self._local
+
+    @property
+    def central(self):
+        if self._central is None:
+            from db.connection import db_manager
+            self._central = db_manager.central_engine()
+        return self._central
+
+    @property
+    def origem(self) -> str:
+        """Identificação da estação (gerada uma vez e guardada na réplica)"""
+        if self._origem is None:
+            self._ensure_schema(central=False)
+            with self.local.begin() as conn:
+                self._origem = _estado(conn, "estacao")
+                if self._origem is None:
+                    self._origem = f"estacao-{uuid.uuid4().hex[:12]}"
+                    _set_estado(conn, "estacao", self._origem)
+        return self._origem
+
+    def _ensure_schema(self, central: bool = True) -> None:
+        for table in _SYNC_SCHEMA:
+            table.create(self.local, checkfirst=True)
+        if central and not self._schema_ready:
+            for table in _SYNC_SCHEMA:
+                table.create(self.central, checkfirst=True)
+            self._schema_ready = True
+
+    # ------------------------
+    # Push / pull
+    # ------------------------
+    def push(self) -> dict:
+        """Envia um lote do diário local; retorna contagens"""
+        with self.local.connect() as conn:
+            pending = [dict(r) for r in conn.execute(
+                select(J).where(J.c.enviado_em.is_(None)).order_by(J.c.id).limit(self.batch_size)
+            ).mappings()]
+        if not pending:
+            return {"enviados": 0, "conflitos": 0}
+
+        results = []
+        with self.central.begin() as conn:
+            for entry in pending:
+                results.append(self._apply_remote(conn, entry))
+
+        agora = datetime.utcnow()
+        with self.local.begin() as conn:
+            conn.execute(
+                J.update().where(J.c.id == bindparam("b_id")).values(enviado_em=agora, situacao=bindparam("b_situacao")),
+                [{"b_id": entry["id"], "b_situacao": situacao} for entry, situacao in zip(pending, results)],
+            )
+        conflitos = results.count("conflito")
+        if conflitos:
+            logger.warning("Sincronização: %d alteração(ões) em conflito (ver sync_conflitos no central)", conflitos)
+            self._reler_do_central([entry for entry, situacao in zip(pending, results) if situacao == "conflito"])
+        return {"enviados": len(pending), "conflitos": conflitos}
+
+    def _reler_do_central(self, entries: List[dict]) -> None:
+        """Sobrescreve a cópia local dos registros em conflito com a versão completa do central"""
+        registros = list(dict.fromkeys((e["tabela"], e["registro_uuid"]) for e in entries))
+        versoes = []
+        with self.central.connect() as conn:
+            for tabela, registro_uuid in registros:
+                table = SYNC_TABLES.get(tabela)
+                central_id = _id_for(conn, tabela, registro_uuid) if table is not None else None
+                if central_id is None:
+                    continue  # inexistente no central (ex.: INSERT recusado): a cópia local fica
+                row = conn.execute(select(table).where(table.c.id == central_id)).mappings().first()
+                if row is None:
+                    continue
+                dados = {}
+                for column in table.columns:
+                    if column.key == "id":
+                        continue
+                    value = row[column.key]
+                    target = _fk_target(column)
+                    if target is not None and value is not None:
+                        value = _uuid_for(conn, target, value)
+                        if value is None:
+                            continue
+                    dados[column.key] = _dump(column, value)
+                # INSERT em _apply recria a linha se o DELETE local foi recusado
+                versoes.append({"change_uuid": None, "tabela": tabela, "registro_uuid": registro_uuid,
+                                "operacao": "INSERT", "dados": dados, "base_updated_at": None})
+        if not versoes:
+            return
+        with self.local.begin() as conn:
+            for entry in versoes:
+                situacao, motivo = _apply(conn, entry, check_conflict=False)
+                if situacao != "aplicado":
+                    logger.warning("Sincronização: registro %s/%s não relido do central: %s",
+                                   entry["tabela"], entry["registro_uuid"], motivo)
+
+    def _apply_remote(self, conn, entry: dict) -> str:
+        existing = conn.execute(select(J.c.situacao).where(J.c.change_uuid == entry["change_uuid"])).scalar()
+        if existing is not None:
+            return existing  # lote reenviado após falha: já aplicado
+
+        situacao, motivo = _apply(conn, entry, check_conflict=True)
+        row = {k: entry[k] for k in ("change_uuid", "origem", "tabela", "registro_uuid", "operacao",
+                                     "dados", "base_updated_at", "created_at")}
+        conn.execute(J.insert().values(**row, situacao=situacao, enviado_em=datetime.utcnow()))
+        if situacao == "conflito":
+            conn.execute(SyncConflito.__table__.insert().values(
+                change_uuid=entry["change_uuid"], origem=entry["origem"], tabela=entry["tabela"],
+                registro_uuid=entry["registro_uuid"], operacao=entry["operacao"], dados=entry["dados"],
+                motivo=motivo, created_at=datetime.utcnow(),
+            ))
+        return situacao
+
+    def pull(self) -> dict:
+        """Recebe e aplica um lote de alterações das outras estações (e as lacunas pendentes)"""
+        with self.local.connect() as conn:
+            cursor = int(_estado(conn, "ultimo_recebido") or 0)
+            pendentes = [int(i) for i in (_estado(conn, "pendentes_recebidos") or "").split(",") if i]
+        filtro = J.c.id > cursor
+        if pendentes:
+            filtro = or_(filtro, J.c.id.in_(pendentes))
+        with self.central.connect() as conn:
+            # todas as origens: um id ausente aqui é lacuna, não alteração filtrada
+            entries = [dict(r) for r in conn.execute(
+                select(J).where(filtro).order_by(J.c.id).limit(self.batch_size)
+            ).mappings()]
+        if not entries:
+            if not self._posicao_informada:
+                self._informar_posicao(cursor)
+            return {"recebidos": 0, "lidos": 0}
+
+        ultimo = max(cursor, entries[-1]["id"])
+        lidos = {entry["id"] for entry in entries}
+        janela = set(range(max(cursor, ultimo - SYNC_JANELA_IDS) + 1, ultimo + 1)) | set(pendentes)
+        pendentes = sorted(i for i in janela - lidos if i > ultimo - SYNC_JANELA_IDS)
+
+        recebidos = 0
+        with self.local.begin() as conn:
+            # registros com alteração anterior ainda não aplicada: as seguintes esperam na fila
+            bloqueados = set(conn.execute(select(C.c.registro_uuid)).scalars())
+            for entry in entries:
+                if entry["origem"] == self.origem or entry["situacao"] != "aplicado":
+                    continue
+                if entry["registro_uuid"] in bloqueados:
+                    situacao, motivo = "conflito", "aguardando alteração anterior do mesmo registro"
+                else:
+                    situacao, motivo = _apply(conn, entry, check_conflict=False)
+                if situacao != "aplicado":
+                    self._adiar(conn, entry, motivo)
+                    bloqueados.add(entry["registro_uuid"])
+                    continue
+                recebidos += 1
+            if bloqueados:
+                recebidos += self._reaplicar(conn)
+            _set_estado(conn, "ultimo_recebido", str(ultimo))
+            _set_estado(conn, "pendentes_recebidos", ",".join(map(str, pendentes)))
+        if ultimo != cursor or not self._posicao_informada:
+            self._informar_posicao(ultimo)
+        return {"recebidos": recebidos, "lidos": len(entries)}
+
+    def _adiar(self, conn, entry: dict, motivo: str) -> None:
+        logger.warning("Sincronização: alteração %s não aplicada localmente (nova tentativa no próximo pull): %s",
+                       entry["change_uuid"], motivo)
+        conn.execute(C.insert().values(
+            change_uuid=entry["change_uuid"], origem=entry["origem"], tabela=entry["tabela"],
+            registro_uuid=entry["registro_uuid"], operacao=entry["operacao"], dados=entry["dados"],
+            motivo=motivo, created_at=datetime.utcnow(),
+        ))
+
+    def _reaplicar(self, conn) -> int:
+        """Tenta de novo as alterações recebidas que não se aplicaram, na ordem em que chegaram"""
+        aplicadas = 0
+        ainda_bloqueados = set()
+        for fila in conn.execute(select(C).order_by(C.c.id)).mappings().all():
+            if fila["registro_uuid"] in ainda_bloqueados:
+                continue
+            situacao, motivo = _apply(conn, {**fila, "base_updated_at": None}, check_conflict=False)
+            if situacao == "aplicado":
+                conn.execute(C.delete().where(C.c.id == fila["id"]))
+                aplicadas += 1
+            else:
+                ainda_bloqueados.add(fila["registro_uuid"])
+                conn.execute(C.update().where(C.c.id == fila["id"]).values(motivo=motivo))
+        return aplicadas
+
+    def _informar_posicao(self, cursor: int) -> None:
+        """Até onde esta estação recebeu: base da limpeza do diário central (podar_diario)"""
+        with self.central.begin() as conn:
+            _set_estado(conn, f"recebido:{self.origem}"[:50], f"{cursor}|{datetime.utcnow().isoformat()}")
+        self._posicao_informada = True
+
+    def sync_once(self) -> dict:
+        """Uma rodada completa: envia todo o pendente e depois recebe tudo o que há"""
+        with self._lock:
+            self._ensure_schema()
+            totais = {"enviados": 0, "conflitos": 0, "recebidos": 0}
+            while True:
+                lote = self.push()
+                totais["enviados"] += lote["enviados"]
+                totais["conflitos"] += lote["conflitos"]
+                if lote["enviados"] < self.batch_size:
+                    break
+            while True:
+                lote = self.pull()
+                totais["recebidos"] += lote["recebidos"]
+                if lote["lidos"] < self.batch_size:
+                    break
+            # entradas locais já enviadas: o central guarda o change_uuid para reenvios
+            with self.local.begin() as conn:
+                conn.execute(J.delete().where(
+                    J.c.enviado_em < datetime.utcnow() - timedelta(days=SYNC_RETENCAO_DIAS)))
+            self.last_sync = datetime.utcnow()
+            self.last_error = None
+            return totais
+
+    def pending(self) -> int:
+        with self.local.connect() as conn:
+            return conn.execute(select(func.count()).select_from(J).where(J.c.enviado_em.is_(None))).scalar()
+
+    def nao_aplicadas(self) -> int:
+        """Alterações recebidas do central que esta estação ainda não conseguiu aplicar"""
+        with self.local.connect() as conn:
+            return conn.execute(select(func.count()).select_from(C)).scalar()
+
+    def status(self) -> dict:
+        return {
+            "estacao": self.origem,
+            "pendentes": self.pending(),
+            "nao_aplicadas": self.nao_aplicadas(),
+            "ultima_sincronizacao": self.last_sync,
+            "ultimo_erro": self.last_error,
+            "executando": self._thread is not None,
+        }
+
+    # ------------------------
+    # Thread em segundo plano
+    # ------------------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sisusf-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def wake(self) -> None:
+        """Antecipa a próxima rodada (ex.: após salvar um cadastro)"""
+        self._wake.set()
+
+    def _run(self) -> None:
+        espera = self.interval
+        while not self._stop.is_set():
+            try:
+                totais = self.sync_once()
+                if any(totais.values()):
+                    logger.info("Sincronização: %s", totais)
+                espera = self.interval
+            except Exception as exc:
+                # link instável: tenta de novo com espera crescente
+                self.last_error = str(exc).splitlines()[0]
+                logger.warning("Sincronização falhou (nova tentativa em %.0fs): %s", espera, self.last_error)
+                espera = min(espera * 2, 600.0)
+            self._wake.wait(espera)
+            self._wake.clear()
+
+
+# ---------------------------
+# Limpeza (rotina "sync" de db/maintenance.py)
+# ---------------------------
+def podar_diario(engine, lote: int, pausa: float = 0.0, agora: Optional[datetime] = None) -> dict:
+    """Apaga do diário central o que todas as estações ativas já receberam
+    (menos a janela de lacunas) e os mapas de registros já excluídos"""
+    agora = agora or datetime.utcnow()
+    if not inspect(engine).has_table(J.name):
+        return {"linhas": 0, "lotes": 0}
+    with engine.connect() as conn:
+        posicoes = conn.execute(select(E.c.chave, E.c.valor).where(E.c.chave.like("recebido:%"))).all()
+    ativas = []
+    for chave, valor in posicoes:
+        recebido, visto_em = valor.split("|", 1)
+        if datetime.fromisoformat(visto_em) >= agora - timedelta(days=SYNC_RETENCAO_DIAS):
+            ativas.append(int(recebido))
+        else:
+            logger.warning("Sincronização: %s sem contato há mais de %.0f dia(s), fora da limpeza",
+                           chave.split(":", 1)[1], SYNC_RETENCAO_DIAS)
+
+    linhas = lotes = 0
+    limite = min(ativas) - SYNC_JANELA_IDS if ativas else 0
+    while limite > 0:
+        with engine.begin() as conn:
+            ids = [r.id for r in conn.execute(
+                select(J.c.id).where(J.c.id <= limite).order_by(J.c.id).limit(lote))]
+            if ids:
+                linhas += conn.execute(J.delete().where(J.c.id.in_(ids))).rowcount
+                lotes += 1
+        if len(ids) < lote:
+            break
+        time.sleep(pausa)
+
+    with engine.begin() as conn:
+        for tabela, table in SYNC_TABLES.items():
+            linhas += conn.execute(M.delete().where(
+                M.c.tabela == tabela, M.c.local_id.not_in(select(table.c.id)))).rowcount
+    return {"linhas": linhas, "lotes": lotes}
+
+
+# instâncias globais
+change_journal = ChangeJournal()
+sync_service = SyncService()
+
+
+def install_from_env() -> bool:
+    """No modo offline (DB_MODE=offline) liga o diário e a sincronização em segundo plano;
+    online com SISUSF_SYNC_CENTRAL=1 liga o diário do central (as estações recebem essas gravações)"""
+    from db.connection import db_manager
+    if not db_manager.offline:
+        if os.getenv("SISUSF_SYNC_CENTRAL", "0") != "1":
+            return False
+        for table in _SYNC_SCHEMA:
+            table.create(db_manager.engine, checkfirst=True)
+        change_journal.enable(os.getenv("SISUSF_ESTACAO") or "central", central=True)
+        return False
+    change_journal.enable(sync_service.origem)
+    sync_service.start()
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    comando = sys.argv[1] if len(sys.argv) > 1 else "sync"
+    if comando == "bootstrap":
+        print(f"✅ {bootstrap(sync_service.local, sync_service.origem)} registros locais no diário")
+    elif comando == "bootstrap-central":
+        sync_service._ensure_schema()
+        print(f"✅ {bootstrap(sync_service.central, 'central', central=True)} registros do central no diário")
+    else:
+        print(f"✅ {sync_service.sync_once()}")
@@ -0,0 +1,156 @@
+# =============================================================================
+# db/unit_of_work.py
+# =============================================================================
+# -*- coding: utf-8 -*-
+"""
+SISUSF - Unidade de trabalho compartilhada entre controllers.
+
+Uma unidade de trabalho corresponde a uma ação da interface (ou a uma
+requisição no modo serviço): uma única Session e uma única transação para
+tudo o que os controllers fizerem dentro dela.
+
+    with unit_of_work("salvar_paciente") as uow:
+        paciente_controller.create_paciente(dados)   # reaproveita uow.session
+        ...
+
+  - unidades aninhadas reaproveitam a sessão da unidade externa; uma unidade
+    de escrita aninhada vira SAVEPOINT (falha desfaz só o trecho interno)
+  - readonly=True: sem autoflush e sem flush/commit no fim; escrever numa
+    unidade somente leitura levanta ReadOnlyUnitError
+  - cada unidade conta as instruções SQL executadas (uow.report())
+  - unidades somente leitura são roteadas por db_manager.get_session(readonly=True)
+    (réplica ou pool de leitura); unidades que gravam registram a escrita para
+    que as leituras seguintes do mesmo usuário vejam os próprios dados
+"""
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from db.connection import db_manager
+
+logger = logging.getLogger("sisusf.db.uow")
+
+_current_unit: contextvars.ContextVar = contextvars.ContextVar("sisusf_unit_of_work", default=None)
+
+
+class ReadOnlyUnitError(RuntimeError):
+    """Tentativa de gravar dentro de uma unidade de trabalho somente leitura"""
+
+
+class UnitOfWork:
+    def __init__(self, name: Optional[str] = None, readonly: bool = False,
+                 session_factory: Optional[Callable] = None):
+        self.name = name or "unidade"
+        self.readonly = readonly
+        # Objetos continuam utilizáveis pelas telas após o commit/fechamento;
+        # unidades somente leitura podem ir para uma engine de leitura
+        if session_factory is None:
+            self.session = db_manager.get_session(readonly=readonly, expire_on_commit=False, autoflush=not readonly)
+        else:
+            self.session = session_factory(expire_on_commit=False, autoflush=not readonly)
+        self.session.info["sisusf_readonly"] = readonly
+        self.statements = 0
+        self.savepoints = 0
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+
+    @contextmanager
+    def savepoint(self):
+        """Trecho aninhado: desfaz apenas o próprio trabalho em caso de erro"""
+        self.savepoints += 1
+        nested = self.session.begin_nested()
+        try:
+            yield self
+            if nested.is_active:
+                nested.commit()
+        except Exception:
+            if nested.is_active:
+                nested.rollback()
+            raise
+
+    def commit(self) -> None:
+        if self.readonly:
+            return
+        wrote = bool(self.session.new or self.session.dirty or self.session.deleted) \
+            or self.session.info.get("sisusf_flushed", False)
+        self.session.commit()
+        if wrote:
+            db_manager.note_write()
+
+    def rollback(self) -> None:
+        self.session.rollback()
+
+    def close(self) -> None:
+        self.session.close()
+        self.duration_ms = (time.perf_counter() - self._started) * 1000.0
+
+    def report(self) -> dict:
+        return {
+            "name": self.name,
+            "readonly": self.readonly,
+            "statements": self.statements,
+            "savepoints": self.savepoints,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+        }
+
+
+@contextmanager
+def unit_of_work(name: Optional[str] = None, readonly: bool = False,
+                 session_factory: Optional[Callable] = None):
+    """Abre (ou reaproveita, se aninhada) uma unidade de trabalho"""
+    current = _current_unit.get()
+
+    if current is not None:
+        if readonly:
+            yield current
+            return
+        if current.readonly:
+            raise ReadOnlyUnitError(f"'{name}' grava dentro da unidade somente leitura '{current.name}'")
+        with current.savepoint():
+            yield current
+        return
+
+    uow = UnitOfWork(name, readonly, session_factory)
+    token = _current_unit.set(uow)
+    try:
+        yield uow
+        uow.commit()
+    except Exception:
+        uow.rollback()
+        raise
+    finally:
+        _current_unit.reset(token)
+        uow.close()
+        logger.debug("Unidade '%s' concluída: %s", uow.name, uow.report())
+
+
+def current_unit() -> Optional[UnitOfWork]:
+    return _current_unit.get()
+
+
+# ---------------------------
+# Eventos
+# ---------------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    uow = _current_unit.get()
+    if uow is not None:
+        uow.statements += 1
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed(session, flush_context):
+    session.info["sisusf_flushed"] = True
+
+
+@event.listens_for(Session, "before_flush")
+def _reject_readonly_flush(session, flush_context, instances):
+    if session.info.get("sisusf_readonly") and (session.new or session.dirty or session.deleted):
+        raise ReadOnlyUnitError("Alterações pendentes em unidade de trabalho somente leitura")
+
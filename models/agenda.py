@@ -0,0 +1,38 @@
+# =============================================================================
+# models/agenda.py
+# =============================================================================
+
+from sqlalchemy import Column, Integer, Time, Date, Boolean, ForeignKey, Enum, Index
+from sqlalchemy.orm import relationship
+from models.base import Base, AuditMixin
+from models.consulta import TipoConsulta
+
+class ModeloAgenda(Base, AuditMixin):
+    """Horário de trabalho semanal do profissional (gera os horários da agenda)"""
+    __tablename__ = 'agenda_modelos'
+    __table_args__ = (
+        Index('ix_agenda_modelos_profissional_dia', 'profissional_id', 'dia_semana'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    profissional_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
+    profissional = relationship("Usuario")
+
+    dia_semana = Column(Integer, nullable=False)  # 0 = segunda ... 6 = domingo (date.weekday())
+    hora_inicio = Column(Time, nullable=False)
+    hora_fim = Column(Time, nullable=False)
+    duracao_minutos = Column(Integer, nullable=False, default=20)
+    tipo = Column(Enum(TipoConsulta), nullable=False, default=TipoConsulta.CONSULTA_MEDICA)
+
+    # Vigência (vazio = sempre)
+    vigencia_inicio = Column(Date)
+    vigencia_fim = Column(Date)
+    ativo = Column(Boolean, default=True, nullable=False)
+
+    def vale_em(self, dia) -> bool:
+        return self.ativo and dia.weekday() == self.dia_semana \
+            and (self.vigencia_inicio is None or dia >= self.vigencia_inicio) \
+            and (self.vigencia_fim is None or dia <= self.vigencia_fim)
+
+    def __repr__(self):
+        return f"<ModeloAgenda(profissional_id={self.profissional_id}, dia={self.dia_semana}, {self.hora_inicio}-{self.hora_fim})>"
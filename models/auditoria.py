@@ -2,12 +2,22 @@
 # models/auditoria.py
 # =============================================================================
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Index
 from models.base import Base
 from datetime import datetime
 
 class LogAuditoria(Base):
     __tablename__ = 'logs_auditoria'
+    # Particionamento mensal e arquivamento: db/audit_partitions.py
+    __table_args__ = (
+        Index('ix_logs_auditoria_timestamp', 'timestamp'),
+        # consultas de auditoria (controllers/auditoria_controller.py): filtro
+        # por registro/usuário e paginação por timestamp no mesmo índice
+        Index('ix_logs_auditoria_registro_timestamp', 'tabela', 'registro_id', 'timestamp'),
+        Index('ix_logs_auditoria_usuario_timestamp', 'usuario_id', 'timestamp'),
+        # ids não são reaproveitados depois da rotação mensal no SQLite
+        {'sqlite_autoincrement': True},
+    )
     
     id = Column(Integer, primary_key=True)
     usuario_id = Column(Integer)
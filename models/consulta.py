@@ -2,9 +2,10 @@
 # models/consulta.py
 # =============================================================================
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Float, Index, text, event, func, inspect
+from sqlalchemy.orm import relationship, Session
 from models.base import Base, AuditMixin
+from models.paciente import Paciente
 import enum
 
 class TipoConsulta(enum.Enum):
@@ -22,11 +23,20 @@ class StatusConsulta(enum.Enum):
 
 class Consulta(Base, AuditMixin):
     __tablename__ = 'consultas'
+    __table_args__ = (
+        # Última barreira contra horário duplicado vindo de duas estações
+        # (no PostgreSQL há também a restrição de exclusão por sobreposição,
+        # ver db/create_tables.py: ensure_agenda_constraints)
+        Index('uq_consultas_profissional_horario', 'profissional_id', 'data_hora', unique=True,
+              postgresql_where=text("status <> 'CANCELADA'"),
+              sqlite_where=text("status <> 'CANCELADA'")),
+    )
     
     id = Column(Integer, primary_key=True)
     
     # Dados da Consulta
     data_hora = Column(DateTime, nullable=False, index=True)
+    duracao_minutos = Column(Integer, nullable=False, default=20, server_default=text('20'))
     tipo = Column(Enum(TipoConsulta), nullable=False)
     status = Column(Enum(StatusConsulta), default=StatusConsulta.AGENDADA)
     
@@ -57,4 +67,77 @@ class Consulta(Base, AuditMixin):
     retorno_em = Column(Integer)  # dias
     
     def __repr__(self):
-        return f"<Consulta(paciente_id={self.paciente_id}, data={self.data_hora.date()})>"
\ No newline at end of file
+        return f"<Consulta(paciente_id={self.paciente_id}, data={self.data_hora.date()})>"
+
+
+# ========================
+# ÚLTIMA CONSULTA DO PACIENTE
+# ========================
+def _paciente_da(session, consulta):
+    paciente = consulta.paciente
+    if consulta.paciente_id is not None and (paciente is None or paciente.id != consulta.paciente_id):
+        paciente = session.get(Paciente, consulta.paciente_id)
+    return paciente
+
+@event.listens_for(Session, "before_flush")
+def atualizar_ultima_consulta(session, flush_context, instances):
+    """Mantém pacientes.ultima_consulta = horário da última consulta REALIZADA.
+
+    Consulta que passa a REALIZADA só avança a data (sem ir ao banco);
+    desfazer uma realizada, mudar horário/paciente dela ou excluí-la
+    recalcula o máximo do paciente.
+    """
+    afetados = {}  # paciente -> recalcular no banco?
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Consulta) and obj.status == StatusConsulta.REALIZADA:
+                afetados.setdefault(_paciente_da(session, obj), False)
+
+        for obj in session.dirty:
+            if not isinstance(obj, Consulta):
+                continue
+            state = inspect(obj)
+            historicos = [state.attrs[k].history for k in ("status", "data_hora", "paciente_id", "paciente")]
+            if not any(h.has_changes() for h in historicos):
+                continue
+            status = historicos[0]
+            if status.deleted:
+                era_realizada = status.deleted[0] == StatusConsulta.REALIZADA
+            else:
+                # status anterior desconhecido (atributo expirado após o commit): recalcula
+                era_realizada = bool(status.added) or obj.status == StatusConsulta.REALIZADA
+            if era_realizada:
+                afetados[_paciente_da(session, obj)] = True
+                for anterior in list(historicos[2].deleted or ()) + list(historicos[3].deleted or ()):
+                    if isinstance(anterior, int):
+                        anterior = session.get(Paciente, anterior)
+                    afetados[anterior] = True
+            elif obj.status == StatusConsulta.REALIZADA:
+                afetados.setdefault(_paciente_da(session, obj), False)
+
+        for obj in session.deleted:
+            if isinstance(obj, Consulta) and obj.status == StatusConsulta.REALIZADA:
+                afetados[_paciente_da(session, obj)] = True
+
+        afetados.pop(None, None)
+        if not afetados:
+            return
+
+        realizadas = [(o, _paciente_da(session, o)) for o in session.new.union(session.dirty)
+                      if isinstance(o, Consulta) and o not in session.deleted
+                      and o.status == StatusConsulta.REALIZADA]
+        alteradas = [o.id for o in session.dirty.union(session.deleted)
+                     if isinstance(o, Consulta) and o.id is not None]
+        for paciente, recalcular in afetados.items():
+            datas = [o.data_hora for o, p in realizadas if p is paciente]
+            if not recalcular:
+                datas.append(paciente.ultima_consulta)
+            elif paciente.id is not None:
+                query = session.query(func.max(Consulta.data_hora)).filter(
+                    Consulta.paciente_id == paciente.id, Consulta.status == StatusConsulta.REALIZADA)
+                if alteradas:
+                    query = query.filter(Consulta.id.notin_(alteradas))
+                datas.append(query.scalar())
+            ultima = max((d for d in datas if d is not None), default=None)
+            if ultima != paciente.ultima_consulta:
+                paciente.ultima_consulta = ultima
@@ -18,7 +18,8 @@ class Endereco(Base, AuditMixin):
     uf = Column(String(2), nullable=False)
     ponto_referencia = Column(String(200))
     
-    # RELACIONAMENTOS CORRIGIDOS - SEM back_populates
-    # Deixar o SQLAlchemy gerenciar automaticamente
+    # Lado inverso de Paciente.endereco (que declara back_populates="pacientes")
+    pacientes = relationship("Paciente", back_populates="endereco")
+
     def __repr__(self):
         return f"<Endereco(logradouro='{self.logradouro}', cidade='{self.cidade}')>"
\ No newline at end of file
@@ -0,0 +1,75 @@
+# =============================================================================
+# models/interacao.py
+# =============================================================================
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.orm import relationship, validates
+from datetime import datetime
+from models.base import Base
+import enum
+import unicodedata
+
+
+def normalizar_principio(nome: str) -> str:
+    """Chave de comparação de princípio ativo: sem acentos, minúsculas, espaços simples"""
+    sem_acento = unicodedata.normalize("NFKD", nome or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acento.lower().split())
+
+
+class GravidadeInteracao(enum.Enum):
+    LEVE = "leve"
+    MODERADA = "moderada"
+    GRAVE = "grave"
+    CONTRAINDICADA = "contraindicada"
+
+
+class InteracaoMedicamentosa(Base):
+    """Par de princípios ativos que interagem (guardado uma vez, principio_a < principio_b)"""
+    __tablename__ = 'interacoes_medicamentosas'
+    __table_args__ = (
+        Index('uq_interacoes_medicamentosas_par', 'principio_a', 'principio_b', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    principio_a = Column(String(200), nullable=False)
+    principio_b = Column(String(200), nullable=False)
+    gravidade = Column(Enum(GravidadeInteracao), nullable=False)
+    descricao = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    @validates('principio_a', 'principio_b')
+    def _normalizar(self, key, value):
+        return normalizar_principio(value)
+
+    def __repr__(self):
+        return f"<InteracaoMedicamentosa({self.principio_a} x {self.principio_b}, {self.gravidade.value})>"
+
+
+class TipoMarcador(enum.Enum):
+    ALERGIA = "alergia"
+    USO_CONTINUO = "uso_continuo"
+
+
+class PacientePrincipioAtivo(Base):
+    """Alergias e medicamentos de uso contínuo do paciente, por princípio
+    ativo (os campos de texto livre de Paciente ficam como observação)"""
+    __tablename__ = 'paciente_principios_ativos'
+    __table_args__ = (
+        Index('uq_paciente_principios_ativos', 'paciente_id', 'tipo', 'principio_ativo', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    paciente_id = Column(Integer, ForeignKey('pacientes.id'), nullable=False)
+    tipo = Column(Enum(TipoMarcador), nullable=False)
+    principio_ativo = Column(String(200), nullable=False)
+    observacao = Column(String(200))  # reação, dose...
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    paciente = relationship("Paciente", backref="principios_ativos")
+
+    @validates('principio_ativo')
+    def _normalizar(self, key, value):
+        return normalizar_principio(value)
+
+    def __repr__(self):
+        return f"<PacientePrincipioAtivo(paciente_id={self.paciente_id}, {self.tipo.value}: {self.principio_ativo})>"
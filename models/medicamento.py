@@ -2,12 +2,24 @@
 # models/medicamento.py
 # =============================================================================
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Boolean, Date, DateTime, Float, ForeignKey, Enum, Index, event, text
+from sqlalchemy.orm import relationship, Session
+from datetime import datetime
 from models.base import Base, AuditMixin
+import enum
+
+# Predicados dos índices parciais de alerta: as consultas do painel usam o
+# mesmo texto para que PostgreSQL e SQLite escolham o índice parcial
+ESTOQUE_BAIXO_SQL = "ativo AND estoque_atual < estoque_minimo"
+LOTE_COM_SALDO_SQL = "quantidade > 0"
 
 class Medicamento(Base, AuditMixin):
     __tablename__ = 'medicamentos'
+    __table_args__ = (
+        # só os medicamentos abaixo do mínimo entram no índice
+        Index('ix_medicamentos_estoque_baixo', 'nome', 'id',
+              postgresql_where=text(ESTOQUE_BAIXO_SQL), sqlite_where=text(ESTOQUE_BAIXO_SQL)),
+    )
     
     id = Column(Integer, primary_key=True)
     nome = Column(String(200), nullable=False, index=True)
@@ -15,9 +27,11 @@ class Medicamento(Base, AuditMixin):
     concentracao = Column(String(50))
     forma_farmaceutica = Column(String(50))  # comprimido, xarope, etc.
     fabricante = Column(String(100))
+    # lote/validade únicos dos cadastros antigos: migrados para LoteMedicamento
+    # (db/create_tables.py: migrate_lotes_legados); o estoque fica por lote
     lote = Column(String(50))
     validade = Column(DateTime)
-    estoque_atual = Column(Integer, default=0)
+    estoque_atual = Column(Integer, default=0)  # soma dos lotes
     estoque_minimo = Column(Integer, default=10)
     ativo = Column(Boolean, default=True)
     
@@ -31,6 +45,7 @@ class DispensacaoMedicamento(Base, AuditMixin):
     paciente_id = Column(Integer, ForeignKey('pacientes.id'), nullable=False)
     medicamento_id = Column(Integer, ForeignKey('medicamentos.id'), nullable=False)
     quantidade = Column(Integer, nullable=False)
+    dias_tratamento = Column(Integer)  # dias cobertos pela entrega; sem valor: 1 unidade por dia
     data_dispensacao = Column(DateTime, nullable=False)
     profissional_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
     observacoes = Column(Text)
@@ -41,4 +56,117 @@ class DispensacaoMedicamento(Base, AuditMixin):
     profissional = relationship("Usuario", backref="dispensacoes_feitas")
     
     def __repr__(self):
-        return f"<DispensacaoMedicamento(paciente_id={self.paciente_id}, medicamento_id={self.medicamento_id}, qtd={self.quantidade})>"
\ No newline at end of file
+        return f"<DispensacaoMedicamento(paciente_id={self.paciente_id}, medicamento_id={self.medicamento_id}, qtd={self.quantidade})>"
+
+class LoteMedicamento(Base):
+    """Saldo de um lote; a dispensação consome primeiro o que vence primeiro (FEFO)"""
+    __tablename__ = 'lotes_medicamento'
+    __table_args__ = (
+        Index('ix_lotes_medicamento_validade', 'medicamento_id', 'validade'),
+        Index('uq_lotes_medicamento_lote', 'medicamento_id', 'lote', unique=True),
+        # lotes vencendo: só lotes com saldo, por validade
+        Index('ix_lotes_medicamento_vencimento', 'validade', 'id',
+              postgresql_where=text(LOTE_COM_SALDO_SQL), sqlite_where=text(LOTE_COM_SALDO_SQL)),
+    )
+
+    id = Column(Integer, primary_key=True)
+    medicamento_id = Column(Integer, ForeignKey('medicamentos.id'), nullable=False)
+    lote = Column(String(50), nullable=False)
+    validade = Column(Date)  # sem validade: consumido por último
+    quantidade = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    medicamento = relationship("Medicamento", backref="lotes")
+
+    def __repr__(self):
+        return f"<LoteMedicamento(medicamento_id={self.medicamento_id}, lote='{self.lote}', qtd={self.quantidade})>"
+
+class TipoMovimento(enum.Enum):
+    ENTRADA = "entrada"
+    DISPENSACAO = "dispensacao"
+    AJUSTE = "ajuste"
+
+class MovimentoEstoque(Base):
+    """Livro de estoque: somente inclusão. A soma das quantidades (entradas
+    positivas, saídas negativas) de um medicamento é o seu estoque_atual;
+    correções entram como um novo movimento de AJUSTE."""
+    __tablename__ = 'movimentos_estoque'
+    __table_args__ = (
+        Index('ix_movimentos_estoque_medicamento', 'medicamento_id', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    medicamento_id = Column(Integer, ForeignKey('medicamentos.id'), nullable=False)
+    tipo = Column(Enum(TipoMovimento), nullable=False)
+    quantidade = Column(Integer, nullable=False)
+    dispensacao_id = Column(Integer, ForeignKey('dispensacoes.id'), nullable=True)
+    lote_id = Column(Integer, ForeignKey('lotes_medicamento.id'), nullable=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=True)
+    observacoes = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    medicamento = relationship("Medicamento", backref="movimentos")
+
+    def __repr__(self):
+        return f"<MovimentoEstoque(medicamento_id={self.medicamento_id}, tipo='{self.tipo.value}', qtd={self.quantidade})>"
+
+class TipoAlerta(enum.Enum):
+    ESTOQUE_BAIXO = "estoque_baixo"
+    ESTOQUE_NORMALIZADO = "estoque_normalizado"
+    LOTE_VENCENDO = "lote_vencendo"
+    ESTOQUE_DIVERGENTE = "estoque_divergente"  # saldo x livro, rotina "estoque"
+
+class AlertaEstoque(Base):
+    """Feed de alertas da farmácia (somente inclusão): cada linha é uma
+    mudança de situação; as telas leem só os ids maiores que o último visto"""
+    __tablename__ = 'alertas_estoque'
+    __table_args__ = (
+        Index('ix_alertas_estoque_lote', 'lote_id', 'tipo'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    medicamento_id = Column(Integer, ForeignKey('medicamentos.id'), nullable=False)
+    lote_id = Column(Integer, ForeignKey('lotes_medicamento.id'), nullable=True)
+    tipo = Column(Enum(TipoAlerta), nullable=False)
+    saldo = Column(Integer)
+    validade = Column(Date)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<AlertaEstoque(medicamento_id={self.medicamento_id}, tipo='{self.tipo.value}')>"
+
+class AdesaoMedicamento(Base):
+    """Resumo mensal de adesão (PDC) por paciente e medicamento, recalculado
+    pela rotina "adesao" de db/maintenance.py; os relatórios leem só daqui"""
+    __tablename__ = 'adesao_medicamentos'
+    __table_args__ = (
+        Index('uq_adesao_medicamentos_competencia', 'competencia', 'paciente_id', 'medicamento_id', unique=True),
+        Index('ix_adesao_medicamentos_pdc', 'competencia', 'pdc', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    competencia = Column(Date, nullable=False)  # primeiro dia do mês avaliado
+    paciente_id = Column(Integer, ForeignKey('pacientes.id'), nullable=False)
+    medicamento_id = Column(Integer, ForeignKey('medicamentos.id'), nullable=False)
+    inicio = Column(Date, nullable=False)  # início do período medido
+    fim = Column(Date, nullable=False)
+    dias_cobertos = Column(Integer, nullable=False)
+    dias_periodo = Column(Integer, nullable=False)
+    dispensacoes = Column(Integer, nullable=False)
+    pdc = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<AdesaoMedicamento(paciente_id={self.paciente_id}, medicamento_id={self.medicamento_id}, pdc={self.pdc:.2f})>"
+
+# ========================
+# LIVRO DE ESTOQUE SOMENTE INCLUSÃO
+# ========================
+@event.listens_for(Session, "before_flush")
+def bloquear_alteracao_movimentos(session, flush_context, instances):
+    for obj in session.deleted:
+        if isinstance(obj, MovimentoEstoque):
+            raise ValueError("Movimentos de estoque não podem ser excluídos; registre um ajuste")
+    for obj in session.dirty:
+        if isinstance(obj, MovimentoEstoque) and session.is_modified(obj):
+            raise ValueError("Movimentos de estoque não podem ser alterados; registre um ajuste")
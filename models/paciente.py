@@ -1,8 +1,8 @@
 # =============================================================================
 # models/paciente.py
 # =============================================================================
-from sqlalchemy import Column, String, Integer, Date, Boolean, DateTime, ForeignKey, Text, Enum, event
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy import Column, String, Integer, Date, Boolean, DateTime, ForeignKey, Text, Enum, Index, event
+from sqlalchemy.orm import relationship, synonym, Session
 from datetime import datetime, date
 import enum
 import re
@@ -52,10 +52,17 @@ class AuditMixin:
 # ========================
 class Paciente(AuditMixin, Base):
     __tablename__ = "pacientes"
+    __table_args__ = (
+        # Indicador de cobertura: pacientes sem consulta há N meses, por família
+        # (ultima_consulta é mantida por models/consulta.py: atualizar_ultima_consulta)
+        Index("ix_pacientes_ultima_consulta", "ultima_consulta", "id"),
+        Index("ix_pacientes_familia_ultima_consulta", "familia_id", "ultima_consulta", "id"),
+    )
 
     # Identificação básica
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome_completo = Column(String(200), nullable=False, index=True)
+    nome = synonym("nome_completo")  # nome usado por controllers e telas
     nome_social = Column(String(200))
     cpf = Column(String(11), unique=True, index=True)
     cns = Column(String(15), unique=True, index=True)
@@ -0,0 +1,69 @@
+# =============================================================================
+# models/sync.py
+# =============================================================================
+# Tabelas da sincronização offline (db/sync.py). Existem na réplica local de
+# cada estação e no PostgreSQL central.
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Index, UniqueConstraint
+from models.base import Base
+from datetime import datetime
+
+class SyncJournal(Base):
+    """Diário de alterações.
+
+    Na estação: alterações locais ainda não enviadas (enviado_em nulo).
+    No central: alterações aplicadas, lidas pelas estações a partir do id.
+    """
+    __tablename__ = 'sync_journal'
+    __table_args__ = (
+        Index('ix_sync_journal_pendentes', 'enviado_em', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    change_uuid = Column(String(36), unique=True, nullable=False)  # idempotência
+    origem = Column(String(64), nullable=False)       # estação que fez a alteração
+    tabela = Column(String(50), nullable=False)
+    registro_uuid = Column(String(36), nullable=False)
+    operacao = Column(String(10), nullable=False)     # INSERT, UPDATE, DELETE
+    dados = Column(JSON)                              # só as colunas alteradas
+    base_updated_at = Column(DateTime)                # updated_at antes da alteração
+    situacao = Column(String(20), nullable=False, default='pendente')  # pendente, aplicado, conflito
+    enviado_em = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<SyncJournal(tabela='{self.tabela}', operacao='{self.operacao}', situacao='{self.situacao}')>"
+
+class SyncIdMap(Base):
+    """Identidade global (uuid) de cada registro sincronizado x id local"""
+    __tablename__ = 'sync_id_map'
+    __table_args__ = (
+        UniqueConstraint('tabela', 'local_id', name='uq_sync_id_map_local'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tabela = Column(String(50), nullable=False)
+    local_id = Column(Integer, nullable=False)
+    uuid = Column(String(36), unique=True, nullable=False)
+
+class SyncEstado(Base):
+    """Chave/valor da sincronização (estação, último id recebido do central)"""
+    __tablename__ = 'sync_estado'
+
+    chave = Column(String(50), primary_key=True)
+    valor = Column(String(200))
+
+class SyncConflito(Base):
+    """Alterações rejeitadas no central (registro alterado por outra estação)"""
+    __tablename__ = 'sync_conflitos'
+
+    id = Column(Integer, primary_key=True)
+    change_uuid = Column(String(36), nullable=False, index=True)
+    origem = Column(String(64), nullable=False)
+    tabela = Column(String(50), nullable=False)
+    registro_uuid = Column(String(36), nullable=False)
+    operacao = Column(String(10), nullable=False)
+    dados = Column(JSON)
+    motivo = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,10 +1,9 @@
 import enum
 from datetime import datetime
 from sqlalchemy import Column, String, Enum, Integer, Boolean, DateTime
-from sqlalchemy.orm import validates, declarative_base
+from sqlalchemy.orm import validates
 import bcrypt
-
-Base = declarative_base()
+from models.base import Base
 
 # ========================
 # ENUMS
@@ -20,6 +20,12 @@ def reset_database():
         with db_manager.engine.begin() as conn:
             # Remover tabelas
             tables_to_drop = [
+                'paciente_principios_ativos',
+                'interacoes_medicamentosas',
+                'adesao_medicamentos',
+                'alertas_estoque',
+                'movimentos_estoque',
+                'lotes_medicamento',
                 'dispensacoes',
                 'consultas', 
                 'pacientes',
@@ -0,0 +1,73 @@
+# =============================================================================
+# tests/conftest.py
+# =============================================================================
+# Os testes usam um SQLite temporário e não esperam pelo PostgreSQL.
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_TMP_DIR = tempfile.mkdtemp(prefix="sisusf_tests_")
+os.environ.setdefault("PG_RETRIES", "0")
+os.environ.setdefault("SQLITE_PATH", os.path.join(_TMP_DIR, "sisusf.db"))
+os.environ.setdefault("SISUSF_AUDIT_SPOOL", os.path.join(_TMP_DIR, "audit_spool.jsonl"))
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+
+def pytest_configure(config):
+    # Mesma inicialização de app/main.py: tabelas + usuários padrão
+    from db.create_tables import create_all_tables
+    from db.manage_data import create_seed_data
+
+    create_all_tables()
+    create_seed_data()
+
+
+@pytest.fixture
+def admin_logado():
+    """Usuário autenticado com perfil admin para chamar os controllers"""
+    from controllers.auth_controller import auth
+
+    anterior = auth.current_user
+    auth.current_user = SimpleNamespace(id=1, nome="Administrador", email="admin@sisusf.com", tipo="admin")
+    yield auth.current_user
+    auth.current_user = anterior
+
+
+@pytest.fixture
+def max_statements():
+    """Afirma o número máximo de instruções SQL executadas dentro do bloco:
+
+        with max_statements(2):
+            paciente_controller.search_pacientes("maria")
+    """
+    from db.connection import db_manager
+    from db.instrumentation import count_statements
+
+    @contextmanager
+    def check(limit: int, engine=None):
+        with count_statements(engine or db_manager.engine) as statements:
+            yield statements
+        assert len(statements) <= limit, (
+            f"{len(statements)} instruções SQL executadas (máximo {limit}):\n" + "\n".join(statements)
+        )
+
+    return check
+
+
+@pytest.fixture
+def nplusone():
+    """Habilita o detector de N+1 em modo "raise" durante o teste"""
+    from db.nplusone import nplusone_detector
+
+    estado = (nplusone_detector.enabled, nplusone_detector.mode, nplusone_detector.threshold)
+    nplusone_detector.enable(mode="raise", threshold=3)
+    yield nplusone_detector
+    if not estado[0]:
+        nplusone_detector.disable()
+    nplusone_detector.mode, nplusone_detector.threshold = estado[1], estado[2]
@@ -0,0 +1,79 @@
+from datetime import date, datetime
+
+import numpy as np
+
+from controllers.relatorio_controller import relatorio_controller
+from db.connection import db_manager
+from db.maintenance import calcular_adesao
+from models.medicamento import DispensacaoMedicamento, Medicamento
+from models.paciente import Paciente, Sexo
+from utils.pdc import intervalos_cobertura, pdc
+
+
+def test_pdc_empurra_sobreposicao_e_reinicia_por_grupo():
+    grupos = np.array([0, 0, 0, 1, 1])
+    datas = np.array([0, 10, 60, 5, 100])
+    dias = np.array([30, 30, 30, 10, 10])
+    inicio, fim = intervalos_cobertura(grupos, datas, dias)
+    # a segunda entrega só começa quando a primeira acaba; o grupo 1 não herda nada
+    assert inicio.tolist() == [0, 30, 60, 5, 100]
+    assert fim.tolist() == [30, 60, 90, 15, 110]
+
+    cobertos, periodo, dispensacoes, proporcao = pdc(grupos, datas, dias, 3, 20, 79)
+    assert cobertos.tolist() == [60, 0, 0]
+    assert periodo.tolist() == [60, 0, 0]
+    assert dispensacoes.tolist() == [1, 0, 0]
+    assert proporcao[0] == 1.0 and np.isnan(proporcao[1:]).all()
+
+
+def test_resumo_mensal_de_adesao(admin_logado):
+    session = db_manager.get_session()
+    try:
+        cronico = Paciente(nome_completo="Adesão Crônico", cpf="01062069153", sexo=Sexo.FEMININO,
+                           condicoes_cronicas="Diabetes tipo 2")
+        eventual = Paciente(nome_completo="Adesão Eventual", cpf="50775363766", sexo=Sexo.MASCULINO)
+        enalapril = Medicamento(nome="Enalapril 10mg", estoque_atual=0)
+        sinvastatina = Medicamento(nome="Sinvastatina 20mg", estoque_atual=0)
+        session.add_all([cronico, eventual, enalapril, sinvastatina])
+        session.flush()
+
+        def dispensacao(paciente, medicamento, dia, quantidade, dias_tratamento=None):
+            return DispensacaoMedicamento(paciente_id=paciente.id, medicamento_id=medicamento.id,
+                                          quantidade=quantidade, dias_tratamento=dias_tratamento,
+                                          data_dispensacao=datetime.combine(dia, datetime.min.time()),
+                                          profissional_id=admin_logado.id)
+
+        session.add_all([
+            # janela de 90 dias: 02/04 a 30/06; a entrega de março ainda cobre 02/04 a 18/04
+            dispensacao(cronico, enalapril, date(2031, 3, 20), 30),
+            dispensacao(cronico, enalapril, date(2031, 4, 15), 30),
+            dispensacao(cronico, enalapril, date(2031, 6, 1), 30),
+            dispensacao(cronico, sinvastatina, date(2031, 6, 16), 60, dias_tratamento=30),
+            dispensacao(eventual, enalapril, date(2031, 6, 1), 30),
+        ])
+        session.commit()
+        ids = {"cronico": cronico.id, "eventual": eventual.id,
+               "enalapril": enalapril.id, "sinvastatina": sinvastatina.id}
+    finally:
+        session.close()
+
+    competencia = date(2031, 6, 1)
+    assert calcular_adesao(db_manager.engine, 2, competencia=competencia, dias=90)["linhas"] == 2
+    # já calculado: a rotina agendada não refaz o mês
+    assert calcular_adesao(db_manager.engine, 2, competencia=competencia, dias=90)["linhas"] == 0
+
+    r = relatorio_controller.adesao(competencia, abaixo_de=1.01)
+    assert r["success"] and r["resumo"]["total"] == 2 and r["resumo"]["aderentes"] == 2
+    assert {d["paciente_id"] for d in r["dados"]} == {ids["cronico"]}
+    enalapril, sinvastatina = r["dados"]
+    assert (enalapril["medicamento_id"], enalapril["inicio"], enalapril["dias_cobertos"],
+            enalapril["dias_periodo"], enalapril["dispensacoes"]) == (ids["enalapril"], date(2031, 4, 2), 77, 90, 2)
+    assert enalapril["pdc"] == 77 / 90
+    assert (sinvastatina["medicamento_id"], sinvastatina["dias_periodo"], sinvastatina["pdc"]) \
+        == (ids["sinvastatina"], 15, 1.0)
+
+    pagina = relatorio_controller.adesao(competencia, abaixo_de=1.01, limite=1)
+    assert [d["id"] for d in pagina["dados"]] == [enalapril["id"]]
+    seguinte = relatorio_controller.adesao(competencia, abaixo_de=1.01, cursor=pagina["proximo_cursor"])
+    assert [d["id"] for d in seguinte["dados"]] == [sinvastatina["id"]]
+    assert relatorio_controller.adesao(competencia)["dados"] == []
@@ -0,0 +1,139 @@
+from datetime import date, datetime, time
+
+import pytest
+
+from controllers.agenda_controller import AgendaController
+from db.connection import db_manager
+from models.endereco import Endereco
+from models.paciente import Paciente, Sexo
+from models.usuario import Usuario
+from utils.intervals import DayIntervals
+
+SEGUNDA = date(2030, 1, 7)
+
+
+def test_intervalos_conflito_por_busca_binaria():
+    dia = DayIntervals([(9, 10, "a"), (10, 11, "b"), (13, 14, "c")])
+    assert dia.conflict(11, 13) is None
+    assert dia.conflict(8, 9) is None
+    assert dia.conflict(9, 10) == "a"
+    assert dia.conflict(10.5, 12) == "b"
+    assert dia.conflict(12, 13.5) == "c"
+
+    dia.remove("b")
+    assert dia.conflict(10, 11) is None
+    dia.add(10, 11, "d")
+    assert dia.conflict(10, 10.5) == "d"
+
+
+def test_intervalos_sobrepostos_antigos():
+    # um intervalo longo seguido de curtos: o fim maior acumulado é considerado
+    dia = DayIntervals([(8, 12, "longo"), (9, 9.5, "curto")])
+    assert dia.conflict(10, 11) == "longo"
+    assert dia.conflict(12, 13) is None
+
+
+@pytest.fixture(scope="module")
+def profissional_e_paciente():
+    session = db_manager.get_session()
+    try:
+        medico = session.query(Usuario).filter(Usuario.email == "medico@sisusf.com").one()
+        paciente = Paciente(nome_completo="Paciente Agenda", cpf="12345678909", sexo=Sexo.MASCULINO,
+                            endereco=Endereco(cep="01001000", logradouro="Rua Agenda", bairro="Centro",
+                                              cidade="São Paulo", uf="SP"))
+        session.add(paciente)
+        session.commit()
+        return medico.id, paciente.id
+    finally:
+        session.close()
+
+
+def test_horarios_marcacao_e_cancelamento(admin_logado, profissional_e_paciente, max_statements):
+    medico_id, paciente_id = profissional_e_paciente
+    agenda = AgendaController()
+    assert agenda.definir_modelo(medico_id, SEGUNDA.weekday(), time(8), time(10), 30)["success"]
+    assert not agenda.definir_modelo(medico_id, SEGUNDA.weekday(), time(9), time(11))["success"]
+
+    horarios = agenda.horarios(medico_id, SEGUNDA)["horarios"]
+    assert [h["inicio"].time() for h in horarios] == [time(8), time(8, 30), time(9), time(9, 30)]
+    assert all(h["livre"] for h in horarios)
+
+    marcada = agenda.agendar(paciente_id, medico_id, datetime.combine(SEGUNDA, time(8, 30)))
+    assert marcada["success"], marcada["message"]
+
+    # ocupação em memória: conflito detectado sem ir ao banco
+    with max_statements(0):
+        conflito = agenda.agendar(paciente_id, medico_id, datetime.combine(SEGUNDA, time(8, 45)))
+    assert conflito["code"] == "CONFLICT" and conflito["consulta_id"] == marcada["consulta_id"]
+
+    livres = [h["livre"] for h in agenda.horarios(medico_id, SEGUNDA)["horarios"]]
+    assert livres == [True, False, True, True]
+
+    assert agenda.cancelar(marcada["consulta_id"])["success"]
+    assert all(h["livre"] for h in agenda.horarios(medico_id, SEGUNDA)["horarios"])
+
+
+def test_banco_impede_marcacao_dupla_de_duas_estacoes(admin_logado, profissional_e_paciente):
+    medico_id, paciente_id = profissional_e_paciente
+    estacao_a, estacao_b = AgendaController(), AgendaController()
+    terca = date(2030, 1, 8)
+    for estacao in (estacao_a, estacao_b):
+        assert estacao.carregar_janela(terca, terca, [medico_id])["success"]
+
+    horario = datetime.combine(terca, time(14))
+    assert estacao_a.agendar(paciente_id, medico_id, horario)["success"]
+    # a estação B ainda não viu a marcação: o índice único barra no banco
+    resultado = estacao_b.agendar(paciente_id, medico_id, horario)
+    assert resultado == {"success": False, "message": "Horário indisponível", "code": "CONFLICT"}
+    assert estacao_b.agendar(paciente_id, medico_id, horario)["code"] == "CONFLICT"
+
+
+def test_ouvinte_removido_nao_recebe_avisos():
+    agenda = AgendaController()
+    avisos = []
+    agenda.on_change(lambda *a: avisos.append(a))
+    ouvinte = lambda *a: avisos.append(("removido",) + a)
+    agenda.on_change(ouvinte)
+    agenda.off_change(ouvinte)
+    agenda.off_change(ouvinte)
+    agenda._notificar(1, [SEGUNDA])
+    assert avisos == [(1, SEGUNDA)]
+
+
+def test_indice_descarta_dias_expirados():
+    from datetime import timedelta
+    from controllers.agenda_controller import AgendaIndex
+
+    agora = [0.0]
+    indice = AgendaIndex(ttl=60, clock=lambda: agora[0])
+    session = db_manager.get_session()
+    try:
+        indice.carregar(session, SEGUNDA, SEGUNDA + timedelta(days=6), [1])
+        assert len(indice._dias) >= 7
+        agora[0] = 61
+        indice.carregar(session, SEGUNDA + timedelta(days=7), SEGUNDA + timedelta(days=7), [1])
+    finally:
+        session.close()
+    assert {dia for _, dia in indice._dias} == {SEGUNDA + timedelta(days=7)}
+
+
+def test_carregar_um_profissional_nao_apaga_a_ocupacao_dos_outros(admin_logado, profissional_e_paciente):
+    medico_id, paciente_id = profissional_e_paciente
+    session = db_manager.get_session()
+    try:
+        enfermeiro_id = session.query(Usuario.id).filter(Usuario.email == "enfermeiro@sisusf.com").scalar()
+    finally:
+        session.close()
+    quinta = date(2030, 1, 10)
+    estacao_a, estacao_b = AgendaController(), AgendaController()
+    for profissional_id in (medico_id, enfermeiro_id):
+        assert estacao_a.definir_modelo(profissional_id, quinta.weekday(), time(8), time(10), 20,
+                                        vigencia_inicio=quinta, vigencia_fim=quinta)["success"]
+
+    assert estacao_b.agendar(paciente_id, enfermeiro_id, datetime.combine(quinta, time(8)))["success"]
+    assert estacao_a.horarios(medico_id, quinta)["success"]
+
+    livres = [h["livre"] for h in estacao_a.horarios(enfermeiro_id, quinta)["horarios"]]
+    assert livres[0] is False
+    resultado = estacao_a.agendar(paciente_id, enfermeiro_id, datetime.combine(quinta, time(8, 10)))
+    assert resultado["code"] == "CONFLICT"
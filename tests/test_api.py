@@ -0,0 +1,107 @@
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+from app.server import APIServer, TokenStore, from_json
+from controllers.auth_controller import auth
+from models.paciente import Paciente, Sexo
+
+
+@pytest.fixture(scope="module")
+def servidor():
+    loop = asyncio.new_event_loop()
+    server = APIServer("127.0.0.1", 0, workers=4)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+
+
+def _request(server, method, path, body=None, token=None, conn=None):
+    conn = conn or http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def _login(server, email, senha):
+    status, dados = _request(server, "POST", "/login", {"email": email, "password": senha})
+    assert status == 200 and dados["success"], dados
+    return dados
+
+
+def test_rotas_exigem_token(servidor):
+    assert _request(servidor, "GET", "/pacientes")[0] == 401
+    assert _request(servidor, "GET", "/inexistente")[0] == 404
+    assert _request(servidor, "DELETE", "/pacientes/1")[0] == 405
+    assert _request(servidor, "GET", "/status")[0] == 200
+
+
+def test_cada_requisicao_roda_em_nome_do_proprio_usuario(servidor):
+    anterior = auth.current_user
+    admin = _login(servidor, "admin@sisusf.com", "admin123")
+    acs = _login(servidor, "acs@sisusf.com", "acs123")
+    assert admin["usuario"]["tipo"] == "ADMIN" and "permissions" not in admin["usuario"]
+    assert "delete" in admin["usuario"]["permissoes"]
+
+    paciente = {
+        "nome_completo": "Paciente API", "cpf": "39053344705", "cns": "700000000000003",
+        "sexo": "F", "data_nascimento": "1990-01-02",
+        "endereco": {"cep": "01001000", "logradouro": "Rua API", "bairro": "Centro", "cidade": "São Paulo", "uf": "SP"},
+    }
+    status, criado = _request(servidor, "POST", "/pacientes", paciente, admin["token"])
+    assert status == 200 and criado["success"], criado
+
+    # mesma conexão (keep-alive) para várias requisições
+    conn = http.client.HTTPConnection("127.0.0.1", servidor.port, timeout=10)
+    _, lido = _request(servidor, "GET", f"/pacientes/{criado['paciente_id']}", token=acs["token"], conn=conn)
+    assert lido["paciente"]["data_nascimento"] == "1990-01-02"
+    assert lido["paciente"]["sexo"] == "F"
+    _, auditoria = _request(servidor, "GET", "/auditoria", token=acs["token"], conn=conn)
+    assert auditoria == {"success": False, "message": "Sem permissão"}
+    _, auditoria = _request(servidor, "GET", f"/auditoria?tabela=pacientes&registro_id={criado['paciente_id']}",
+                            token=admin["token"], conn=conn)
+    assert auditoria["success"] and "CREATE" in [e["acao"] for e in auditoria["dados"]]
+
+    # o login feito pela API não muda o usuário do processo fora das requisições
+    assert auth.current_user is anterior
+    assert _request(servidor, "POST", "/logout", token=acs["token"])[0] == 200
+    assert _request(servidor, "GET", "/pacientes", token=acs["token"])[0] == 401
+    assert auth.current_user is anterior
+
+
+def test_token_expira_por_inatividade():
+    agora = [0.0]
+    tokens = TokenStore(ttl=60, clock=lambda: agora[0])
+    token = tokens.criar("usuario")
+    agora[0] = 59
+    assert tokens.usuario(token) == "usuario"
+    agora[0] = 118
+    assert tokens.usuario(token) == "usuario"
+    agora[0] = 179
+    assert tokens.usuario(token) is None
+
+
+def test_conversao_de_json_pelos_tipos_das_colunas():
+    dados = from_json(Paciente, {"sexo": "FEMININO", "data_nascimento": "2000-05-06", "nome_completo": "X"})
+    assert dados["sexo"] is Sexo.FEMININO
+    assert dados["data_nascimento"].year == 2000
+    assert from_json(Paciente, {"sexo": "M"})["sexo"] is Sexo.MASCULINO
+
+
+def test_recorrencia_sem_coorte_e_recusada(servidor):
+    admin = _login(servidor, "admin@sisusf.com", "admin123")
+    status, dados = _request(servidor, "POST", "/agenda/recorrencia",
+                             {"regra": {"profissional_id": 1, "inicio": "2031-01-01"}, "condicao": " "},
+                             admin["token"])
+    assert status == 400 and not dados["success"]
@@ -0,0 +1,64 @@
+from datetime import date
+
+from sqlalchemy import select
+
+from controllers.auditoria_controller import auditoria_controller
+from controllers.paciente_controller import paciente_controller
+from db.audit_diff import replay
+from db.connection import db_manager
+from models.auditoria import LogAuditoria
+from models.paciente import Sexo
+
+
+def _eventos(tabela, registro_id):
+    t = LogAuditoria.__table__
+    with db_manager.engine.connect() as conn:
+        return [dict(r) for r in conn.execute(
+            select(t).where(t.c.tabela == tabela, t.c.registro_id == registro_id).order_by(t.c.id)
+        ).mappings()]
+
+
+def test_diff_de_criacao_e_alteracao(admin_logado):
+    resultado = paciente_controller.create_paciente({
+        "nome_completo": "Paciente Diff",
+        "cpf": "11144477735",
+        "cns": "700000000000002",
+        "sexo": Sexo.FEMININO,
+        "telefone": "1133334444",
+        "data_nascimento": date(1985, 3, 10),
+        "endereco": {"cep": "01001000", "logradouro": "Rua C", "bairro": "Centro", "cidade": "São Paulo", "uf": "SP"},
+    })
+    assert resultado["success"], resultado["message"]
+    paciente_id = resultado["paciente_id"]
+
+    assert paciente_controller.update_paciente(paciente_id, {"telefone": "11999990000"})["success"]
+
+    criacao, alteracao = [e for e in _eventos("pacientes", paciente_id) if e["acao"] != "READ"]
+    assert criacao["acao"] == "CREATE"
+    assert criacao["usuario_id"] == admin_logado.id
+    assert criacao["dados_novos"]["sexo"] == [None, "F"]
+    assert criacao["dados_novos"]["data_nascimento"] == [None, "1985-03-10"]
+    # só o campo alterado; updated_at/updated_by ficam de fora
+    assert alteracao["acao"] == "UPDATE"
+    assert alteracao["dados_novos"] == {"telefone": ["1133334444", "11999990000"]}
+    assert alteracao["dados_anteriores"] is None
+
+    endereco_id = criacao["dados_novos"]["endereco_id"][1]
+    assert [e["acao"] for e in _eventos("enderecos", endereco_id)] == ["CREATE"]
+
+    antes = auditoria_controller.versao_registro("pacientes", paciente_id, em=criacao["timestamp"])
+    depois = auditoria_controller.versao_registro("pacientes", paciente_id)
+    assert antes["dados"]["telefone"] == "1133334444"
+    assert depois["dados"]["telefone"] == "11999990000"
+    assert depois["dados"]["nome_completo"] == "Paciente Diff"
+    assert depois["alteracoes"] == 2
+
+
+def test_replay_aceita_formato_antigo_e_exclusao():
+    eventos = [
+        {"acao": "CREATE", "dados_novos": {"nome": "Maria", "cpf": "123"}},
+        {"acao": "READ", "dados_novos": None},
+        {"acao": "UPDATE", "dados_novos": {"nome": ["Maria", "Maria José"]}},
+    ]
+    assert replay(eventos) == {"nome": "Maria José", "cpf": "123"}
+    assert replay(eventos + [{"acao": "DELETE", "dados_novos": {"nome": ["Maria José", None]}}]) is None
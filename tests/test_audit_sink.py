@@ -0,0 +1,75 @@
+from sqlalchemy import create_engine, func, select
+
+from db.audit_sink import AuditSink
+from models.auditoria import LogAuditoria
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    LogAuditoria.__table__.create(engine)
+    return engine
+
+
+def _total(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(LogAuditoria.__table__)).scalar()
+
+
+def test_grava_em_lote_e_compacta_spool(tmp_path):
+    engine = _engine(tmp_path)
+    sink = AuditSink(spool_path=str(tmp_path / "spool.jsonl"), engine=engine, batch_size=100, flush_interval=0.05)
+    for i in range(450):
+        sink.emit("LOGIN", usuario_id=i, usuario_nome=f"usuario{i}", ip_address="127.0.0.1")
+    assert sink.flush(timeout=10)
+
+    stats = sink.stats()
+    assert _total(engine) == 450
+    assert stats["flushed"] == 450
+    assert stats["batches"] < 450
+    assert stats["queue_depth"] == 0
+    assert stats["spool_pending_bytes"] == 0
+    sink.close()
+
+
+def test_eventos_sobrevivem_a_banco_indisponivel(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    indisponivel = create_engine(f"sqlite:///{tmp_path / 'nao_existe' / 'x.db'}")
+    sink = AuditSink(spool_path=spool, engine=indisponivel, flush_interval=0.05)
+    for i in range(20):
+        sink.emit("LOGIN_FAILED_INVALID_PASSWORD", usuario_nome="alguem@sisusf.com")
+    sink.close(timeout=2)
+    assert sink.stats()["errors"] >= 1
+
+    # próxima execução (ou banco de volta): relê o spool
+    engine = _engine(tmp_path)
+    recuperado = AuditSink(spool_path=spool, engine=engine, flush_interval=0.05)
+    recuperado.start()
+    assert recuperado.flush(timeout=10)
+    assert _total(engine) == 20
+    recuperado.close()
+
+
+def test_fila_cheia_nao_perde_eventos(tmp_path):
+    engine = _engine(tmp_path)
+    sink = AuditSink(spool_path=str(tmp_path / "spool.jsonl"), engine=engine, max_queue=5, flush_interval=0.05)
+    for i in range(200):
+        sink.emit("LOGOUT", usuario_id=i)
+    assert sink.flush(timeout=10)
+    assert sink.stats()["overflow"] > 0
+    assert _total(engine) == 200
+    sink.close()
+
+
+def test_flush_so_retorna_com_o_evento_gravado(tmp_path, monkeypatch):
+    import db.audit_sink as modulo
+    registrados = []
+    monkeypatch.setattr(modulo.atexit, "register", registrados.append)
+    engine = _engine(tmp_path)
+    sink = AuditSink(spool_path=str(tmp_path / "spool.jsonl"), engine=engine, flush_interval=0.001)
+    for rodada in range(3):
+        for i in range(50):
+            sink.emit("LOGIN", usuario_id=i)
+            assert sink.flush(timeout=10)
+            assert _total(engine) == rodada * 50 + i + 1
+        sink.close()
+    assert registrados == [sink.close]
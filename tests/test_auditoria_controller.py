@@ -0,0 +1,85 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from controllers.auditoria_controller import auditoria_controller
+from controllers.auth_controller import auth
+from db.audit_partitions import rotate_live_table
+from db.connection import db_manager
+from models.auditoria import LogAuditoria
+
+
+def _inserir(eventos):
+    with db_manager.engine.begin() as conn:
+        conn.execute(LogAuditoria.__table__.insert(), eventos)
+
+
+def _todas_as_paginas(consulta, limite):
+    ids, cursor, paginas = [], None, 0
+    while True:
+        result = consulta(cursor=cursor, limite=limite)
+        assert result["success"]
+        ids.extend(evento["id"] for evento in result["dados"])
+        paginas += 1
+        cursor = result["proximo_cursor"]
+        if cursor is None:
+            return ids, paginas
+
+
+def test_paginacao_por_chave_sem_repetir_nem_pular(admin_logado):
+    base = datetime.utcnow().replace(microsecond=0)
+    # vários eventos com o mesmo timestamp: desempate pelo id
+    _inserir([{"acao": "UPDATE", "tabela": "teste_paginacao", "registro_id": 7, "usuario_id": 1,
+               "timestamp": base - timedelta(seconds=i // 3)} for i in range(23)])
+
+    ids, paginas = _todas_as_paginas(
+        lambda **kw: auditoria_controller.historico_registro("teste_paginacao", 7, **kw), limite=5)
+
+    assert len(ids) == 23 and len(set(ids)) == 23
+    assert paginas == 5
+
+
+def test_historico_inclui_tabelas_mensais_rotacionadas(admin_logado):
+    antigos = [datetime(2025, 11, 3, 8), datetime(2026, 2, 10, 9), datetime(2026, 2, 11, 9)]
+    _inserir([{"acao": "UPDATE", "tabela": "teste_rotacao", "registro_id": 1, "timestamp": ts} for ts in antigos])
+    rotate_live_table(db_manager.engine, today=date(2026, 3, 1))
+    _inserir([{"acao": "READ", "tabela": "teste_rotacao", "registro_id": 1, "timestamp": datetime(2026, 3, 2)}])
+
+    ids, paginas = _todas_as_paginas(
+        lambda **kw: auditoria_controller.historico_registro("teste_rotacao", 1, **kw), limite=2)
+    result = auditoria_controller.historico_registro("teste_rotacao", 1, limite=10)
+
+    assert len(ids) == 4 and paginas == 2
+    assert [e["timestamp"] for e in result["dados"]] == [datetime(2026, 3, 2)] + sorted(antigos, reverse=True)
+
+
+def test_atividade_do_usuario_no_periodo(admin_logado):
+    _inserir([
+        {"acao": "LOGIN", "usuario_id": 4242, "timestamp": datetime(2026, 4, 1, 8)},
+        {"acao": "UPDATE", "usuario_id": 4242, "tabela": "pacientes", "registro_id": 1, "timestamp": datetime(2026, 4, 1, 9)},
+        {"acao": "LOGIN", "usuario_id": 4242, "timestamp": datetime(2026, 4, 2, 8)},
+    ])
+
+    result = auditoria_controller.atividade_usuario(4242, desde=date(2026, 4, 1), ate=date(2026, 4, 2))
+
+    assert [e["acao"] for e in result["dados"]] == ["UPDATE", "LOGIN"]
+    assert result["proximo_cursor"] is None
+
+
+def test_consulta_usa_indice_composto():
+    with db_manager.engine.connect() as conn:
+        plano = " ".join(str(row) for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM logs_auditoria WHERE tabela = 'pacientes' AND registro_id = 1 "
+            "ORDER BY timestamp DESC, id DESC LIMIT 51"
+        )))
+    assert "ix_logs_auditoria_registro_timestamp" in plano
+
+
+def test_auditoria_exige_permissao():
+    anterior = auth.current_user
+    auth.current_user = SimpleNamespace(id=2, nome="Medico", email="medico@sisusf.com", tipo="medico")
+    try:
+        assert auditoria_controller.historico_registro("pacientes", 1)["success"] is False
+    finally:
+        auth.current_user = anterior
@@ -0,0 +1,68 @@
+from datetime import date, datetime
+
+from controllers.relatorio_controller import relatorio_controller
+from db.connection import db_manager
+from models.consulta import Consulta, StatusConsulta, TipoConsulta
+from models.endereco import Endereco
+from models.familia import Familia
+from models.paciente import Paciente, Sexo
+from models.usuario import Usuario
+
+HOJE = date(2031, 6, 15)
+
+
+def _consulta(paciente, profissional_id, data_hora, status=StatusConsulta.REALIZADA):
+    return Consulta(paciente=paciente, profissional_id=profissional_id, data_hora=data_hora,
+                    tipo=TipoConsulta.CONSULTA_ENFERMAGEM, status=status)
+
+
+def test_ultima_consulta_mantida_e_pacientes_sem_consulta(admin_logado):
+    session = db_manager.get_session()
+    try:
+        enfermeiro = session.query(Usuario).filter(Usuario.email == "enfermeiro@sisusf.com").one()
+        endereco = Endereco(cep="01001000", logradouro="Rua Cobertura", bairro="Centro", cidade="São Paulo", uf="SP")
+        familia = Familia(codigo_familia="COB-001", nome_responsavel="Responsável", cpf_responsavel="45074952883",
+                          endereco=endereco)
+        nunca, antigo, recente, corrigido = [
+            Paciente(nome_completo=f"Cobertura {i}", cpf=cpf, sexo=Sexo.FEMININO, familia=familia)
+            for i, cpf in enumerate(["36084852955", "51131154444", "86840102130", "99940561580"])]
+        session.add_all([nunca, antigo, recente, corrigido])
+        session.flush()
+
+        session.add_all([
+            _consulta(antigo, enfermeiro.id, datetime(2030, 4, 2, 9)),
+            _consulta(antigo, enfermeiro.id, datetime(2030, 3, 1, 9)),
+            _consulta(antigo, enfermeiro.id, datetime(2031, 6, 1, 9), StatusConsulta.AGENDADA),
+            _consulta(recente, enfermeiro.id, datetime(2031, 4, 10, 8)),
+            _consulta(corrigido, enfermeiro.id, datetime(2029, 12, 5, 10)),
+        ])
+        engano = _consulta(corrigido, enfermeiro.id, datetime(2031, 5, 20, 10), StatusConsulta.AGENDADA)
+        session.add(engano)
+        session.commit()
+        assert antigo.ultima_consulta == datetime(2030, 4, 2, 9)
+        assert recente.ultima_consulta == datetime(2031, 4, 10, 8)
+        assert nunca.ultima_consulta is None
+
+        # agendada -> realizada avança; desfazer recalcula a partir das demais
+        engano.status = StatusConsulta.REALIZADA
+        session.commit()
+        assert corrigido.ultima_consulta == datetime(2031, 5, 20, 10)
+        engano.status = StatusConsulta.CANCELADA
+        session.commit()
+        assert corrigido.ultima_consulta == datetime(2029, 12, 5, 10)
+        familia_id = familia.id
+        ids = [nunca.id, corrigido.id, antigo.id]
+    finally:
+        session.close()
+
+    paginas, cursor = [], None
+    while True:
+        pagina = relatorio_controller.pacientes_sem_consulta(12, familia_id, cursor, limite=2, hoje=HOJE)
+        assert pagina["success"], pagina.get("message")
+        paginas.append([p["id"] for p in pagina["dados"]])
+        cursor = pagina["proximo_cursor"]
+        if cursor is None:
+            break
+    # nunca atendido primeiro, depois a última consulta mais antiga
+    assert paginas == [ids[:2], ids[2:]]
+    assert not relatorio_controller.pacientes_sem_consulta(cursor="x")["success"]
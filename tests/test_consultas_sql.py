@@ -0,0 +1,91 @@
+from datetime import date, datetime
+
+import pytest
+
+from db.connection import db_manager
+from db.nplusone import NPlusOneError
+from models.consulta import Consulta, TipoConsulta
+from models.endereco import Endereco
+from models.paciente import Paciente, Sexo
+from controllers.paciente_controller import paciente_controller
+from controllers.relatorio_controller import relatorio_controller
+
+
+@pytest.fixture(scope="module")
+def pacientes_com_consultas():
+    session = db_manager.get_session()
+    try:
+        pacientes = []
+        for i in range(5):
+            paciente = Paciente(
+                nome_completo=f"Paciente N+1 {i}",
+                sexo=Sexo.FEMININO,
+                data_nascimento=date(1980, 1, 1 + i),
+                endereco=Endereco(cep="01001000", logradouro="Rua A", bairro="Centro", cidade="São Paulo", uf="SP"),
+            )
+            session.add(paciente)
+            pacientes.append(paciente)
+        session.flush()
+        for paciente in pacientes:
+            session.add(Consulta(
+                data_hora=datetime.now(), tipo=TipoConsulta.CONSULTA_MEDICA,
+                paciente_id=paciente.id, profissional_id=1,
+            ))
+        session.commit()
+        yield [p.id for p in pacientes]
+    finally:
+        session.close()
+
+
+def test_detector_aponta_lazy_load_repetido(pacientes_com_consultas, nplusone):
+    session = db_manager.get_session()
+    try:
+        with pytest.raises(NPlusOneError) as exc:
+            for consulta in session.query(Consulta).all():
+                consulta.paciente.nome_completo
+        assert "tests/test_consultas_sql.py" in str(exc.value)
+    finally:
+        session.close()
+
+
+def test_acesso_em_lote_nao_dispara_detector(pacientes_com_consultas, nplusone):
+    from sqlalchemy.orm import joinedload
+
+    session = db_manager.get_session()
+    try:
+        for consulta in session.query(Consulta).options(joinedload(Consulta.paciente)).all():
+            consulta.paciente.nome_completo
+    finally:
+        session.close()
+
+
+def test_search_pacientes_uma_instrucao(pacientes_com_consultas, admin_logado, max_statements):
+    with max_statements(1):
+        resultado = paciente_controller.search_pacientes("Paciente N+1")
+    assert len(resultado) == 5
+
+
+def test_get_paciente_by_id_uma_instrucao(pacientes_com_consultas, admin_logado, max_statements):
+    with max_statements(1):
+        assert paciente_controller.get_paciente_by_id(pacientes_com_consultas[0])["success"]
+
+
+def test_dashboard_quatro_instrucoes(admin_logado, max_statements):
+    with max_statements(4):
+        assert relatorio_controller.get_dashboard_data()["success"]
+
+
+def test_create_paciente_uma_transacao(admin_logado, max_statements):
+    dados = {
+        "nome_completo": "Paciente Transação Única",
+        "cpf": "52998224725",
+        "cns": "700000000000001",
+        "sexo": Sexo.MASCULINO,
+        "data_nascimento": date(1970, 5, 20),
+        "endereco": {"cep": "01001000", "logradouro": "Rua B", "bairro": "Centro", "cidade": "São Paulo", "uf": "SP"},
+    }
+    # SELECT de duplicidade + INSERT endereço + INSERT paciente + INSERT auditoria
+    with max_statements(4):
+        resultado = paciente_controller.create_paciente(dados)
+    assert resultado["success"], resultado["message"]
+    assert resultado["paciente_id"]
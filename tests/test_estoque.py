@@ -0,0 +1,256 @@
+import threading
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, update
+
+from controllers.estoque_controller import estoque_controller
+from db.connection import db_manager
+from db.create_tables import migrate_lotes_legados
+from models.medicamento import DispensacaoMedicamento, LoteMedicamento, Medicamento, MovimentoEstoque
+from models.paciente import Paciente, Sexo
+
+
+def _criar(*objetos):
+    session = db_manager.get_session()
+    try:
+        session.add_all(objetos)
+        session.commit()
+        return [o.id for o in objetos]
+    finally:
+        session.close()
+
+
+def _saldo_e_livro(medicamento_id):
+    session = db_manager.get_session()
+    try:
+        saldo = session.get(Medicamento, medicamento_id).estoque_atual
+        livro = session.query(func.coalesce(func.sum(MovimentoEstoque.quantidade), 0)) \
+            .filter(MovimentoEstoque.medicamento_id == medicamento_id).scalar()
+        dispensado = session.query(func.coalesce(func.sum(DispensacaoMedicamento.quantidade), 0)) \
+            .filter(DispensacaoMedicamento.medicamento_id == medicamento_id).scalar()
+        return saldo, livro, dispensado
+    finally:
+        session.close()
+
+
+def test_dispensacao_concorrente_nao_vende_alem_do_saldo(admin_logado):
+    paciente_id, losartana, metformina = _criar(
+        Paciente(nome_completo="Paciente Farmácia", cpf="59765613148", sexo=Sexo.MASCULINO),
+        Medicamento(nome="Losartana 50mg", estoque_atual=0),
+        Medicamento(nome="Metformina 850mg", estoque_atual=0))
+    assert estoque_controller.entrada(losartana, 50)["success"]
+    assert estoque_controller.entrada(metformina, 5)["success"]
+
+    resultados, trava = [], threading.Lock()
+
+    def balcao():
+        for _ in range(5):
+            r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": losartana, "quantidade": 1}])
+            with trava:
+                resultados.append(r)
+
+    threads = [threading.Thread(target=balcao) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    sucessos = [r for r in resultados if r["success"]]
+    falhas = [r for r in resultados if not r["success"]]
+    assert len(sucessos) == 50
+    assert {r.get("code") for r in falhas} == {"ESTOQUE_INSUFICIENTE"}, falhas[:3]
+    assert _saldo_e_livro(losartana) == (0, 0, 50)
+
+    # vários itens: tudo ou nada
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": metformina, "quantidade": 2},
+                                                   {"medicamento_id": losartana, "quantidade": 1}])
+    assert not r["success"] and r["medicamento_ids"] == [losartana]
+    assert "Losartana 50mg: saldo 0" in r["message"]
+    assert _saldo_e_livro(metformina) == (5, 5, 0)
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": metformina, "quantidade": 2},
+                                                   {"medicamento_id": metformina, "quantidade": 1}])
+    assert r["success"] and len(r["dispensacao_ids"]) == 1
+    assert _saldo_e_livro(metformina) == (2, 2, 3)
+    assert not estoque_controller.dispensar(paciente_id, [{"medicamento_id": metformina, "quantidade": 0}])["success"]
+
+
+def test_reconciliacao_registra_saldo_de_abertura(admin_logado):
+    dipirona, = _criar(Medicamento(nome="Dipirona 500mg", estoque_atual=7))
+
+    def divergencias():
+        return [d for d in estoque_controller.reconciliar()["divergencias"] if d["medicamento_id"] == dipirona]
+
+    assert divergencias() == [{"medicamento_id": dipirona, "saldo": 7, "livro": 0}]
+    assert estoque_controller.reconciliar(corrigir=True)["success"]
+    assert divergencias() == []
+    extrato = estoque_controller.extrato(dipirona)
+    assert extrato["saldo"] == 7 and extrato["movimentos"][0]["quantidade"] == 7
+
+    session = db_manager.get_session()
+    try:
+        movimento = session.query(MovimentoEstoque).filter(MovimentoEstoque.medicamento_id == dipirona).one()
+        movimento.quantidade = 70
+        with pytest.raises(ValueError):
+            session.flush()
+    finally:
+        session.rollback()
+        session.close()
+
+
+def _lotes(medicamento_id):
+    session = db_manager.get_session()
+    try:
+        return {l.lote: l.quantidade for l in
+                session.query(LoteMedicamento).filter(LoteMedicamento.medicamento_id == medicamento_id)}
+    finally:
+        session.close()
+
+
+def test_fefo_divide_entre_lotes_e_ignora_vencidos(admin_logado):
+    paciente_id, amoxicilina = _criar(
+        Paciente(nome_completo="Paciente Lotes", cpf="14105659391", sexo=Sexo.FEMININO),
+        Medicamento(nome="Amoxicilina 500mg", estoque_atual=0))
+    for lote, validade, quantidade in [("A", date(2031, 1, 10), 3), ("B", date(2030, 12, 1), 2),
+                                       ("VENCIDO", date(2020, 1, 1), 10), ("SEM-VALIDADE", None, 5)]:
+        assert estoque_controller.entrada(amoxicilina, quantidade, lote, validade)["success"]
+
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": amoxicilina, "quantidade": 4}])
+    assert r["success"]
+    assert _lotes(amoxicilina) == {"A": 1, "B": 0, "VENCIDO": 10, "SEM-VALIDADE": 5}
+
+    # o total (16) basta, mas só 6 unidades estão na validade
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": amoxicilina, "quantidade": 7}])
+    assert not r["success"] and r["code"] == "ESTOQUE_INSUFICIENTE"
+    assert _lotes(amoxicilina)["A"] == 1 and _saldo_e_livro(amoxicilina)[0] == 16
+
+    # outra estação consome o lote A por fora: a separação relê os lotes
+    with db_manager.engine.begin() as conn:
+        conn.execute(update(LoteMedicamento.__table__).where(LoteMedicamento.lote == "A",
+                                                             LoteMedicamento.medicamento_id == amoxicilina)
+                     .values(quantidade=0))
+        conn.execute(update(Medicamento.__table__).where(Medicamento.id == amoxicilina).values(estoque_atual=15))
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": amoxicilina, "quantidade": 5}])
+    assert r["success"], r["message"]
+    assert r["lotes"][amoxicilina] == [{"lote_id": r["lotes"][amoxicilina][0]["lote_id"], "quantidade": 5}]
+    assert _lotes(amoxicilina) == {"A": 0, "B": 0, "VENCIDO": 10, "SEM-VALIDADE": 0}
+
+
+def test_estoque_sem_lote_migrado(admin_logado):
+    ibuprofeno, = _criar(Medicamento(nome="Ibuprofeno 600mg", estoque_atual=4, lote="L9",
+                                     validade=datetime(2032, 5, 1)))
+    assert migrate_lotes_legados() >= 1
+    assert migrate_lotes_legados() == 0
+    assert _lotes(ibuprofeno) == {"L9": 4}
+
+
+def test_alertas_de_estoque_baixo_e_lote_vencendo(admin_logado):
+    from db.maintenance import alertar_vencimentos
+    from models.medicamento import TipoAlerta
+
+    paciente_id, captopril = _criar(
+        Paciente(nome_completo="Paciente Alertas", cpf="74565198037", sexo=Sexo.MASCULINO),
+        Medicamento(nome="Captopril 25mg", estoque_atual=0, estoque_minimo=10))
+    inicio = estoque_controller.ultimo_alerta_id()
+    avisados = []
+    estoque_controller.on_alerta(avisados.extend)
+
+    assert estoque_controller.entrada(captopril, 12, "C1", date(2031, 3, 1))["success"]
+    for quantidade in (3, 1):
+        assert estoque_controller.dispensar(paciente_id, [{"medicamento_id": captopril,
+                                                           "quantidade": quantidade}])["success"]
+    # só as passagens pelo mínimo geram alerta
+    tipos = [(a["tipo"], a["saldo"]) for a in avisados if a["medicamento_id"] == captopril]
+    assert tipos == [(TipoAlerta.ESTOQUE_NORMALIZADO, 12), (TipoAlerta.ESTOQUE_BAIXO, 9)]
+
+    feed = estoque_controller.novos_alertas(inicio)
+    assert [a["tipo"] for a in feed["alertas"] if a["medicamento_id"] == captopril] == [t for t, _ in tipos]
+    assert feed["alertas"][-1]["nome"] == "Captopril 25mg"
+    assert estoque_controller.novos_alertas(feed["ultimo_id"])["alertas"] == []
+
+    painel = estoque_controller.alertas(dias=30, hoje=date(2031, 2, 15))
+    assert captopril in [m["medicamento_id"] for m in painel["estoque_baixo"]]
+    assert [(l["lote"], l["quantidade"]) for l in painel["vencendo"] if l["medicamento_id"] == captopril] \
+        == [("C1", 8)]
+    assert not [l for l in estoque_controller.alertas(dias=30, hoje=date(2030, 1, 1))["vencendo"]
+                if l["medicamento_id"] == captopril]
+
+    # a rotina alerta cada lote uma única vez
+    agora = datetime(2031, 2, 15)
+    assert alertar_vencimentos(db_manager.engine, 2, agora=agora, dias=30)["linhas"] >= 1
+    assert alertar_vencimentos(db_manager.engine, 2, agora=agora, dias=30)["linhas"] == 0
+    vencendo = [a for a in estoque_controller.novos_alertas(feed["ultimo_id"])["alertas"]
+                if a["medicamento_id"] == captopril]
+    assert [(a["tipo"], a["saldo"], a["validade"]) for a in vencendo] \
+        == [(TipoAlerta.LOTE_VENCENDO, 8, date(2031, 3, 1))]
+
+
+def test_lote_de_outra_estacao_entra_na_separacao(admin_logado):
+    from controllers.estoque_controller import EstoqueController
+
+    paciente_id, omeprazol = _criar(
+        Paciente(nome_completo="Paciente Duas Estações", cpf="46881973659", sexo=Sexo.MASCULINO),
+        Medicamento(nome="Omeprazol 20mg", estoque_atual=0))
+    assert estoque_controller.entrada(omeprazol, 2, "O1", date(2031, 1, 1))["success"]
+    # esta estação guarda em cache só o lote O1
+    assert estoque_controller.dispensar(paciente_id, [{"medicamento_id": omeprazol, "quantidade": 1}])["success"]
+
+    outra_estacao = EstoqueController()
+    assert outra_estacao.entrada(omeprazol, 5, "O2", date(2032, 1, 1))["success"]
+
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": omeprazol, "quantidade": 4}])
+    assert r["success"], r["message"]
+    assert _lotes(omeprazol) == {"O1": 0, "O2": 2}
+
+
+def test_rotina_agendada_alerta_divergencia_sem_corrigir(admin_logado):
+    from db.maintenance import ROTINAS
+    from models.medicamento import AlertaEstoque, TipoAlerta
+
+    captopril, = _criar(Medicamento(nome="Captopril 25mg", estoque_atual=0))
+    assert estoque_controller.entrada(captopril, 10)["success"]
+    with db_manager.engine.begin() as conn:
+        conn.execute(update(Medicamento.__table__).where(Medicamento.__table__.c.id == captopril)
+                     .values(estoque_atual=8))
+
+    for _ in range(2):
+        ROTINAS["estoque"](db_manager.engine, 500)
+    assert _saldo_e_livro(captopril)[:2] == (8, 10)
+    session = db_manager.get_session()
+    try:
+        alertas = session.query(AlertaEstoque.tipo, AlertaEstoque.saldo).filter(
+            AlertaEstoque.medicamento_id == captopril, AlertaEstoque.tipo == TipoAlerta.ESTOQUE_DIVERGENTE).all()
+    finally:
+        session.close()
+    assert alertas == [(TipoAlerta.ESTOQUE_DIVERGENTE, 8)]
+
+    assert estoque_controller.reconciliar(corrigir=True)["success"]
+    assert _saldo_e_livro(captopril)[:2] == (8, 8)
+
+
+def test_feed_rele_alerta_confirmado_fora_de_ordem(admin_logado):
+    from models.medicamento import AlertaEstoque, TipoAlerta
+
+    enalapril, inativo = _criar(Medicamento(nome="Enalapril 10mg", estoque_atual=0),
+                                Medicamento(nome="Descontinuado 1mg", estoque_atual=0))
+    inicio = estoque_controller.ultimo_alerta_id()
+    tabela = AlertaEstoque.__table__
+
+    def alerta(alerta_id):
+        with db_manager.engine.begin() as conn:
+            conn.execute(tabela.insert().values(id=alerta_id, medicamento_id=enalapril,
+                                                tipo=TipoAlerta.ESTOQUE_BAIXO, created_at=datetime.utcnow()))
+
+    # id inicio+1 reservado por uma transação que confirma depois de inicio+2
+    alerta(inicio + 2)
+    feed = estoque_controller.novos_alertas(inicio)
+    assert [a["id"] for a in feed["alertas"]] == [inicio + 2] and feed["pendentes"] == [inicio + 1]
+    alerta(inicio + 1)
+    feed = estoque_controller.novos_alertas(feed["ultimo_id"], pendentes=feed["pendentes"])
+    assert [a["id"] for a in feed["alertas"]] == [inicio + 1] and feed["pendentes"] == []
+
+    assert estoque_controller.entrada(inativo, 5, "D1", date(2031, 3, 1))["success"]
+    with db_manager.engine.begin() as conn:
+        conn.execute(update(Medicamento.__table__).where(Medicamento.__table__.c.id == inativo).values(ativo=False))
+    painel = estoque_controller.alertas(dias=30, hoje=date(2031, 2, 15))
+    assert inativo not in [l["medicamento_id"] for l in painel["vencendo"]]
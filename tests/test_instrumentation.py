@@ -0,0 +1,54 @@
+import logging
+
+from sqlalchemy import create_engine, text
+
+from db.instrumentation import QueryMetrics, normalize_sql, param_shape, track_operation, query_metrics
+
+
+def test_normalize_sql_remove_literais_e_listas():
+    sql = "SELECT * FROM pacientes WHERE cpf = '12345678901' AND id IN (?, ?, ?) LIMIT 50"
+    assert normalize_sql(sql) == "SELECT * FROM pacientes WHERE cpf = ? AND id IN (?...) LIMIT ?"
+
+
+def test_param_shape_nao_expoe_valores():
+    shape = param_shape({"cpf": "12345678901", "limite": 50, "nasc": None})
+    assert shape == "{cpf: str, limite: int, nasc: null}"
+    assert "12345678901" not in shape
+    assert param_shape([(1, "a"), (2, "b")], executemany=True) == "2x (int, str)"
+
+
+def test_metricas_por_instrucao_e_log_lento_sem_valores(caplog):
+    engine = create_engine("sqlite://")
+    metrics = QueryMetrics(slow_query_ms=0)
+    metrics.install(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (cpf TEXT)"))
+        for _ in range(3):
+            with caplog.at_level(logging.WARNING, logger="sisusf.db.slow"):
+                conn.execute(text("SELECT cpf FROM t WHERE cpf = :cpf"), {"cpf": "98765432100"})
+
+    snap = metrics.snapshot()
+    assert snap["statements"]["SELECT cpf FROM t WHERE cpf = ?"]["count"] == 3
+    assert snap["pool_wait"]["count"] >= 1
+    assert snap["slow_queries"][-1]["params"] == "(str)"  # sqlite: parâmetros posicionais
+    assert "98765432100" not in caplog.text
+    assert "98765432100" not in str(snap)
+
+
+def test_contagem_por_operacao():
+    engine = create_engine("sqlite://")
+    query_metrics.install(engine)
+    query_metrics.reset()
+
+    @track_operation("busca_teste")
+    def busca():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+    busca()
+    busca()
+    op = query_metrics.snapshot()["operations"]["busca_teste"]
+    assert op["calls"] == 2
+    assert op["statements"] == 4
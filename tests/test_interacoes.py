@@ -0,0 +1,105 @@
+from controllers.estoque_controller import estoque_controller
+from controllers.interacao_controller import interacao_controller
+from db.connection import db_manager
+from models.interacao import GravidadeInteracao
+from models.medicamento import Medicamento
+from models.paciente import Paciente, Sexo
+
+
+def _criar(*objetos):
+    session = db_manager.get_session()
+    try:
+        session.add_all(objetos)
+        session.commit()
+        return [o.id for o in objetos]
+    finally:
+        session.close()
+
+
+def test_alergia_e_interacoes_na_prescricao(admin_logado, max_statements):
+    paciente_id, aas, varfarina, metamizol = _criar(
+        Paciente(nome_completo="Paciente Interações", cpf="52601815906", sexo=Sexo.FEMININO),
+        Medicamento(nome="AAS 100mg", principio_ativo="Ácido Acetilsalicílico", estoque_atual=0),
+        Medicamento(nome="Varfarina 5mg", principio_ativo="Varfarina", estoque_atual=0),
+        Medicamento(nome="Novalgina 1g", principio_ativo="Dipirona", estoque_atual=0))
+    assert interacao_controller.cadastrar_interacao("Varfarina", "acido acetilsalicilico",
+                                                    GravidadeInteracao.GRAVE, "Risco de sangramento")["success"]
+    assert interacao_controller.cadastrar_interacao("Sildenafila", "Isossorbida",
+                                                    GravidadeInteracao.CONTRAINDICADA)["success"]
+    assert interacao_controller.definir_marcadores(paciente_id, alergias=["DIPIRONA"],
+                                                   uso_continuo=["Varfarina "])["success"]
+    assert interacao_controller.marcadores(paciente_id)["dados"] == {
+        "alergia": [{"principio_ativo": "dipirona", "observacao": None}],
+        "uso_continuo": [{"principio_ativo": "varfarina", "observacao": None}]}
+
+    r = interacao_controller.verificar(paciente_id, [aas])
+    assert not r["bloqueante"]
+    assert [(a["tipo"], a["principio"], a["com"], a["gravidade"]) for a in r["alertas"]] \
+        == [("interacao", "acido acetilsalicilico", "varfarina", GravidadeInteracao.GRAVE)]
+
+    # matriz e perfil em memória: a verificação a cada tecla não vai ao banco
+    with max_statements(0):
+        r = interacao_controller.verificar(paciente_id, [metamizol], ["Sildenafila", "isossorbida"])
+    assert r["bloqueante"]
+    assert [(a["tipo"], a["principio"], a["com"]) for a in r["alertas"]] == [
+        ("alergia", "dipirona", None), ("interacao", "isossorbida", "sildenafila")]
+    assert interacao_controller.verificar(paciente_id, [varfarina])["alertas"] == []
+
+    assert estoque_controller.entrada(metamizol, 10)["success"]
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": metamizol, "quantidade": 1}])
+    assert not r["success"] and r["code"] == "ALERTA_CLINICO" and r["alertas"][0]["tipo"] == "alergia"
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": metamizol, "quantidade": 1}],
+                                     confirmar_alertas=True)
+    assert r["success"] and r["alertas"][0]["principio"] == "dipirona"
+
+    # retirar a alergia vale na hora para esta estação
+    assert interacao_controller.definir_marcadores(paciente_id, uso_continuo=["varfarina"])["success"]
+    assert not interacao_controller.verificar(paciente_id, [metamizol])["bloqueante"]
+
+
+def test_importa_marcadores_do_texto_livre(admin_logado):
+    paciente_id, = _criar(Paciente(nome_completo="Paciente Texto Livre", cpf="08301661305", sexo=Sexo.MASCULINO,
+                                   alergias="Dipirona; poeira", medicamentos_uso_continuo="Varfarina\nchá"))
+    interacao_controller.cadastrar_interacao("Varfarina", "Ácido Acetilsalicílico", GravidadeInteracao.GRAVE)
+    _criar(Medicamento(nome="Dipirona gotas", principio_ativo="Dipirona", estoque_atual=0))
+
+    assert interacao_controller.importar_texto_livre()["total"] >= 2
+    assert interacao_controller.importar_texto_livre()["total"] == 0
+    dados = interacao_controller.marcadores(paciente_id)["dados"]
+    assert [m["principio_ativo"] for m in dados["alergia"]] == ["dipirona"]
+    assert [m["principio_ativo"] for m in dados["uso_continuo"]] == ["varfarina"]
+
+
+def test_marcador_gravado_em_outra_estacao_bloqueia_dispensacao(admin_logado):
+    from controllers.interacao_controller import InteracaoController
+
+    paciente_id, amiodarona = _criar(
+        Paciente(nome_completo="Paciente Outra Estação", cpf="18609139034", sexo=Sexo.FEMININO),
+        Medicamento(nome="Amiodarona 200mg", principio_ativo="Amiodarona", estoque_atual=0))
+    assert estoque_controller.entrada(amiodarona, 5)["success"]
+    # perfil já em cache nesta estação, ainda sem alergia
+    assert not interacao_controller.verificar(paciente_id, [amiodarona])["bloqueante"]
+
+    outra_estacao = InteracaoController()
+    assert outra_estacao.definir_marcadores(paciente_id, alergias=["amiodarona"])["success"]
+
+    r = estoque_controller.dispensar(paciente_id, [{"medicamento_id": amiodarona, "quantidade": 1}])
+    assert not r["success"] and r["code"] == "ALERTA_CLINICO"
+
+
+def test_nomes_digitados_e_ids_desconhecidos_nao_crescem_a_matriz(admin_logado, max_statements):
+    paciente_id, = _criar(Paciente(nome_completo="Paciente Digitação", cpf="66392332154", sexo=Sexo.MASCULINO))
+    interacao_controller.matriz.invalidar()
+    interacao_controller.verificar(paciente_id)
+    conhecidos = len(interacao_controller.matriz._nomes)
+    with max_statements(0):
+        for prefixo in ("m", "me", "met", "metf", "metfo", "metformina xyz"):
+            assert interacao_controller.verificar(paciente_id, [987654], [prefixo])["alertas"] == []
+    assert len(interacao_controller.matriz._nomes) == conhecidos
+
+
+def test_falha_na_conferencia_bloqueia_dispensacao(admin_logado, monkeypatch):
+    monkeypatch.setattr(interacao_controller, "verificar",
+                        lambda *a, **k: {"success": False, "message": "Sem permissão"})
+    r = estoque_controller.dispensar(1, [{"medicamento_id": 1, "quantidade": 1}])
+    assert not r["success"] and r["code"] == "ALERTA_CLINICO"
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from db.maintenance import MaintenanceRunner, atualizar_ultima_consulta, marcar_faltas
+from db.sync import change_journal
+from models.base import Base
+from models.consulta import Consulta, StatusConsulta, TipoConsulta
+from models.paciente import Paciente, Sexo
+from models.sync import SyncJournal
+
+AGORA = datetime(2031, 3, 10, 12)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'manutencao.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _consultas(engine, paciente_id, horarios_status):
+    # fora do ORM (como dados antigos ou recebidos na sincronização)
+    with engine.begin() as conn:
+        conn.execute(insert(Consulta.__table__), [
+            {"paciente_id": paciente_id, "profissional_id": 1, "data_hora": h,
+             "tipo": TipoConsulta.CONSULTA_MEDICA, "status": s} for h, s in horarios_status])
+
+
+def _paciente(engine, cpf, ultima=None):
+    with Session(engine) as session:
+        paciente = Paciente(nome_completo="Manutenção", cpf=cpf, sexo=Sexo.MASCULINO, ultima_consulta=ultima)
+        session.add(paciente)
+        session.commit()
+        return paciente.id
+
+
+def test_faltas_em_lotes(engine):
+    paciente_id = _paciente(engine, "11144477735")
+    passadas = [(AGORA - timedelta(days=2, minutes=20 * i), StatusConsulta.AGENDADA) for i in range(5)]
+    _consultas(engine, paciente_id, passadas + [
+        (AGORA - timedelta(hours=2), StatusConsulta.AGENDADA),       # ainda na tolerância
+        (AGORA - timedelta(days=3), StatusConsulta.REALIZADA),
+        (AGORA + timedelta(days=1), StatusConsulta.AGENDADA),
+    ])
+
+    resultado = marcar_faltas(engine, lote=2, agora=AGORA, tolerancia=timedelta(hours=24))
+    assert resultado == {"linhas": 5, "lotes": 3}
+    with engine.connect() as conn:
+        status = [s for s, in conn.execute(select(Consulta.status).order_by(Consulta.id))]
+    assert status == [StatusConsulta.FALTOU] * 5 + [StatusConsulta.AGENDADA, StatusConsulta.REALIZADA,
+                                                    StatusConsulta.AGENDADA]
+    assert marcar_faltas(engine, lote=2, agora=AGORA, tolerancia=timedelta(hours=24))["linhas"] == 0
+
+
+def test_ultima_consulta_e_diario_de_sincronizacao(engine):
+    atualizado = _paciente(engine, "39053344705", ultima=AGORA - timedelta(days=1))
+    desatualizado = _paciente(engine, "12345678909", ultima=AGORA - timedelta(days=90))
+    sem_data = _paciente(engine, "98765432100")
+    _consultas(engine, atualizado, [(AGORA - timedelta(days=1), StatusConsulta.REALIZADA)])
+    _consultas(engine, desatualizado, [(AGORA - timedelta(days=30), StatusConsulta.REALIZADA),
+                                       (AGORA - timedelta(days=10), StatusConsulta.REALIZADA),
+                                       (AGORA - timedelta(days=5), StatusConsulta.CANCELADA)])
+    _consultas(engine, sem_data, [(AGORA - timedelta(days=3), StatusConsulta.REALIZADA)])
+
+    change_journal.enable("a")
+    try:
+        runner = MaintenanceRunner(engine, lote=1, pausa=0)
+        resultados = {r["rotina"]: r for r in runner.run_once(["ultima_consulta"])}
+    finally:
+        change_journal.disable()
+
+    assert resultados["ultima_consulta"]["linhas"] == 2
+    assert resultados["ultima_consulta"]["lotes"] == 2
+    assert runner.status()["resultados"][0]["duracao_ms"] >= 0
+    with engine.connect() as conn:
+        ultimas = dict(conn.execute(select(Paciente.id, Paciente.ultima_consulta)).all())
+        entradas = conn.execute(select(SyncJournal.tabela, SyncJournal.operacao, SyncJournal.dados)
+                                .where(SyncJournal.operacao == "UPDATE")).all()
+    assert ultimas == {atualizado: AGORA - timedelta(days=1), desatualizado: AGORA - timedelta(days=10),
+                       sem_data: AGORA - timedelta(days=3)}
+    assert len(entradas) == 2
+    assert {"ultima_consulta", "updated_at"} <= set(entradas[0].dados)
+
+
+
+def test_ultima_consulta_sem_realizada_volta_a_nulo(engine):
+    # consulta REALIZADA estornada (ex.: recebida como CANCELADA na sincronização)
+    estornado = _paciente(engine, "39053344705", ultima=AGORA - timedelta(days=7))
+    nunca_atendido = _paciente(engine, "12345678909")
+    _consultas(engine, estornado, [(AGORA - timedelta(days=7), StatusConsulta.CANCELADA)])
+
+    assert atualizar_ultima_consulta(engine, lote=10, agora=AGORA) == {"linhas": 1, "lotes": 1}
+    with engine.connect() as conn:
+        ultimas = dict(conn.execute(select(Paciente.id, Paciente.ultima_consulta)).all())
+    assert ultimas == {estornado: None, nunca_atendido: None}
+    assert atualizar_ultima_consulta(engine, lote=10, agora=AGORA)["linhas"] == 0
+
+def test_faltas_usam_hora_local_e_auditam_cada_lote(engine, monkeypatch):
+    import time as _time
+    from db import maintenance
+
+    # UTC-3: com utcnow() uma consulta daqui a 1 hora já passaria da tolerância zero
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    _time.tzset()
+    eventos = []
+    monkeypatch.setattr(maintenance.audit_sink, "emit", lambda acao, **campos: eventos.append((acao, campos)))
+    try:
+        paciente_id = _paciente(engine, "12345678909")
+        agora = datetime.now()
+        _consultas(engine, paciente_id, [(agora + timedelta(hours=1), StatusConsulta.AGENDADA),
+                                         (agora - timedelta(hours=1), StatusConsulta.AGENDADA)])
+        assert marcar_faltas(engine, lote=10, tolerancia=timedelta(0))["linhas"] == 1
+    finally:
+        monkeypatch.delenv("TZ")
+        _time.tzset()
+    assert [(acao, campos["tabela"], campos["usuario_nome"]) for acao, campos in eventos] \
+        == [("UPDATE", "consultas", "manutencao")]
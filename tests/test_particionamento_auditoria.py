@@ -0,0 +1,54 @@
+import gzip
+import json
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, func, inspect, select
+
+from db.audit_partitions import archive_partitions, audit_tables, ensure_partitions
+from models.auditoria import LogAuditoria
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'auditoria.db'}")
+    LogAuditoria.__table__.create(engine)
+    rows = []
+    for mes, quantidade in ((datetime(2026, 1, 15), 3), (datetime(2026, 8, 2), 4), (datetime(2026, 10, 5), 2)):
+        for i in range(quantidade):
+            rows.append({"acao": "LOGIN", "usuario_id": i, "usuario_nome": f"usuario{i}",
+                         "dados_novos": {"n": i}, "timestamp": mes})
+    with engine.begin() as conn:
+        conn.execute(LogAuditoria.__table__.insert(), rows)
+    return engine
+
+
+def test_rotacao_mantem_so_o_mes_corrente(tmp_path):
+    engine = _engine(tmp_path)
+
+    movidos = ensure_partitions(engine, today=date(2026, 10, 19))
+
+    assert movidos == ["logs_auditoria_202601", "logs_auditoria_202608"]
+    assert list(audit_tables(engine)) == [date(2026, 1, 1), date(2026, 8, 1)]
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(LogAuditoria.__table__)).scalar() == 2
+    indices = {ix["name"] for ix in inspect(engine).get_indexes("logs_auditoria_202608")}
+    assert "ix_logs_auditoria_timestamp_202608" in indices
+
+    # segunda rotação no mesmo mês não move nada
+    assert ensure_partitions(engine, today=date(2026, 10, 19)) == []
+
+
+def test_arquivamento_exporta_e_remove_meses_antigos(tmp_path):
+    engine = _engine(tmp_path)
+    ensure_partitions(engine, today=date(2026, 10, 19))
+
+    arquivadas = archive_partitions(engine, retention_months=6, archive_dir=str(tmp_path / "arquivo"),
+                                    today=date(2026, 10, 19))
+
+    assert [a["tabela"] for a in arquivadas] == ["logs_auditoria_202601"]
+    assert arquivadas[0]["registros"] == 3
+    assert list(audit_tables(engine)) == [date(2026, 8, 1)]
+
+    with gzip.open(arquivadas[0]["arquivo"], "rt", encoding="utf-8") as f:
+        linhas = [json.loads(linha) for linha in f]
+    assert [l["dados_novos"] for l in linhas] == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert linhas[0]["timestamp"].startswith("2026-01-15")
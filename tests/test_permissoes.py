@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+
+from config import policy
+from controllers.auth_controller import auth
+from models.usuario import TipoUsuario
+from utils.permissions import clear_policy_cache, compile_policy, normalize_role, policy_for
+
+
+@pytest.mark.parametrize("tipo", [TipoUsuario.ADMIN, "TipoUsuario.ADMIN", "ADMIN", "admin"])
+def test_perfil_derivado_de_qualquer_forma_do_tipo(tipo):
+    assert normalize_role(tipo) == "ADMIN"
+
+
+def test_login_compila_politica_do_perfil():
+    result = auth.login("medico@sisusf.com", "medico123", "127.0.0.1")
+    try:
+        assert result["success"], result["message"]
+        assert auth.current_user.tipo == "MEDICO"
+        assert auth.current_user.permissions is compile_policy("MEDICO")
+        assert auth.has_permission("report")
+        assert not auth.has_permission("delete")
+        assert not auth.has_permission("audit", "logs_auditoria")
+    finally:
+        auth.current_user = None
+
+
+def test_regra_por_recurso_substitui_a_geral():
+    acs = compile_policy("ACS")
+    assert acs.allows("update", "pacientes")
+    assert acs.allows("read", "consultas")
+    assert not acs.allows("update", "consultas")
+    assert not acs.allows("acao_inexistente")
+
+
+def test_ajustes_por_ubs(monkeypatch):
+    monkeypatch.setitem(policy.POLICY, "ubs", {
+        "2077485": {
+            "conceder": {"ENFERMEIRO": {"*": ["report"]}},
+            "negar": {"ENFERMEIRO": {"pacientes": ["create"]}},
+        },
+    })
+    clear_policy_cache()
+    try:
+        ubs = compile_policy("ENFERMEIRO", "2077485")
+        assert ubs.allows("report")
+        assert not ubs.allows("create", "pacientes")
+        assert ubs.allows("create", "familias")
+        assert not compile_policy("ENFERMEIRO").allows("report")
+    finally:
+        clear_policy_cache()
+
+
+def test_verificacao_em_lote_e_cache_no_usuario():
+    usuario = SimpleNamespace(id=9, nome="Agente", tipo="ACS")
+    assert policy_for(usuario) is usuario.permissions
+
+    auth_anterior = auth.current_user
+    auth.current_user = usuario
+    try:
+        assert auth.has_permissions(("create", "read", "report")) == {"create": False, "read": True, "report": False}
+    finally:
+        auth.current_user = auth_anterior
@@ -0,0 +1,109 @@
+from controllers import auth_controller as modulo_auth
+from controllers.auth_controller import AuthController
+from utils.rate_limit import SlidingWindowLimiter, WindowAggregator
+from utils.security import SecurityManager
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_janela_deslizante():
+    relogio = Relogio()
+    limiter = SlidingWindowLimiter(3, 60, clock=relogio)
+    for _ in range(3):
+        assert limiter.retry_after("x") == 0
+        limiter.hit("x")
+    assert limiter.retry_after("x") == 60
+
+    relogio.agora += 30
+    assert limiter.retry_after("x") == 30
+    relogio.agora += 30
+    assert limiter.retry_after("x") == 0
+    assert limiter.retry_after("outra") == 0
+
+
+def test_limiter_limita_numero_de_chaves():
+    limiter = SlidingWindowLimiter(1, 60, max_keys=2)
+    for chave in ("a", "b", "c"):
+        limiter.hit(chave)
+    assert limiter.retry_after("a") == 0
+    assert limiter.retry_after("c") > 0
+
+
+def test_agregador_um_resumo_por_janela():
+    relogio = Relogio()
+    agregador = WindowAggregator(60, clock=relogio)
+    assert agregador.add("k", email="x") == []
+    relogio.agora += 10
+    assert agregador.add("k", email="x") == []
+    relogio.agora += 60
+    fechados = agregador.add("k", email="x")
+    assert [(a["total"], a["inicio"], a["fim"]) for a in fechados] == [(2, 1000.0, 1010.0)]
+    assert [a["total"] for a in agregador.flush()] == [1]
+
+
+def test_login_bloqueado_nao_toca_banco_nem_bcrypt(monkeypatch, max_statements):
+    verificacoes, eventos = [], []
+    verify = SecurityManager.verify_password
+    monkeypatch.setattr(SecurityManager, "verify_password",
+                        staticmethod(lambda *a: verificacoes.append(1) or verify(*a)))
+    monkeypatch.setattr(modulo_auth.audit_sink, "emit", lambda acao, **campos: eventos.append((acao, campos)))
+
+    auth = AuthController()
+    auth._falhas_email = SlidingWindowLimiter(3, 60)
+
+    for _ in range(3):
+        assert auth.login("Medico@sisusf.com", "errada", "10.0.0.5")["code"] == "INVALID_PASSWORD"
+    assert len(verificacoes) == 3
+
+    with max_statements(0):
+        for _ in range(4):
+            result = auth.login("medico@sisusf.com", "medico123", "10.0.0.5")
+            assert result["code"] == "TOO_MANY_ATTEMPTS"
+    assert len(verificacoes) == 3
+
+    auth.logout()
+    bloqueios = [campos for acao, campos in eventos if acao == "LOGIN_THROTTLED"]
+    assert len(bloqueios) == 1
+    assert bloqueios[0]["observacoes"].startswith("4 tentativa(s)")
+    assert len([acao for acao, _ in eventos if acao == "LOGIN_FAILED_INVALID_PASSWORD"]) == 3
+
+
+def test_login_local_nao_bloqueia_a_estacao(monkeypatch):
+    monkeypatch.setattr(modulo_auth.audit_sink, "emit", lambda acao, **campos: None)
+    auth = AuthController()
+    auth._falhas_ip = SlidingWindowLimiter(2, 60)
+
+    # outra pessoa erra a senha de várias contas no mesmo terminal
+    for email in ("a@sisusf.com", "b@sisusf.com", "c@sisusf.com"):
+        assert auth.login(email, "errada", "127.0.0.1")["code"] != "TOO_MANY_ATTEMPTS"
+        assert auth.login(email, "errada", None)["code"] != "TOO_MANY_ATTEMPTS"
+    assert auth.login("medico@sisusf.com", "medico123", "127.0.0.1")["success"]
+    auth.logout()
+
+    for email in ("a@sisusf.com", "b@sisusf.com"):
+        auth.login(email, "errada", "10.0.0.9")
+    assert auth.login("medico@sisusf.com", "medico123", "10.0.0.9")["code"] == "TOO_MANY_ATTEMPTS"
+
+
+def test_resumo_de_bloqueio_gravado_sem_nova_tentativa(monkeypatch):
+    eventos = []
+    monkeypatch.setattr(modulo_auth.audit_sink, "emit", lambda acao, **campos: eventos.append(acao))
+    monkeypatch.setattr(modulo_auth, "LOGIN_JANELA", 0.05)
+    relogio = Relogio()
+    auth = AuthController()
+    auth._falhas_email = SlidingWindowLimiter(1, 60)
+    auth._bloqueios = WindowAggregator(60, clock=relogio)
+
+    auth.login("x@sisusf.com", "errada", "10.0.0.7")
+    assert auth.login("x@sisusf.com", "errada", "10.0.0.7")["code"] == "TOO_MANY_ATTEMPTS"
+    descarga = auth._descarga
+    relogio.agora += 60
+    descarga.join(5)
+    assert eventos.count("LOGIN_THROTTLED") == 1
+    assert auth._bloqueios.pending() == 0
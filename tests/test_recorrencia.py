@@ -0,0 +1,106 @@
+from datetime import date, datetime, time
+
+from sqlalchemy import func, select
+
+from controllers.agenda_controller import AgendaController
+from controllers.recorrencia_controller import RecorrenciaController, datas_previstas
+from db.connection import db_manager
+from models.consulta import Consulta
+from models.paciente import Paciente, Sexo
+from models.usuario import Usuario
+
+CPFS = ["98765432100", "11122233396", "22233344405"]
+
+
+def _preparar():
+    session = db_manager.get_session()
+    try:
+        enfermeiro = session.query(Usuario).filter(Usuario.email == "enfermeiro@sisusf.com").one()
+        pacientes = [Paciente(nome_completo=f"Hipertenso {i}", cpf=cpf, sexo=Sexo.FEMININO,
+                              condicoes_cronicas="Hipertensão arterial")
+                     for i, cpf in enumerate(CPFS)]
+        session.add_all(pacientes)
+        session.commit()
+        return enfermeiro.id, [p.id for p in pacientes]
+    finally:
+        session.close()
+
+
+def test_datas_mensais_respeitam_fim_do_mes():
+    datas = datas_previstas({"inicio": date(2031, 1, 31), "ocorrencias": 3, "intervalo_meses": 1})
+    assert datas == [date(2031, 1, 31), date(2031, 2, 28), date(2031, 3, 31)]
+    assert datas_previstas({"inicio": date(2031, 1, 1), "ocorrencias": 2, "intervalo_dias": 14})[1] == date(2031, 1, 15)
+
+
+def test_recorrencia_em_lote_com_simulacao(admin_logado, max_statements):
+    enfermeiro_id, pacientes = _preparar()
+    agenda = AgendaController()
+    recorrencia = RecorrenciaController(agenda)
+    # quartas-feiras, 3 horários de 30 min
+    assert agenda.definir_modelo(enfermeiro_id, 2, time(8), time(9, 30), 30)["success"]
+    ja_marcada = agenda.agendar(pacientes[0], enfermeiro_id, datetime(2031, 1, 1, 8))
+    assert ja_marcada["success"], ja_marcada["message"]
+
+    assert sorted(recorrencia.pacientes_da_coorte("hipertens")) == sorted(pacientes)
+    regra = {"profissional_id": enfermeiro_id, "inicio": date(2031, 1, 1), "ocorrencias": 6,
+             "intervalo_meses": 1, "tolerancia_dias": 7}
+
+    simulacao = recorrencia.gerar(regra, pacientes, simular=True)
+    assert simulacao["success"] and simulacao["simulacao"]
+    assert simulacao["total"] == 18 and not simulacao["nao_agendadas"]
+    primeiras = [c["data_hora"] for c in simulacao["consultas"] if c["data_prevista"] == date(2031, 1, 1)]
+    # 01/01/2031 é quarta: 08:00 já ocupado; o terceiro paciente vai para a quarta seguinte
+    assert primeiras == [datetime(2031, 1, 1, 8, 30), datetime(2031, 1, 1, 9), datetime(2031, 1, 8, 8)]
+
+    with db_manager.engine.connect() as conn:
+        antes = conn.execute(select(func.count()).select_from(Consulta.__table__)).scalar()
+
+    # planejamento em memória + 1 INSERT e 1 SELECT por bloco
+    with max_statements(4):
+        resultado = recorrencia.gerar(regra, pacientes)
+    assert resultado["success"], resultado["message"]
+    assert len(resultado["consulta_ids"]) == 18
+
+    with db_manager.engine.connect() as conn:
+        depois = conn.execute(select(func.count()).select_from(Consulta.__table__)).scalar()
+    assert depois - antes == 18
+
+    # os horários gerados já ocupam o índice da agenda
+    horarios = agenda.horarios(enfermeiro_id, date(2031, 1, 8))["horarios"]
+    assert [h["livre"] for h in horarios] == [False, True, True]
+    assert recorrencia.gerar(dict(regra, tolerancia_dias=0), pacientes[:1], simular=True)["total"] == 0
+
+    # coorte vazia ou só curingas não seleciona a população inteira; id inexistente é recusado
+    assert recorrencia.pacientes_da_coorte("") == [] and recorrencia.pacientes_da_coorte("  ") == []
+    assert recorrencia.pacientes_da_coorte("%") == [] and recorrencia.pacientes_da_coorte("_") == []
+    inexistente = recorrencia.gerar(regra, [pacientes[0], 999999], simular=True)
+    assert not inexistente["success"] and inexistente["code"] == "NOT_FOUND"
+
+
+def test_recorrencia_de_um_profissional_preserva_a_ocupacao_dos_outros(admin_logado):
+    session = db_manager.get_session()
+    try:
+        ids = dict(session.query(Usuario.email, Usuario.id).filter(
+            Usuario.email.in_(["medico@sisusf.com", "enfermeiro@sisusf.com"])))
+        paciente = Paciente(nome_completo="Paciente Recorrência", cpf="99356327254", sexo=Sexo.MASCULINO)
+        session.add(paciente)
+        session.commit()
+        medico_id, enfermeiro_id, paciente_id = ids["medico@sisusf.com"], ids["enfermeiro@sisusf.com"], paciente.id
+    finally:
+        session.close()
+
+    agenda = AgendaController()
+    recorrencia = RecorrenciaController(agenda)
+    # sextas-feiras de 2032 para os dois profissionais
+    sexta = date(2032, 1, 9)
+    for profissional_id in (medico_id, enfermeiro_id):
+        assert agenda.definir_modelo(profissional_id, sexta.weekday(), time(14), time(16), 20,
+                                     vigencia_inicio=date(2032, 1, 1), vigencia_fim=date(2032, 12, 31))["success"]
+    assert agenda.agendar(paciente_id, medico_id, datetime.combine(sexta, time(14)))["success"]
+
+    regra = {"profissional_id": enfermeiro_id, "inicio": sexta, "ocorrencias": 12, "intervalo_meses": 1}
+    assert recorrencia.gerar(regra, [paciente_id], simular=True)["success"]
+
+    # a janela de 12 meses do enfermeiro não zera o dia já carregado do médico
+    resultado = agenda.agendar(paciente_id, medico_id, datetime.combine(sexta, time(14, 10)))
+    assert resultado["code"] == "CONFLICT"
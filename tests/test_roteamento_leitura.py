@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from db.connection import _parse_lsn, db_manager, read_your_writes_key
+from db.unit_of_work import unit_of_work
+from models.auditoria import LogAuditoria
+
+
+def test_unidade_somente_leitura_usa_pool_de_leitura():
+    assert db_manager.read_engines, "SQLite deveria ter pool de leitura"
+    with unit_of_work("escrita") as uow:
+        assert uow.session.get_bind() is db_manager.engine
+        uow.session.add(LogAuditoria(acao="ROTEAMENTO"))
+
+    with unit_of_work("leitura", readonly=True) as uow:
+        assert uow.session.get_bind() in db_manager.read_engines
+        # WAL: a escrita recém-commitada já é visível para o leitor
+        assert uow.session.query(LogAuditoria).filter(LogAuditoria.acao == "ROTEAMENTO").count() == 1
+
+
+def test_pool_de_leitura_recusa_escrita():
+    with db_manager.read_engines[0].connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("DELETE FROM logs_auditoria"))
+
+
+def test_parse_lsn():
+    assert _parse_lsn("0/16B3748") == 0x16B3748
+    assert _parse_lsn("1/0") > _parse_lsn("0/FFFFFFFF")
+    assert _parse_lsn(None) is None
+
+
+def test_replica_atrasada_nao_recebe_leituras_apos_escrita(monkeypatch):
+    replica = object()
+    monkeypatch.setattr(db_manager, "database_type", "postgresql")
+    monkeypatch.setattr(db_manager, "read_engines", [replica])
+    monkeypatch.setattr(db_manager, "_read_cycle", iter(lambda: replica, None))
+    monkeypatch.setattr(db_manager, "_pending_writes", {})
+    posicao = {"lsn": 100, "lag": 0.1}
+    monkeypatch.setattr(db_manager, "_replica_position", lambda engine: (posicao["lsn"], posicao["lag"]))
+
+    token = read_your_writes_key.set("usuario-1")
+    try:
+        assert db_manager.choose_read_engine() is replica
+        db_manager._pending_writes["usuario-1"] = (0.0, 150)
+        assert db_manager.choose_read_engine() is db_manager.engine
+        posicao["lsn"] = 150
+        assert db_manager.choose_read_engine() is replica
+        assert "usuario-1" not in db_manager._pending_writes
+        posicao["lag"] = 60
+        assert db_manager.choose_read_engine() is db_manager.engine
+    finally:
+        read_your_writes_key.reset(token)
@@ -0,0 +1,34 @@
+from sqlalchemy import create_engine
+
+from db.sqlite_profile import SQLITE_PROFILES, install_profile, resolve_profile
+
+
+def test_pragmas_aplicados_em_todas_as_conexoes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'perfil.db'}")
+    install_profile(engine, "balanced", overrides="")
+
+    conexoes = [engine.raw_connection() for _ in range(3)]
+    try:
+        for conn in conexoes:
+            cursor = conn.cursor()
+            assert cursor.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+            assert cursor.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert cursor.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert cursor.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+            assert cursor.execute("PRAGMA busy_timeout").fetchone()[0] == 20000
+    finally:
+        for conn in conexoes:
+            conn.close()
+        engine.dispose()
+
+
+def test_resolve_profile_com_sobrescritas():
+    pragmas = resolve_profile("fast", overrides="cache_size=-1000, mmap_size=0, invalido=1")
+    assert pragmas["synchronous"] == SQLITE_PROFILES["fast"]["synchronous"]
+    assert pragmas["cache_size"] == -1000
+    assert pragmas["mmap_size"] == 0
+    assert "invalido" not in pragmas
+
+
+def test_perfil_desconhecido_usa_padrao():
+    assert resolve_profile("turbo", overrides="") == SQLITE_PROFILES["balanced"]
@@ -0,0 +1,222 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from db.sync import ChangeJournal, SyncService
+from models.base import Base
+from models.endereco import Endereco
+from models.paciente import Paciente, Sexo
+from models.sync import SyncConflito, SyncJournal
+
+
+@pytest.fixture
+def estacoes(tmp_path):
+    """Duas estações offline (SQLite) e um central (SQLite) com o diário ligado"""
+    engines = {}
+    for nome in ("a", "b", "central"):
+        engines[nome] = create_engine(f"sqlite:///{tmp_path / nome}.db")
+        Base.metadata.create_all(engines[nome])
+
+    journal = ChangeJournal()
+    journal.enable("a")
+    servicos = {nome: SyncService(engines[nome], engines["central"], origem=nome, batch_size=2)
+                for nome in ("a", "b")}
+    sessoes = {nome: sessionmaker(bind=engines[nome], expire_on_commit=False) for nome in ("a", "b")}
+
+    def sessao(nome):
+        journal.origem = nome
+        return sessoes[nome]()
+
+    yield sessao, servicos, engines
+    journal.disable()
+    for engine in engines.values():
+        engine.dispose()
+
+
+def _criar_paciente(session, nome="Maria Sync", cpf="52998224725"):
+    endereco = Endereco(cep="01001000", logradouro="Rua Sync", bairro="Centro", cidade="São Paulo", uf="SP")
+    paciente = Paciente(nome_completo=nome, cpf=cpf, sexo=Sexo.FEMININO, endereco=endereco)
+    session.add(paciente)
+    session.commit()
+    return paciente
+
+
+def _pacientes(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(Paciente.__table__.c.nome_completo, Paciente.__table__.c.telefone,
+                                   Paciente.__table__.c.sexo, Paciente.__table__.c.endereco_id)).all()
+
+
+def test_alteracoes_chegam_as_outras_estacoes(estacoes):
+    sessao, servicos, engines = estacoes
+    with sessao("a") as s:
+        paciente = _criar_paciente(s)
+        paciente.telefone = "1133334444"
+        s.commit()
+
+    assert servicos["a"].pending() == 3
+    assert servicos["a"].sync_once() == {"enviados": 3, "conflitos": 0, "recebidos": 0}
+    assert servicos["a"].pending() == 0
+    assert servicos["b"].sync_once()["recebidos"] == 3
+
+    nome, telefone, sexo, endereco_id = _pacientes(engines["b"])[0]
+    assert (nome, telefone, sexo) == ("Maria Sync", "1133334444", Sexo.FEMININO)
+    with engines["b"].connect() as conn:
+        assert conn.execute(select(Endereco.__table__.c.logradouro)
+                            .where(Endereco.__table__.c.id == endereco_id)).scalar() == "Rua Sync"
+
+    # alteração feita em B volta para A; nada é reenviado a quem originou
+    with sessao("b") as s:
+        s.query(Paciente).one().telefone = "11999990000"
+        s.commit()
+    assert servicos["b"].sync_once() == {"enviados": 1, "conflitos": 0, "recebidos": 0}
+    assert servicos["a"].sync_once()["recebidos"] == 1
+    assert _pacientes(engines["a"])[0][1] == "11999990000"
+
+
+def test_conflito_quando_duas_estacoes_alteram_o_mesmo_registro(estacoes):
+    sessao, servicos, engines = estacoes
+    with sessao("a") as s:
+        _criar_paciente(s)
+    servicos["a"].sync_once()
+    servicos["b"].sync_once()
+
+    with sessao("a") as s:
+        s.query(Paciente).one().telefone = "1100000001"
+        s.commit()
+    with sessao("b") as s:
+        s.query(Paciente).one().telefone = "1100000002"
+        s.commit()
+
+    assert servicos["a"].sync_once()["conflitos"] == 0
+    assert servicos["b"].sync_once() == {"enviados": 1, "conflitos": 1, "recebidos": 1}
+    # a versão do central prevalece e o conflito fica registrado
+    assert _pacientes(engines["b"])[0][1] == "1100000001"
+    with engines["central"].connect() as conn:
+        conflito = conn.execute(select(SyncConflito.__table__)).mappings().one()
+    assert conflito["origem"] == "b"
+    assert conflito["dados"]["telefone"] == "1100000002"
+
+
+def test_reenvio_de_lote_nao_duplica(estacoes):
+    sessao, servicos, engines = estacoes
+    with sessao("a") as s:
+        _criar_paciente(s)
+
+    # simula queda do link depois do commit no central e antes de marcar o envio local
+    journal = SyncJournal.__table__
+    servicos["a"].sync_once()
+    with engines["a"].begin() as conn:
+        conn.execute(journal.update().values(enviado_em=None, situacao="pendente"))
+
+    assert servicos["a"].sync_once()["enviados"] == 2
+    assert len(_pacientes(engines["central"])) == 1
+    with engines["central"].connect() as conn:
+        assert len(conn.execute(select(journal.c.id)).all()) == 2
+
+
+def test_conflito_reler_registro_inteiro_do_central(estacoes):
+    sessao, servicos, engines = estacoes
+    with sessao("a") as s:
+        _criar_paciente(s)
+    servicos["a"].sync_once()
+    servicos["b"].sync_once()
+
+    # colunas diferentes: o pull só traria o telefone alterado por A
+    with sessao("a") as s:
+        s.query(Paciente).one().telefone = "1100000001"
+        s.commit()
+    with sessao("b") as s:
+        s.query(Paciente).one().email = "recusado@exemplo.com"
+        s.commit()
+
+    servicos["a"].sync_once()
+    assert servicos["b"].sync_once()["conflitos"] == 1
+
+    colunas = (Paciente.__table__.c.telefone, Paciente.__table__.c.email, Paciente.__table__.c.updated_at)
+    copias = []
+    for nome in ("b", "central"):
+        with engines[nome].connect() as conn:
+            copias.append(tuple(conn.execute(select(*colunas)).one()))
+    assert copias[0] == copias[1]
+    assert copias[0][:2] == ("1100000001", None)
+
+    # a próxima alteração de B parte da versão do central e não conflita
+    with sessao("b") as s:
+        s.query(Paciente).one().email = "aceito@exemplo.com"
+        s.commit()
+    assert servicos["b"].sync_once()["conflitos"] == 0
+
+
+def test_lacuna_do_diario_central_e_relida(estacoes):
+    sessao, servicos, engines = estacoes
+    with sessao("a") as s:
+        _criar_paciente(s)
+    servicos["a"].sync_once()
+
+    # id 2 (paciente) ainda não confirmado no central quando B lê (transação lenta)
+    journal = SyncJournal.__table__
+    with engines["central"].begin() as conn:
+        reservada = dict(conn.execute(select(journal).where(journal.c.id == 2)).mappings().one())
+        conn.execute(journal.delete().where(journal.c.id == 2))
+    assert servicos["b"].sync_once()["recebidos"] == 1
+    assert _pacientes(engines["b"]) == []
+
+    with engines["central"].begin() as conn:
+        conn.execute(journal.insert().values(**reservada))
+    assert servicos["b"].sync_once()["recebidos"] == 1
+    assert _pacientes(engines["b"])[0][0] == "Maria Sync"
+
+
+def test_limpeza_do_diario_recebido_por_todas(estacoes, monkeypatch):
+    from db import sync
+    from models.sync import SyncIdMap
+
+    sessao, servicos, engines = estacoes
+    monkeypatch.setattr(sync, "SYNC_JANELA_IDS", 0)
+    servicos["b"].sync_once()  # estação conhecida, ainda na posição 0
+    with sessao("a") as s:
+        _criar_paciente(s)
+    servicos["a"].sync_once()
+    assert sync.podar_diario(engines["central"], 10)["linhas"] == 0  # B ainda não recebeu
+
+    servicos["b"].sync_once()
+    with sessao("b") as s:
+        s.delete(s.query(Paciente).one())
+        s.commit()
+    servicos["b"].sync_once()
+    servicos["a"].sync_once()
+
+    # endereço apagado no central fora do ORM: o mapa fica órfão
+    with engines["central"].begin() as conn:
+        conn.execute(Endereco.__table__.delete())
+
+    journal, mapa = SyncJournal.__table__, SyncIdMap.__table__
+    assert sync.podar_diario(engines["central"], 1)["linhas"] == 4  # 3 entradas + mapa do endereço
+    with engines["central"].connect() as conn:
+        assert conn.execute(select(journal.c.id)).all() == []
+        assert conn.execute(select(mapa.c.tabela)).all() == []
+
+
+def test_alteracao_com_referencia_de_lote_seguinte_e_reaplicada(estacoes):
+    sessao, servicos, engines = estacoes
+    with sessao("a") as s:
+        paciente = _criar_paciente(s)
+        paciente.telefone = "1133334444"
+        s.commit()
+    servicos["a"].sync_once()
+
+    # o endereço chega ao diário central depois do paciente que o referencia
+    journal = SyncJournal.__table__
+    with engines["central"].begin() as conn:
+        conn.execute(journal.update().where(journal.c.tabela == "enderecos").values(id=100))
+    servicos["b"].batch_size = 1
+    servicos["b"].pull()
+    servicos["b"].pull()
+    assert _pacientes(engines["b"]) == []
+    assert servicos["b"].nao_aplicadas() == 2  # INSERT sem endereço e o UPDATE que espera atrás
+
+    servicos["b"].sync_once()
+    assert servicos["b"].nao_aplicadas() == 0
+    nome, telefone, _, endereco_id = _pacientes(engines["b"])[0]
+    assert (nome, telefone) == ("Maria Sync", "1133334444") and endereco_id is not None
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import func
+
+from db.unit_of_work import ReadOnlyUnitError, current_unit, unit_of_work
+from models.auditoria import LogAuditoria
+from controllers.paciente_controller import paciente_controller
+
+
+def _total_logs(acao):
+    with unit_of_work(readonly=True) as uow:
+        return uow.session.query(func.count(LogAuditoria.id)).filter(LogAuditoria.acao == acao).scalar()
+
+
+def test_savepoint_desfaz_apenas_trecho_aninhado():
+    with unit_of_work("externa") as uow:
+        uow.session.add(LogAuditoria(acao="UOW_EXTERNA"))
+        with pytest.raises(RuntimeError):
+            with unit_of_work("interna"):
+                uow.session.add(LogAuditoria(acao="UOW_INTERNA"))
+                uow.session.flush()
+                raise RuntimeError("falha no trecho interno")
+        assert uow.savepoints == 1
+
+    assert _total_logs("UOW_EXTERNA") == 1
+    assert _total_logs("UOW_INTERNA") == 0
+
+
+def test_unidade_somente_leitura_rejeita_escrita():
+    with pytest.raises(ReadOnlyUnitError):
+        with unit_of_work("leitura", readonly=True) as uow:
+            uow.session.add(LogAuditoria(acao="UOW_READONLY"))
+            uow.session.flush()
+
+    with pytest.raises(ReadOnlyUnitError):
+        with unit_of_work("leitura", readonly=True):
+            with unit_of_work("escrita"):
+                pass
+
+
+def test_controllers_compartilham_a_unidade(admin_logado):
+    with unit_of_work("acao_tela", readonly=True) as uow:
+        paciente_controller.search_pacientes("ninguém com esse nome")
+        paciente_controller.get_paciente_by_id(-1)
+        assert current_unit() is uow
+
+    assert uow.report()["statements"] == 2
+    assert uow.report()["duration_ms"] is not None
+    assert current_unit() is None
@@ -0,0 +1,39 @@
+from controllers.relatorio_controller import relatorio_controller
+from controllers.warmup import Warmup
+from db.connection import db_manager
+
+
+def test_warm_pool_abre_conexoes():
+    assert db_manager.warm_pool() >= 1
+
+
+def test_dashboard_pre_carregado_e_entregue_uma_vez(admin_logado, max_statements):
+    # unidades somente leitura vão para a engine de leitura (se houver)
+    leitura = db_manager.read_engines[0] if db_manager.read_engines else db_manager.engine
+    relatorio_controller.prefetch_dashboard()
+
+    with max_statements(0, engine=leitura):
+        primeiro = relatorio_controller.get_dashboard_data()
+    assert primeiro["success"]
+
+    # depois do primeiro uso volta a consultar o banco
+    with max_statements(4, engine=leitura) as statements:
+        assert relatorio_controller.get_dashboard_data()["success"]
+    assert len(statements) == 4
+
+
+def test_etapas_executadas_uma_vez_e_falhas_nao_interrompem():
+    chamadas = []
+    aquecimento = Warmup()
+    aquecimento.register("falha", lambda: 1 / 0)
+    aquecimento.register("ok", lambda: chamadas.append("ok"))
+
+    assert aquecimento.start()
+    assert not aquecimento.start()
+    assert aquecimento.wait(timeout=5)
+    assert chamadas == ["ok"]
+    assert set(aquecimento.timings) == {"falha", "ok"}
+
+    aquecimento.reset()
+    assert aquecimento.start() and aquecimento.wait(timeout=5)
+    assert chamadas == ["ok", "ok"]
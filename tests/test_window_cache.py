@@ -0,0 +1,66 @@
+import threading
+from datetime import date
+
+from utils.window_cache import WindowCache
+
+SEMANA = (date(2031, 1, 6), date(2031, 1, 12), 7)
+PROXIMA = (date(2031, 1, 13), date(2031, 1, 19), 7)
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_carrega_uma_vez_e_expira():
+    relogio, cargas = Relogio(), []
+    cache = WindowCache(lambda *janela: cargas.append(janela) or [janela], ttl=60, clock=relogio)
+    assert cache.load(SEMANA) == [SEMANA]
+    assert cache.load(SEMANA) == [SEMANA]
+    assert len(cargas) == 1
+    relogio.agora = 61
+    assert cache.get(SEMANA) is None
+    cache.load(SEMANA)
+    assert len(cargas) == 2
+
+
+def test_prefetch_em_segundo_plano_e_invalidacao():
+    liberar = threading.Event()
+    cargas = []
+
+    def carregar(*janela):
+        cargas.append(janela)
+        if janela == PROXIMA:
+            liberar.wait(5)
+        return [janela]
+
+    cache = WindowCache(carregar, max_janelas=2)
+    cache.load(SEMANA)
+    cache.prefetch([PROXIMA, PROXIMA])
+    # alteração na agenda durante a pré-carga: o resultado antigo é descartado
+    cache.invalidar_dia(date(2031, 1, 14), 7)
+    liberar.set()
+    cache.shutdown()
+    assert cargas.count(PROXIMA) == 1
+    assert cache.get(PROXIMA) is None
+    assert cache.get(SEMANA) == [SEMANA]
+
+    cache.invalidar_dia(date(2031, 1, 8), 99)
+    assert cache.get(SEMANA) == [SEMANA]
+    cache.invalidar_dia(date(2031, 1, 8), 7)
+    assert cache.get(SEMANA) is None
+
+
+def test_falha_na_pre_carga_vai_para_o_log(caplog):
+    def carregar(inicio, fim, filtro):
+        raise RuntimeError("banco fora do ar")
+
+    cache = WindowCache(carregar)
+    with caplog.at_level("WARNING", logger="sisusf.window_cache"):
+        cache.prefetch([SEMANA])
+        cache._executor.shutdown(wait=True)
+    assert cache.get(SEMANA) is None
+    assert any("banco fora do ar" in r.getMessage() for r in caplog.records)
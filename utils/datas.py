@@ -0,0 +1,21 @@
+# =============================================================================
+# utils/datas.py
+# =============================================================================
+"""
+Aritmética de datas usada pelos controllers e rotinas (meses de calendário).
+"""
+import calendar
+from datetime import date, datetime, timedelta
+
+
+def add_months(dia: date, meses: int) -> date:
+    """dia + meses (negativo volta); dia 31 vira o último dia do mês de destino"""
+    mes = dia.month - 1 + meses
+    ano, mes = dia.year + mes // 12, mes % 12 + 1
+    return date(ano, mes, min(dia.day, calendar.monthrange(ano, mes)[1]))
+
+
+def competencia_fechada(agora: datetime) -> date:
+    """Primeiro dia do mês anterior a `agora` (último mês fechado)"""
+    anterior = agora.date().replace(day=1) - timedelta(days=1)
+    return anterior.replace(day=1)
@@ -0,0 +1,63 @@
+# =============================================================================
+# utils/intervals.py
+# =============================================================================
+"""
+Índice de intervalos de um dia (ocupação da agenda de um profissional).
+
+Vetores ordenados pelo início + máximo acumulado dos fins: a verificação de
+conflito é uma busca binária (O(log n)), sem consulta ao banco por horário
+candidato. Intervalos são semiabertos [inicio, fim).
+"""
+from bisect import bisect_left, bisect_right
+from typing import Hashable, Iterable, List, Optional, Tuple
+
+
+class DayIntervals:
+    def __init__(self, intervals: Iterable[Tuple[object, object, Hashable]] = ()):
+        ordered = sorted(intervals, key=lambda i: (i[0], i[1]))
+        self._starts: List = [i[0] for i in ordered]
+        self._ends: List = [i[1] for i in ordered]
+        self._keys: List[Hashable] = [i[2] for i in ordered]
+        self._max_end: List = []
+        self._rebuild(0)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends, self._keys))
+
+    def _rebuild(self, position: int) -> None:
+        # max_end[i] = maior fim entre os intervalos 0..i (cobre sobreposições antigas)
+        del self._max_end[position:]
+        for i in range(position, len(self._starts)):
+            end = self._ends[i]
+            self._max_end.append(end if i == 0 or self._max_end[i - 1] < end else self._max_end[i - 1])
+
+    def conflict(self, start, end) -> Optional[Hashable]:
+        """Chave de um intervalo que se sobrepõe a [start, end), ou None"""
+        # primeiro intervalo que começa depois de start: candidato pela direita
+        i = bisect_left(self._starts, end)
+        j = bisect_right(self._starts, start)
+        if j < i:
+            return self._keys[j]
+        # pela esquerda: algum intervalo iniciado até start termina depois dele;
+        # o primeiro k com max_end[k] > start é justamente um desses
+        k = bisect_right(self._max_end, start, 0, j)
+        return self._keys[k] if k < j else None
+
+    def add(self, start, end, key: Hashable) -> None:
+        position = bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._ends.insert(position, end)
+        self._keys.insert(position, key)
+        self._rebuild(position)
+
+    def remove(self, key: Hashable) -> bool:
+        try:
+            position = self._keys.index(key)
+        except ValueError:
+            return False
+        del self._starts[position], self._ends[position], self._keys[position]
+        self._rebuild(position)
+        return True
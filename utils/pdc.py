@@ -0,0 +1,81 @@
+# =============================================================================
+# utils/pdc.py
+# =============================================================================
+"""
+Adesão ao tratamento: proporção de dias cobertos (PDC), vetorizada.
+
+Entrada em colunas, uma posição por dispensação, ordenada por
+(paciente, medicamento, data):
+
+    grupos  índice do par paciente/medicamento (0..n-1, não decrescente)
+    datas   dia da dispensação (date.toordinal())
+    dias    dias de tratamento entregues
+
+Regra de cobertura: uma dispensação feita antes do fim da anterior só
+começa quando a anterior acaba (o paciente guarda o excedente). Assim
+início_i = max(data_i, fim_{i-1}) e fim_i = início_i + dias_i, recorrência
+que se resolve sem laço: com S_i a soma acumulada de dias no grupo,
+fim_i = S_i + max_{j<=i}(data_j - S_{j-1}) — um máximo acumulado por grupo.
+
+PDC = dias cobertos dentro da janela / dias entre a primeira dispensação
+na janela (ou o início da janela, se havia cobertura anterior) e o fim.
+"""
+
+import numpy as np
+
+
+def _cummax_por_grupo(valores: np.ndarray, grupos: np.ndarray) -> np.ndarray:
+    """Máximo acumulado reiniciado a cada grupo (grupos ordenados)"""
+    if not len(valores):
+        return valores
+    # deslocamento por grupo maior que a amplitude dos valores: o máximo de
+    # um grupo anterior nunca alcança os valores do grupo seguinte
+    passo = int(valores.max() - valores.min()) + 1
+    deslocamento = grupos.astype(np.int64) * passo
+    return np.maximum.accumulate(valores + deslocamento) - deslocamento
+
+
+def intervalos_cobertura(grupos: np.ndarray, datas: np.ndarray, dias: np.ndarray):
+    """(inicio, fim) de cada dispensação, fim exclusivo, já sem sobreposição no grupo"""
+    grupos = np.asarray(grupos, dtype=np.int64)
+    datas = np.asarray(datas, dtype=np.int64)
+    dias = np.asarray(dias, dtype=np.int64)
+    acumulado = np.cumsum(dias)
+    # soma acumulada reiniciada em cada grupo
+    primeiro = np.r_[True, grupos[1:] != grupos[:-1]] if len(grupos) else np.zeros(0, dtype=bool)
+    base = np.maximum.accumulate(np.where(primeiro, acumulado - dias, 0)) if len(grupos) else acumulado
+    soma = acumulado - base
+    fim = soma + _cummax_por_grupo(datas - (soma - dias), grupos)
+    return fim - dias, fim
+
+
+def pdc(grupos: np.ndarray, datas: np.ndarray, dias: np.ndarray, n_grupos: int,
+        janela_inicio: int, janela_fim: int):
+    """Por grupo: (dias_cobertos, dias_periodo, dispensacoes_na_janela, pdc).
+
+    janela_inicio/janela_fim: ordinais, ambos inclusivos. Grupos sem
+    dispensação na janela ficam com dias_periodo 0 e pdc nan.
+    """
+    grupos = np.asarray(grupos, dtype=np.int64)
+    datas = np.asarray(datas, dtype=np.int64)
+    inicio, fim = intervalos_cobertura(grupos, datas, dias)
+
+    limite = janela_fim + 1
+    cobertos_por_dispensacao = np.clip(np.minimum(fim, limite) - np.maximum(inicio, janela_inicio), 0, None)
+    cobertos = np.bincount(grupos, weights=cobertos_por_dispensacao, minlength=n_grupos).astype(np.int64)
+
+    na_janela = (datas >= janela_inicio) & (datas <= janela_fim)
+    dispensacoes = np.bincount(grupos[na_janela], minlength=n_grupos)
+
+    # início do período: primeira dispensação na janela, ou o início da
+    # janela quando uma dispensação anterior ainda cobria esse dia
+    primeira = np.full(n_grupos, limite, dtype=np.int64)
+    np.minimum.at(primeira, grupos[na_janela], datas[na_janela])
+    herdado = np.zeros(n_grupos, dtype=bool)
+    herdado[grupos[(datas < janela_inicio) & (fim > janela_inicio)]] = True
+    primeira[herdado] = janela_inicio
+
+    periodo = np.where(dispensacoes > 0, limite - primeira, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        proporcao = np.where(periodo > 0, np.minimum(cobertos, periodo) / periodo, np.nan)
+    return np.minimum(cobertos, periodo), periodo, dispensacoes, proporcao
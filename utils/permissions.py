@@ -0,0 +1,102 @@
+# =============================================================================
+# utils/permissions.py
+# =============================================================================
+"""
+Motor de permissões: compila a política de config/policy.py em máscaras de
+bits (uma por recurso) uma única vez por perfil/UBS. O resultado fica no
+usuário logado (current_user.permissions) e cada verificação é uma consulta
+a dicionário e um AND de bits.
+"""
+import enum
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from config.policy import ACTIONS, POLICY, ROLE_ALIASES
+
+ACTION_BITS: Dict[str, int] = {action: 1 << i for i, action in enumerate(ACTIONS)}
+
+
+def normalize_role(tipo) -> Optional[str]:
+    """TipoUsuario.ADMIN, "TipoUsuario.ADMIN", "ADMIN" ou "admin" -> "ADMIN" """
+    if tipo is None:
+        return None
+    if isinstance(tipo, enum.Enum):
+        tipo = tipo.value
+    role = str(tipo).rsplit(".", 1)[-1].upper()
+    return ROLE_ALIASES.get(role, role)
+
+
+def _mask(actions: Iterable[str]) -> int:
+    mask = 0
+    for action in actions:
+        if action not in ACTION_BITS:
+            raise ValueError(f"Ação desconhecida na política: {action!r}")
+        mask |= ACTION_BITS[action]
+    return mask
+
+
+class CompiledPolicy:
+    """Permissões compiladas de um perfil (imutável, compartilhada entre sessões)"""
+    __slots__ = ("role", "ubs", "default", "resources")
+
+    def __init__(self, role: Optional[str], ubs: Optional[str], default: int, resources: Dict[str, int]):
+        self.role = role
+        self.ubs = ubs
+        self.default = default
+        self.resources = resources
+
+    def allows(self, action: str, resource: Optional[str] = None) -> bool:
+        mask = self.resources.get(resource, self.default) if resource else self.default
+        return bool(mask & ACTION_BITS.get(action, 0))
+
+    def allows_many(self, actions: Iterable[str], resource: Optional[str] = None) -> Dict[str, bool]:
+        mask = self.resources.get(resource, self.default) if resource else self.default
+        return {action: bool(mask & ACTION_BITS.get(action, 0)) for action in actions}
+
+    def actions(self, resource: Optional[str] = None) -> FrozenSet[str]:
+        mask = self.resources.get(resource, self.default) if resource else self.default
+        return frozenset(a for a, bit in ACTION_BITS.items() if mask & bit)
+
+    def __repr__(self):
+        return f"<CompiledPolicy(role={self.role!r}, ubs={self.ubs!r}, acoes={sorted(self.actions())})>"
+
+
+def compile_policy(role: Optional[str], ubs: Optional[str] = None) -> CompiledPolicy:
+    """Compila (uma vez por perfil/UBS) as máscaras de permissão"""
+    return _compile(role, ubs)
+
+
+@lru_cache(maxsize=None)
+def _compile(role: Optional[str], ubs: Optional[str]) -> CompiledPolicy:
+    masks = {resource: _mask(actions) for resource, actions in POLICY["roles"].get(role, {}).items()}
+    default = masks.pop("*", 0)
+
+    ajustes = POLICY["ubs"].get(ubs, {}) if ubs is not None else {}
+    for tipo, aplicar in (("conceder", lambda m, b: m | b), ("negar", lambda m, b: m & ~b)):
+        for resource, actions in ajustes.get(tipo, {}).get(role, {}).items():
+            bits = _mask(actions)
+            if resource == "*":
+                # vale também para os recursos com regra própria
+                default = aplicar(default, bits)
+                masks = {r: aplicar(m, bits) for r, m in masks.items()}
+            else:
+                masks[resource] = aplicar(masks.get(resource, default), bits)
+
+    return CompiledPolicy(role, ubs, default, masks)
+
+
+def clear_policy_cache() -> None:
+    """Descarta as políticas compiladas (após alterar config/policy.py em execução)"""
+    _compile.cache_clear()
+
+
+def policy_for(user) -> CompiledPolicy:
+    """Política do usuário, compilada e guardada no próprio objeto da sessão"""
+    compiled = getattr(user, "permissions", None)
+    if compiled is None:
+        compiled = compile_policy(normalize_role(getattr(user, "tipo", None)), getattr(user, "ubs", None))
+        try:
+            user.permissions = compiled
+        except AttributeError:
+            pass
+    return compiled
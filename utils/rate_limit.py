@@ -0,0 +1,109 @@
+# =============================================================================
+# utils/rate_limit.py
+# =============================================================================
+"""
+Limitador em janela deslizante (em memória) e agregação de eventos
+bloqueados, usados para conter tentativas de login repetidas antes do bcrypt.
+"""
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+class SlidingWindowLimiter:
+    """No máximo max_events por chave em qualquer intervalo de window segundos"""
+
+    def __init__(self, max_events: int, window: float, max_keys: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_events = max_events
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._events: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key, now: float) -> Optional[deque]:
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def retry_after(self, key) -> float:
+        """0 se a chave pode prosseguir; senão segundos até liberar"""
+        with self._lock:
+            now = self.clock()
+            events = self._prune(key, now)
+            if events is None or len(events) < self.max_events:
+                return 0.0
+            return events[0] + self.window - now
+
+    def hit(self, key) -> int:
+        """Registra um evento e devolve quantos há na janela"""
+        with self._lock:
+            now = self.clock()
+            events = self._prune(key, now)
+            if events is None:
+                events = self._events[key] = deque()
+                # memória limitada: descarta as chaves mais antigas
+                while len(self._events) > self.max_keys:
+                    self._events.popitem(last=False)
+            else:
+                self._events.move_to_end(key)
+            events.append(now)
+            return len(events)
+
+    def reset(self, key) -> None:
+        with self._lock:
+            self._events.pop(key, None)
+
+
+class WindowAggregator:
+    """Conta eventos por chave e entrega um resumo por janela fixa.
+
+    add() e collect() devolvem os resumos das janelas já encerradas; flush()
+    entrega todos (encerramento do sistema).
+    """
+
+    def __init__(self, window: float, clock: Callable[[], float] = time.time):
+        self.window = window
+        self.clock = clock
+        self._open: Dict[Hashable, dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, **info) -> List[dict]:
+        with self._lock:
+            now = self.clock()
+            closed = self._collect(now)
+            current = self._open.get(key)
+            if current is None:
+                current = self._open[key] = {"chave": key, "inicio": now, "fim": now, "total": 0, **info}
+            current["total"] += 1
+            current["fim"] = now
+            return closed
+
+    def collect(self) -> List[dict]:
+        """Resumos das janelas encerradas, sem esperar um novo evento"""
+        with self._lock:
+            return self._collect(self.clock())
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._open)
+
+    def flush(self) -> List[dict]:
+        with self._lock:
+            closed = list(self._open.values())
+            self._open.clear()
+            return closed
+
+    def _collect(self, now: float) -> List[dict]:
+        closed = [a for a in self._open.values() if now - a["inicio"] >= self.window]
+        for aggregate in closed:
+            del self._open[aggregate["chave"]]
+        return closed
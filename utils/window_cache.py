@@ -0,0 +1,108 @@
+# =============================================================================
+# utils/window_cache.py
+# =============================================================================
+"""
+Cache de janelas de datas (semana/mês da agenda) com pré-carga em segundo
+plano das janelas vizinhas.
+
+Chave: (inicio, fim, filtro). Guarda no máximo max_janelas (LRU); cada
+janela vale ttl segundos (alterações feitas em outras estações) e pode ser
+descartada antes por invalidar_dia() (alterações desta estação).
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger("sisusf.window_cache")
+
+Janela = Tuple[date, date, Hashable]
+
+
+class WindowCache:
+    def __init__(self, carregar: Callable[[date, date, Hashable], object], max_janelas: int = 24,
+                 ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.carregar = carregar
+        self.max_janelas = max_janelas
+        self.ttl = ttl
+        self.clock = clock
+        self._janelas: "OrderedDict[Janela, Tuple[float, object]]" = OrderedDict()
+        self._geracao = 0                # invalidações durante uma carga descartam o resultado
+        self._em_carga = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def get(self, janela: Janela):
+        """Dados da janela se estiverem em cache e válidos; senão None"""
+        with self._lock:
+            entrada = self._janelas.get(janela)
+            if entrada is None or self.clock() - entrada[0] > self.ttl:
+                return None
+            self._janelas.move_to_end(janela)
+            return entrada[1]
+
+    def load(self, janela: Janela):
+        """Dados da janela (do cache ou carregados agora, na thread atual)"""
+        dados = self.get(janela)
+        if dados is None:
+            with self._lock:
+                geracao = self._geracao
+            dados = self.carregar(*janela)
+            self._guardar(janela, dados, geracao)
+        return dados
+
+    def prefetch(self, janelas: Iterable[Janela]) -> None:
+        """Carrega em segundo plano as janelas que ainda não estão em cache"""
+        for janela in janelas:
+            with self._lock:
+                if janela in self._em_carga:
+                    continue
+            if self.get(janela) is not None:
+                continue
+            with self._lock:
+                self._em_carga.add(janela)
+                geracao = self._geracao
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(1, thread_name_prefix="sisusf-prefetch")
+            self._executor.submit(self._prefetch_one, janela, geracao)
+
+    def _prefetch_one(self, janela: Janela, geracao: int) -> None:
+        try:
+            dados = self.carregar(*janela)
+            self._guardar(janela, dados, geracao)
+        except Exception as e:
+            logger.warning("Falha na pré-carga da janela %s: %r", janela, e)
+        finally:
+            with self._lock:
+                self._em_carga.discard(janela)
+
+    def _guardar(self, janela: Janela, dados, geracao: int) -> bool:
+        with self._lock:
+            if geracao != self._geracao:
+                return False
+            self._janelas[janela] = (self.clock(), dados)
+            self._janelas.move_to_end(janela)
+            while len(self._janelas) > self.max_janelas:
+                self._janelas.popitem(last=False)
+            return True
+
+    def invalidar_dia(self, dia: date, filtro: Hashable = None) -> None:
+        """Descarta as janelas que contêm o dia (filtro None: de qualquer filtro)"""
+        with self._lock:
+            self._geracao += 1
+            for janela in [j for j in self._janelas if j[0] <= dia <= j[1]]:
+                if filtro is None or janela[2] is None or janela[2] == filtro:
+                    del self._janelas[janela]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._geracao += 1
+            self._janelas.clear()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
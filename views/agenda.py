@@ -0,0 +1,312 @@
+# =============================================================================
+# views/agenda.py
+# =============================================================================
+
+from datetime import date, timedelta
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from controllers.agenda_controller import agenda_controller, AGENDA_CACHE_TTL
+from models.consulta import StatusConsulta
+from utils.window_cache import WindowCache
+
+HORA_INICIO = 7
+HORA_FIM = 19
+PASSO_MINUTOS = 30
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho",
+         "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+CORES_STATUS = {
+    StatusConsulta.AGENDADA: QColor("#3498db"),
+    StatusConsulta.REALIZADA: QColor("#27ae60"),
+    StatusConsulta.FALTOU: QColor("#e67e22"),
+}
+
+CONSULTAS_ROLE = Qt.UserRole
+DIA_ROLE = Qt.UserRole + 1
+
+
+def janela_de(modo: str, dia: date):
+    """(inicio, fim) exibidos: a semana (seg-dom) ou as 6 semanas da grade do mês"""
+    if modo == "semana":
+        inicio = dia - timedelta(days=dia.weekday())
+        return inicio, inicio + timedelta(days=6)
+    primeiro = dia.replace(day=1)
+    inicio = primeiro - timedelta(days=primeiro.weekday())
+    return inicio, inicio + timedelta(days=41)
+
+
+def deslocar(modo: str, dia: date, passos: int) -> date:
+    if modo == "semana":
+        return dia + timedelta(days=7 * passos)
+    mes = dia.month - 1 + passos
+    return date(dia.year + mes // 12, mes % 12 + 1, 1)
+
+
+class CalendarioModel(QAbstractTableModel):
+    """Grade da semana (horário x dia) ou do mês (semana x dia); cada célula
+    guarda a lista das suas consultas, desenhadas pelo ConsultaDelegate"""
+
+    def __init__(self):
+        super().__init__()
+        self.modo = "semana"
+        self.referencia = date.today()
+        self.inicio, self.fim = janela_de(self.modo, self.referencia)
+        self.celulas = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self.modo == "semana":
+            return (HORA_FIM - HORA_INICIO) * 60 // PASSO_MINUTOS
+        return 6
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 7
+
+    def dia(self, index) -> date:
+        if self.modo == "semana":
+            return self.inicio + timedelta(days=index.column())
+        return self.inicio + timedelta(days=index.row() * 7 + index.column())
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == CONSULTAS_ROLE:
+            return self.celulas.get((index.row(), index.column()), [])
+        if role == DIA_ROLE:
+            return self.dia(index)
+        if role == Qt.ToolTipRole:
+            consultas = self.celulas.get((index.row(), index.column()), [])
+            return "\n".join(f"{c['data_hora']:%H:%M} {c['nome_completo']}" for c in consultas) or None
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            if self.modo == "semana":
+                dia = self.inicio + timedelta(days=section)
+                return f"{DIAS_SEMANA[section]} {dia:%d/%m}"
+            return DIAS_SEMANA[section]
+        if self.modo == "semana":
+            minutos = HORA_INICIO * 60 + section * PASSO_MINUTOS
+            return f"{minutos // 60:02d}:{minutos % 60:02d}"
+        return None
+
+    def set_janela(self, modo: str, referencia: date, consultas):
+        """Troca a janela exibida e distribui as consultas pelas células"""
+        self.beginResetModel()
+        self.modo = modo
+        self.referencia = referencia
+        self.inicio, self.fim = janela_de(modo, referencia)
+        self.celulas = {}
+        for consulta in consultas:
+            dias = (consulta["data_hora"].date() - self.inicio).days
+            if modo == "semana":
+                minutos = consulta["data_hora"].hour * 60 + consulta["data_hora"].minute - HORA_INICIO * 60
+                linha = min(max(minutos // PASSO_MINUTOS, 0), self.rowCount() - 1)
+                celula = (linha, dias)
+            else:
+                celula = (dias // 7, dias % 7)
+            self.celulas.setdefault(celula, []).append(consulta)
+        self.endResetModel()
+
+
+class ConsultaDelegate(QStyledItemDelegate):
+    """Desenha as consultas da célula (sem um widget por consulta)"""
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        dia = index.data(DIA_ROLE)
+        consultas = index.data(CONSULTAS_ROLE)
+        rect = option.rect
+
+        painter.save()
+        fundo = QColor("#ffffff")
+        if dia.weekday() >= 5:
+            fundo = QColor("#f4f6f7")
+        if model.modo == "mes" and dia.month != model.referencia.month:
+            fundo = QColor("#eaeded")
+        if dia == date.today():
+            fundo = QColor("#fef9e7")
+        if option.state & QStyle.State_Selected:
+            fundo = QColor("#d6eaf8")
+        painter.fillRect(rect, fundo)
+        painter.setPen(QColor("#d5dbdb"))
+        painter.drawRect(rect.adjusted(0, 0, -1, -1))
+
+        metrics = option.fontMetrics
+        linha_altura = metrics.height() + 2
+        area = rect.adjusted(2, 2, -2, -2)
+        if model.modo == "mes":
+            painter.setPen(QColor("#2c3e50"))
+            painter.drawText(area, Qt.AlignLeft | Qt.AlignTop, str(dia.day))
+            area.setTop(area.top() + linha_altura)
+
+        if consultas:
+            largura = area.width() // len(consultas) if model.modo == "semana" else area.width()
+            maximo = max(1, area.height() // linha_altura) if model.modo == "mes" else len(consultas)
+            for n, consulta in enumerate(consultas[:maximo]):
+                if model.modo == "semana":
+                    bloco = QRect(area.left() + n * largura, area.top(), largura - 1, area.height())
+                else:
+                    bloco = QRect(area.left(), area.top() + n * linha_altura, area.width(), linha_altura - 1)
+                if model.modo == "mes" and n == maximo - 1 and len(consultas) > maximo:
+                    painter.setPen(QColor("#7f8c8d"))
+                    painter.drawText(bloco, Qt.AlignLeft | Qt.AlignVCenter, f"+{len(consultas) - n} consultas")
+                    break
+                cor = CORES_STATUS.get(consulta["status"], QColor("#95a5a6"))
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(cor)
+                painter.drawRoundedRect(bloco, 3, 3)
+                painter.setPen(QColor("white"))
+                texto = f"{consulta['data_hora']:%H:%M} {consulta['nome_completo']}"
+                painter.drawText(bloco.adjusted(3, 0, -3, 0), Qt.AlignLeft | Qt.AlignVCenter,
+                                 metrics.elidedText(texto, Qt.ElideRight, bloco.width() - 6))
+        painter.restore()
+
+
+class AgendaWidget(QWidget):
+    """Agenda em semana/mês: carrega só a janela visível, pré-carrega as
+    vizinhas em segundo plano e mantém as janelas recentes em cache"""
+
+    def __init__(self):
+        super().__init__()
+        self.modo = "semana"
+        self.referencia = date.today()
+        # pré-carga em segundo plano; a interface só lê do cache
+        self.cache = WindowCache(self.carregar_janela, ttl=AGENDA_CACHE_TTL)
+        agenda_controller.on_change(self.on_agenda_alterada)
+        self.init_ui()
+        self.mostrar()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        # Título
+        title = QLabel("Agenda")
+        title.setStyleSheet("""
+            QLabel {
+                font-size: 20px;
+                font-weight: bold;
+                color: #2c3e50;
+                margin: 10px;
+            }
+        """)
+        layout.addWidget(title)
+
+        # Controles
+        controles = QHBoxLayout()
+
+        self.profissional_combo = QComboBox()
+        self.profissional_combo.addItem("Todos os profissionais", None)
+        for profissional in agenda_controller.profissionais():
+            self.profissional_combo.addItem(profissional["nome"], profissional["id"])
+        self.profissional_combo.currentIndexChanged.connect(lambda _: self.mostrar())
+        controles.addWidget(self.profissional_combo)
+
+        self.modo_combo = QComboBox()
+        self.modo_combo.addItem("Semana", "semana")
+        self.modo_combo.addItem("Mês", "mes")
+        self.modo_combo.currentIndexChanged.connect(self.on_modo)
+        controles.addWidget(self.modo_combo)
+
+        for texto, passos in (("◀", -1), ("Hoje", 0), ("▶", 1)):
+            botao = QPushButton(texto)
+            botao.clicked.connect(lambda _, p=passos: self.navegar(p))
+            controles.addWidget(botao)
+
+        self.periodo_label = QLabel()
+        self.periodo_label.setStyleSheet("font-weight: bold; color: #2c3e50; margin-left: 10px;")
+        controles.addWidget(self.periodo_label)
+        controles.addStretch()
+        layout.addLayout(controles)
+
+        # Grade
+        self.model = CalendarioModel()
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setItemDelegate(ConsultaDelegate(self.view))
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.view.setShowGrid(False)
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.view.doubleClicked.connect(self.mostrar_detalhes)
+        layout.addWidget(self.view)
+
+        QShortcut(QKeySequence(Qt.Key_PageUp), self, lambda: self.navegar(-1))
+        QShortcut(QKeySequence(Qt.Key_PageDown), self, lambda: self.navegar(1))
+
+        # Status
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        layout.addWidget(self.status_label)
+
+        self.setLayout(layout)
+
+    # ------------------------
+    # Janelas
+    # ------------------------
+    def carregar_janela(self, inicio, fim, profissional_id):
+        return agenda_controller.agenda_periodo(inicio, fim, profissional_id)
+
+    def janela(self, referencia=None):
+        inicio, fim = janela_de(self.modo, referencia or self.referencia)
+        return inicio, fim, self.profissional_combo.currentData()
+
+    def mostrar(self):
+        janela = self.janela()
+        consultas = self.cache.load(janela)
+        self.model.set_janela(self.modo, self.referencia, consultas)
+
+        vh = self.view.verticalHeader()
+        if self.modo == "semana":
+            vh.setVisible(True)
+            vh.setSectionResizeMode(QHeaderView.Fixed)
+            vh.setDefaultSectionSize(28)
+        else:
+            vh.setVisible(False)
+            vh.setSectionResizeMode(QHeaderView.Stretch)
+
+        if self.modo == "semana":
+            self.periodo_label.setText(f"{janela[0]:%d/%m/%Y} a {janela[1]:%d/%m/%Y}")
+        else:
+            self.periodo_label.setText(f"{MESES[self.referencia.month - 1]} de {self.referencia.year}")
+        self.status_label.setText(f"{len(consultas)} consulta(s) no período")
+
+        # próxima e anterior já ficam prontas para a navegação
+        self.cache.prefetch([self.janela(deslocar(self.modo, self.referencia, p)) for p in (1, -1)])
+
+    def navegar(self, passos: int):
+        self.referencia = date.today() if passos == 0 else deslocar(self.modo, self.referencia, passos)
+        self.mostrar()
+
+    def on_modo(self, _):
+        self.modo = self.modo_combo.currentData()
+        self.mostrar()
+
+    def on_agenda_alterada(self, profissional_id, dia):
+        self.cache.invalidar_dia(dia, profissional_id)
+        inicio, fim, _ = self.janela()
+        if inicio <= dia <= fim:
+            self.mostrar()
+
+    def mostrar_detalhes(self, index):
+        consultas = index.data(CONSULTAS_ROLE)
+        dia = index.data(DIA_ROLE)
+        if not consultas:
+            return
+        linhas = [f"{c['data_hora']:%H:%M} - {c['nome_completo']} ({c['tipo'].value.replace('_', ' ')}, "
+                  f"{c['status'].value})" for c in consultas]
+        QMessageBox.information(self, f"Consultas de {dia:%d/%m/%Y}", "\n".join(linhas))
+
+    def encerrar(self):
+        """Solta o aviso do controller e a thread de pré-carga (a aba não recebe closeEvent)"""
+        agenda_controller.off_change(self.on_agenda_alterada)
+        self.cache.shutdown()
+
+    def closeEvent(self, event):
+        self.encerrar()
+        super().closeEvent(event)
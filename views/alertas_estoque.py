@@ -0,0 +1,130 @@
+# =============================================================================
+# views/alertas_estoque.py
+# =============================================================================
+
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from controllers.estoque_controller import estoque_controller
+from models.medicamento import TipoAlerta
+
+ALERTAS_POLL_MS = 60000
+
+DESCRICAO_ALERTA = {
+    TipoAlerta.ESTOQUE_BAIXO: "abaixo do mínimo",
+    TipoAlerta.ESTOQUE_NORMALIZADO: "estoque normalizado",
+    TipoAlerta.LOTE_VENCENDO: "lote vencendo",
+    TipoAlerta.ESTOQUE_DIVERGENTE: "saldo diverge do livro",
+}
+
+
+class IndicadorAlertas(QLabel):
+    """Contador de alertas de estoque na barra de status: lê só o feed novo
+    (ids maiores que o último visto) e abre o painel ao clicar"""
+
+    alertas_recebidos = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ultimo_id = estoque_controller.ultimo_alerta_id()
+        self.pendentes = []  # lacunas de id ainda não confirmadas (ver novos_alertas)
+        self.nao_vistos = []
+        self.setCursor(Qt.PointingHandCursor)
+        self.atualizar_texto()
+
+        # alertas desta estação chegam na hora; os das outras pelo timer
+        self.alertas_recebidos.connect(self.buscar_novos)
+        estoque_controller.on_alerta(lambda alertas: self.alertas_recebidos.emit(alertas))
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.buscar_novos)
+        self.timer.start(ALERTAS_POLL_MS)
+
+    def buscar_novos(self, *_):
+        result = estoque_controller.novos_alertas(self.ultimo_id, pendentes=self.pendentes)
+        if not result["success"]:
+            return
+        self.ultimo_id = result["ultimo_id"]
+        self.pendentes = result["pendentes"]
+        if not result["alertas"]:
+            return
+        self.nao_vistos.extend(result["alertas"])
+        self.atualizar_texto()
+
+    def atualizar_texto(self):
+        total = len(self.nao_vistos)
+        self.setText(f"Estoque: {total} alerta(s)" if total else "Estoque: sem alertas")
+        self.setStyleSheet("color: #c0392b; font-weight: bold;" if total else "color: #7f8c8d;")
+        self.setToolTip("\n".join(
+            f"{a['nome']}: {DESCRICAO_ALERTA[a['tipo']]}" for a in self.nao_vistos[-10:]
+        ))
+
+    def mousePressEvent(self, event):
+        self.nao_vistos = []
+        self.atualizar_texto()
+        AlertasEstoqueDialog(self.window()).exec_()
+
+
+class AlertasEstoqueDialog(QDialog):
+    """Painel de alertas: medicamentos abaixo do mínimo e lotes vencendo"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Alertas de Estoque")
+        self.resize(700, 500)
+        self.init_ui()
+        self.carregar()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        controles = QHBoxLayout()
+        controles.addWidget(QLabel("Lotes vencendo em até"))
+        self.dias = QSpinBox()
+        self.dias.setRange(1, 365)
+        self.dias.setValue(30)
+        self.dias.setSuffix(" dias")
+        self.dias.valueChanged.connect(self.carregar)
+        controles.addWidget(self.dias)
+        controles.addStretch()
+        layout.addLayout(controles)
+
+        layout.addWidget(QLabel("Abaixo do estoque mínimo"))
+        self.tabela_baixo = self.criar_tabela(["Medicamento", "Estoque", "Mínimo"])
+        layout.addWidget(self.tabela_baixo)
+
+        layout.addWidget(QLabel("Lotes vencendo"))
+        self.tabela_vencendo = self.criar_tabela(["Medicamento", "Lote", "Validade", "Quantidade"])
+        layout.addWidget(self.tabela_vencendo)
+
+        fechar = QPushButton("Fechar")
+        fechar.clicked.connect(self.accept)
+        layout.addWidget(fechar, alignment=Qt.AlignRight)
+
+        self.setLayout(layout)
+
+    def criar_tabela(self, colunas):
+        tabela = QTableWidget(0, len(colunas))
+        tabela.setHorizontalHeaderLabels(colunas)
+        tabela.horizontalHeader().setStretchLastSection(True)
+        tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        tabela.setSelectionBehavior(QAbstractItemView.SelectRows)
+        return tabela
+
+    def preencher(self, tabela, linhas):
+        tabela.setRowCount(len(linhas))
+        for i, valores in enumerate(linhas):
+            for j, valor in enumerate(valores):
+                tabela.setItem(i, j, QTableWidgetItem("" if valor is None else str(valor)))
+
+    def carregar(self):
+        result = estoque_controller.alertas(self.dias.value())
+        if not result["success"]:
+            QMessageBox.warning(self, "Erro", result["message"])
+            return
+        self.preencher(self.tabela_baixo, [
+            (m["nome"], m["estoque_atual"], m["estoque_minimo"]) for m in result["estoque_baixo"]
+        ])
+        self.preencher(self.tabela_vencendo, [
+            (l["nome"], l["lote"], l["validade"].strftime("%d/%m/%Y"), l["quantidade"])
+            for l in result["vencendo"]
+        ])
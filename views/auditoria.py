@@ -0,0 +1,163 @@
+# =============================================================================
+# views/auditoria.py
+# =============================================================================
+
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from controllers.auditoria_controller import auditoria_controller
+
+class AuditoriaWidget(QWidget):
+    """Visualizador de auditoria: as páginas são carregadas conforme a rolagem"""
+
+    COLUNAS = ["Data/Hora", "Usuário", "Ação", "Tabela", "Registro", "IP", "Observações"]
+
+    def __init__(self):
+        super().__init__()
+        self.cursor = None
+        self.filtros = {}
+        self.carregando = False
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        # Título
+        title = QLabel("Auditoria")
+        title.setStyleSheet("""
+            QLabel {
+                font-size: 20px;
+                font-weight: bold;
+                color: #2c3e50;
+                margin: 10px;
+            }
+        """)
+        layout.addWidget(title)
+
+        # Filtros
+        filtros_layout = QHBoxLayout()
+
+        self.tipo_combo = QComboBox()
+        self.tipo_combo.addItems(["Paciente", "Usuário"])
+        filtros_layout.addWidget(self.tipo_combo)
+
+        self.id_input = QLineEdit()
+        self.id_input.setPlaceholderText("ID do paciente ou do usuário")
+        self.id_input.setValidator(QIntValidator(1, 2**31 - 1))
+        self.id_input.returnPressed.connect(self.pesquisar)
+        filtros_layout.addWidget(self.id_input)
+
+        filtros_layout.addWidget(QLabel("De:"))
+        self.desde_input = QDateEdit(QDate.currentDate())
+        self.desde_input.setCalendarPopup(True)
+        filtros_layout.addWidget(self.desde_input)
+
+        filtros_layout.addWidget(QLabel("Até:"))
+        self.ate_input = QDateEdit(QDate.currentDate())
+        self.ate_input.setCalendarPopup(True)
+        filtros_layout.addWidget(self.ate_input)
+
+        self.periodo_check = QCheckBox("Filtrar período")
+        filtros_layout.addWidget(self.periodo_check)
+
+        search_button = QPushButton("Pesquisar")
+        search_button.clicked.connect(self.pesquisar)
+        search_button.setStyleSheet("""
+            QPushButton {
+                background-color: #3498db;
+                color: white;
+                padding: 8px 16px;
+                border: none;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #2980b9;
+            }
+        """)
+        filtros_layout.addWidget(search_button)
+
+        layout.addLayout(filtros_layout)
+
+        # Tabela de eventos
+        self.table = QTableWidget()
+        self.table.setColumnCount(len(self.COLUNAS))
+        self.table.setHorizontalHeaderLabels(self.COLUNAS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        header = self.table.horizontalHeader()
+        for i in range(len(self.COLUNAS) - 1):
+            header.setSectionResizeMode(i, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(len(self.COLUNAS) - 1, QHeaderView.Stretch)
+
+        # Próxima página ao chegar perto do fim da rolagem
+        self.table.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        layout.addWidget(self.table)
+
+        # Status
+        self.status_label = QLabel("Informe o paciente ou o usuário para consultar a auditoria")
+        self.status_label.setStyleSheet("color: #7f8c8d; font-style: italic;")
+        layout.addWidget(self.status_label)
+
+        self.setLayout(layout)
+
+    def pesquisar(self):
+        """Nova consulta: limpa a tabela e carrega a primeira página"""
+        texto = self.id_input.text().strip()
+        if not texto:
+            self.status_label.setText("Informe o ID para pesquisar")
+            return
+
+        if self.tipo_combo.currentText() == "Paciente":
+            self.filtros = {"tabela": "pacientes", "registro_id": int(texto)}
+        else:
+            self.filtros = {"usuario_id": int(texto)}
+
+        if self.periodo_check.isChecked():
+            self.filtros["desde"] = self.desde_input.date().toPyDate()
+            # 'ate' é exclusivo: inclui o dia inteiro selecionado
+            self.filtros["ate"] = self.ate_input.date().addDays(1).toPyDate()
+
+        self.cursor = None
+        self.table.setRowCount(0)
+        self.carregar_pagina()
+
+    def on_scroll(self, value):
+        barra = self.table.verticalScrollBar()
+        if self.cursor and not self.carregando and value >= barra.maximum() - 5:
+            self.carregar_pagina()
+
+    def carregar_pagina(self):
+        self.carregando = True
+        try:
+            result = auditoria_controller.buscar(cursor=self.cursor, **self.filtros)
+            if not result["success"]:
+                self.status_label.setText(result["message"])
+                return
+
+            self.adicionar_linhas(result["dados"])
+            self.cursor = result["proximo_cursor"]
+
+            total = self.table.rowCount()
+            if self.cursor:
+                self.status_label.setText(f"{total} evento(s) carregado(s) - role para carregar mais")
+            else:
+                self.status_label.setText(f"{total} evento(s) encontrado(s)")
+        finally:
+            self.carregando = False
+
+    def adicionar_linhas(self, eventos):
+        inicio = self.table.rowCount()
+        self.table.setRowCount(inicio + len(eventos))
+        for i, evento in enumerate(eventos):
+            valores = [
+                evento["timestamp"].strftime("%d/%m/%Y %H:%M:%S"),
+                evento.get("usuario_nome") or "",
+                evento.get("acao") or "",
+                evento.get("tabela") or "",
+                str(evento["registro_id"]) if evento.get("registro_id") is not None else "",
+                evento.get("ip_address") or "",
+                evento.get("observacoes") or "",
+            ]
+            for col, valor in enumerate(valores):
+                self.table.setItem(inicio + i, col, QTableWidgetItem(valor))
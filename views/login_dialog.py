@@ -7,10 +7,35 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from controllers.auth_controller import auth
+from controllers.warmup import warmup
+
+class LoginWorker(QThread):
+    """Executa o login (consulta + bcrypt) fora da thread da interface"""
+    concluido = pyqtSignal(dict)
+
+    def __init__(self, email: str, password: str, ip_address: str, parent=None):
+        super().__init__(parent)
+        self.email = email
+        self.password = password
+        self.ip_address = ip_address
+
+    def run(self):
+        warmup.start()
+        try:
+            result = auth.login(self.email, self.password, self.ip_address)
+        except Exception as e:
+            result = {"success": False, "message": f"Erro no login: {e}"}
+        if result["success"]:
+            # janela principal abre com pool e dashboard já carregados
+            warmup.wait(timeout=5.0)
+        self.concluido.emit(result)
 
 class LoginDialog(QDialog):
     def __init__(self):
         super().__init__()
+        self.worker = None
+        # novo login (ex.: após logout): aquece de novo com os dados atuais
+        warmup.reset()
         self.init_ui()
     
     def init_ui(self):
@@ -62,6 +87,17 @@ class LoginDialog(QDialog):
         form_layout.addRow("E-mail:", self.email_input)
         form_layout.addRow("Senha:", self.password_input)
         
+        # Aquecimento do banco começa na primeira tecla digitada
+        self.email_input.textEdited.connect(self.on_typing)
+        self.password_input.textEdited.connect(self.on_typing)
+        
+        # Indicador de progresso (indeterminado) durante a autenticação
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setTextVisible(False)
+        self.progress.setMaximumHeight(6)
+        self.progress.hide()
+        
         # Botões
         button_layout = QHBoxLayout()
         
@@ -111,6 +147,7 @@ class LoginDialog(QDialog):
         layout.addWidget(title)
         layout.addWidget(subtitle)
         layout.addLayout(form_layout)
+        layout.addWidget(self.progress)
         layout.addLayout(button_layout)
         
         self.setLayout(layout)
@@ -118,7 +155,13 @@ class LoginDialog(QDialog):
         # Foco inicial
         self.email_input.setFocus()
     
+    def on_typing(self):
+        warmup.start()
+    
     def handle_login(self):
+        if self.worker is not None:
+            return  # login em andamento
+        
         email = self.email_input.text().strip()
         password = self.password_input.text()
         
@@ -126,18 +169,34 @@ class LoginDialog(QDialog):
             QMessageBox.warning(self, "Atenção", "Preencha email e senha.")
             return
         
-        # Desabilitar botão durante login
-        self.login_button.setEnabled(False)
-        self.login_button.setText("Entrando...")
+        # Desabilitar formulário durante login
+        self.set_busy(True)
         
-        # Processar login
-        result = auth.login(email, password, "127.0.0.1")
+        # Processar login em segundo plano
+        self.worker = LoginWorker(email, password, "127.0.0.1", self)
+        self.worker.concluido.connect(self.on_login_finished)
+        self.worker.start()
+    
+    def on_login_finished(self, result):
+        self.worker.wait()
+        self.worker = None
         
         if result["success"]:
             self.accept()
         else:
+            self.set_busy(False)
             QMessageBox.critical(self, "Erro", result["message"])
-            self.login_button.setEnabled(True)
-            self.login_button.setText("Entrar")
             self.password_input.clear()
-            self.password_input.setFocus()
\ No newline at end of file
+            self.password_input.setFocus()
+    
+    def set_busy(self, busy: bool):
+        self.login_button.setEnabled(not busy)
+        self.login_button.setText("Entrando..." if busy else "Entrar")
+        self.email_input.setEnabled(not busy)
+        self.password_input.setEnabled(not busy)
+        self.progress.setVisible(busy)
+    
+    def reject(self):
+        if self.worker is not None:
+            return  # aguarda o término do login antes de fechar
+        super().reject()
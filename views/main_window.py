@@ -9,8 +9,12 @@ from PyQt5.QtGui import *
 from datetime import datetime
 from controllers.auth_controller import auth
 from controllers.relatorio_controller import relatorio_controller
+from db.audit_sink import audit_sink
 from views.cadastro_paciente import CadastroPacienteDialog
 from views.consulta_paciente import ConsultaPacienteWidget
+from views.auditoria import AuditoriaWidget
+from views.agenda import AgendaWidget
+from views.alertas_estoque import IndicadorAlertas
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -30,6 +34,8 @@ class MainWindow(QMainWindow):
         
         # Status bar
         self.statusBar().showMessage(f"Usuário: {auth.current_user.nome} - {auth.current_user.tipo.upper()}")
+        if auth.has_permission('read', 'medicamentos'):
+            self.statusBar().addPermanentWidget(IndicadorAlertas(self))
         
         # Widget central
         self.create_central_widget()
@@ -69,12 +75,15 @@ class MainWindow(QMainWindow):
     def create_menu_bar(self):
         menubar = self.menuBar()
         
+        # Permissões verificadas de uma vez para montar menus e toolbar
+        self.perms = auth.has_permissions(('create', 'read', 'report', 'audit'))
+        
         # Menu Cadastro
         cadastro_menu = menubar.addMenu('Cadastro')
-        cadastro_menu.addAction('Novo Paciente', self.show_cadastro_paciente, 'Ctrl+N')
-        cadastro_menu.addAction('Nova Família', self.show_cadastro_familia)
+        cadastro_menu.addAction('Novo Paciente', self.show_cadastro_paciente, 'Ctrl+N').setEnabled(self.perms['create'])
+        cadastro_menu.addAction('Nova Família', self.show_cadastro_familia).setEnabled(self.perms['create'])
         cadastro_menu.addSeparator()
-        cadastro_menu.addAction('Usuários', self.show_usuarios)
+        cadastro_menu.addAction('Usuários', self.show_usuarios).setEnabled(self.perms['audit'])
         
         # Menu Atendimento
         atendimento_menu = menubar.addMenu('Atendimento')
@@ -85,9 +94,9 @@ class MainWindow(QMainWindow):
         
         # Menu Relatórios
         relatorios_menu = menubar.addMenu('Relatórios')
-        relatorios_menu.addAction('Dashboard', self.show_dashboard, 'F5')
-        relatorios_menu.addAction('Pacientes', self.show_relatorio_pacientes)
-        relatorios_menu.addAction('Consultas', self.show_relatorio_consultas)
+        relatorios_menu.addAction('Dashboard', self.show_dashboard, 'F5').setEnabled(self.perms['read'])
+        relatorios_menu.addAction('Pacientes', self.show_relatorio_pacientes).setEnabled(self.perms['report'])
+        relatorios_menu.addAction('Consultas', self.show_relatorio_consultas).setEnabled(self.perms['report'])
         
         # Menu Sistema
         sistema_menu = menubar.addMenu('Sistema')
@@ -100,12 +109,12 @@ class MainWindow(QMainWindow):
         toolbar = self.addToolBar('Principal')
         
         # Ações principais
-        toolbar.addAction('Novo Paciente', self.show_cadastro_paciente)
-        toolbar.addAction('Buscar', self.show_busca_paciente)
-        toolbar.addAction('Consulta', self.show_consulta)
+        toolbar.addAction('Novo Paciente', self.show_cadastro_paciente).setEnabled(self.perms['create'])
+        toolbar.addAction('Buscar', self.show_busca_paciente).setEnabled(self.perms['read'])
+        toolbar.addAction('Consulta', self.show_consulta).setEnabled(self.perms['read'])
         toolbar.addSeparator()
-        toolbar.addAction('Dashboard', self.show_dashboard)
-        toolbar.addAction('Relatórios', self.show_relatorios)
+        toolbar.addAction('Dashboard', self.show_dashboard).setEnabled(self.perms['read'])
+        toolbar.addAction('Relatórios', self.show_relatorios).setEnabled(self.perms['report'])
         
         # Adicionar busca rápida
         toolbar.addSeparator()
@@ -131,6 +140,11 @@ class MainWindow(QMainWindow):
         # Tab Pacientes
         self.pacientes_tab = ConsultaPacienteWidget()
         self.tab_widget.addTab(self.pacientes_tab, "Pacientes")
+        
+        # Tab Auditoria (somente perfis com permissão)
+        if self.perms['audit']:
+            self.auditoria_tab = AuditoriaWidget()
+            self.tab_widget.addTab(self.auditoria_tab, "Auditoria")
     
     def create_dashboard_tab(self):
         """Cria aba do dashboard"""
@@ -295,7 +309,13 @@ Versão: 1.0.0
         self.tab_widget.setCurrentWidget(self.pacientes_tab)
     
     def show_agenda(self):
-        QMessageBox.information(self, "Info", "Funcionalidade em desenvolvimento")
+        # aba criada na primeira abertura
+        if not self.perms['read']:
+            return
+        if getattr(self, 'agenda_tab', None) is None:
+            self.agenda_tab = AgendaWidget()
+            self.tab_widget.addTab(self.agenda_tab, "Agenda")
+        self.tab_widget.setCurrentWidget(self.agenda_tab)
     
     def show_medicamentos(self):
         QMessageBox.information(self, "Info", "Funcionalidade em desenvolvimento")
@@ -340,7 +360,11 @@ Versão: 1.0.0
         )
         
         if reply == QMessageBox.Yes:
+            if getattr(self, 'agenda_tab', None) is not None:
+                self.agenda_tab.encerrar()
             auth.logout()
+            # grava os eventos de auditoria ainda na fila antes de sair
+            audit_sink.close()
             event.accept()
         else:
             event.ignore()
\ No newline at end of file